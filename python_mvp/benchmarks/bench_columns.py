@@ -0,0 +1,91 @@
+"""Compare product field filters on the set indexes with the NumPy columns.
+
+Builds a synthetic catalog (see `catalog.py`) and times analytical filters
+such as `status=active,draft` with `classification!=restricted`, and
+`created_at` windows:
+
+  - on the set indexes, as catalogs below `COLUMNAR_MIN_PRODUCTS` (or
+    without NumPy) answer them;
+  - on the integer-coded columns of `columns.py`, after timing how long the
+    first such filter takes to build them.
+
+The query cache is off, so every run evaluates the filters. Without NumPy
+only the set indexes are timed.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_columns --products 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+from benchmarks.catalog import generate_catalog
+from registry.columns import available
+from registry.filters import Filter, parse_filter
+from registry.query_cache import QueryCache
+from registry.services import Registry
+
+QUERIES = (
+	("status=active,draft", "classification!=restricted"),
+	("status=active,draft", "classification!=restricted", "owner_team_id!=1,2"),
+	("status=active,draft", "classification!=restricted", "business.domain=climate"),
+	("status!=deprecated", "technical.row_count>1e6"),
+	("created_at>=2024-01-01", "created_at<2025-01-01"),
+	("created_at>=2024-01-01", "classification!=restricted", "business.domain=climate"),
+)
+
+
+def best(run: Callable[[], object], repeat: int) -> Tuple[float, object]:
+	times = []
+	result = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = run()
+		times.append(time.perf_counter() - start)
+	return min(times), result
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=1000000)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	registry = Registry()
+	registry.query_cache = QueryCache(capacity=0)
+	with registry.untracked():
+		generate_catalog(registry, args.products, seed=args.seed)
+	print(f"{args.products} products, NumPy {'installed' if available() else 'not installed'}")
+
+	queries: List[List[Filter]] = [[parse_filter(expr) for expr in query] for query in QUERIES]
+	if available():
+		registry.columnar_min_products = 0
+		start = time.perf_counter()
+		registry.filter_product_ids(queries[0])
+		print(f"columns built by the first filter in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+	rows: List[Tuple[str, float, float, int]] = []
+	for query in queries:
+		registry.columnar_min_products = args.products + 1
+		set_seconds, expected = best(lambda: registry.filter_product_ids(query), args.repeat)
+		column_seconds = 0.0
+		if available():
+			registry.columnar_min_products = 0
+			column_seconds, ids = best(lambda: registry.filter_product_ids(query), args.repeat)
+			if ids != expected:
+				raise SystemExit(f"columns and set indexes disagree on {', '.join(map(str, query))}")
+		rows.append((", ".join(str(f) for f in query), set_seconds, column_seconds, len(expected)))
+
+	print(f"{'filters':<76} {'sets ms':>9} {'columns ms':>10} {'products':>9}")
+	for label, set_seconds, column_seconds, count in rows:
+		columns = f"{column_seconds * 1e3:.1f}" if available() else "-"
+		print(f"{label:<76} {set_seconds * 1e3:>9.1f} {columns:>10} {count:>9}")
+
+
+if __name__ == "__main__":
+	main()
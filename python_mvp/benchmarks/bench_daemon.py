@@ -0,0 +1,100 @@
+"""Compare `feam` command latency with and without a running `feam daemon`.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_daemon --products 20000 --runs 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.bench_memory import build
+from registry.client import feam_environment, request
+from registry.storage import JournalStore
+
+PYTHON_MVP = Path(__file__).resolve().parent.parent
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+	ordered = sorted(samples)
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def time_process(argv: List[str], cwd: str, env: Dict[str, str], runs: int) -> List[float]:
+	samples = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		# Captured, not shown: every `--limit` listing ends with a paging hint
+		# ("Next page: --after ...") on stderr.
+		subprocess.run(argv, cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+		samples.append(time.perf_counter() - start)
+	return samples
+
+
+def time_requests(command: List[str], cwd: str, runs: int) -> List[float]:
+	"""Round trips from an already running client, e.g. a workflow engine."""
+	message = {"argv": command, "cwd": cwd, "env": feam_environment()}
+	samples = []
+	for _ in range(runs):
+		start = time.perf_counter()
+		response = request(os.path.join(cwd, "feam.sock"), message)
+		samples.append(time.perf_counter() - start)
+		assert response is not None and not response.get("fallback"), response
+	return samples
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=20000)
+	parser.add_argument("--metadata-per-product", type=int, default=8)
+	parser.add_argument("--runs", type=int, default=20)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	registry, _ = build(False, args.products, args.metadata_per_product, args.seed)
+	commands = {
+		"show": ["show", str(args.products // 2)],
+		"search": ["search", "synthetic product", "--limit", "10"],
+		"filter": ["search", "--filter", "status=active", "--limit", "10"],
+	}
+
+	env = dict(os.environ, PYTHONPATH=str(PYTHON_MVP))
+	with tempfile.TemporaryDirectory() as tmp:
+		JournalStore(Path(tmp) / "feam_registry.json").compact(registry)
+		cold_env = dict(env, FEAM_DAEMON="0")
+		cli = [sys.executable, "-m", "registry.cli"]
+		client = [sys.executable, "-m", "registry.client"]
+
+		daemon = subprocess.Popen(
+			cli + ["daemon", "--socket", "feam.sock"], cwd=tmp, env=env, stdout=subprocess.PIPE, text=True
+		)
+		try:
+			daemon.stdout.readline()  # "feam daemon serving ..."
+			print(f"{args.products} products, {args.runs} runs each; times in ms (median / p95)")
+			print(f"{'command':<8} {'cold CLI':>16} {'CLI via daemon':>16} {'socket only':>16}")
+			for label, command in commands.items():
+				rows = [
+					time_process(cli + command, tmp, cold_env, args.runs),
+					time_process(client + command, tmp, env, args.runs),
+					time_requests(command, tmp, args.runs),
+				]
+				cells = [
+					f"{statistics.median(s) * 1000:.1f} / {percentile(s, 0.95) * 1000:.1f}" for s in rows
+				]
+				print(f"{label:<8} {cells[0]:>16} {cells[1]:>16} {cells[2]:>16}")
+		finally:
+			daemon.terminate()
+			daemon.wait()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,97 @@
+"""Compare `feam facets` counts from the filter indexes with counting over every product.
+
+Builds a synthetic catalog (see `catalog.py`), writes it to a temporary
+registry and times the default facets (format, status, classification,
+team, domain), unfiltered and under `status=active`:
+
+  - a full scan: read every product and its metadata and count values, as
+    `feam facets` would without the indexes;
+  - `facet_counts` on the registry that built the catalog, whose postings
+    are all in memory;
+  - `facet_counts` on a registry loaded from the binary snapshot, which
+    reads posting counts (and, under a filter, postings) from the file
+    without decoding products.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_facets --products 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from benchmarks.catalog import generate_catalog
+from registry.filters import DEFAULT_FACETS, Facet, Filter, parse_facet, parse_filter
+from registry.services import Registry
+from registry.storage import JournalStore
+
+
+def full_scan(registry: Registry, facets: Sequence[Facet], filters: Sequence[Filter]) -> Dict[str, Counter]:
+	"""Facet counts found by reading every matching product."""
+	counts = {facet.name: Counter() for facet in facets}
+	for product in registry.iter_products(filters):
+		for facet in facets:
+			if facet.is_product_field:
+				counts[facet.name][str(getattr(product, facet.key))] += 1
+				continue
+			values = {m.meta_value for m in product.metadata if (m.namespace, m.meta_key) == (facet.namespace, facet.key)}
+			counts[facet.name].update(values)
+	return counts
+
+
+def indexed(registry: Registry, facets: Sequence[Facet], filters: Sequence[Filter]) -> Dict[str, Counter]:
+	return {facet.name: Counter(registry.facet_counts(facet, filters)) for facet in facets}
+
+
+def best(run: Callable[[], object], repeat: int) -> Tuple[float, object]:
+	times = []
+	result = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = run()
+		times.append(time.perf_counter() - start)
+	return min(times), result
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=100000)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	facets = [parse_facet(name) for name in DEFAULT_FACETS]
+	cases = [("all products", []), ("status=active", [parse_filter("status=active")])]
+	rows: List[Tuple[str, float]] = []
+	with tempfile.TemporaryDirectory() as tmp:
+		store = JournalStore(Path(tmp) / "feam_registry.json")
+		built = Registry()
+		store.load(built)
+		generate_catalog(built, args.products, seed=args.seed)
+		store.commit(built)
+		loaded = Registry()
+		JournalStore(store.path).load(loaded)
+		print(f"{args.products} products, facets: {', '.join(DEFAULT_FACETS)}")
+
+		for label, filters in cases:
+			seconds, expected = best(lambda: full_scan(built, facets, filters), min(args.repeat, 2))
+			rows.append((f"full scan, {label}", seconds))
+			for source, registry in (("memory", built), ("snapshot", loaded)):
+				seconds, counts = best(lambda: indexed(registry, facets, filters), args.repeat)
+				if counts != expected:
+					raise SystemExit(f"{source} facet counts differ from the full scan for {label}")
+				rows.append((f"indexes ({source}), {label}", seconds))
+
+	print(f"{'query':<40} {'ms':>10}")
+	for label, seconds in rows:
+		print(f"{label:<40} {seconds * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+	main()
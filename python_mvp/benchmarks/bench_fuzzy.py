@@ -0,0 +1,95 @@
+"""Compare `search --fuzzy` with computing edit distance against every name.
+
+Builds a catalog of names like `canada_soil_moisture_weekly`, mistypes some
+of them (one or two dropped, doubled or swapped letters) and times the
+trigram search against a full scan, also checking how often the intended
+product comes first.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_fuzzy --products 100000 --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import List
+
+from benchmarks.catalog import CADENCES, MEASURES, REGIONS, TOPICS
+from registry.fuzzy import distance_from, normalize
+from registry.services import Registry
+
+
+def mistype(name: str, rng: random.Random) -> str:
+	chars = list(name.replace("_", " "))
+	for _ in range(rng.choice((1, 2))):
+		i = rng.randrange(1, len(chars) - 1)
+		edit = rng.choice(("drop", "double", "swap"))
+		if edit == "drop":
+			del chars[i]
+		elif edit == "double":
+			chars.insert(i, chars[i])
+		else:
+			chars[i], chars[i + 1] = chars[i + 1], chars[i]
+	return "".join(chars)
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=100000)
+	parser.add_argument("--queries", type=int, default=200)
+	parser.add_argument("--scan-queries", type=int, default=10, help="Queries timed with the full scan")
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	rng = random.Random(args.seed)
+	registry = Registry()
+	team = registry.create_team("Benchmark Team")
+	with registry.untracked():
+		for i in range(args.products):
+			name = "_".join(
+				(rng.choice(REGIONS), rng.choice(TOPICS), rng.choice(MEASURES), rng.choice(CADENCES), f"{i:x}")
+			)
+			registry.create_data_product(
+				name=name,
+				description=f"Synthetic product {i}",
+				owner_team_id=team.teams_id,
+				data_format="parquet",
+				access_uri=f"/publish/bench/{name}",
+				status="active",
+				classification="internal",
+			)
+	products = registry.list_products()
+
+	start = time.perf_counter()
+	registry.fuzzy_search_products("warm up the index", limit=1)
+	print(f"{args.products} products; trigram index built in {time.perf_counter() - start:.2f}s")
+
+	targets = [rng.choice(products) for _ in range(args.queries)]
+	queries = [mistype(p.name, rng) for p in targets]
+	samples = []
+	found = 0
+	for target, query in zip(targets, queries):
+		start = time.perf_counter()
+		hits = registry.fuzzy_search_products(query, limit=10)
+		samples.append(time.perf_counter() - start)
+		found += bool(hits) and hits[0][0].product_id == target.product_id
+
+	names = [(p.product_id, normalize(p.name)) for p in products]
+	scans = []
+	for query in queries[:args.scan_queries]:
+		start = time.perf_counter()
+		distance_to = distance_from(normalize(query))
+		sorted((distance_to(name), product_id) for product_id, name in names)[:10]
+		scans.append(time.perf_counter() - start)
+
+	print(f"Trigram search : median {statistics.median(samples) * 1e3:8.1f} ms, max {max(samples) * 1e3:8.1f} ms")
+	print(f"Full scan      : median {statistics.median(scans) * 1e3:8.1f} ms")
+	print(f"Intended product ranked first for {found}/{len(queries)} mistyped names")
+
+
+if __name__ == "__main__":
+	main()
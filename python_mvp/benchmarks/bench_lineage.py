@@ -0,0 +1,86 @@
+"""Time lineage closure and impact queries on a large synthetic graph.
+
+Products are grouped into pipelines; each product reads `--fan-in` earlier
+products of its own pipeline, so upstream closures reach back to the start
+of the pipeline. Pass `--pipeline-size` equal to `--products` for one deep
+graph.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_lineage --products 100000 --fan-in 2 --pipeline-size 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, List
+
+from benchmarks.bench_memory import build
+from registry.lineage import LineageCycleError
+
+
+def time_each(query: Callable[[int], object], product_ids: List[int]) -> List[float]:
+	samples = []
+	for product_id in product_ids:
+		start = time.perf_counter()
+		query(product_id)
+		samples.append(time.perf_counter() - start)
+	return samples
+
+
+def report(label: str, samples: List[float]) -> None:
+	ordered = sorted(samples)
+	p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+	print(f"{label:<24}: median {statistics.median(samples) * 1e3:8.3f} ms   p99 {p99 * 1e3:8.3f} ms")
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=100000)
+	parser.add_argument("--fan-in", type=int, default=2, help="Upstream products per product")
+	parser.add_argument("--pipeline-size", type=int, default=1000)
+	parser.add_argument("--queries", type=int, default=200)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	rng = random.Random(args.seed)
+	registry, _ = build(False, args.products, 0, args.seed)
+	product_ids = [p.product_id for p in registry.list_products()]
+
+	start = time.perf_counter()
+	for position, product_id in enumerate(product_ids):
+		first = position - position % args.pipeline_size
+		if position == first:
+			continue
+		for _ in range(args.fan_in):
+			registry.add_lineage(product_id, product_ids[rng.randrange(first, position)])
+	registry.drain_changes()
+	edges = len(registry.list_lineage())
+	print(f"{args.products} products, {edges} edges: built in {time.perf_counter() - start:.2f}s")
+
+	sample = [rng.choice(product_ids) for _ in range(args.queries)]
+	report("upstream (cold)", time_each(registry.upstream_ids, sample))
+	report("upstream (memoized)", time_each(registry.upstream_ids, sample))
+	report("downstream (cold)", time_each(registry.downstream_ids, sample))
+	report("downstream (memoized)", time_each(registry.downstream_ids, sample))
+	report("impact order", time_each(registry.impact_order, sample))
+
+	def add_rejected(product_id: int) -> None:
+		upstream = next(iter(registry.downstream_ids(product_id)), None)
+		if upstream is None:
+			return
+		try:
+			registry.add_lineage(product_id, upstream)
+		except LineageCycleError:
+			pass
+
+	report("cycle check (rejected)", time_each(add_rejected, sample))
+	print(f"Closure sizes           : median upstream {statistics.median(len(registry.upstream_ids(p)) for p in sample):.0f}, "
+		f"downstream {statistics.median(len(registry.downstream_ids(p)) for p in sample):.0f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,85 @@
+"""Compare registry memory use with and without compact metadata storage.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_memory --products 20000 --metadata-per-product 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import List, Tuple
+
+from registry.services import Registry
+
+NAMESPACES = ("business", "technical", "governance", "feam")
+KEYS = ("domain", "spatial_resolution", "refresh_schedule", "source", "row_count", "size")
+VALUE_TYPES = ("string", "cron", "path", "integer", "bytes")
+
+
+def fresh(text: str) -> str:
+	"""A new string object with the same value, as `json.load` would return."""
+	return "".join(list(text))
+
+
+def build(compact: bool, products: int, per_product: int, seed: int) -> Tuple[Registry, float]:
+	rng = random.Random(seed)
+	start = time.perf_counter()
+	registry = Registry(compact=compact)
+	team = registry.create_team("Benchmark Team")
+	with registry.untracked():
+		for i in range(products):
+			product = registry.create_data_product(
+				name=f"product_{i:07d}",
+				description=f"Synthetic product {i} for memory benchmarking.",
+				owner_team_id=team.teams_id,
+				data_format=fresh(rng.choice(("parquet", "geoparquet", "delta", "zarr"))),
+				access_uri=f"/publish/bench/product_{i:07d}",
+				status=fresh(rng.choice(("active", "draft", "deprecated"))),
+				classification=fresh(rng.choice(("public", "internal", "restricted"))),
+			)
+			for _ in range(per_product):
+				value_type = rng.choice(VALUE_TYPES)
+				value = str(rng.randrange(10**9)) if value_type in ("integer", "bytes") else f"value-{rng.randrange(5000)}"
+				registry.add_metadata(
+					data_product_id=product.product_id,
+					namespace=fresh(rng.choice(NAMESPACES)),
+					meta_key=fresh(rng.choice(KEYS)),
+					meta_value=value,
+					value_type=fresh(value_type),
+				)
+	return registry, time.perf_counter() - start
+
+
+def measure(compact: bool, products: int, per_product: int, seed: int) -> Tuple[int, float]:
+	gc.collect()
+	tracemalloc.start()
+	registry, elapsed = build(compact, products, per_product, seed)
+	gc.collect()
+	current, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del registry
+	return current, elapsed
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=20000)
+	parser.add_argument("--metadata-per-product", type=int, default=8)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	rows = args.products * args.metadata_per_product
+	print(f"{args.products} products, {rows} metadata rows")
+	print(f"{'layout':<10} {'MiB':>10} {'bytes/row':>10} {'build s':>10}")
+	for label, compact in (("default", False), ("compact", True)):
+		used, elapsed = measure(compact, args.products, args.metadata_per_product, args.seed)
+		print(f"{label:<10} {used / 2**20:>10.1f} {used / max(rows, 1):>10.0f} {elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,130 @@
+"""Compare loading a legacy snapshot before and after its one-time format upgrade.
+
+Writes a catalog in the oldest `feam_registry.json` layout (no header, no
+ids, no metadata), whose metadata has to be backfilled from the mock catalog,
+and times:
+
+  - a load that upgrades the parsed file in memory, the work every load of
+    such a file used to repeat;
+  - the one-time streamed upgrade (`JournalStore.upgrade`), with its peak
+    memory next to that of parsing the whole file;
+  - loads of the upgraded file from JSON and from the binary snapshot, which
+    only check the format header.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_migrations --products 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from benchmarks.catalog import generate_catalog
+from registry.migrations import file_format_version
+from registry.seed import seed_mock_data
+from registry.services import Registry
+from registry.storage import JournalStore, apply_snapshot, snapshot_to_dict
+
+
+def legacy_snapshot(products: int, seed: int) -> str:
+	"""The mock catalog plus `products` synthetic products, in the pre-versioning layout."""
+	registry = Registry()
+	with registry.untracked():
+		seed_mock_data(registry)
+		generate_catalog(registry, products, seed=seed)
+	data = snapshot_to_dict(registry)
+	return json.dumps({"teams": without_ids(data["teams"]), "products": without_ids(data["products"])}, indent=2)
+
+
+def without_ids(records: List[dict]) -> List[dict]:
+	return [{key: value for key, value in record.items() if key != "id"} for record in records]
+
+
+def load_json(store: JournalStore) -> Registry:
+	registry = Registry()
+	with registry.untracked(), store.path.open("r", encoding="utf-8") as f:
+		apply_snapshot(registry, json.load(f))
+	return registry
+
+
+def load_store(store: JournalStore) -> Registry:
+	registry = Registry()
+	store.load(registry)
+	return registry
+
+
+def best(run: Callable[[], object], repeat: int) -> float:
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		run()
+		times.append(time.perf_counter() - start)
+	return min(times)
+
+
+def peak_mib(run: Callable[[], object]) -> float:
+	tracemalloc.start()
+	try:
+		run()
+		return tracemalloc.get_traced_memory()[1] / 2**20
+	finally:
+		tracemalloc.stop()
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=20000)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	legacy = legacy_snapshot(args.products, args.seed)
+	with tempfile.TemporaryDirectory() as tmp:
+		legacy_path = Path(tmp) / "legacy.json"
+		legacy_path.write_text(legacy, encoding="utf-8")
+		store = JournalStore(Path(tmp) / "feam_registry.json")
+
+		def fresh_legacy() -> None:
+			shutil.copyfile(legacy_path, store.path)
+
+		fresh_legacy()
+		print(f"{args.products} products; legacy JSON {store.path.stat().st_size / 2**20:.1f} MiB")
+		rows: List[Tuple[str, float, str]] = []
+
+		rows.append(("legacy load (upgrade in memory)", best(lambda: load_json(store), args.repeat), "every load"))
+
+		upgrade_times = []
+		for _ in range(args.repeat):
+			fresh_legacy()
+			start = time.perf_counter()
+			store.upgrade()
+			upgrade_times.append(time.perf_counter() - start)
+		rows.append(("one-time upgrade (streamed)", min(upgrade_times), "once"))
+
+		fresh_legacy()
+		streamed_mib = peak_mib(store.upgrade)
+		fresh_legacy()
+		parsed_mib = peak_mib(lambda: json.loads(store.path.read_text(encoding="utf-8")))
+
+		store.upgrade()
+		rows.append(("format header check", best(lambda: file_format_version(store.path), args.repeat), "every load"))
+		rows.append(("upgraded load, JSON", best(lambda: load_json(store), args.repeat), "every load"))
+		load_store(store)  # writes the binary snapshot
+		rows.append(("upgraded load, binary", best(lambda: load_store(store), args.repeat), "every load"))
+
+		print(f"{'step':<34} {'ms':>10} {'paid':>12}")
+		for label, seconds, paid in rows:
+			print(f"{label:<34} {seconds * 1e3:>10.3f} {paid:>12}")
+		print(f"peak memory: streamed upgrade {streamed_mib:.1f} MiB, parsing the file {parsed_mib:.1f} MiB")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,121 @@
+"""Replay a dashboard-like query workload with different query cache sizes.
+
+Builds a synthetic catalog (see `catalog.py`) and replays the same workload
+against it once per cache size: ranked searches, filtered searches, fuzzy
+searches and lookups by name, drawn with a Zipf-like skew from a pool of
+distinct queries, with a product published every `--write-every` queries.
+Reports the hit rate and query times for each size, to help choose
+`--query-cache-size`.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_query_cache --products 20000 --queries 5000 --sizes 0,64,256,1024
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from benchmarks.catalog import MEASURES, REGIONS, TOPICS, generate_catalog
+from registry.filters import parse_filter
+from registry.query_cache import QueryCache
+from registry.services import Registry
+from registry.storage import JournalStore
+
+Query = Callable[[Registry], object]
+
+
+def query_pool(registry: Registry, rng: random.Random, size: int) -> List[Query]:
+	"""`size` distinct queries, most popular first."""
+	names = [product.name for product in registry.list_products()]
+	active = [parse_filter("status=active")]
+	pool: List[Query] = []
+	while len(pool) < size:
+		kind = rng.random()
+		term = rng.choice(TOPICS + REGIONS + MEASURES).replace("_", " ")
+		if kind < 0.4:
+			query = f"{term} {rng.choice(TOPICS)}" if rng.random() < 0.5 else term
+			pool.append(lambda r, q=query: r.rank_products(q, limit=20))
+		elif kind < 0.55:
+			pool.append(lambda r, q=term: r.rank_products(q, limit=20, filters=active))
+		elif kind < 0.7:
+			typo = term[:-1] + term[-1] * 2
+			pool.append(lambda r, q=typo: r.fuzzy_search_products(q, limit=10))
+		else:
+			pool.append(lambda r, name=rng.choice(names): r.get_product_by_name(name))
+	return pool
+
+
+def replay(
+	store: JournalStore, capacity: int, workload: List[Query], write_every: int, seed: int
+) -> Tuple[QueryCache, List[float]]:
+	registry = Registry()
+	store.load(registry, QueryCache(capacity))
+	team_id = registry.list_teams()[0].teams_id
+	rng = random.Random(seed)
+	samples = []
+	for i, query in enumerate(workload, start=1):
+		start = time.perf_counter()
+		query(registry)
+		samples.append(time.perf_counter() - start)
+		if write_every and i % write_every == 0:
+			topic = rng.choice(TOPICS)
+			product = registry.create_data_product(
+				name=f"bench_{topic}_{i}",
+				description=f"Benchmark {topic} product {i}",
+				owner_team_id=team_id,
+				data_format="parquet",
+				access_uri=f"/publish/bench/bench_{topic}_{i}",
+				status="active",
+				classification="internal",
+			)
+			registry.add_metadata(product.product_id, "business", "domain", topic, "string")
+	return registry.query_cache, samples
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=20000)
+	parser.add_argument("--queries", type=int, default=5000)
+	parser.add_argument("--distinct", type=int, default=1000, help="Distinct queries in the workload")
+	parser.add_argument("--write-every", type=int, default=50, help="Publish a product every N queries (0: never)")
+	parser.add_argument("--sizes", default="0,64,256,1024", help="Comma-separated cache sizes to compare")
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+	sizes = [int(size) for size in args.sizes.split(",")]
+
+	rng = random.Random(args.seed)
+	registry = Registry()
+	with registry.untracked():
+		generate_catalog(registry, args.products, seed=args.seed)
+	pool = query_pool(registry, rng, args.distinct)
+	# Zipf-like popularity: the k-th query is asked about 1/k as often as the first.
+	workload = rng.choices(pool, [1 / rank for rank in range(1, len(pool) + 1)], k=args.queries)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		store = JournalStore(Path(tmp) / "feam_registry.json")
+		store.compact(registry)
+		print(
+			f"{args.products} products; {args.queries} queries over {len(pool)} distinct ones, "
+			f"a write every {args.write_every or 'never'}"
+		)
+		print(f"{'size':>6} {'hit rate':>9} {'mean ms':>9} {'median ms':>10} {'invalidated':>12} {'evicted':>8}")
+		for size in sizes:
+			cache, samples = replay(store, size, workload, args.write_every, args.seed)
+			stats = cache.stats()
+			lookups = stats["hits"] + stats["misses"]
+			hit_rate = stats["hits"] / lookups if lookups else 0.0
+			print(
+				f"{size:>6} {hit_rate:>9.1%} {statistics.mean(samples) * 1e3:>9.3f} "
+				f"{statistics.median(samples) * 1e3:>10.3f} {stats['invalidations']:>12} {stats['evictions']:>8}"
+			)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,125 @@
+"""Compare refresh-schedule queries against the heap index with a full scan of cron strings.
+
+Builds a synthetic catalog (see `catalog.py`) and records a last refresh for
+each scheduled product shortly after its latest run, except for a
+`--missed` fraction that skipped that run, and times:
+
+  - a full scan: parse every product's `technical.refresh_schedule` and work
+    out its next run after the last refresh, as `feam due` would without an
+    index;
+  - building the `RefreshIndex` (the first `refresh_due` call of a command);
+  - `refresh_due` queries for `feam stale` and `feam due --within 6h` on the
+    built index;
+  - recording one refresh and querying again, as a long-running daemon would.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_schedule --products 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+from benchmarks.catalog import generate_catalog
+from registry.schedule import REFRESH_SCHEDULE, REFRESHED_AT, CronSchedule
+from registry.services import Registry
+from registry.typed_values import parse_datetime
+
+
+def record_history(registry: Registry, now: datetime, missed: float, seed: int) -> int:
+	"""Record a last refresh for every scheduled product; returns how many there are."""
+	rng = random.Random(seed)
+	scheduled = 0
+	for product in registry.list_products():
+		expression = next(
+			(m.meta_value for m in product.metadata if (m.namespace, m.meta_key) == REFRESH_SCHEDULE), None
+		)
+		if expression is None:
+			continue
+		scheduled += 1
+		latest = CronSchedule(expression).last_until(now - timedelta(minutes=15))
+		if rng.random() < missed:
+			at = latest - timedelta(seconds=1)
+		else:
+			at = latest + timedelta(seconds=rng.randrange(600))
+		registry.set_metadata(product.product_id, *REFRESHED_AT, at.isoformat(), "datetime")
+	return scheduled
+
+
+def full_scan(registry: Registry, until: datetime) -> int:
+	"""Products due by `until`, found by re-parsing every schedule."""
+	due = 0
+	for product in registry.list_products():
+		expression = refreshed = None
+		for m in product.metadata:
+			key = (m.namespace, m.meta_key)
+			if key == REFRESH_SCHEDULE:
+				expression = m.meta_value
+			elif key == REFRESHED_AT:
+				refreshed = parse_datetime(m.meta_value)
+		if expression is None:
+			continue
+		if refreshed is None or CronSchedule(expression).next_after(refreshed) <= until:
+			due += 1
+	return due
+
+
+def best(run: Callable[[], object], repeat: int) -> Tuple[float, object]:
+	times = []
+	result = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		result = run()
+		times.append(time.perf_counter() - start)
+	return min(times), result
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=100000)
+	parser.add_argument("--missed", type=float, default=0.05, help="Fraction of products that missed their latest run")
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	now = datetime(2026, 1, 15, 12, 0)
+	registry = Registry()
+	with registry.untracked():
+		generate_catalog(registry, args.products, seed=args.seed)
+		scheduled = record_history(registry, now, args.missed, args.seed)
+	print(f"{args.products} products, {scheduled} with a refresh schedule")
+
+	rows: List[Tuple[str, float, object]] = []
+	rows.append(("full scan, due within 6h", *best(lambda: full_scan(registry, now + timedelta(hours=6)), args.repeat)))
+
+	start = time.perf_counter()
+	registry.refresh_due(now)
+	rows.append(("index build", time.perf_counter() - start, "-"))
+	seconds, stale = best(lambda: registry.refresh_due(now), args.repeat)
+	rows.append(("index, stale", seconds, len(stale)))
+	seconds, due = best(lambda: registry.refresh_due(now + timedelta(hours=6)), args.repeat)
+	rows.append(("index, due within 6h", seconds, len(due)))
+
+	stale_ids = [entry.product_id for entry in stale]
+	rng = random.Random(args.seed)
+
+	def refresh_one() -> int:
+		product_id = rng.choice(stale_ids)
+		registry.set_metadata(product_id, *REFRESHED_AT, now.isoformat(), "datetime")
+		return len(registry.refresh_due(now + timedelta(hours=6)))
+
+	with registry.untracked():
+		rows.append(("record a refresh + due within 6h", *best(refresh_one, args.repeat)))
+
+	print(f"{'query':<34} {'ms':>10} {'products':>10}")
+	for label, seconds, count in rows:
+		print(f"{label:<34} {seconds * 1e3:>10.3f} {count:>10}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,73 @@
+"""Compare command start-up from the JSON snapshot and the binary snapshot.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_startup --products 20000 --metadata-per-product 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from benchmarks.bench_memory import build
+from registry.filters import parse_filter
+from registry.services import Registry
+from registry.storage import JournalStore, apply_snapshot
+
+
+def timed(store: JournalStore, binary: bool, command: Callable[[Registry], object], repeat: int) -> float:
+	"""Best wall time to load the registry and run `command` once."""
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		registry = Registry()
+		if binary:
+			store.load(registry)
+		else:
+			# What `load` did before the binary snapshot existed.
+			with registry.untracked(), store.path.open("r", encoding="utf-8") as f:
+				apply_snapshot(registry, json.load(f))
+		command(registry)
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=20000)
+	parser.add_argument("--metadata-per-product", type=int, default=8)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	registry, _ = build(False, args.products, args.metadata_per_product, args.seed)
+	middle = f"product_{args.products // 2:07d}"
+	commands = {
+		"show <id>": lambda r: r.get_product(args.products // 2),
+		"show <name>": lambda r: r.get_product_by_name(middle),
+		"search": lambda r: r.search_products("synthetic product 42", limit=10),
+		"filter": lambda r: r.search_products("", limit=10, filters=[parse_filter("status=active")]),
+		# What `feam republish`, `scan` and `verify` do to a stored product.
+		"set metadata": lambda r: r.set_metadata(args.products // 2, "feam", "fingerprint", "sha256:0", "string"),
+	}
+
+	with tempfile.TemporaryDirectory() as tmp:
+		store = JournalStore(Path(tmp) / "feam_registry.json")
+		store.compact(registry)
+		json_size = store.path.stat().st_size
+		binary_size = store.binary_path.stat().st_size
+		print(f"{args.products} products; JSON {json_size / 2**20:.1f} MiB, binary {binary_size / 2**20:.1f} MiB")
+		print(f"{'command':<14} {'JSON s':>10} {'binary s':>10} {'speedup':>10}")
+		for label, command in commands.items():
+			json_s = timed(store, False, command, args.repeat)
+			binary_s = timed(store, True, command, args.repeat)
+			print(f"{label:<14} {json_s:>10.3f} {binary_s:>10.3f} {json_s / binary_s:>9.1f}x")
+
+
+if __name__ == "__main__":
+	main()
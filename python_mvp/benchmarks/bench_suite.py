@@ -0,0 +1,252 @@
+"""Time the registry's hot paths on synthetic catalogs from 1k to 1M products.
+
+For every catalog size, one process generates the catalog with
+`benchmarks.catalog` and compacts it into a snapshot, and a second, fresh
+process runs what commands do: `load_registry`, `show`, full-text search,
+`search_products_by_name`, `print_products`, and `save_registry` after
+serving one product. Each reports its latencies and peak resident memory.
+Results are written as JSON, tagged with the git commit, and `--compare`
+prints the change against an earlier results file.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_suite --sizes 1000,10000,100000 --out results.json
+    python -m benchmarks.bench_suite --sizes 1000,10000,100000 --compare results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+	import resource
+except ImportError:  # Windows
+	resource = None
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+
+# Metrics shown in the report, in order; lower is better for all of them.
+METRICS = (
+	"generate_s", "compact_s", "build_peak_mib",
+	"load_s", "show_ms", "search_ms", "search_p99_ms", "by_name_ms", "print_products_s", "save_ms", "query_peak_mib",
+)
+
+
+def peak_mib() -> Optional[float]:
+	"""Peak resident memory of this process so far."""
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS.
+	return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def timed(call: Callable[[], object]) -> float:
+	start = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		call()
+	return time.perf_counter() - start
+
+
+def samples_ms(call: Callable[[Any], object], args: List[Any]) -> List[float]:
+	return [timed(lambda: call(arg)) * 1e3 for arg in args]
+
+
+def p99(samples: List[float]) -> float:
+	ordered = sorted(samples)
+	return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+
+# -------------------- phases (run in child processes) --------------------
+
+def build_phase(products: int, metadata: int, seed: int) -> Dict[str, Any]:
+	from benchmarks.catalog import generate_catalog
+	from registry.cli import load_registry, open_store
+	from registry.services import Registry
+
+	registry = Registry()
+	# Creates the store (and its id counters) like a first `feam` command.
+	load_registry(registry)
+	start = time.perf_counter()
+	with registry.untracked():
+		size = generate_catalog(registry, products, metadata=metadata, seed=seed)
+	generate_s = time.perf_counter() - start
+	store = open_store()
+	compact_s = timed(lambda: store.compact(registry))
+	return {
+		"teams": size.teams,
+		"metadata": size.metadata,
+		"generate_s": generate_s,
+		"compact_s": compact_s,
+		"json_mib": store.path.stat().st_size / 2**20,
+		"binary_mib": store.binary_path.stat().st_size / 2**20,
+		"build_peak_mib": peak_mib(),
+	}
+
+
+def query_phase(queries: int, seed: int) -> Dict[str, Any]:
+	from benchmarks.catalog import MEASURES, REGIONS, TOPICS
+	from registry.cli import load_registry, print_product_details, print_products, save_registry
+	from registry.query_cache import QueryCache
+	from registry.services import Registry
+
+	registry = Registry()
+	# Repeated random queries would time cache hits; measure the searches themselves.
+	load_s = timed(lambda: load_registry(registry, QueryCache(capacity=0)))
+	rng = random.Random(seed)
+	last_id = registry.next_ids()["product"] - 1
+	product_ids = [str(rng.randint(1, last_id)) for _ in range(queries)]
+	show = samples_ms(lambda ref: print_product_details(registry, ref), product_ids)
+	texts = [f"{rng.choice(REGIONS)} {rng.choice(TOPICS)} {rng.choice(MEASURES)}" for _ in range(queries)]
+	search = samples_ms(lambda text: registry.search_products(text, limit=10), texts)
+	terms = [f"{rng.choice(TOPICS)}_{rng.choice(MEASURES)}" for _ in range(max(1, queries // 10))]
+	by_name = samples_ms(registry.search_products_by_name, terms)
+	print_products_s = timed(lambda: print_products(registry))
+
+	def serve_one(i: int) -> None:
+		# What `feam serve` adds: one product with a few metadata rows.
+		product = registry.create_data_product(
+			f"bench_served_{i}", "Served by the benchmark.", 1, "parquet", f"/publish/bench/served_{i}", "active", "internal",
+		)
+		registry.add_metadata(product.product_id, "business", "domain", "agriculture", "string")
+		registry.add_metadata(product.product_id, "feam", "size_bytes", "1GB", "bytes")
+		save_registry(registry)
+
+	save = samples_ms(serve_one, list(range(10)))
+	return {
+		"load_s": load_s,
+		"show_ms": statistics.median(show),
+		"show_p99_ms": p99(show),
+		"search_ms": statistics.median(search),
+		"search_p99_ms": p99(search),
+		"by_name_ms": statistics.median(by_name),
+		"print_products_s": print_products_s,
+		"save_ms": statistics.median(save),
+		"query_peak_mib": peak_mib(),
+	}
+
+
+def run_phase(directory: str, argv: List[str]) -> Dict[str, Any]:
+	"""Run one phase in a fresh interpreter inside `directory` and return its results."""
+	root = Path(__file__).resolve().parents[1]
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (str(root), os.environ.get("PYTHONPATH")))))
+	# Measure the JSON backend in-process, not a daemon that may be running.
+	env["FEAM_DAEMON"] = "0"
+	output = subprocess.run(
+		[sys.executable, "-m", "benchmarks.bench_suite", *argv],
+		cwd=directory,
+		env=env,
+		check=True,
+		stdout=subprocess.PIPE,
+		text=True,
+	).stdout
+	return json.loads(output.splitlines()[-1])
+
+
+def measure(products: int, metadata_per_product: int, queries: int, seed: int) -> Dict[str, Any]:
+	with tempfile.TemporaryDirectory() as tmp:
+		result: Dict[str, Any] = {"products": products}
+		result.update(run_phase(tmp, ["--phase", "build", "--sizes", str(products),
+			"--metadata-per-product", str(metadata_per_product), "--seed", str(seed)]))
+		result.update(run_phase(tmp, ["--phase", "query", "--queries", str(queries), "--seed", str(seed)]))
+	return result
+
+
+# -------------------- reporting --------------------
+
+def git_commit() -> Optional[str]:
+	try:
+		return subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"],
+			cwd=Path(__file__).resolve().parent,
+			check=True,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.DEVNULL,
+			text=True,
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def format_value(value: Optional[float]) -> str:
+	return "n/a" if value is None else f"{value:.3f}" if value < 10 else f"{value:.1f}"
+
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[int, Dict[str, Any]]] = None) -> None:
+	sizes = [r["products"] for r in results]
+	print(f"{'metric':<18}" + "".join(f"{size:>16,}" for size in sizes))
+	for metric in METRICS:
+		cells = []
+		for result in results:
+			cell = format_value(result.get(metric))
+			before = (baseline or {}).get(result["products"], {}).get(metric)
+			if before and result.get(metric) is not None:
+				cell += f" ({result[metric] / before - 1:+.0%})"
+			cells.append(cell)
+		print(f"{metric:<18}" + "".join(f"{cell:>16}" for cell in cells))
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated product counts")
+	parser.add_argument("--metadata-per-product", type=int, default=6)
+	parser.add_argument("--queries", type=int, default=200, help="Timed show and search calls per size")
+	parser.add_argument("--seed", type=int, default=7)
+	parser.add_argument("--out", default="bench_suite.json", help="Where to write the results")
+	parser.add_argument("--compare", help="Earlier results file to compare against")
+	parser.add_argument("--phase", choices=("build", "query"), help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+	if args.phase == "build":
+		print(json.dumps(build_phase(sizes[0], sizes[0] * args.metadata_per_product, args.seed)))
+		return
+	if args.phase == "query":
+		print(json.dumps(query_phase(args.queries, args.seed)))
+		return
+
+	baseline = None
+	if args.compare:
+		with open(args.compare, "r", encoding="utf-8") as f:
+			previous = json.load(f)
+		baseline = {r["products"]: r for r in previous["results"]}
+		print(f"Compared with {args.compare} (commit {previous.get('commit') or 'unknown'})")
+
+	results = []
+	for products in sizes:
+		start = time.perf_counter()
+		results.append(measure(products, args.metadata_per_product, args.queries, args.seed))
+		print(f"{products:,} products measured in {time.perf_counter() - start:.0f}s", file=sys.stderr)
+
+	print_results(results, baseline)
+	report = {
+		"commit": git_commit(),
+		"created_at": datetime.now().isoformat(timespec="seconds"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"metadata_per_product": args.metadata_per_product,
+		"queries": args.queries,
+		"seed": args.seed,
+		"results": results,
+	}
+	with open(args.out, "w", encoding="utf-8") as f:
+		json.dump(report, f, indent=2)
+	print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,92 @@
+"""Time `feam verify` path health sweeps with different worker counts and caps.
+
+Builds a synthetic catalog (see `catalog.py`) whose products' source paths
+are files in a temporary directory, a `--missing` fraction of them deleted,
+and times:
+
+  - uncapped sweeps with each of `--workers`, which shows how far parallel
+    `stat` calls go on this filesystem;
+  - a sweep under `--max-ops-per-second`, which is what a full sweep costs
+    when the metadata servers are protected;
+  - a re-run within the TTL, answered from the stat cache;
+  - recording the results as metadata.
+
+Local disks answer `stat` from the page cache, so the parallel speed-up here
+is smaller than on a parallel filesystem, where each call is a round trip to
+a metadata server.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_verify --products 20000 --workers 1,4,16 --max-ops-per-second 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List, Tuple
+
+from benchmarks.catalog import generate_catalog
+from registry.cli import product_paths, record_path_status
+from registry.health import PathChecker, StatCache
+from registry.services import Registry
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=20000)
+	parser.add_argument("--missing", type=float, default=0.05, help="Fraction of source paths deleted")
+	parser.add_argument("--workers", default="1,4,16", help="Comma-separated worker counts to compare")
+	parser.add_argument("--max-ops-per-second", type=float, default=5000.0)
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+	worker_counts = [int(count) for count in args.workers.split(",")]
+
+	rng = random.Random(args.seed)
+	registry = Registry()
+	with registry.untracked(), tempfile.TemporaryDirectory() as tmp:
+		generate_catalog(registry, args.products, seed=args.seed)
+		for product in registry.list_products():
+			path = os.path.join(tmp, f"product_{product.product_id}.csv")
+			if rng.random() >= args.missing:
+				with open(path, "w") as f:
+					f.write("x\n")
+			registry.set_metadata(product.product_id, "feam", "source_path", path, "path")
+		products = registry.list_products()
+		targets = {product.product_id: product_paths(product) for product in products}
+		paths = [path for paths in targets.values() for path in paths.values()]
+		print(f"{args.products} products, {len(set(paths))} distinct paths")
+
+		rows: List[Tuple[str, float, int]] = []
+		for workers in worker_counts:
+			report = PathChecker(StatCache(), workers=workers, ops_per_second=None).check(paths)
+			rows.append((f"sweep, workers={workers}, no cap", report.seconds, report.metadata_ops))
+		cache = StatCache()
+		checker = PathChecker(cache, workers=max(worker_counts), ops_per_second=args.max_ops_per_second)
+		report = checker.check(paths)
+		rows.append((f"sweep, cap {args.max_ops_per_second:g}/s", report.seconds, report.metadata_ops))
+		report = checker.check(paths)
+		rows.append(("re-run within TTL (cached)", report.seconds, report.metadata_ops))
+
+		start = time.perf_counter()
+		for product in products:
+			for target, path in targets[product.product_id].items():
+				record_path_status(registry, product, target, report.statuses[path])
+		rows.append(("record metadata", time.perf_counter() - start, 0))
+
+	print(f"{'step':<34} {'seconds':>9} {'metadata ops':>13} {'ops/s':>9}")
+	for label, seconds, ops in rows:
+		rate = ops / seconds if seconds and ops else 0.0
+		print(f"{label:<34} {seconds:>9.3f} {ops:>13} {rate:>9.0f}")
+	per_product = rows[-3][2] / args.products
+	print(
+		f"a 100000-product sweep at {args.max_ops_per_second:g} ops/s: "
+		f"about {100000 * per_product / args.max_ops_per_second / 60:.1f} minutes"
+	)
+
+
+if __name__ == "__main__":
+	main()
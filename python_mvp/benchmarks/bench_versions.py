@@ -0,0 +1,117 @@
+"""Measure what each published version costs with structurally shared metadata.
+
+Publishes one product many times, changing a few metadata entries between
+versions, and compares the memory its history takes with copying the full
+metadata set per version. Also times latest/by-label lookups and listing.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_versions --metadata 2000 --versions 500 --changes 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Dict, List
+
+from registry.services import Registry
+
+
+def measure(allocate) -> int:
+	gc.collect()
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	kept = allocate()
+	gc.collect()
+	used = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+	del kept
+	return used
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--metadata", type=int, default=2000, help="Metadata entries on the product")
+	parser.add_argument("--versions", type=int, default=500)
+	parser.add_argument("--changes", type=int, default=3, help="Entries changed between versions")
+	parser.add_argument("--seed", type=int, default=7)
+	args = parser.parse_args(argv)
+
+	rng = random.Random(args.seed)
+	registry = Registry()
+	team = registry.create_team("Benchmark Team")
+	product = registry.create_data_product(
+		name="versioned",
+		description="Product republished many times",
+		owner_team_id=team.teams_id,
+		data_format="zarr",
+		access_uri="/publish/bench/versioned",
+		status="active",
+		classification="internal",
+	)
+	entries = [
+		registry.add_metadata(product.product_id, "technical", f"key_{i}", f"value-{i}", "string")
+		for i in range(args.metadata)
+	]
+	registry.create_version(product.product_id)
+
+	# Values are created up front so both sides share the same strings.
+	updates = [
+		[(rng.choice(entries).metadata_id, f"value-{v}-{c}") for c in range(args.changes)]
+		for v in range(args.versions)
+	]
+
+	def shared() -> Registry:
+		start = time.perf_counter()
+		for changes in updates:
+			for metadata_id, value in changes:
+				registry.update_metadata(metadata_id, value, "string")
+			registry.create_version(product.product_id)
+			# Journal records would be written out by a commit; don't count them.
+			registry.drain_changes()
+		shared.seconds = time.perf_counter() - start  # type: ignore[attr-defined]
+		return registry
+
+	def copied() -> List[Dict[int, tuple]]:
+		current = {m.metadata_id: (m.namespace, m.meta_key, m.meta_value, m.value_type) for m in entries}
+		history = []
+		for changes in updates:
+			for metadata_id, value in changes:
+				namespace, meta_key, _, value_type = current[metadata_id]
+				current[metadata_id] = (namespace, meta_key, value, value_type)
+			history.append(dict(current))
+		return history
+
+	registry.drain_changes()
+	copied_bytes = measure(copied)
+	shared_bytes = measure(shared)
+
+	labels = [v.version_label for v in registry.list_versions(product.product_id)]
+	lookups = 100_000
+	start = time.perf_counter()
+	for i in range(lookups):
+		registry.get_version(product.product_id, labels[i % len(labels)])
+	by_label = (time.perf_counter() - start) / lookups
+	start = time.perf_counter()
+	for _ in range(lookups):
+		registry.get_version(product.product_id)
+	latest = (time.perf_counter() - start) / lookups
+	start = time.perf_counter()
+	history = registry.list_versions(product.product_id)
+	listing = time.perf_counter() - start
+
+	print(f"{args.versions} versions of a product with {args.metadata} metadata entries, {args.changes} changed per version")
+	print(f"Shared history : {shared_bytes / 1024:,.0f} KiB ({shared_bytes / args.versions:,.0f} B/version)")
+	print(f"Full copies    : {copied_bytes / 1024:,.0f} KiB ({copied_bytes / args.versions:,.0f} B/version)")
+	print(f"Publish        : {shared.seconds / args.versions * 1e6:,.1f} us/version")  # type: ignore[attr-defined]
+	print(f"Latest lookup  : {latest * 1e6:.2f} us")
+	print(f"Label lookup   : {by_label * 1e6:.2f} us")
+	print(f"List history   : {listing * 1e6:,.0f} us for {len(history)} versions")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,140 @@
+"""Stress concurrent `feam serve --batch` writers and check nothing is lost.
+
+Starts many CLI processes at once against one registry, the way the tasks of
+an HPC array job would, then reloads the registry and checks that every row
+was registered exactly once with distinct ids. Exits non-zero otherwise.
+
+With `--fork` the writers are forked from this process instead of started as
+new interpreters, which takes interpreter start-up and imports out of the
+measurement and leaves mostly the locking and commit path.
+
+Run from the `python_mvp` directory:
+
+    python -m benchmarks.bench_writers --processes 200 --rows-per-process 5
+    python -m benchmarks.bench_writers --processes 200 --rows-per-process 5 --fork
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+from benchmarks.bench_memory import build
+from registry import cli
+from registry.services import Registry
+from registry.storage import JournalStore
+
+PYTHON_MVP = Path(__file__).resolve().parent.parent
+
+
+def run_forked(cwd: str, argv: List[str]) -> None:
+	"""Body of a `--fork` writer: one CLI invocation in a fresh process."""
+	os.chdir(cwd)
+	with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+		cli.run(argv)
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--processes", type=int, default=200)
+	parser.add_argument("--rows-per-process", type=int, default=5)
+	parser.add_argument("--catalog", type=int, default=5000, help="Products registered beforehand")
+	parser.add_argument("--namespaces", type=int, default=4, help="Publish namespaces the jobs spread over")
+	parser.add_argument("--seed", type=int, default=7)
+	parser.add_argument("--fork", action="store_true", help="Fork writers instead of starting interpreters")
+	args = parser.parse_args(argv)
+
+	registry, _ = build(False, args.catalog, 4, args.seed)
+	env = dict(os.environ, PYTHONPATH=str(PYTHON_MVP), FEAM_DAEMON="0")
+	with tempfile.TemporaryDirectory() as tmp:
+		store = JournalStore(Path(tmp) / "feam_registry.json")
+		store.compact(registry)
+
+		expected = set()
+		commands = []
+		for task in range(args.processes):
+			manifest = Path(tmp) / f"task_{task:05d}.jsonl"
+			with manifest.open("w", encoding="utf-8") as f:
+				for row in range(args.rows_per_process):
+					name = f"task_{task:05d}_{row:03d}"
+					namespace = f"lab_{task % args.namespaces}"
+					expected.add(f"/publish/{namespace}/{name}")
+					record = {"path": f"/scratch/{name}", "name": name, "namespace": namespace}
+					f.write(json.dumps(record) + "\n")
+			commands.append(["serve", "--batch", str(manifest), "--no-fingerprint"])
+
+		start = time.perf_counter()
+		failures = 0
+		if args.fork:
+			context = multiprocessing.get_context("fork")
+			forked = [context.Process(target=run_forked, args=(tmp, command)) for command in commands]
+			for process in forked:
+				process.start()
+			for process in forked:
+				process.join()
+				failures += process.exitcode != 0
+		else:
+			cli_command = [sys.executable, "-m", "registry.cli"]
+			processes = [
+				subprocess.Popen(
+					cli_command + command, cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+				)
+				for command in commands
+			]
+			for process in processes:
+				_, stderr = process.communicate()
+				if process.returncode:
+					failures += 1
+					sys.stderr.write(stderr.decode("utf-8", "replace"))
+		elapsed = time.perf_counter() - start
+
+		spooled = len(list(store.spool_dir.glob("*"))) if store.spool_dir.exists() else 0
+		loaded = Registry()
+		JournalStore(store.path).load(loaded)
+		products = loaded.list_products()
+		uris = Counter(p.access_uri for p in products)
+		registered = expected & set(uris)
+		duplicated = [uri for uri in expected if uris[uri] > 1]
+		metadata_ids = [m.metadata_id for p in products for m in p.metadata]
+		teams = Counter(t.name for t in loaded.list_teams())
+
+		rows = args.processes * args.rows_per_process
+		mode = "forked" if args.fork else "new interpreter"
+		print(
+			f"{args.processes} processes ({mode}) x {args.rows_per_process} rows "
+			f"onto a {args.catalog}-product catalog"
+		)
+		print(f"Wall time   : {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s, {args.processes / elapsed:,.1f} commits/s)")
+		print(f"Registered  : {len(registered)} / {rows}")
+		print(f"Duplicated  : {len(duplicated)}")
+		print(f"Failed jobs : {failures}")
+		print(f"Left spooled: {spooled}")
+		print(f"Unique ids  : products {len(products) == len({p.product_id for p in products})}, "
+			f"metadata {len(metadata_ids) == len(set(metadata_ids))}")
+		print(f"Teams       : {sum(teams.values())} ({sum(n - 1 for n in teams.values())} duplicate names)")
+
+		ok = (
+			len(registered) == rows
+			and not duplicated
+			and not failures
+			and not spooled
+			and len(metadata_ids) == len(set(metadata_ids))
+			and all(n == 1 for n in teams.values())
+		)
+		print("Result      : " + ("OK" if ok else "LOST OR DUPLICATED REGISTRATIONS"))
+		if not ok:
+			raise SystemExit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,236 @@
+"""Seeded, deterministic synthetic catalogs for benchmarks.
+
+`generate_catalog` fills a registry with N teams, M products and K metadata
+rows drawn from the vocabulary of `registry/seed.py` (domains, formats,
+classifications, refresh schedules, ...), with skewed distributions like a
+real lab's: a few teams own most products, most products are active
+parquet, and the number of metadata rows varies from product to product.
+The same arguments always produce the same catalog.
+
+Run from the `python_mvp` directory to write one into a registry file:
+
+    python -m benchmarks.catalog --products 100000 --out /tmp/catalog/feam_registry.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, TypeVar
+
+from registry.services import Registry
+from registry.storage import JournalStore
+
+T = TypeVar("T")
+
+# -------------------- vocabulary --------------------
+
+# Product names: region_topic_measure_cadence, as in the seed catalog.
+REGIONS = ("canada", "alberta", "prairie", "boreal", "arctic", "atlantic", "pacific", "ontario", "quebec", "yukon")
+TOPICS = (
+	"climate", "soil", "crop", "livestock", "satellite", "irrigation", "forest", "wetland",
+	"snowpack", "drought", "wildfire", "river", "glacier", "pasture", "grain", "weather",
+)
+MEASURES = (
+	"observations", "moisture", "yield", "population", "ndvi", "water_usage", "cover", "extent",
+	"temperature", "precipitation", "forecast", "index", "biomass", "discharge", "emissions",
+)
+CADENCES = ("daily", "weekly", "monthly", "annual", "hourly", "timeseries", "grid", "summary")
+
+TEAM_AREAS = (
+	"Climate & Environment", "Crop Analytics", "Soil Science", "Earth Observation", "Water Resources",
+	"Livestock Health", "Forest Monitoring", "Agri-Economics", "Field Operations", "Data Engineering",
+)
+
+# Values from the seed catalog, weighted so the common ones dominate.
+DOMAINS = (("agriculture", 50), ("climate", 30), ("water_management", 12), ("forestry", 8))
+DATA_FORMATS = (("parquet", 55), ("geoparquet", 25), ("delta", 15), ("zarr", 5))
+STATUSES = (("active", 80), ("draft", 15), ("deprecated", 5))
+CLASSIFICATIONS = (("internal", 60), ("public", 30), ("restricted", 10))
+REFRESH_SCHEDULES = (
+	("0 6 * * *", 40), ("0 3 * * 1", 20), ("0 4 * * 0", 15), ("0 1 1 * *", 15), ("0 2 1 */3 *", 5), ("*/15 * * * *", 5),
+)
+SPATIAL_RESOLUTIONS = (
+	"station-level", "10km x 10km national grid", "250m raster", "5km grid", "province-level", "regional-level",
+)
+SOURCES = (
+	"Environment and Climate Change Canada", "Sentinel-2 Satellite Imagery", "Canadian Soil Monitoring Network",
+	"Statistics Canada", "Provincial water authorities", "Field sensor network",
+)
+INTENDED_USES = (
+	"research and policy analysis", "policy development and economic forecasting", "water resource planning",
+	"operational monitoring", "model training",
+)
+
+# Metadata rows in the order products receive them: every product with at
+# least one row has a domain, most have a refresh schedule, and so on.
+# (namespace, key, value type)
+METADATA_FIELDS = (
+	("business", "domain", "string"),
+	("technical", "refresh_schedule", "cron"),
+	("technical", "spatial_resolution", "string"),
+	("governance", "source", "string"),
+	("technical", "row_count", "integer"),
+	("feam", "size_bytes", "bytes"),
+	("governance", "published_after", "date"),
+	("business", "intended_use", "string"),
+)
+
+# Teams, and metadata rows per product, when not given.
+PRODUCTS_PER_TEAM = 200
+METADATA_PER_PRODUCT = 6
+# Products are added evenly over this span, in id order.
+CREATED_FROM = datetime(2020, 1, 1)
+CREATED_UNTIL = datetime(2026, 1, 1)
+
+
+@dataclass
+class CatalogSize:
+	teams: int
+	products: int
+	metadata: int
+
+
+def weighted(rng: random.Random, choices: Sequence[Tuple[T, int]]) -> T:
+	values, weights = zip(*choices)
+	return rng.choices(values, weights)[0]
+
+
+def slug(text: str) -> str:
+	return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def team_names(count: int) -> List[str]:
+	names = list(TEAM_AREAS[:count])
+	for i in range(len(names), count):
+		names.append(f"{TEAM_AREAS[i % len(TEAM_AREAS)]} {i // len(TEAM_AREAS) + 1}")
+	return names
+
+
+def metadata_counts(rng: random.Random, products: int, rows: int) -> List[int]:
+	"""Split `rows` over `products`: around the mean, with some bare and some rich products."""
+	if not products:
+		return []
+	counts = [rows // products] * products
+	for i in rng.sample(range(products), rows % products):
+		counts[i] += 1
+	# Move rows between random pairs of products to spread the counts.
+	for _ in range(products // 2):
+		donor, receiver = rng.randrange(products), rng.randrange(products)
+		moved = rng.randint(0, counts[donor] // 2)
+		counts[donor] -= moved
+		counts[receiver] += moved
+	return counts
+
+
+def metadata_value(rng: random.Random, key: str, domain: str) -> str:
+	if key == "domain":
+		return domain
+	if key == "refresh_schedule":
+		return weighted(rng, REFRESH_SCHEDULES)
+	if key == "spatial_resolution":
+		return rng.choice(SPATIAL_RESOLUTIONS)
+	if key == "source":
+		return rng.choice(SOURCES)
+	if key == "row_count":
+		# Log-uniform: thousands to billions of rows.
+		return str(int(10 ** rng.uniform(3, 10)))
+	if key == "size_bytes":
+		return f"{10 ** rng.uniform(0, 4):.1f}GB"
+	if key == "published_after":
+		return (date(2018, 1, 1) + timedelta(days=rng.randrange(8 * 365))).isoformat()
+	return rng.choice(INTENDED_USES)
+
+
+def generate_catalog(
+	registry: Registry,
+	products: int,
+	teams: Optional[int] = None,
+	metadata: Optional[int] = None,
+	seed: int = 7,
+) -> CatalogSize:
+	"""Add a synthetic catalog to `registry` and return its size.
+
+	`teams` defaults to one per `PRODUCTS_PER_TEAM` products and `metadata`
+	to `METADATA_PER_PRODUCT` rows per product. Changes are recorded like any
+	other, so committing the registry writes them to its journal.
+	"""
+	teams = max(1, products // PRODUCTS_PER_TEAM) if teams is None else teams
+	metadata = METADATA_PER_PRODUCT * products if metadata is None else metadata
+	rng = random.Random(seed)
+
+	owners = [registry.create_team(name) for name in team_names(teams)]
+	# Zipf-like ownership: the k-th team owns about 1/k as much as the first.
+	owner_weights = [1 / rank for rank in range(1, teams + 1)]
+	counts = metadata_counts(rng, products, metadata)
+	taken = set(p.name for p in registry.list_products())
+
+	for i in range(products):
+		team = rng.choices(owners, owner_weights)[0]
+		region, topic, measure, cadence = (rng.choice(words) for words in (REGIONS, TOPICS, MEASURES, CADENCES))
+		name = f"{region}_{topic}_{measure}_{cadence}"
+		if name in taken:
+			name = f"{name}_{i:x}"
+		taken.add(name)
+		domain = weighted(rng, DOMAINS)
+		product = registry.create_data_product(
+			name=name,
+			description=(
+				f"{cadence.capitalize()} {topic} {measure.replace('_', ' ')} for {region.capitalize()}, "
+				f"maintained by {team.name} for {domain.replace('_', ' ')} work."
+			),
+			owner_team_id=team.teams_id,
+			data_format=weighted(rng, DATA_FORMATS),
+			access_uri=f"/publish/{slug(team.name)}/{name}",
+			status=weighted(rng, STATUSES),
+			classification=weighted(rng, CLASSIFICATIONS),
+			created_at=CREATED_FROM + (CREATED_UNTIL - CREATED_FROM) * (i / products),
+		)
+		for j in range(counts[i]):
+			if j < len(METADATA_FIELDS):
+				namespace, key, value_type = METADATA_FIELDS[j]
+				value = metadata_value(rng, key, domain)
+			else:
+				namespace, key, value_type = "business", f"tag_{j - len(METADATA_FIELDS) + 1}", "string"
+				value = rng.choice(TOPICS)
+			registry.add_metadata(
+				data_product_id=product.product_id,
+				namespace=namespace,
+				meta_key=key,
+				meta_value=value,
+				value_type=value_type,
+			)
+	return CatalogSize(teams=teams, products=products, metadata=metadata)
+
+
+def main(argv: List[str] = None) -> None:
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--products", type=int, default=10000)
+	parser.add_argument("--teams", type=int, help=f"Default: one per {PRODUCTS_PER_TEAM} products")
+	parser.add_argument("--metadata", type=int, help=f"Metadata rows in total; default {METADATA_PER_PRODUCT} per product")
+	parser.add_argument("--seed", type=int, default=7)
+	parser.add_argument("--out", default="feam_registry.json", help="Registry snapshot to write (must not exist)")
+	args = parser.parse_args(argv)
+
+	path = Path(args.out)
+	if path.exists():
+		parser.error(f"{path} already exists")
+	path.parent.mkdir(parents=True, exist_ok=True)
+	start = time.perf_counter()
+	registry = Registry()
+	with registry.untracked():
+		size = generate_catalog(registry, args.products, args.teams, args.metadata, args.seed)
+	JournalStore(path).compact(registry)
+	print(
+		f"Wrote {size.teams} teams, {size.products} products and {size.metadata} metadata rows "
+		f"to {path} in {time.perf_counter() - start:.1f}s"
+	)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,5 +1,28 @@
-from .services import Registry
-from .seed import seed_mock_data
-from . import models as models
+from __future__ import annotations
 
-__all__ = ["Registry", "seed_mock_data", "models"]
+from typing import Any
+
+# Submodules are imported on first use so that `registry.client`, the thin
+# front end of `feam`, starts without loading the registry itself.
+
+__all__ = ["Registry", "SqliteRegistry", "seed_mock_data", "models"]
+
+
+def __getattr__(name: str) -> Any:
+	if name == "Registry":
+		from .services import Registry
+
+		return Registry
+	if name == "SqliteRegistry":
+		from .sqlite_registry import SqliteRegistry
+
+		return SqliteRegistry
+	if name == "seed_mock_data":
+		from .seed import seed_mock_data
+
+		return seed_mock_data
+	if name == "models":
+		from . import models
+
+		return models
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
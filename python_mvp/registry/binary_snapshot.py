@@ -0,0 +1,676 @@
+from __future__ import annotations
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import uuid
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .filters import PRODUCT_FILTER_FIELDS, TIMESTAMP_FILTER_FIELDS
+from .fuzzy import FIELDS as TRIGRAM_FIELDS, trigrams
+from .models import DataProduct, MetadataEntry
+from .text_index import tokenize
+from .typed_values import TIME, epoch_seconds, parse_typed_value, sort_key
+from .versions import VersionHistory
+
+# Binary, memory-mapped registry snapshot.
+#
+# The JSON snapshot has to be parsed in full before a single product can be
+# shown. This format stores the same catalog so a command can `mmap` it and
+# decode only the records it touches:
+#
+#   header      magic, format version, byte order, and the size/mtime of the
+#               JSON snapshot it was built from
+#   directory   name -> (offset, length) for each section below
+#   info        JSON: teams and the next team/product/metadata/version ids
+#   records     one length-prefixed JSON record per product, metadata and
+#               version deltas inlined
+#   id index    sorted product ids with their record offsets and text lengths
+#   name order  product ids sorted by (name, id), for listings sorted by name
+#   lineage     parallel arrays of downstream and upstream product ids
+#   key tables  sorted byte-string keys with fixed-width integer values, for
+#               lookups by name and access URI, search postings, equality
+#               filters, range filters (over typed metadata and product
+#               timestamps) and the trigram index of `--fuzzy`
+#
+# Ids are taken from the JSON snapshot (or assigned exactly as the format
+# migrations assign them for files that predate stored ids), so journal
+# records written against either form replay the same.
+# Arrays are stored in native byte order; the header records it and snapshots
+# from a machine of the other endianness are rejected (and rebuilt from JSON).
+
+MAGIC = b"FEAMSNAP"
+FORMAT_VERSION = 6
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+_HEADER = struct.Struct("<8sHBxIqq")
+_SECTION = struct.Struct("<16sQQ")
+_RECORD_LENGTH = struct.Struct("<I")
+_ALIGN = 8
+
+# Key prefixes inside the "filters" table.
+_FIELD_KEY = "f"
+_METADATA_KEY = "m"
+_SEP = "\0"
+
+
+def _field_key(field: str, value: str) -> bytes:
+	return _SEP.join((_FIELD_KEY, field, value)).encode("utf-8")
+
+
+def _metadata_key(namespace: str, meta_key: str, meta_value: str) -> bytes:
+	return _SEP.join((_METADATA_KEY, namespace, meta_key, meta_value)).encode("utf-8")
+
+
+def _range_key(namespace: str, meta_key: str, kind: str) -> bytes:
+	return _SEP.join((namespace, meta_key, kind)).encode("utf-8")
+
+
+def _timestamp_key(field: str) -> bytes:
+	# Metadata namespaces are never empty, so these cannot collide.
+	return _range_key("", field, TIME)
+
+
+def _trigram_key(field: str, trigram: str) -> bytes:
+	return _SEP.join((field, trigram)).encode("utf-8")
+
+
+# -------------------- writing --------------------
+
+
+def _key_table(entries: Dict[bytes, Sequence[int]], width: int) -> bytes:
+	"""Serialize `key -> width ints` as count, key offsets, values, key blob."""
+	keys = sorted(entries)
+	offsets = array("Q", [0])
+	values = array("q")
+	blob = bytearray()
+	for key in keys:
+		blob += key
+		offsets.append(len(blob))
+		values.extend(entries[key])
+		if len(entries[key]) != width:
+			raise ValueError(f"Key table values must have width {width}")
+	return struct.pack("<Q", len(keys)) + offsets.tobytes() + values.tobytes() + bytes(blob)
+
+
+def build_sections(data: Dict[str, Any]) -> Dict[str, bytes]:
+	"""Encode a snapshot dict (the JSON layout) into binary sections."""
+	teams = sorted(
+		[team.get("id", team_id), team["name"]]
+		for team_id, team in enumerate(data.get("teams", []), start=1)
+	)
+	products = sorted(
+		((product.get("id", product_id), product) for product_id, product in enumerate(data.get("products", []), start=1)),
+		key=lambda item: item[0],
+	)
+	known_products = {product_id for product_id, _ in products}
+	metadata_by_product: Dict[int, List[list]] = {}
+	metadata_owners: List[Tuple[int, int]] = []
+	next_metadata_id = 1
+	for entry in sorted(data.get("metadata", []), key=lambda entry: entry.get("id", 0)):
+		product_id = entry["data_product_id"]
+		if product_id not in known_products:
+			continue
+		metadata_id = entry.get("id", next_metadata_id)
+		metadata_by_product.setdefault(product_id, []).append(
+			[metadata_id, entry["namespace"], entry["meta_key"], entry["meta_value"], entry["value_type"]]
+		)
+		metadata_owners.append((metadata_id, product_id))
+		next_metadata_id = max(next_metadata_id, metadata_id + 1)
+	metadata_owners.sort()
+	versions_by_product: Dict[int, List[list]] = {}
+	next_version_id = 1
+	for version in data.get("versions", []):
+		product_id = version["data_product_id"]
+		if product_id not in known_products:
+			continue
+		versions_by_product.setdefault(product_id, []).append(
+			[
+				version["id"],
+				version["label"],
+				version["created_at"],
+				version["data_format"],
+				version["access_uri"],
+				version["status"],
+				version["classification"],
+				version["changed"],
+				version["removed"],
+			]
+		)
+		next_version_id = max(next_version_id, version["id"] + 1)
+	lineage = sorted(
+		(downstream_id, upstream_id)
+		for downstream_id, upstream_id in data.get("lineage", [])
+		# A shard's edges may lead upstream into other shards.
+		if downstream_id in known_products and (upstream_id in known_products or "namespace" in data)
+	)
+	name_order = array("q", (product_id for _, product_id in sorted((p["name"], i) for i, p in products)))
+	metadata_ids = array("q", (metadata_id for metadata_id, _ in metadata_owners))
+	metadata_products = array("q", (product_id for _, product_id in metadata_owners))
+
+	records = bytearray()
+	product_ids = array("q")
+	product_offsets = array("q")
+	doc_lengths = array("q")
+	by_name: Dict[bytes, List[int]] = {}
+	by_uri: Dict[bytes, List[int]] = {}
+	postings: Dict[str, Dict[int, int]] = {}
+	filter_ids: Dict[bytes, List[int]] = {}
+	ranges: Dict[bytes, List[Tuple[float, int]]] = {}
+	trigram_ids: Dict[bytes, List[int]] = {}
+	text_docs = text_length = 0
+
+	for product_id, product in products:
+		metadata = metadata_by_product.get(product_id, [])
+		payload = json.dumps(
+			[
+				product_id,
+				product["name"],
+				product["description"],
+				product["owner_team_id"],
+				product["data_format"],
+				product["access_uri"],
+				product["status"],
+				product["classification"],
+				product["created_at"],
+				product["updated_at"],
+				metadata,
+				versions_by_product.get(product_id, []),
+			],
+			separators=(",", ":"),
+		).encode("utf-8")
+		product_ids.append(product_id)
+		product_offsets.append(len(records))
+		records += _RECORD_LENGTH.pack(len(payload)) + payload
+
+		by_name.setdefault(product["name"].encode("utf-8"), [product_id])
+		by_uri.setdefault(product["access_uri"].encode("utf-8"), [product_id])
+		for field in PRODUCT_FILTER_FIELDS:
+			filter_ids.setdefault(_field_key(field, str(product[field])), []).append(product_id)
+		for field in TIMESTAMP_FILTER_FIELDS:
+			key = epoch_seconds(datetime.fromisoformat(product[field]))
+			ranges.setdefault(_timestamp_key(field), []).append((key, product_id))
+
+		for field in TRIGRAM_FIELDS:
+			for trigram in trigrams(product[field]):
+				trigram_ids.setdefault(_trigram_key(field, trigram), []).append(product_id)
+
+		tokens = tokenize(product["name"]) + tokenize(product["description"])
+		for _, namespace, meta_key, meta_value, value_type in metadata:
+			tokens.extend(tokenize(meta_value))
+			ids = filter_ids.setdefault(_metadata_key(namespace, meta_key, meta_value), [])
+			if not ids or ids[-1] != product_id:
+				ids.append(product_id)
+			typed_value = parse_typed_value(meta_value, value_type)
+			if typed_value is not None:
+				kind, key = sort_key(typed_value)
+				ranges.setdefault(_range_key(namespace, meta_key, kind), []).append((key, product_id))
+		for token in tokens:
+			doc = postings.setdefault(token, {})
+			doc[product_id] = doc.get(product_id, 0) + 1
+		doc_lengths.append(len(tokens))
+		if tokens:
+			text_docs += 1
+			text_length += len(tokens)
+
+	term_values: Dict[bytes, List[int]] = {}
+	post_ids = array("q")
+	post_tfs = array("q")
+	for term, docs in postings.items():
+		term_values[term.encode("utf-8")] = [len(post_ids), len(docs)]
+		post_ids.extend(docs.keys())
+		post_tfs.extend(docs.values())
+
+	filter_values: Dict[bytes, List[int]] = {}
+	filter_lists = array("q")
+	for key, ids in filter_ids.items():
+		filter_values[key] = [len(filter_lists), len(ids)]
+		filter_lists.extend(ids)
+
+	range_values: Dict[bytes, List[int]] = {}
+	range_keys = array("d")
+	range_ids = array("q")
+	for key, pairs in ranges.items():
+		pairs.sort()
+		range_values[key] = [len(range_keys), len(pairs)]
+		range_keys.extend(k for k, _ in pairs)
+		range_ids.extend(product_id for _, product_id in pairs)
+
+	trigram_values: Dict[bytes, List[int]] = {}
+	trigram_lists = array("q")
+	for key, ids in trigram_ids.items():
+		trigram_values[key] = [len(trigram_lists), len(ids)]
+		trigram_lists.extend(ids)
+
+	info = {
+		"teams": teams,
+		"next_team_id": max((team_id for team_id, _ in teams), default=0) + 1,
+		"next_product_id": max(known_products, default=0) + 1,
+		"next_metadata_id": next_metadata_id,
+		"next_version_id": next_version_id,
+		"text_docs": text_docs,
+		"text_length": text_length,
+	}
+	return {
+		"info": json.dumps(info, separators=(",", ":")).encode("utf-8"),
+		"records": bytes(records),
+		"product_ids": product_ids.tobytes(),
+		"product_offsets": product_offsets.tobytes(),
+		"name_order": name_order.tobytes(),
+		"doc_lengths": doc_lengths.tobytes(),
+		"metadata_ids": metadata_ids.tobytes(),
+		"metadata_owners": metadata_products.tobytes(),
+		"by_name": _key_table(by_name, 1),
+		"by_uri": _key_table(by_uri, 1),
+		"terms": _key_table(term_values, 2),
+		"post_ids": post_ids.tobytes(),
+		"post_tfs": post_tfs.tobytes(),
+		"filters": _key_table(filter_values, 2),
+		"filter_ids": filter_lists.tobytes(),
+		"ranges": _key_table(range_values, 2),
+		"range_keys": range_keys.tobytes(),
+		"range_ids": range_ids.tobytes(),
+		"trigrams": _key_table(trigram_values, 2),
+		"trigram_ids": trigram_lists.tobytes(),
+		"lineage_down": array("q", (downstream_id for downstream_id, _ in lineage)).tobytes(),
+		"lineage_up": array("q", (upstream_id for _, upstream_id in lineage)).tobytes(),
+	}
+
+
+def write_binary_snapshot(path: Path, data: Dict[str, Any], source_stamp: Tuple[int, int]) -> None:
+	"""Atomically write `data` as a binary snapshot of the JSON file with `source_stamp`.
+
+	`source_stamp` is the JSON snapshot's `(st_size, st_mtime_ns)`; readers
+	only trust the binary form while it still matches.
+	"""
+	sections = build_sections(data)
+	directory_size = _SECTION.size * len(sections)
+	position = _HEADER.size + directory_size
+	layout: List[Tuple[str, int, bytes]] = []
+	for name, payload in sections.items():
+		position += -position % _ALIGN
+		layout.append((name, position, payload))
+		position += len(payload)
+
+	path = Path(path)
+	# Unique per writer: readers that find a stale copy rebuild it concurrently.
+	tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:12]}.tmp")
+	with tmp_path.open("xb") as f:
+		f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, int(_LITTLE_ENDIAN), len(sections), *source_stamp))
+		for name, offset, payload in layout:
+			f.write(_SECTION.pack(name.encode("ascii"), offset, len(payload)))
+		for _, offset, payload in layout:
+			f.write(b"\0" * (offset - f.tell()))
+			f.write(payload)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp_path, path)
+
+
+def source_stamp(path: Path) -> Tuple[int, int]:
+	st = os.stat(path)
+	return st.st_size, st.st_mtime_ns
+
+
+# -------------------- reading --------------------
+
+
+class _Keys:
+	"""Sequence view of a key table's keys, for `bisect`."""
+
+	__slots__ = ("_offsets", "_blob")
+
+	def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+		self._offsets = offsets
+		self._blob = blob
+
+	def __len__(self) -> int:
+		return len(self._offsets) - 1
+
+	def __getitem__(self, index: int) -> bytes:
+		return self._blob[self._offsets[index]:self._offsets[index + 1]].tobytes()
+
+
+class KeyTable:
+	"""Read side of `_key_table`: sorted keys with fixed-width int values."""
+
+	def __init__(self, view: memoryview, width: int) -> None:
+		(count,) = struct.unpack_from("<Q", view)
+		offsets_end = 8 + 8 * (count + 1)
+		values_end = offsets_end + 8 * count * width
+		self.width = width
+		self.keys = _Keys(view[8:offsets_end].cast("Q"), view[values_end:])
+		self._values = view[offsets_end:values_end].cast("q")
+
+	def __len__(self) -> int:
+		return len(self.keys)
+
+	def values(self, index: int) -> Tuple[int, ...]:
+		start = index * self.width
+		return tuple(self._values[start:start + self.width])
+
+	def get(self, key: bytes) -> Optional[Tuple[int, ...]]:
+		index = bisect.bisect_left(self.keys, key)
+		if index < len(self.keys) and self.keys[index] == key:
+			return self.values(index)
+		return None
+
+	def prefixed(self, prefix: bytes) -> Iterator[Tuple[bytes, Tuple[int, ...]]]:
+		index = bisect.bisect_left(self.keys, prefix)
+		while index < len(self.keys):
+			key = self.keys[index]
+			if not key.startswith(prefix):
+				return
+			yield key, self.values(index)
+			index += 1
+
+
+class _NameOrder:
+	"""Sequence view of `(name, id)` in name order, for `bisect`; decodes the probed records."""
+
+	__slots__ = ("_snapshot",)
+
+	def __init__(self, snapshot: BinarySnapshot) -> None:
+		self._snapshot = snapshot
+
+	def __len__(self) -> int:
+		return len(self._snapshot._name_order)
+
+	def __getitem__(self, index: int) -> Tuple[str, int]:
+		product_id = self._snapshot._name_order[index]
+		return self._snapshot.product(product_id).name, product_id
+
+
+class BinarySnapshot:
+	"""A memory-mapped binary snapshot; products are decoded on demand."""
+
+	def __init__(self, path: Path) -> None:
+		self.path = Path(path)
+		with self.path.open("rb") as f:
+			self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			self._open()
+		except (KeyError, TypeError, struct.error) as exc:
+			# Truncated or damaged file; callers fall back to the JSON snapshot.
+			raise ValueError(f"{self.path} is not a valid feam binary snapshot") from exc
+
+	def _open(self) -> None:
+		if len(self._mmap) < _HEADER.size:
+			raise ValueError(f"{self.path} is not a feam binary snapshot")
+		magic, version, little, count, size, mtime_ns = _HEADER.unpack_from(self._mmap)
+		if magic != MAGIC:
+			raise ValueError(f"{self.path} is not a feam binary snapshot")
+		if version != FORMAT_VERSION:
+			raise ValueError(f"{self.path} has unsupported snapshot version {version}")
+		if bool(little) != _LITTLE_ENDIAN:
+			raise ValueError(f"{self.path} was written on a machine with a different byte order")
+		self.source_stamp = (size, mtime_ns)
+
+		view = memoryview(self._mmap)
+		self._sections: Dict[str, memoryview] = {}
+		for i in range(count):
+			name, offset, length = _SECTION.unpack_from(self._mmap, _HEADER.size + i * _SECTION.size)
+			if offset + length > len(view):
+				raise ValueError(f"{self.path} is truncated")
+			self._sections[name.rstrip(b"\0").decode("ascii")] = view[offset:offset + length]
+
+		info = json.loads(self._sections["info"].tobytes())
+		self.teams: List[Tuple[int, str]] = [(team_id, name) for team_id, name in info["teams"]]
+		self.next_team_id: int = info["next_team_id"]
+		self.next_product_id: int = info["next_product_id"]
+		self.next_metadata_id: int = info["next_metadata_id"]
+		self.next_version_id: int = info["next_version_id"]
+		self.text = SnapshotTextSegment(self, info["text_docs"], info["text_length"])
+		self.trigrams = SnapshotTrigramSegment(self)
+
+		self._records = self._sections["records"]
+		self._product_ids = self._array("product_ids", "q")
+		self._product_offsets = self._array("product_offsets", "q")
+		self._name_order = self._array("name_order", "q")
+		self._doc_lengths = self._array("doc_lengths", "q")
+		self._metadata_ids = self._array("metadata_ids", "q")
+		self._metadata_products = self._array("metadata_owners", "q")
+		self._by_name = KeyTable(self._sections["by_name"], 1)
+		self._by_uri = KeyTable(self._sections["by_uri"], 1)
+		self._terms = KeyTable(self._sections["terms"], 2)
+		self._post_ids = self._array("post_ids", "q")
+		self._post_tfs = self._array("post_tfs", "q")
+		self._filters = KeyTable(self._sections["filters"], 2)
+		self._filter_ids = self._array("filter_ids", "q")
+		self._ranges = KeyTable(self._sections["ranges"], 2)
+		self._range_keys = self._array("range_keys", "d")
+		self._range_ids = self._array("range_ids", "q")
+		self._trigram_keys = KeyTable(self._sections["trigrams"], 2)
+		self._trigram_ids = self._array("trigram_ids", "q")
+		self._lineage_down = self._array("lineage_down", "q")
+		self._lineage_up = self._array("lineage_up", "q")
+
+	def _array(self, name: str, typecode: str) -> memoryview:
+		return self._sections[name].cast(typecode)
+
+	# -------------------- products --------------------
+
+	def __len__(self) -> int:
+		return len(self._product_ids)
+
+	@property
+	def product_ids(self) -> Sequence[int]:
+		return self._product_ids
+
+	def _position(self, product_id: int) -> int:
+		index = bisect.bisect_left(self._product_ids, product_id)
+		if index < len(self._product_ids) and self._product_ids[index] == product_id:
+			return index
+		return -1
+
+	def has_product(self, product_id: int) -> bool:
+		return self._position(product_id) >= 0
+
+	def product(self, product_id: int) -> Optional[DataProduct]:
+		index = self._position(product_id)
+		return self._decode(self._product_offsets[index]) if index >= 0 else None
+
+	def iter_products(self) -> Iterator[DataProduct]:
+		for offset in self._product_offsets:
+			yield self._decode(offset)
+
+	def _decode(self, offset: int) -> DataProduct:
+		(length,) = _RECORD_LENGTH.unpack_from(self._records, offset)
+		start = offset + _RECORD_LENGTH.size
+		(
+			product_id,
+			name,
+			description,
+			owner_team_id,
+			data_format,
+			access_uri,
+			status,
+			classification,
+			created_at,
+			updated_at,
+			metadata,
+			versions,
+		) = json.loads(self._records[start:start + length].tobytes())
+		now = datetime.utcnow()
+		product = DataProduct(
+			product_id=product_id,
+			name=name,
+			description=description,
+			owner_team_id=owner_team_id,
+			data_format=sys.intern(data_format),
+			access_uri=access_uri,
+			status=sys.intern(status),
+			classification=sys.intern(classification),
+			created_at=datetime.fromisoformat(created_at),
+			updated_at=datetime.fromisoformat(updated_at),
+		)
+		product.metadata = [
+			MetadataEntry(
+				metadata_id=metadata_id,
+				data_product_id=product_id,
+				namespace=sys.intern(namespace),
+				meta_key=sys.intern(meta_key),
+				meta_value=meta_value,
+				value_type=sys.intern(value_type),
+				created_at=now,
+				typed_value=parse_typed_value(meta_value, value_type),
+			)
+			for metadata_id, namespace, meta_key, meta_value, value_type in metadata
+		]
+		if versions:
+			product.versions = VersionHistory()
+			for version_id, label, created_at, *fields, changed, removed in versions:
+				product.versions.append_delta(
+					version_id,
+					product_id,
+					label,
+					*fields,
+					created_at=datetime.fromisoformat(created_at),
+					changed=changed,
+					removed=removed,
+				)
+		return product
+
+	def lineage_edges(self) -> Iterator[Tuple[int, int]]:
+		"""Every `(downstream id, upstream id)` lineage edge, sorted."""
+		return zip(self._lineage_down, self._lineage_up)
+
+	def ids_by_name(self, after: Optional[Tuple[str, int]] = None) -> Iterator[int]:
+		"""Product ids sorted by (name, id), starting after `after`."""
+		start = bisect.bisect_right(_NameOrder(self), tuple(after)) if after is not None else 0
+		for index in range(start, len(self._name_order)):
+			yield self._name_order[index]
+
+	def product_id_by_name(self, name: str) -> Optional[int]:
+		values = self._by_name.get(name.encode("utf-8"))
+		return values[0] if values else None
+
+	def product_id_by_uri(self, access_uri: str) -> Optional[int]:
+		values = self._by_uri.get(access_uri.encode("utf-8"))
+		return values[0] if values else None
+
+	def metadata_product_id(self, metadata_id: int) -> Optional[int]:
+		index = bisect.bisect_left(self._metadata_ids, metadata_id)
+		if index < len(self._metadata_ids) and self._metadata_ids[index] == metadata_id:
+			return self._metadata_products[index]
+		return None
+
+	# -------------------- filters --------------------
+
+	def _id_list(self, key: bytes) -> Sequence[int]:
+		values = self._filters.get(key)
+		if values is None:
+			return ()
+		start, count = values
+		return self._filter_ids[start:start + count]
+
+	def field_ids(self, field: str, value: str) -> Sequence[int]:
+		return self._id_list(_field_key(field, value))
+
+	def field_values(self, field: str) -> List[str]:
+		"""Distinct values of product field `field`, as stored in the filter keys."""
+		prefix = _field_key(field, "")
+		return [key[len(prefix):].decode("utf-8") for key, _ in self._filters.prefixed(prefix)]
+
+	def field_postings(self, field: str) -> Iterator[Tuple[str, Sequence[int]]]:
+		"""Distinct values of product field `field`, with the ids of their products."""
+		prefix = _field_key(field, "")
+		for key, (start, count) in self._filters.prefixed(prefix):
+			yield key[len(prefix):].decode("utf-8"), self._filter_ids[start:start + count]
+
+	def metadata_ids(self, namespace: str, meta_key: str, meta_value: str) -> Sequence[int]:
+		return self._id_list(_metadata_key(namespace, meta_key, meta_value))
+
+	def metadata_values(self, namespace: str, meta_key: str) -> Iterator[Tuple[str, Sequence[int]]]:
+		"""Distinct values of metadata key `namespace.meta_key`, with the ids of their products."""
+		prefix = _metadata_key(namespace, meta_key, "")
+		for key, (start, count) in self._filters.prefixed(prefix):
+			yield key[len(prefix):].decode("utf-8"), self._filter_ids[start:start + count]
+
+	def range_items(self, namespace: str, meta_key: str, kind: str) -> Iterator[Tuple[float, int]]:
+		"""Every `(sort key, product id)` pair of typed key `namespace.meta_key`, in key order."""
+		values = self._ranges.get(_range_key(namespace, meta_key, kind))
+		if values is None:
+			return iter(())
+		start, count = values
+		return zip(self._range_keys[start:start + count], self._range_ids[start:start + count])
+
+	def range_select(self, namespace: str, meta_key: str, kind: str, op: str, key: float) -> Set[int]:
+		"""Product ids whose typed value satisfies `value <op> key`."""
+		return self._select(_range_key(namespace, meta_key, kind), op, key)
+
+	def timestamp_arrays(self, field: str) -> Tuple[Sequence[float], Sequence[int]]:
+		"""Epoch seconds of product timestamp `field` and their product ids, oldest first."""
+		values = self._ranges.get(_timestamp_key(field))
+		if values is None:
+			return (), ()
+		start, count = values
+		return self._range_keys[start:start + count], self._range_ids[start:start + count]
+
+	def timestamp_select(self, field: str, op: str, key: float) -> Set[int]:
+		"""Product ids whose timestamp `field` satisfies `timestamp <op> key` (epoch seconds)."""
+		return self._select(_timestamp_key(field), op, key)
+
+	def _select(self, range_key: bytes, op: str, key: float) -> Set[int]:
+		values = self._ranges.get(range_key)
+		if values is None:
+			return set()
+		start, count = values
+		keys = self._range_keys[start:start + count]
+		if op == ">":
+			lo, hi = bisect.bisect_right(keys, key), count
+		elif op == ">=":
+			lo, hi = bisect.bisect_left(keys, key), count
+		elif op == "<":
+			lo, hi = 0, bisect.bisect_left(keys, key)
+		elif op == "<=":
+			lo, hi = 0, bisect.bisect_right(keys, key)
+		elif op == "=":
+			lo, hi = bisect.bisect_left(keys, key), bisect.bisect_right(keys, key)
+		else:
+			raise ValueError(f"Unknown range operator {op!r}")
+		return set(self._range_ids[start + lo:start + hi])
+
+
+class SnapshotTextSegment:
+	"""`text_index.TextSegment` over the postings stored in a snapshot."""
+
+	def __init__(self, snapshot: BinarySnapshot, doc_count: int, total_length: int) -> None:
+		self._snapshot = snapshot
+		self.doc_count = doc_count
+		self.total_length = total_length
+
+	def expand(self, token: str) -> List[str]:
+		return [key.decode("utf-8") for key, _ in self._snapshot._terms.prefixed(token.encode("utf-8"))]
+
+	def postings(self, term: str) -> Dict[int, int]:
+		values = self._snapshot._terms.get(term.encode("utf-8"))
+		if values is None:
+			return {}
+		start, count = values
+		snapshot = self._snapshot
+		return dict(zip(snapshot._post_ids[start:start + count], snapshot._post_tfs[start:start + count]))
+
+	def doc_length(self, doc_id: int) -> int:
+		index = self._snapshot._position(doc_id)
+		return self._snapshot._doc_lengths[index] if index >= 0 else 0
+
+
+class SnapshotTrigramSegment:
+	"""`fuzzy.TrigramSegment` over the trigram postings stored in a snapshot."""
+
+	def __init__(self, snapshot: BinarySnapshot) -> None:
+		self._snapshot = snapshot
+
+	def postings(self, field: str, trigram: str) -> Sequence[int]:
+		values = self._snapshot._trigram_keys.get(_trigram_key(field, trigram))
+		if values is None:
+			return ()
+		start, count = values
+		return self._snapshot._trigram_ids[start:start + count]
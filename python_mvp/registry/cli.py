@@ -1,108 +1,133 @@
 from __future__ import annotations
 
 import argparse
+import json
 import os
-from typing import List, Optional
-
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from registry import client, trace
+from registry.filters import DEFAULT_FACETS, Facet, Filter, parse_facet, parse_filter
+from registry.fuzzy import DEFAULT_SIMILARITY
+from registry.lineage import LineageCycleError
+from registry.migrations import SnapshotFormatError
+from registry.models import DataProduct, DataProductVersion
+from registry.paging import ID, RANK, SORT_FIELDS, CursorError, Position, decode_cursor, encode_cursor, position
+from registry.query_cache import DEFAULT_CAPACITY, QueryCache
+from registry.schedule import REFRESH_SCHEDULE, REFRESHED_AT, RefreshDue, compile_cron, parse_duration
 from registry.services import Registry
-from registry.seed import seed_mock_data
+from registry.storage import JournalStore
+from registry.typed_values import parse_datetime
 
-import json
 from pathlib import Path
 
+# Feature modules (scanning, fingerprints, path checks, ingest and the
+# sqlite and sharded backends) are imported by the commands that use them,
+# so other commands do not pay for loading them.
+if TYPE_CHECKING:
+	from registry.health import PathStatus
+	from registry.scan import FoundProduct
+	from registry.shards import ShardedRegistry, ShardSet
+	from registry.sqlite_registry import SqliteRegistry
+
 DATA_FILE = Path("feam_registry.json")
+SCAN_CACHE_FILE = Path("feam_scan_cache.json")
+FINGERPRINT_CACHE_FILE = Path("feam_fingerprints.json")
+STAT_CACHE_FILE = Path("feam_stat_cache.json")
+SQLITE_FILE = Path("registry.db")
+SHARD_ROOT_ENV = "FEAM_SHARD_ROOT"
+DEFAULT_SHARD_ROOT = "feam_shards"
+BACKENDS = ("json", "sqlite", "sharded")
+# Where the json backend keeps query results between identical queries.
+QUERY_CACHE_MODES = ("memory", "persist", "off")
 
+AnyRegistry = Union[Registry, "ShardedRegistry", "SqliteRegistry"]
 
-def load_registry(registry: Registry) -> None:
-	"""Load registry state from disk, with a fallback migration for old files."""
-	if not DATA_FILE.exists():
-		seed_mock_data(registry)
-		return
 
-	with DATA_FILE.open("r", encoding="utf-8") as f:
-		data = json.load(f)
-
-	for team in data.get("teams", []):
-		registry.create_team(team["name"])
-
-	for product in data.get("products", []):
-		registry.create_data_product(
-			name=product["name"],
-			description=product["description"],
-			owner_team_id=product["owner_team_id"],
-			data_format=product["data_format"],
-			access_uri=product["access_uri"],
-			status=product["status"],
-			classification=product["classification"],
-		)
+@lru_cache(maxsize=None)
+def open_store() -> JournalStore:
+	"""The process's store; it tracks whether others wrote since it loaded."""
+	return JournalStore(DATA_FILE)
 
-	metadata_entries = data.get("metadata")
-	if metadata_entries is None:
-		restore_seed_metadata(registry)
-		return
 
-	for entry in metadata_entries:
-		if registry.get_product(entry["data_product_id"]) is None:
-			continue
-		registry.add_metadata(
-			data_product_id=entry["data_product_id"],
-			namespace=entry["namespace"],
-			meta_key=entry["meta_key"],
-			meta_value=entry["meta_value"],
-			value_type=entry["value_type"],
+def load_registry(registry: Registry, query_cache: Optional[QueryCache] = None) -> None:
+	"""Load registry state from the snapshot and its journal."""
+	open_store().load(registry, query_cache)
+
+
+def save_registry(registry: Registry) -> None:
+	"""Persist pending mutations; read-only commands write nothing but a persisted query cache."""
+	store = open_store()
+	store.commit(registry)
+	store.save_query_cache(registry.query_cache)
+
+
+def open_query_cache(args: argparse.Namespace) -> QueryCache:
+	"""The query cache selected by --query-cache and --query-cache-size."""
+	if args.query_cache == "off":
+		return QueryCache(capacity=0)
+	if args.query_cache == "persist":
+		return open_store().read_query_cache(args.query_cache_size)
+	return QueryCache(args.query_cache_size)
+
+
+@lru_cache(maxsize=None)
+def open_shards() -> ShardSet:
+	"""The per-namespace shards of the sharded backend, under $FEAM_SHARD_ROOT."""
+	from registry.shards import ShardSet
+
+	return ShardSet(Path(os.getenv(SHARD_ROOT_ENV, DEFAULT_SHARD_ROOT)))
+
+
+def open_registry(args: argparse.Namespace) -> AnyRegistry:
+	"""Open the registry for the selected storage backend."""
+	if args.backend == "sqlite":
+		from registry.sqlite_registry import SqliteRegistry
+
+		return SqliteRegistry(SQLITE_FILE)
+	if args.backend == "sharded":
+		from registry.shards import ShardedRegistry
+
+		return ShardedRegistry(
+			open_shards(),
+			resolve_current_namespace(),
+			compact=args.compact_metadata,
+			namespaces=args.shards or None,
 		)
+	registry = Registry(compact=args.compact_metadata)
+	load_registry(registry, open_query_cache(args))
+	return registry
 
 
-def restore_seed_metadata(registry: Registry) -> None:
-	"""Backfill metadata for old JSON files that predate metadata persistence."""
-	seeded_registry = Registry()
-	seed_mock_data(seeded_registry)
+def commit_registry(registry: AnyRegistry) -> None:
+	"""Make the command's mutations durable in a single write."""
+	if isinstance(registry, Registry):
+		save_registry(registry)
+	else:
+		registry.commit()
 
-	seeded_products = {product.name: product for product in seeded_registry.list_products()}
-	for product in registry.list_products():
-		seeded_product = seeded_products.get(product.name)
-		if seeded_product is None or product.metadata:
-			continue
-		for entry in seeded_product.metadata:
-			registry.add_metadata(
-				data_product_id=product.product_id,
-				namespace=entry.namespace,
-				meta_key=entry.meta_key,
-				meta_value=entry.meta_value,
-				value_type=entry.value_type,
-			)
 
+def close_registry(registry: AnyRegistry) -> None:
+	"""Commit any remaining mutations and release the backend."""
+	commit_registry(registry)
+	if is_sqlite(registry):
+		registry.close()
+
+
+def is_sqlite(registry: AnyRegistry) -> bool:
+	"""Whether `registry` is the sqlite backend, without importing it for the others."""
+	module = sys.modules.get("registry.sqlite_registry")
+	return module is not None and isinstance(registry, module.SqliteRegistry)
 
-def save_registry(registry: Registry) -> None:
-	data = {
-		"teams": [{"name": t.name} for t in registry.list_teams()],
-		"products": [
-			{
-				"name": p.name,
-				"description": p.description,
-				"owner_team_id": p.owner_team_id,
-				"data_format": p.data_format,
-				"access_uri": p.access_uri,
-				"status": p.status,
-				"classification": p.classification,
-			}
-			for p in registry.list_products()
-		],
-		"metadata": [
-			{
-				"data_product_id": p.product_id,
-				"namespace": m.namespace,
-				"meta_key": m.meta_key,
-				"meta_value": m.meta_value,
-				"value_type": m.value_type,
-			}
-			for p in registry.list_products()
-			for m in p.metadata
-		],
-	}
 
-	with DATA_FILE.open("w", encoding="utf-8") as f:
-		json.dump(data, f, indent=2)
+def is_sharded(registry: AnyRegistry) -> bool:
+	"""Whether `registry` is the sharded backend, without importing it for the others."""
+	module = sys.modules.get("registry.shards")
+	return module is not None and isinstance(registry, module.ShardedRegistry)
 
 
 def print_header(title: str) -> None:
@@ -111,28 +136,153 @@ def print_header(title: str) -> None:
 	print("=" * 80)
 
 
-def print_teams(registry: Registry) -> None:
+def print_teams(registry: AnyRegistry) -> None:
 	print_header("Teams")
 	for t in registry.list_teams():
 		print(f"[{t.teams_id}] {t.name} (created {t.created_at:%Y-%m-%d})")
 
 
-def print_products(registry: Registry) -> None:
-	print_header("Data products")
-	for p in registry.list_products():
-		team = registry.get_team(p.owner_team_id)
-		owner = team.name if team else f"team:{p.owner_team_id}"
-		print(f"[{p.product_id}] {p.name} (owner={owner})")
-		# print(
-		# 	f"[{p.product_id}] {p.name} | owner={owner} | format={p.data_format} | "
-		# 	f"status={p.status} | class={p.classification}"
-		# )
+# Listing output: lines are written to stdout in batches of this many, except
+# the first, which is flushed at once.
+OUTPUT_BATCH = 256
+LISTING_FORMATS = ("table", "jsonl", "tsv")
+TSV_COLUMNS = ("id", "name", "owner", "data_format", "status", "classification", "access_uri", "description")
 
 
-def print_product_details(registry: Registry, product_id: int) -> None:
-	product = registry.get_product(product_id)
+class LineWriter:
+	"""Buffered writes to stdout for streamed listings."""
+
+	def __init__(self) -> None:
+		self._pending: List[str] = []
+		self._flushed = False
+
+	def write(self, line: str) -> None:
+		self._pending.append(line)
+		if not self._flushed or len(self._pending) >= OUTPUT_BATCH:
+			self.flush()
+
+	def flush(self) -> None:
+		if self._pending:
+			sys.stdout.write("".join(self._pending))
+			self._pending.clear()
+		if not self._flushed:
+			sys.stdout.flush()
+			self._flushed = True
+
+
+def tsv_field(value: object) -> str:
+	return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def format_product_row(product: DataProduct, owner: str, fmt: str) -> str:
+	if fmt == "table":
+		return f"[{product.product_id}] {product.name} (owner={owner})\n"
+	record = {
+		"id": product.product_id,
+		"name": product.name,
+		"owner": owner,
+		"owner_team_id": product.owner_team_id,
+		"data_format": product.data_format,
+		"status": product.status,
+		"classification": product.classification,
+		"access_uri": product.access_uri,
+		"description": product.description,
+	}
+	if fmt == "jsonl":
+		return json.dumps(record, ensure_ascii=False) + "\n"
+	return "\t".join(tsv_field(record[column]) for column in TSV_COLUMNS) + "\n"
+
+
+def print_listing(
+	registry: AnyRegistry,
+	rows: Iterable[Tuple[DataProduct, Position]],
+	sort: str,
+	title: str,
+	empty_message: str,
+	limit: Optional[int] = None,
+	fmt: str = "table",
+) -> int:
+	"""Stream `(product, position)` rows in `fmt`; returns how many were written.
+
+	With `limit`, a full page ends with the cursor for the next one on
+	stderr, so stdout stays machine-readable.
+	"""
+	writer = LineWriter()
+	owners: Dict[int, str] = {}
+	written = 0
+	last: Optional[Position] = None
+	if fmt == "tsv":
+		writer.write("\t".join(TSV_COLUMNS) + "\n")
+	for product, at in rows:
+		if limit is not None and written == limit:
+			writer.flush()
+			print(f"Next page: --after {encode_cursor(sort, last)}", file=sys.stderr)
+			break
+		if written == 0 and fmt == "table":
+			print_header(title)
+		owner = owners.get(product.owner_team_id)
+		if owner is None:
+			team = registry.get_team(product.owner_team_id)
+			owner = owners[product.owner_team_id] = team.name if team else f"team:{product.owner_team_id}"
+		writer.write(format_product_row(product, owner, fmt))
+		written += 1
+		last = at
+	writer.flush()
+	if not written and fmt == "table":
+		print(empty_message)
+	return written
+
+
+def sorted_rows(products: Iterable[DataProduct], sort: str) -> Iterable[Tuple[DataProduct, Position]]:
+	return ((product, position(product, sort)) for product in products)
+
+
+def print_products(
+	registry: AnyRegistry,
+	filters: Sequence[Filter] = (),
+	sort: str = ID,
+	after: Optional[Position] = None,
+	limit: Optional[int] = None,
+	fmt: str = "table",
+) -> None:
+	print_listing(
+		registry,
+		sorted_rows(registry.iter_products(filters, sort, after), sort),
+		sort,
+		"Data products",
+		"No data products.",
+		limit=limit,
+		fmt=fmt,
+	)
+
+
+# Version labels listed by `show` before eliding older ones.
+MAX_LISTED_VERSIONS = 10
+
+
+def find_product(registry: AnyRegistry, product_ref: str) -> Optional[DataProduct]:
+	"""Look a product up by id or, failing that, by name; report it if missing."""
+	if product_ref.isdigit():
+		product = registry.get_product(int(product_ref))
+	else:
+		product = registry.get_product_by_name(product_ref)
 	if not product:
-		print(f"No data product with id {product_id} found.")
+		kind = "id" if product_ref.isdigit() else "name"
+		print(f"No data product with {kind} {product_ref} found.")
+	return product
+
+
+def print_product_details(registry: AnyRegistry, product_ref: str, version_label: Optional[str] = None) -> None:
+	"""Print a product given its id or, failing that, its name.
+
+	With `version_label`, print that published version instead of the
+	product's current state.
+	"""
+	product = find_product(registry, product_ref)
+	if not product:
+		return
+	if version_label is not None:
+		print_version_details(registry, product, version_label)
 		return
 
 	team = registry.get_team(product.owner_team_id)
@@ -148,6 +298,15 @@ def print_product_details(registry: Registry, product_id: int) -> None:
 	print(f"Classif.    : {product.classification}")
 	print(f"Created     : {product.created_at:%Y-%m-%d %H:%M}")
 	print(f"Updated     : {product.updated_at:%Y-%m-%d %H:%M}")
+	versions = registry.list_versions(product.product_id)
+	if versions:
+		labels = [v.version_label for v in versions[-MAX_LISTED_VERSIONS:]]
+		if len(versions) > MAX_LISTED_VERSIONS:
+			labels.insert(0, "...")
+		print(f"Versions    : {', '.join(labels)} ({len(versions)} total)")
+	schedule = get_metadata_value(product, *REFRESH_SCHEDULE)
+	if schedule is not None:
+		print(f"Refresh     : {describe_schedule(schedule, datetime.utcnow())}")
 
 	if not product.metadata:
 		print("\nNo metadata entries.")
@@ -163,47 +322,106 @@ def print_product_details(registry: Registry, product_id: int) -> None:
 	print()
 
 
-def get_or_create_team(registry: Registry, team_name: str) -> int:
-	for team in registry.list_teams():
-		if team.name == team_name:
-			return team.teams_id
+def print_version_details(registry: AnyRegistry, product: DataProduct, version_label: str) -> None:
+	version = registry.get_version(product.product_id, version_label)
+	if version is None:
+		print(f"No version {version_label} of data product {product.name} found.")
+		return
+
+	print_header(f"Data product: {product.name} @ {version.version_label}")
+	print(f"ID          : {product.product_id}")
+	print(f"Version ID  : {version.version_id}")
+	print(f"Format      : {version.data_format}")
+	print(f"Access URI  : {version.access_uri}")
+	print(f"Status      : {version.status}")
+	print(f"Classif.    : {version.classification}")
+	print(f"Published   : {version.created_at:%Y-%m-%d %H:%M}")
+
+	if not version.metadata:
+		print("\nNo metadata entries.")
+		return
+
+	print("\nMetadata:")
+	for m in sorted(version.metadata.values(), key=lambda m: m.metadata_id):
+		print(f"- {m.namespace}.{m.meta_key} = {m.meta_value} (type={m.value_type})")
+	print()
+
+
+def print_query_cache(cache: QueryCache) -> None:
+	stats = cache.stats()
+	lookups = stats["hits"] + stats["misses"]
+	where = f"saved in {open_store().query_cache_path}" if cache.persistent else "kept in memory"
+	print_header("Query cache")
+	print(f"Storage     : {where}")
+	print(f"Entries     : {stats['entries']} of {stats['capacity']}")
+	print(f"Hits        : {stats['hits']}")
+	print(f"Misses      : {stats['misses']}")
+	if lookups:
+		print(f"Hit rate    : {stats['hits'] / lookups:.1%}")
+	print(f"Evictions   : {stats['evictions']}")
+	print(f"Invalidated : {stats['invalidations']}")
+	print(f"Generation  : {stats['generation']}")
+
+
+def get_or_create_team(registry: AnyRegistry, namespace: str) -> int:
+	"""The id of `namespace`'s team, creating the team on first use."""
+	team_name = namespace_to_team_name(namespace)
+	team = registry.get_team_by_name(team_name)
+	if team is not None:
+		return team.teams_id
+	if isinstance(registry, Registry):
+		# Other processes may be publishing into the same new namespace.
+		return open_store().create_team(registry, team_name).teams_id
+	if is_sharded(registry):
+		return registry.create_team(team_name, namespace).teams_id
 	return registry.create_team(team_name).teams_id
 
 
+NAMESPACE_TEAMS = {
+	"demo_team": "Demo Team",
+	"climate_environment": "Climate & Environment",
+	"crop_analytics": "Crop Analytics",
+}
+
+
 def namespace_to_team_name(namespace: str) -> str:
-	namespace_map = {
-		"demo_team": "Demo Team",
-		"climate_environment": "Climate & Environment",
-		"crop_analytics": "Crop Analytics",
-	}
-	return namespace_map.get(namespace, namespace)
+	return NAMESPACE_TEAMS.get(namespace, namespace)
+
+
+def team_name_to_namespace(team_name: str) -> str:
+	"""Inverse of `namespace_to_team_name`, e.g. for teams from before namespaces."""
+	for namespace, name in NAMESPACE_TEAMS.items():
+		if name == team_name:
+			return namespace
+	return re.sub(r"[^a-z0-9]+", "_", team_name.lower()).strip("_") or "default"
 
 
 def resolve_current_namespace() -> str:
 	return os.getenv("FEAM_NAMESPACE", "demo_team")
 
 
-def serve_product(registry: Registry, args: argparse.Namespace) -> None:
-	namespace = resolve_current_namespace()
-	team_name = namespace_to_team_name(namespace)
-	owner_team_id = get_or_create_team(registry, team_name)
+def publish_uri(namespace: str, name: str) -> str:
+	return f"/publish/{namespace}/{name}"
 
-	path = args.path or input("Asset path: ").strip()
-	name = args.name or input("Name: ").strip()
-	asset_type = args.asset_type or input("Asset type: ").strip() or "dataset"
-	description = input("Description: ").strip()
-	status = input("Status (active, deprecated, draft): ").strip() or "draft"
-	classification = (
-		input("Classification (internal/restricted/public): ").strip() or "internal"
-	)
-	access_uri = f"/publish/{namespace}/{name}"
 
+def publish_product(
+	registry: AnyRegistry,
+	namespace: str,
+	owner_team_id: int,
+	path: str,
+	name: str,
+	asset_type: str,
+	description: str,
+	status: str,
+	classification: str,
+) -> DataProduct:
+	"""Register a served asset and its `feam.*` bookkeeping metadata."""
 	product = registry.create_data_product(
 		name=name,
-		description=description or f"Served from {path}",
+		description=description,
 		owner_team_id=owner_team_id,
 		data_format=asset_type,
-		access_uri=access_uri,
+		access_uri=publish_uri(namespace, name),
 		status=status,
 		classification=classification,
 	)
@@ -222,15 +440,698 @@ def serve_product(registry: Registry, args: argparse.Namespace) -> None:
 		meta_value=namespace,
 		value_type="string",
 	)
+	return product
+
+
+def publish_versions(registry: AnyRegistry, labels: Dict[int, Optional[str]]) -> Dict[int, DataProductVersion]:
+	"""Freeze the current state of each product as a new version (json backend).
+
+	`labels` maps product ids to the label to publish under, or None for the
+	next number. The sqlite schema versions products itself: the first
+	version is created with the product and later ones are opened by
+	`republish` before the changes they publish.
+	"""
+	if is_sqlite(registry):
+		return {}
+	return {product_id: registry.create_version(product_id, label) for product_id, label in labels.items()}
+
+
+def is_new_version(registry: AnyRegistry, product: DataProduct, path: str, version_label: Optional[str]) -> bool:
+	"""Whether serving `path` again as `product` publishes a new version.
+
+	An explicit label publishes unless it exists; otherwise only a different
+	source path does, so re-running a serve is idempotent.
+	"""
+	if version_label is not None:
+		return registry.get_version(product.product_id, version_label) is None
+	return get_source_path(product) != path
+
+
+def republish(
+	registry: AnyRegistry, product: DataProduct, path: str, version_label: Optional[str]
+) -> Optional[DataProductVersion]:
+	"""Point an already served product at `path`.
+
+	On sqlite this opens the new version first, so the change lands on it
+	(see `SqliteRegistry.create_version`) and returns it; the json backend
+	publishes afterwards with `publish_versions`.
+	"""
+	version = None
+	if is_sqlite(registry):
+		version = registry.create_version(product.product_id, version_label)
+	if get_source_path(product) != path:
+		# The digest described the old source; `record_fingerprints` takes a new one.
+		clear_fingerprint(registry, product.product_id)
+	registry.set_metadata(product.product_id, "feam", "source_path", path, "path")
+	return version
+
+
+def get_source_path(product: DataProduct) -> Optional[str]:
+	return get_metadata_value(product, "feam", "source_path")
+
+
+def get_metadata_value(product: DataProduct, namespace: str, meta_key: str) -> Optional[str]:
+	for m in product.metadata:
+		if m.namespace == namespace and m.meta_key == meta_key:
+			return m.meta_value
+	return None
+
+
+def record_refreshes(registry: AnyRegistry, refreshed: Dict[int, datetime]) -> None:
+	"""Store when each product's data was last refreshed, for `feam stale` and `feam due`."""
+	for product_id, at in refreshed.items():
+		registry.set_metadata(product_id, *REFRESHED_AT, at.replace(microsecond=0).isoformat(), "datetime")
+
+
+def record_fingerprints(
+	registry: AnyRegistry, paths: Dict[int, str]
+) -> Tuple[Dict[int, str], int, List[str]]:
+	"""Store `feam.fingerprint` for products whose source path exists locally.
+
+	Products whose path is missing or unreadable have an earlier digest
+	cleared instead, so it is not published with their next version.
+	Returns the recorded digests by product id, the bytes actually hashed
+	(cached digests are reused) and any errors.
+	"""
+	existing = {product_id: path for product_id, path in paths.items() if os.path.exists(path)}
+	for product_id in paths.keys() - existing.keys():
+		clear_fingerprint(registry, product_id)
+	if not existing:
+		return {}, 0, []
+
+	from registry.fingerprint import FingerprintCache, Fingerprinter
+
+	cache = FingerprintCache.load(FINGERPRINT_CACHE_FILE)
+	trees = Fingerprinter(cache).fingerprint_many(list(existing.values()))
+	cache.save()
+
+	digests: Dict[int, str] = {}
+	errors: List[str] = []
+	for product_id, path in existing.items():
+		tree = trees[os.path.abspath(path)]
+		if tree.digest is None:
+			errors.extend(tree.errors)
+			clear_fingerprint(registry, product_id)
+			continue
+		registry.set_metadata(product_id, "feam", "fingerprint", tree.digest, "digest")
+		digests[product_id] = tree.digest
+	hashed_bytes = sum(tree.hashed_bytes for tree in trees.values())
+	return digests, hashed_bytes, errors
+
+
+def clear_fingerprint(registry: AnyRegistry, product_id: int) -> None:
+	"""Blank a recorded `feam.fingerprint` that no longer describes the product's source."""
+	product = registry.get_product(product_id)
+	if product is not None and get_metadata_value(product, "feam", "fingerprint"):
+		registry.set_metadata(product_id, "feam", "fingerprint", "", "digest")
+
+
+def serve_product(registry: AnyRegistry, args: argparse.Namespace) -> None:
+	namespace = resolve_current_namespace()
+	owner_team_id = get_or_create_team(registry, namespace)
+
+	path = args.path or input("Asset path: ").strip()
+	name = args.name or input("Name: ").strip()
+	asset_type = args.asset_type or input("Asset type: ").strip() or "dataset"
+
+	existing = registry.get_product_by_uri(publish_uri(namespace, name))
+	version: Optional[DataProductVersion] = None
+	if existing is not None:
+		# Serving a published name again publishes a new version of it.
+		if args.version and registry.get_version(existing.product_id, args.version) is not None:
+			print(f"Data product {name} already has a version {args.version}.")
+			return
+		version = republish(registry, existing, path, args.version)
+		product = existing
+	else:
+		description = input("Description: ").strip()
+		status = input("Status (active, deprecated, draft): ").strip() or "draft"
+		classification = (
+			input("Classification (internal/restricted/public): ").strip() or "internal"
+		)
+
+		product = publish_product(
+			registry,
+			namespace=namespace,
+			owner_team_id=owner_team_id,
+			path=path,
+			name=name,
+			asset_type=asset_type,
+			description=description or f"Served from {path}",
+			status=status,
+			classification=classification,
+		)
+
+	record_refreshes(registry, {product.product_id: datetime.utcnow()})
+	fingerprint: Optional[str] = None
+	if not args.no_fingerprint:
+		digests, _, errors = record_fingerprints(registry, {product.product_id: path})
+		fingerprint = digests.get(product.product_id)
+		for error in errors:
+			print(f"Could not fingerprint {error}")
+	version = publish_versions(registry, {product.product_id: args.version}).get(product.product_id) or version
 
 	print_header("Served data product")
 	print(f"Namespace   : {namespace}")
-	print(f"Published to: {access_uri}")
+	print(f"Published to: {product.access_uri}")
 	print(f"Product ID  : {product.product_id}")
 	print(f"Name        : {product.name}")
+	if version is not None:
+		print(f"Version     : {version.version_label}")
+	if fingerprint:
+		print(f"Fingerprint : {fingerprint}")
+
 
+def format_size(num_bytes: int) -> str:
+	size = float(num_bytes)
+	for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+		if size < 1024 or unit == "TiB":
+			break
+		size /= 1024
+	return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+# Invalid manifest rows reported in full; the rest are only counted.
+MAX_REPORTED_ERRORS = 20
+
+
+def serve_batch(registry: AnyRegistry, manifest: str, fingerprint: bool = True) -> None:
+	"""Register every asset in a JSONL/CSV manifest and commit once."""
+	from registry.ingest import ManifestError, iter_manifest_records, validate_record
+
+	default_namespace = resolve_current_namespace()
+	team_ids: Dict[str, int] = {}
+	paths: Dict[int, str] = {}
+	labels: Dict[int, Optional[str]] = {}
+	rows = registered = republished = duplicates = invalid = 0
+	errors: List[ManifestError] = []
+
+	start = time.perf_counter()
+	for line, record in iter_manifest_records(manifest):
+		rows += 1
+		try:
+			row = validate_record(line, record)
+		except ManifestError as exc:
+			invalid += 1
+			if len(errors) < MAX_REPORTED_ERRORS:
+				errors.append(exc)
+			continue
+
+		namespace = row.namespace or default_namespace
+		# Rows registered earlier in this batch are visible here too, so this
+		# also dedupes the manifest against itself.
+		existing = registry.get_product_by_uri(publish_uri(namespace, row.name))
+		if existing is not None:
+			if existing.product_id in labels or not is_new_version(registry, existing, row.path, row.version):
+				duplicates += 1
+				continue
+			republish(registry, existing, row.path, row.version)
+			product = existing
+			republished += 1
+		else:
+			owner_team_id = team_ids.get(namespace)
+			if owner_team_id is None:
+				owner_team_id = get_or_create_team(registry, namespace)
+				team_ids[namespace] = owner_team_id
+
+			product = publish_product(
+				registry,
+				namespace=namespace,
+				owner_team_id=owner_team_id,
+				path=row.path,
+				name=row.name,
+				asset_type=row.asset_type,
+				description=row.description,
+				status=row.status,
+				classification=row.classification,
+			)
+			registered += 1
+		paths[product.product_id] = row.path
+		labels[product.product_id] = row.version
+
+	ingest_seconds = time.perf_counter() - start
+	digests: Dict[int, str] = {}
+	hashed_bytes = 0
+	fingerprint_errors: List[str] = []
+	if fingerprint:
+		digests, hashed_bytes, fingerprint_errors = record_fingerprints(registry, paths)
+	record_refreshes(registry, dict.fromkeys(paths, datetime.utcnow()))
+	publish_versions(registry, labels)
+	commit_registry(registry)
+	total_seconds = time.perf_counter() - start
+
+	print_header("Batch serve")
+	print(f"Manifest    : {manifest}")
+	print(f"Rows read   : {rows}")
+	print(f"Registered  : {registered}")
+	print(f"New versions: {republished}")
+	print(f"Duplicates  : {duplicates}")
+	print(f"Invalid     : {invalid}")
+	print(f"Ingest      : {ingest_seconds:.3f}s ({rows / max(ingest_seconds, 1e-9):,.0f} rows/s)")
+	if fingerprint:
+		print(f"Fingerprints: {len(digests)} ({format_size(hashed_bytes)} hashed)")
+	print(f"Total       : {total_seconds:.3f}s incl. commit ({rows / max(total_seconds, 1e-9):,.0f} rows/s)")
+	for exc in errors:
+		print(f"  invalid {exc}")
+	if invalid > len(errors):
+		print(f"  ... and {invalid - len(errors)} more invalid rows")
+	for error in fingerprint_errors[:MAX_REPORTED_ERRORS]:
+		print(f"  unreadable {error}")
+
+
+def scanned_product_name(root: str, path: str) -> str:
+	"""Product name for a scanned directory: its path below the scan root."""
+	relative = os.path.relpath(path, root)
+	if relative == os.curdir:
+		relative = os.path.basename(path)
+	parts = relative.split(os.sep)
+	parts[-1] = os.path.splitext(parts[-1])[0] or parts[-1]
+	return "_".join(parts)
+
+
+def record_scan_metadata(registry: AnyRegistry, product_id: int, found: FoundProduct) -> None:
+	modified_at = datetime.utcfromtimestamp(found.latest_mtime).replace(microsecond=0)
+	for key, value, value_type in (
+		("size_bytes", str(found.size_bytes), "bytes"),
+		("file_count", str(found.file_count), "integer"),
+		("modified_at", modified_at.isoformat(), "datetime"),
+	):
+		registry.set_metadata(product_id, "feam", key, value, value_type)
+	# The data was refreshed when its newest file was written.
+	record_refreshes(registry, {product_id: modified_at})
+
+
+def scan_tree(registry: AnyRegistry, args: argparse.Namespace) -> None:
+	"""Crawl `args.root`, register new product directories and refresh changed ones."""
+	from registry.scan import ScanCache, Scanner
+
+	namespace = resolve_current_namespace()
+	cache = ScanCache.load(SCAN_CACHE_FILE)
+	scanner = Scanner(
+		cache,
+		workers=args.workers,
+		max_metadata_ops=args.max_metadata_ops,
+		full=args.full,
+	)
+
+	start = time.perf_counter()
+	report = scanner.scan(args.root)
+	crawl_seconds = time.perf_counter() - start
+
+	owner_team_id: Optional[int] = None
+	registered = updated = unchanged = 0
+	conflicts: List[str] = []
+	# New and changed products, to fingerprint in one pass.
+	changed_paths: Dict[int, str] = {}
+	for found in report.products:
+		name = scanned_product_name(report.root, found.path)
+		product = registry.get_product_by_uri(publish_uri(namespace, name))
+		if product is None:
+			if owner_team_id is None:
+				owner_team_id = get_or_create_team(registry, namespace)
+			product = publish_product(
+				registry,
+				namespace=namespace,
+				owner_team_id=owner_team_id,
+				path=found.path,
+				name=name,
+				asset_type=found.asset_type,
+				description=f"Discovered by feam scan in {found.path}",
+				status="draft",
+				classification="internal",
+			)
+			record_scan_metadata(registry, product.product_id, found)
+			changed_paths[product.product_id] = found.path
+			registered += 1
+			continue
 
-def add_product_interactively(registry: Registry) -> None:
+		source = get_source_path(product)
+		if source != found.path:
+			conflicts.append(f"{found.path}: name {name!r} already published from {source}")
+		elif found.changed:
+			record_scan_metadata(registry, product.product_id, found)
+			changed_paths[product.product_id] = found.path
+			updated += 1
+		else:
+			unchanged += 1
+
+	digests: Dict[int, str] = {}
+	hashed_bytes = 0
+	fingerprint_errors: List[str] = []
+	if not args.no_fingerprint:
+		digests, hashed_bytes, fingerprint_errors = record_fingerprints(registry, changed_paths)
+	publish_versions(registry, dict.fromkeys(changed_paths))
+
+	# Only remember what was seen once the registry reflects it.
+	commit_registry(registry)
+	cache.save()
+	total_seconds = time.perf_counter() - start
+
+	print_header("Scan")
+	print(f"Root        : {report.root}")
+	print(f"Directories : {report.dirs_listed} listed, {report.dirs_skipped} unchanged")
+	print(f"Metadata ops: {report.metadata_ops}")
+	print(f"Products    : {len(report.products)} found")
+	print(f"Registered  : {registered}")
+	print(f"Updated     : {updated}")
+	print(f"Unchanged   : {unchanged}")
+	if not args.no_fingerprint:
+		print(f"Fingerprints: {len(digests)} ({format_size(hashed_bytes)} hashed)")
+	print(f"Crawl       : {crawl_seconds:.3f}s ({args.workers} workers, <= {args.max_metadata_ops} metadata ops in flight)")
+	print(f"Total       : {total_seconds:.3f}s incl. commit")
+	for message in conflicts[:MAX_REPORTED_ERRORS]:
+		print(f"  conflict {message}")
+	for path, error in report.errors[:MAX_REPORTED_ERRORS]:
+		print(f"  error {path}: {error}")
+	for error in fingerprint_errors[:MAX_REPORTED_ERRORS]:
+		print(f"  unreadable {error}")
+	hidden = sum(
+		max(len(messages) - MAX_REPORTED_ERRORS, 0)
+		for messages in (conflicts, report.errors, fingerprint_errors)
+	)
+	if hidden:
+		print(f"  ... and {hidden} more")
+
+
+def verify_product(registry: AnyRegistry, product_id: int, rehash: bool = False) -> bool:
+	"""Re-fingerprint a product's source and compare with the recorded digest.
+
+	Only files whose stat key changed since the last fingerprint are read
+	again, unless `rehash` is set. Returns True when the content matches.
+	"""
+	product = registry.get_product(product_id)
+	if product is None:
+		print(f"No data product with id {product_id} found.")
+		return False
+	path = get_source_path(product)
+	recorded = next(
+		(m.meta_value for m in product.metadata if m.namespace == "feam" and m.meta_key == "fingerprint"),
+		None,
+	)
+
+	print_header(f"Verify: {product.name}")
+	print(f"Source      : {path or '-'}")
+	print(f"Recorded    : {recorded or '-'}")
+	if path is None or not recorded:
+		print("Result      : NOT FINGERPRINTED (serve or scan the product first)")
+		return False
+	if not os.path.exists(path):
+		print("Result      : MISSING")
+		return False
+
+	from registry.fingerprint import FingerprintCache, Fingerprinter, diff_trees
+
+	cache = FingerprintCache.load(FINGERPRINT_CACHE_FILE)
+	fingerprinter = Fingerprinter(cache, rehash=rehash)
+	baseline = fingerprinter.baseline(path)
+	start = time.perf_counter()
+	# The recorded baseline stays as it was; only the digest cache learns.
+	tree = fingerprinter.fingerprint(path, record=False)
+	elapsed = time.perf_counter() - start
+	cache.save()
+
+	print(f"Current     : {tree.digest or '-'}")
+	print(f"Files       : {len(tree.files)} ({format_size(tree.total_bytes)})")
+	print(f"Re-hashed   : {tree.hashed_files} files, {format_size(tree.hashed_bytes)} in {elapsed:.3f}s")
+	for error in tree.errors[:MAX_REPORTED_ERRORS]:
+		print(f"  unreadable {error}")
+	if baseline is not None:
+		diff = diff_trees(baseline, tree)
+		for label, names in (("added", diff.added), ("removed", diff.removed), ("modified", diff.modified)):
+			for name in names[:MAX_REPORTED_ERRORS]:
+				print(f"  {label} {name or os.path.basename(path)}")
+			if len(names) > MAX_REPORTED_ERRORS:
+				print(f"  ... and {len(names) - MAX_REPORTED_ERRORS} more {label}")
+
+	ok = tree.digest == recorded
+	print(f"Result      : {'OK' if ok else 'CHANGED'}")
+	return ok
+
+
+def product_paths(product: DataProduct) -> Dict[str, str]:
+	"""The filesystem paths `feam verify` checks for a product: its source path and access URI."""
+	from registry.health import uri_path
+
+	paths: Dict[str, str] = {}
+	source = get_source_path(product)
+	if source:
+		paths["source"] = source
+	access = uri_path(product.access_uri)
+	if access:
+		paths["access"] = access
+	return paths
+
+
+def record_path_status(registry: AnyRegistry, product: DataProduct, target: str, status: PathStatus) -> bool:
+	"""Store a check of one of the product's paths as `feam.<target>_*`; True if its state changed.
+
+	Size and modification time are those last seen, so a missing path
+	keeps the ones from before it went missing.
+	"""
+	previous = get_metadata_value(product, "feam", f"{target}_state")
+	registry.set_metadata(product.product_id, "feam", f"{target}_state", status.state, "string")
+	if status.size_bytes is not None:
+		registry.set_metadata(product.product_id, "feam", f"{target}_size_bytes", str(status.size_bytes), "bytes")
+	if status.mtime is not None:
+		modified_at = datetime.utcfromtimestamp(status.mtime).replace(microsecond=0)
+		registry.set_metadata(product.product_id, "feam", f"{target}_modified_at", modified_at.isoformat(), "datetime")
+	return previous != status.state
+
+
+def verify_paths(registry: AnyRegistry, args: argparse.Namespace) -> bool:
+	"""Check that every product's (or one namespace's) source path and access URI still exist.
+
+	Paths are stat'ed in parallel under an ops-per-second cap, skipping those
+	checked within the TTL, and the results are recorded as metadata.
+	Returns True when every path is present and readable.
+	"""
+	from registry.health import DENIED, ERROR, MISSING, OK, PROBLEMS, PathChecker, StatCache
+	from registry.shards import namespace_of_uri
+
+	start = time.perf_counter()
+	products = [
+		product
+		for product in registry.list_products()
+		if args.namespace is None or namespace_of_uri(product.access_uri) == args.namespace
+	]
+	targets = {product.product_id: product_paths(product) for product in products}
+
+	ttl = args.ttl.total_seconds()
+	cache = StatCache.load(STAT_CACHE_FILE)
+	checker = PathChecker(cache, workers=args.workers, ops_per_second=args.max_ops_per_second or None, ttl=ttl)
+	with trace.span("stat"):
+		report = checker.check(path for paths in targets.values() for path in paths.values())
+	trace.count("paths_checked", report.checked)
+
+	counts = dict.fromkeys((OK,) + PROBLEMS, 0)
+	changed = 0
+	problems: List[str] = []
+	with trace.span("record"):
+		for product in products:
+			for target, path in targets[product.product_id].items():
+				status = report.statuses[path]
+				counts[status.state] += 1
+				changed += record_path_status(registry, product, target, status)
+				if status.state in PROBLEMS:
+					problems.append(f"{status.state} [{product.product_id}] {product.name} {target} {path}")
+	commit_registry(registry)
+	cache.save(ttl)
+	total_seconds = time.perf_counter() - start
+
+	rate = report.metadata_ops / report.seconds if report.seconds else 0.0
+	cap = f"cap {args.max_ops_per_second:g}/s" if args.max_ops_per_second else "no cap"
+	print_header(f"Verify: {args.namespace}" if args.namespace else "Verify")
+	print(f"Products    : {len(products)} ({sum(1 for paths in targets.values() if not paths)} without local paths)")
+	print(f"Paths       : {len(report.statuses)} distinct, {report.checked} checked, {report.cached} cached")
+	print(f"OK          : {counts[OK]}")
+	print(f"Missing     : {counts[MISSING]}")
+	print(f"Denied      : {counts[DENIED]}")
+	print(f"Errors      : {counts[ERROR]}")
+	print(f"Changed     : {changed} states")
+	print(
+		f"Checks      : {report.seconds:.3f}s, {report.metadata_ops} metadata ops ({rate:.0f}/s; "
+		f"{args.workers} workers, {cap})"
+	)
+	print(f"Total       : {total_seconds:.3f}s incl. commit")
+	for message in problems[:MAX_REPORTED_ERRORS]:
+		print(f"  {message}")
+	if len(problems) > MAX_REPORTED_ERRORS:
+		print(f"  ... and {len(problems) - MAX_REPORTED_ERRORS} more")
+	return not problems
+
+
+def describe_schedule(expression: str, now: datetime) -> str:
+	"""`expression` with its runs around `now`, or why it does not parse."""
+	try:
+		schedule = compile_cron(expression)
+		return (
+			f"{expression} (previous {schedule.last_until(now):%Y-%m-%d %H:%M}, "
+			f"next {schedule.next_after(now):%Y-%m-%d %H:%M} UTC)"
+		)
+	except ValueError as exc:
+		return f"{expression} (invalid: {exc})"
+
+
+def format_refresh_row(product: Optional[DataProduct], due: RefreshDue, now: datetime, fmt: str) -> str:
+	name = product.name if product is not None else f"product:{due.product_id}"
+	expected = f"{due.expected_at:%Y-%m-%d %H:%M}" if due.expected_at is not None else None
+	refreshed = f"{due.refreshed_at:%Y-%m-%d %H:%M}" if due.refreshed_at is not None else None
+	if fmt == "table":
+		overdue = ", overdue" if due.is_overdue(now) else ""
+		return (
+			f"[{due.product_id}] {name} (schedule={due.schedule}, expected={expected or '-'}, "
+			f"refreshed={refreshed or 'never'}{overdue})\n"
+		)
+	record = {
+		"id": due.product_id,
+		"name": name,
+		"schedule": due.schedule,
+		"expected_at": due.expected_at.isoformat() if due.expected_at is not None else None,
+		"refreshed_at": due.refreshed_at.isoformat() if due.refreshed_at is not None else None,
+		"overdue": due.is_overdue(now),
+	}
+	return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def print_refreshes(
+	registry: AnyRegistry, until: datetime, now: datetime, title: str, empty_message: str, fmt: str
+) -> None:
+	"""List scheduled products expected to refresh by `until`, then schedules that do not parse."""
+	due = registry.refresh_due(until)
+	writer = LineWriter()
+	if due and fmt == "table":
+		print_header(title)
+	for entry in due:
+		writer.write(format_refresh_row(registry.get_product(entry.product_id), entry, now, fmt))
+	writer.flush()
+	if not due and fmt == "table":
+		print(empty_message)
+	invalid = registry.invalid_refresh_schedules()
+	out = sys.stdout if fmt == "table" else sys.stderr
+	for product_id, (expression, error) in sorted(invalid.items())[:MAX_REPORTED_ERRORS]:
+		print(f"  invalid schedule [{product_id}] {expression!r}: {error}", file=out)
+	if len(invalid) > MAX_REPORTED_ERRORS:
+		print(f"  ... and {len(invalid) - MAX_REPORTED_ERRORS} more invalid schedules", file=out)
+
+
+def facet_label(registry: AnyRegistry, facet: Facet, value: str) -> str:
+	"""Owner team ids read as team names; other values as stored."""
+	if facet.key == "owner_team_id" and facet.is_product_field:
+		team = registry.get_team(int(value))
+		return team.name if team else f"team:{value}"
+	return value
+
+
+def print_facets(
+	registry: AnyRegistry, facets: List[Facet], filters: List[Filter], limit: Optional[int], fmt: str
+) -> None:
+	"""Count matching products per value of each facet, most common values first."""
+	if fmt == "table":
+		print_header(f"Facets for {describe_search('', filters)}")
+	writer = LineWriter()
+	for facet in facets:
+		counts = sorted(registry.facet_counts(facet, filters).items(), key=lambda item: (-item[1], item[0]))
+		shown = counts if limit is None else counts[:limit]
+		if fmt == "jsonl":
+			for value, count in shown:
+				record = {"facet": facet.name, "value": value, "label": facet_label(registry, facet, value), "count": count}
+				writer.write(json.dumps(record, ensure_ascii=False) + "\n")
+			continue
+		target = facet.key if facet.is_product_field else f"{facet.namespace}.{facet.key}"
+		heading = facet.name if facet.name == target else f"{facet.name} ({target})"
+		writer.write(f"\n{heading}: {len(counts)} values\n")
+		for value, count in shown:
+			writer.write(f"  {facet_label(registry, facet, value) or '(empty)':<48} {count:>8}\n")
+		if len(counts) > len(shown):
+			writer.write(f"  ... and {len(counts) - len(shown)} more values\n")
+	writer.flush()
+
+
+def product_label(registry: AnyRegistry, product_id: int) -> str:
+	product = registry.get_product(product_id)
+	return product.name if product else f"product:{product_id}"
+
+
+def describe_cycle(registry: AnyRegistry, cycle: List[int]) -> str:
+	"""`a <- b <- a`: each product is derived from the next."""
+	return " <- ".join(product_label(registry, product_id) for product_id in cycle)
+
+
+def add_lineage(registry: AnyRegistry, downstream_ref: str, upstream_refs: List[str]) -> bool:
+	"""Record that a product is derived from each of `upstream_refs`."""
+	downstream = find_product(registry, downstream_ref)
+	upstreams = [find_product(registry, ref) for ref in upstream_refs]
+	if downstream is None or None in upstreams:
+		return False
+	ok = True
+	for upstream in upstreams:
+		try:
+			added = registry.add_lineage(downstream.product_id, upstream.product_id)
+		except LineageCycleError as exc:
+			print(f"Not added {downstream.name} <- {upstream.name}: it would create a cycle ({describe_cycle(registry, exc.cycle)})")
+			ok = False
+			continue
+		state = "Added" if added else "Already recorded"
+		print(f"{state}: {downstream.name} <- {upstream.name}")
+	return ok
+
+
+def remove_lineage(registry: AnyRegistry, downstream_ref: str, upstream_ref: str) -> bool:
+	downstream = find_product(registry, downstream_ref)
+	upstream = find_product(registry, upstream_ref)
+	if downstream is None or upstream is None:
+		return False
+	if not registry.remove_lineage(downstream.product_id, upstream.product_id):
+		print(f"No lineage recorded for {downstream.name} <- {upstream.name}.")
+		return False
+	print(f"Removed: {downstream.name} <- {upstream.name}")
+	return True
+
+
+def print_lineage(registry: AnyRegistry, product_ref: str, direction: str, direct: bool = False) -> bool:
+	"""List the products upstream or downstream of a product."""
+	product = find_product(registry, product_ref)
+	if product is None:
+		return False
+	if direction == "upstream":
+		product_ids = registry.upstream_ids(product.product_id, transitive=not direct)
+		title = f"{'Direct inputs' if direct else 'Upstream'} of {product.name}"
+	else:
+		product_ids = registry.downstream_ids(product.product_id, transitive=not direct)
+		title = f"{'Direct consumers' if direct else 'Downstream'} of {product.name}"
+	product_ids.discard(product.product_id)
+	if not product_ids:
+		print(f"No {direction} products recorded for {product.name}.")
+		return True
+	print_header(title)
+	for product_id in sorted(product_ids):
+		print(f"[{product_id}] {product_label(registry, product_id)}")
+	print(f"({len(product_ids)} product{'' if len(product_ids) == 1 else 's'})")
+	return True
+
+
+def print_impact(registry: AnyRegistry, product_ref: str) -> bool:
+	"""List what must be recomputed if a product changes, in a valid order."""
+	product = find_product(registry, product_ref)
+	if product is None:
+		return False
+	try:
+		order = registry.impact_order(product.product_id)
+	except LineageCycleError as exc:
+		print(f"Lineage downstream of {product.name} has a cycle: {describe_cycle(registry, exc.cycle)}")
+		return False
+	if not order:
+		print(f"Nothing is derived from {product.name}.")
+		return True
+	print_header(f"Impact of a change to {product.name}")
+	print("Recompute in this order (each product after all of its inputs):")
+	width = len(str(len(order)))
+	for step, product_id in enumerate(order, start=1):
+		print(f"{step:>{width}}. [{product_id}] {product_label(registry, product_id)}")
+	return True
+
+
+def add_product_interactively(registry: AnyRegistry) -> None:
 	print_header("Add new data product")
 	name = input("Name: ").strip()
 	description = input("Description: ").strip()
@@ -270,7 +1171,7 @@ def add_product_interactively(registry: Registry) -> None:
 	print(f"\nCreated data product {product.name} with id {product.product_id}.")
 
 
-def search_products(registry: Registry) -> None:
+def search_products(registry: AnyRegistry) -> None:
 	term = input("Search term in product name: ").strip()
 	results = registry.search_products_by_name(term)
 	if not results:
@@ -283,6 +1184,86 @@ def search_products(registry: Registry) -> None:
 		print(f"[{p.product_id}] {p.name} (owner={owner})")
 
 
+def filter_arg(expr: str) -> Filter:
+	try:
+		return parse_filter(expr)
+	except ValueError as exc:
+		raise argparse.ArgumentTypeError(str(exc)) from exc
+
+
+def facet_arg(name: str) -> Facet:
+	try:
+		return parse_facet(name)
+	except ValueError as exc:
+		raise argparse.ArgumentTypeError(str(exc)) from exc
+
+
+def duration_arg(text: str) -> timedelta:
+	try:
+		return parse_duration(text)
+	except ValueError as exc:
+		raise argparse.ArgumentTypeError(str(exc)) from exc
+
+
+def moment_arg(text: str) -> datetime:
+	try:
+		return parse_datetime(text)
+	except ValueError as exc:
+		raise argparse.ArgumentTypeError(f"Invalid time {text!r}; expected an ISO date or datetime") from exc
+
+
+def add_refresh_arguments(parser: argparse.ArgumentParser) -> None:
+	parser.add_argument(
+		"--at",
+		type=moment_arg,
+		metavar="TIME",
+		help="Evaluate schedules as of this ISO time (UTC) instead of now",
+	)
+	parser.add_argument(
+		"--format",
+		dest="output_format",
+		choices=("table", "jsonl"),
+		default="table",
+		help="Output format; jsonl prints one product per line (default: table)",
+	)
+
+
+def add_paging_arguments(parser: argparse.ArgumentParser) -> None:
+	parser.add_argument(
+		"--sort",
+		choices=SORT_FIELDS,
+		default=ID,
+		help="Order listed products by this field, then id (default: id)",
+	)
+	parser.add_argument(
+		"--after",
+		metavar="CURSOR",
+		help="Continue after the page that printed this cursor (see --limit)",
+	)
+	parser.add_argument(
+		"--format",
+		dest="output_format",
+		choices=LISTING_FORMATS,
+		default="table",
+		help="Output format; jsonl and tsv print one product per line (default: table)",
+	)
+
+
+def cursor_arg(parser: argparse.ArgumentParser, cursor: Optional[str], sort: str) -> Optional[Position]:
+	if cursor is None:
+		return None
+	try:
+		return decode_cursor(cursor, sort)
+	except CursorError as exc:
+		parser.error(str(exc))
+
+
+def describe_search(query: str, filters: List[Filter]) -> str:
+	parts = [f"'{query}'"] if query else []
+	parts.extend(str(f) for f in filters)
+	return ", ".join(parts) or "all products"
+
+
 def build_parser() -> argparse.ArgumentParser:
 	"""Create the top-level argument parser for the `feam` executable."""
 
@@ -290,38 +1271,208 @@ def build_parser() -> argparse.ArgumentParser:
 		prog="feam",
 		description="Data registry CLI (mock MVP)",
 	)
+	parser.add_argument(
+		"--backend",
+		choices=BACKENDS,
+		default=os.getenv("FEAM_BACKEND", "json"),
+		help=(
+			"Registry storage: 'json' (feam_registry.json + journal), "
+			"'sqlite' (registry.db shared with the Rust CLI) or 'sharded' (one json "
+			"store per namespace under $FEAM_SHARD_ROOT). Defaults to $FEAM_BACKEND."
+		),
+	)
+	parser.add_argument(
+		"--shard",
+		dest="shards",
+		action="append",
+		default=[],
+		metavar="NAMESPACE",
+		help=(
+			"With --backend sharded, only read this namespace's shard; repeat for "
+			"several (default: every shard)"
+		),
+	)
+	parser.add_argument(
+		"--compact-metadata",
+		action="store_true",
+		default=os.getenv("FEAM_COMPACT_METADATA", "") not in ("", "0"),
+		help=(
+			"Keep metadata in compact struct-of-arrays storage (json backend). "
+			"Also enabled by FEAM_COMPACT_METADATA=1."
+		),
+	)
+	parser.add_argument(
+		"--query-cache",
+		choices=QUERY_CACHE_MODES,
+		default=os.getenv("FEAM_QUERY_CACHE", "memory"),
+		help=(
+			"Keep search and lookup results for repeated queries (json backend): "
+			"'memory' for this process or daemon, 'persist' to also reuse them across "
+			"commands via feam_registry.json.cache, or 'off'. Defaults to $FEAM_QUERY_CACHE "
+			"or memory."
+		),
+	)
+	parser.add_argument(
+		"--query-cache-size",
+		type=int,
+		default=os.getenv("FEAM_QUERY_CACHE_SIZE", str(DEFAULT_CAPACITY)),
+		metavar="N",
+		help=f"Most query results to keep (default: $FEAM_QUERY_CACHE_SIZE or {DEFAULT_CAPACITY})",
+	)
+	parser.add_argument(
+		"--profile",
+		action="store_true",
+		help=(
+			"Time each phase (import, load, command, save) and registry call and print "
+			"a summary to stderr. FEAM_TRACE=1 does the same."
+		),
+	)
+	parser.add_argument(
+		"--profile-format",
+		choices=trace.FORMATS,
+		default="table",
+		help="Report format for --profile (default: table)",
+	)
+	parser.add_argument(
+		"--profile-output",
+		help=(
+			"Write the --profile report to this file instead of stderr; prometheus "
+			"files are replaced, jsonl files appended to. FEAM_TRACE=<format>:<path> does the same."
+		),
+	)
 	subparsers = parser.add_subparsers(dest="command", required=True)
 
 	# Legacy MVP helper commands
 	subparsers.add_parser("teams", help="List teams")
 
-	# Legacy MVP helper commands
-	subparsers.add_parser("products", help="List data products")
+	# feam products [--filter key=value ...] [--sort FIELD] [--limit N] [--after CURSOR] [--format F]
+	products_parser = subparsers.add_parser("products", help="List data products")
+	products_parser.add_argument(
+		"--filter",
+		dest="filters",
+		action="append",
+		default=[],
+		type=filter_arg,
+		metavar="KEY[OP]VALUE",
+		help="Only list products matching this filter (see search); repeat to combine with AND",
+	)
+	products_parser.add_argument(
+		"--limit",
+		type=int,
+		help="Print at most this many products, then the cursor for the next page on stderr",
+	)
+	add_paging_arguments(products_parser)
 
-	# feam show <product_id> [--version <v>]
+	# feam show <product_id|name> [--version <v>]
 	show_parser = subparsers.add_parser(
 		"show",
-		help="Show a data product by id",
+		help="Show a data product by id or name",
 	)
-	show_parser.add_argument("product_id", type=int, help="Data product id")
+	show_parser.add_argument("product", help="Data product id or name")
 	show_parser.add_argument(
 		"--version",
-		help="Optional product version to inspect",
+		help="Show this published version (label) instead of the current state",
 	)
 
-	# feam search <query> [--filter key=value]
+	# feam search [query] [--filter key=value ...] [--limit N] [--any] [--after CURSOR] [--format F]
+	# feam search <query> --fuzzy [--descriptions] [--min-similarity S]
 	search_parser = subparsers.add_parser(
 		"search",
-		help="Search data products by name",
+		help="Full-text search over data products",
+	)
+	search_parser.add_argument(
+		"query",
+		nargs="?",
+		default="",
+		help="Search terms matched against names, descriptions and metadata values",
+	)
+	search_parser.add_argument(
+		"--limit",
+		type=int,
+		help="Return at most this many results, best matches first, then the cursor for the next page on stderr",
+	)
+	search_parser.add_argument(
+		"--any",
+		dest="match_any",
+		action="store_true",
+		help="Match products containing any term instead of all terms",
 	)
-	search_parser.add_argument("query", help="Search term in product name")
 	search_parser.add_argument(
 		"--filter",
-		dest="filter_expr",
-		help="Optional filter expression such as key=value",
+		dest="filters",
+		action="append",
+		default=[],
+		type=filter_arg,
+		metavar="KEY[OP]VALUE",
+		help=(
+			"Filter such as business.domain=agriculture, status=active,draft, "
+			"classification!=restricted, technical.row_count>1e9 (also >=, <, <=) or "
+			"created_at>=2025-01-01; repeat to combine filters with AND"
+		),
+	)
+	search_parser.add_argument(
+		"--fuzzy",
+		action="store_true",
+		help="Typo-tolerant search over product names, closest first",
+	)
+	search_parser.add_argument(
+		"--descriptions",
+		action="store_true",
+		help="With --fuzzy, match descriptions as well as names",
+	)
+	search_parser.add_argument(
+		"--min-similarity",
+		type=float,
+		default=DEFAULT_SIMILARITY,
+		help=(
+			"With --fuzzy, the share of the query's character trigrams a match must "
+			f"contain (default {DEFAULT_SIMILARITY})"
+		),
+	)
+	add_paging_arguments(search_parser)
+
+	# feam facets [--facet NAME ...] [--filter key=value ...] [--limit N] [--format table|jsonl]
+	facets_parser = subparsers.add_parser(
+		"facets",
+		help="Count products per value of format, status, team, domain or any metadata key",
+	)
+	facets_parser.add_argument(
+		"--facet",
+		dest="facets",
+		action="append",
+		default=[],
+		type=facet_arg,
+		metavar="NAME",
+		help=(
+			f"Facet to count: {', '.join(DEFAULT_FACETS)}, a product field or a metadata "
+			"namespace.key; repeat for several (default: all of the named ones)"
+		),
+	)
+	facets_parser.add_argument(
+		"--filter",
+		dest="filters",
+		action="append",
+		default=[],
+		type=filter_arg,
+		metavar="KEY[OP]VALUE",
+		help="Only count products matching this filter, as for search; repeat to combine with AND",
+	)
+	facets_parser.add_argument(
+		"--limit",
+		type=int,
+		default=20,
+		help="Print at most this many values per facet, most common first (default: 20; 0 for all)",
+	)
+	facets_parser.add_argument(
+		"--format",
+		dest="output_format",
+		choices=("table", "jsonl"),
+		default="table",
+		help="Output format; jsonl prints one facet value per line (default: table)",
 	)
 
 	# feam serve <path> --name <name> --asset-type <type> [flags]
+	# feam serve --batch <manifest.jsonl|manifest.csv>
 	serve_parser = subparsers.add_parser(
 		"serve",
 		help="Create a new data product entry",
@@ -329,6 +1480,187 @@ def build_parser() -> argparse.ArgumentParser:
 	serve_parser.add_argument("path", nargs="?", help="Asset path to serve")
 	serve_parser.add_argument("--name", help="Asset name")
 	serve_parser.add_argument("--asset-type", help="Asset type")
+	serve_parser.add_argument(
+		"--version",
+		help="Label for the published version (default: its number); serving a published name again adds a version",
+	)
+	serve_parser.add_argument(
+		"--no-fingerprint",
+		action="store_true",
+		help="Skip computing the content fingerprint of the served path",
+	)
+	serve_parser.add_argument(
+		"--batch",
+		metavar="MANIFEST",
+		help=(
+			"Non-interactively register every asset in a JSONL or .csv manifest "
+			"('-' reads JSONL from stdin) and commit once"
+		),
+	)
+
+	# feam scan <root> [--workers N] [--max-metadata-ops N] [--full]
+	scan_parser = subparsers.add_parser(
+		"scan",
+		help="Crawl a directory tree and register the data products found in it",
+	)
+	scan_parser.add_argument("root", help="Directory to crawl")
+	scan_parser.add_argument(
+		"--workers",
+		type=int,
+		help="Directory listing threads (default 8)",
+	)
+	scan_parser.add_argument(
+		"--max-metadata-ops",
+		type=int,
+		help=(
+			"Cap on concurrent scandir/stat calls, to spare the filesystem's "
+			"metadata servers (default 4)"
+		),
+	)
+	scan_parser.add_argument(
+		"--full",
+		action="store_true",
+		help="Ignore the directory mtime cache and re-list every directory",
+	)
+	scan_parser.add_argument(
+		"--no-fingerprint",
+		action="store_true",
+		help="Skip content fingerprints for new and changed products",
+	)
+
+	# feam verify <product_id> [--rehash]
+	# feam verify [--namespace NS] [--workers N] [--max-ops-per-second N] [--ttl DURATION]
+	verify_parser = subparsers.add_parser(
+		"verify",
+		help=(
+			"Check a product's files against its recorded content fingerprint, or without a "
+			"product id, check that every product's paths still exist"
+		),
+	)
+	verify_parser.add_argument("product_id", type=int, nargs="?", help="Data product id")
+	verify_parser.add_argument(
+		"--rehash",
+		action="store_true",
+		help="Read every file again instead of trusting unchanged (device, inode, size, mtime)",
+	)
+	verify_parser.add_argument(
+		"--namespace",
+		help="Without a product id, only check products published in this namespace",
+	)
+	verify_parser.add_argument(
+		"--workers",
+		type=int,
+		help="Path checking threads (default 16)",
+	)
+	verify_parser.add_argument(
+		"--max-ops-per-second",
+		type=float,
+		metavar="N",
+		help=(
+			"Cap on stat/access calls per second across all threads, to spare the "
+			"filesystem's metadata servers; 0 for no cap (default 1000)"
+		),
+	)
+	verify_parser.add_argument(
+		"--ttl",
+		type=duration_arg,
+		metavar="DURATION",
+		help="Reuse results of paths checked this recently, e.g. 30m or 1d; 0 checks every path (default: 1h)",
+	)
+
+	# feam stale [--grace DURATION] [--at TIME] [--format table|jsonl]
+	stale_parser = subparsers.add_parser(
+		"stale",
+		help="List products that missed the refresh their technical.refresh_schedule expected",
+	)
+	stale_parser.add_argument(
+		"--grace",
+		type=duration_arg,
+		default=timedelta(0),
+		metavar="DURATION",
+		help="Only list products overdue by more than this, e.g. 30m or 2h (default: 0)",
+	)
+	add_refresh_arguments(stale_parser)
+
+	# feam due [--within DURATION] [--at TIME] [--format table|jsonl]
+	due_parser = subparsers.add_parser(
+		"due",
+		help="List products expected to refresh within a time window, overdue ones first",
+	)
+	due_parser.add_argument(
+		"--within",
+		type=duration_arg,
+		default=timedelta(days=1),
+		metavar="DURATION",
+		help="Window to look ahead, e.g. 6h or 2d (default: 1d)",
+	)
+	add_refresh_arguments(due_parser)
+
+	# feam lineage add <product> <upstream> [<upstream> ...]
+	# feam lineage remove <product> <upstream>
+	# feam lineage upstream|downstream <product> [--direct]
+	# feam lineage impact <product>
+	lineage_parser = subparsers.add_parser(
+		"lineage",
+		help="Record and query which data products are derived from which",
+	)
+	lineage_commands = lineage_parser.add_subparsers(dest="lineage_command", required=True)
+	lineage_add = lineage_commands.add_parser("add", help="Record that a product is derived from others")
+	lineage_add.add_argument("product", help="Derived data product id or name")
+	lineage_add.add_argument("upstream", nargs="+", help="Id or name of a product it is derived from")
+	lineage_remove = lineage_commands.add_parser("remove", help="Forget a recorded lineage edge")
+	lineage_remove.add_argument("product", help="Derived data product id or name")
+	lineage_remove.add_argument("upstream", help="Id or name of the product it was derived from")
+	for direction, help_text in (
+		("upstream", "List every product a product is derived from"),
+		("downstream", "List every product derived from a product"),
+	):
+		direction_parser = lineage_commands.add_parser(direction, help=help_text)
+		direction_parser.add_argument("product", help="Data product id or name")
+		direction_parser.add_argument(
+			"--direct",
+			action="store_true",
+			help="Only list direct inputs/consumers instead of the transitive closure",
+		)
+	lineage_impact = lineage_commands.add_parser(
+		"impact",
+		help="List what must be recomputed if a product changes, in order",
+	)
+	lineage_impact.add_argument("product", help="Data product id or name")
+
+	# feam compact
+	subparsers.add_parser(
+		"compact",
+		help="Fold the registry journal (or SQLite WAL) into the main file",
+	)
+
+	# feam cache [--clear]
+	cache_parser = subparsers.add_parser(
+		"cache",
+		help="Show query cache statistics (json backend)",
+	)
+	cache_parser.add_argument(
+		"--clear",
+		action="store_true",
+		help="Drop every cached result; statistics are kept",
+	)
+
+	# feam shard
+	subparsers.add_parser(
+		"shard",
+		help="Split feam_registry.json into one shard per namespace under $FEAM_SHARD_ROOT",
+	)
+
+	# feam daemon [--socket PATH]
+	daemon_parser = subparsers.add_parser(
+		"daemon",
+		help="Keep the registry loaded and answer feam commands over a Unix socket",
+	)
+	daemon_parser.add_argument(
+		"--socket",
+		default=client.socket_path(),
+		help="Socket to listen on (default: $FEAM_SOCKET or ./feam.sock)",
+	)
 
 	return parser
 
@@ -336,46 +1668,267 @@ def build_parser() -> argparse.ArgumentParser:
 
 
 
-def run(argv: Optional[List[str]] = None) -> None:
-	parser = build_parser()
-	args = parser.parse_args(argv)
+def start_tracing(parser: argparse.ArgumentParser, args: argparse.Namespace) -> Optional[Tuple[str, Optional[str]]]:
+	"""Enable tracing if --profile or FEAM_TRACE asks for it; returns (format, path)."""
+	if args.profile:
+		target = (args.profile_format, args.profile_output)
+	elif os.getenv(trace.TRACE_ENV, "") not in ("", "0"):
+		try:
+			target = trace.parse_target(os.environ[trace.TRACE_ENV])
+		except ValueError as exc:
+			parser.error(str(exc))
+	else:
+		return None
+	trace.enable()
+	trace.instrument(Registry)
+	if args.backend == "sharded":
+		from registry.shards import ShardedRegistry
+
+		trace.instrument(ShardedRegistry)
+	elif args.backend == "sqlite":
+		from registry.sqlite_registry import SqliteRegistry
 
-	registry = Registry()
-	load_registry(registry)
+		trace.instrument(SqliteRegistry)
+	return target
 
+
+def run(argv: Optional[List[str]] = None, import_seconds: Optional[float] = None) -> None:
+	"""Run one `feam` command; `import_seconds` is how long importing this module took."""
+	started = time.perf_counter()
+	parser = build_parser()
+	args = parser.parse_args(argv)
+	target = start_tracing(parser, args)
+	if import_seconds is not None:
+		trace.record("import", import_seconds)
+	trace.record("parse", time.perf_counter() - started)
+
+	try:
+		with trace.span("load"):
+			try:
+				registry = open_registry(args)
+			except SnapshotFormatError as exc:
+				parser.exit(1, f"{parser.prog}: error: {exc}\n")
+		with trace.span("command"):
+			exit_code = run_command(parser, args, registry)
+		with trace.span("save"):
+			close_registry(registry)
+	finally:
+		tracer = trace.disable()
+		if tracer is not None and target is not None:
+			fmt, path = target
+			trace.write_report(tracer, fmt, path, {"command": args.command, "backend": args.backend})
+	if exit_code:
+		raise SystemExit(exit_code)
+
+
+def fill_defaults(args: argparse.Namespace, **defaults) -> None:
+	"""Set options left out on the command line to defaults kept by the command's module."""
+	for name, value in defaults.items():
+		if getattr(args, name) is None:
+			setattr(args, name, value)
+
+
+def run_command(parser: argparse.ArgumentParser, args: argparse.Namespace, registry: AnyRegistry) -> int:
+	"""Run one parsed command against an open registry and return its exit code."""
 	cmd = args.command
+	exit_code = 0
 
 	if cmd == "teams":
 		print_teams(registry)
 	elif cmd == "products":
-		print_products(registry)
+		if args.limit is not None and args.limit < 1:
+			parser.error("--limit must be at least 1")
+		print_products(
+			registry,
+			args.filters,
+			args.sort,
+			cursor_arg(parser, args.after, args.sort),
+			args.limit,
+			args.output_format,
+		)
 	elif cmd == "show":
-		print_product_details(registry, args.product_id)
-	elif cmd == "search":
-		results = registry.search_products_by_name(args.query)
-		if not results:
-			print(f"No products found for term '{args.query}'.")
+		print_product_details(registry, args.product, args.version)
+	elif cmd == "search" and args.fuzzy:
+		if not args.query.strip():
+			parser.error("search --fuzzy needs a query")
+		if args.match_any:
+			parser.error("--any does not apply to --fuzzy")
+		if not 0 < args.min_similarity <= 1:
+			parser.error("--min-similarity must be in (0, 1]")
+		if args.after or args.sort != ID or args.output_format != "table":
+			parser.error("--after, --sort and --format do not apply to --fuzzy")
+		hits = registry.fuzzy_search_products(
+			args.query,
+			limit=args.limit,
+			similarity=args.min_similarity,
+			descriptions=args.descriptions,
+			filters=args.filters,
+		)
+		description = describe_search(args.query, args.filters)
+		if not hits:
+			print(f"No products resemble {description}.")
 		else:
-			print_header(f"Search results for '{args.query}'")
-			for p in results:
+			print_header(f"Closest matches for {description}")
+			for p, distance in hits:
 				team = registry.get_team(p.owner_team_id)
 				owner = team.name if team else f"team:{p.owner_team_id}"
-				print(f"[{p.product_id}] {p.name} (owner={owner})")
+				print(f"[{p.product_id}] {p.name} (owner={owner}, edits={distance})")
+	elif cmd == "search":
+		if args.descriptions:
+			parser.error("--descriptions only applies to --fuzzy")
+		if args.limit is not None and args.limit < 1:
+			parser.error("--limit must be at least 1")
+		rows: Iterable[Tuple[DataProduct, Position]]
+		if args.query.strip():
+			if args.sort != ID:
+				parser.error("--sort only applies when listing without a query; results are ranked")
+			sort = RANK
+			# One extra result tells whether there is a next page.
+			rows = registry.rank_products(
+				args.query,
+				limit=None if args.limit is None else args.limit + 1,
+				match_all=not args.match_any,
+				filters=args.filters,
+				after=cursor_arg(parser, args.after, sort),
+			)
+		else:
+			sort = args.sort
+			products = registry.iter_products(args.filters, sort, cursor_arg(parser, args.after, sort))
+			rows = sorted_rows(products, sort)
+		description = describe_search(args.query, args.filters)
+		print_listing(
+			registry,
+			rows,
+			sort,
+			f"Search results for {description}",
+			f"No products found for {description}.",
+			limit=args.limit,
+			fmt=args.output_format,
+		)
+	elif cmd == "facets":
+		if args.limit < 0:
+			parser.error("--limit must not be negative")
+		facets = args.facets or [parse_facet(name) for name in DEFAULT_FACETS]
+		print_facets(registry, facets, args.filters, args.limit or None, args.output_format)
 	elif cmd == "serve":
-		serve_product(registry, args)
+		if args.batch:
+			if args.path or args.name or args.asset_type or args.version:
+				parser.error("serve --batch takes no path, --name, --asset-type or --version")
+			if args.batch != "-" and not Path(args.batch).is_file():
+				parser.error(f"Manifest not found: {args.batch}")
+			serve_batch(registry, args.batch, fingerprint=not args.no_fingerprint)
+		else:
+			serve_product(registry, args)
+	elif cmd == "scan":
+		from registry.scan import DEFAULT_MAX_METADATA_OPS, DEFAULT_WORKERS
+
+		fill_defaults(args, workers=DEFAULT_WORKERS, max_metadata_ops=DEFAULT_MAX_METADATA_OPS)
+		if not Path(args.root).is_dir():
+			parser.error(f"Not a directory: {args.root}")
+		if args.workers < 1 or args.max_metadata_ops < 1:
+			parser.error("--workers and --max-metadata-ops must be at least 1")
+		scan_tree(registry, args)
+	elif cmd == "verify":
+		if args.product_id is not None:
+			if args.namespace is not None:
+				parser.error("--namespace selects the products to check; leave out the product id")
+			exit_code = 0 if verify_product(registry, args.product_id, rehash=args.rehash) else 1
+		else:
+			if args.rehash:
+				parser.error("--rehash needs a product id")
+			from registry.health import DEFAULT_CHECK_WORKERS, DEFAULT_OPS_PER_SECOND, DEFAULT_TTL_SECONDS
+
+			fill_defaults(
+				args,
+				workers=DEFAULT_CHECK_WORKERS,
+				max_ops_per_second=DEFAULT_OPS_PER_SECOND,
+				ttl=timedelta(seconds=DEFAULT_TTL_SECONDS),
+			)
+			if args.workers < 1 or args.max_ops_per_second < 0:
+				parser.error("--workers must be at least 1 and --max-ops-per-second not negative")
+			exit_code = 0 if verify_paths(registry, args) else 1
+	elif cmd == "stale":
+		now = args.at or datetime.utcnow()
+		print_refreshes(
+			registry,
+			now - args.grace,
+			now,
+			f"Stale products as of {now:%Y-%m-%d %H:%M} UTC",
+			"No stale products.",
+			args.output_format,
+		)
+	elif cmd == "due":
+		now = args.at or datetime.utcnow()
+		until = now + args.within
+		print_refreshes(
+			registry,
+			until,
+			now,
+			f"Products due by {until:%Y-%m-%d %H:%M} UTC",
+			"No products are due.",
+			args.output_format,
+		)
+	elif cmd == "lineage":
+		action = args.lineage_command
+		if action == "add":
+			ok = add_lineage(registry, args.product, args.upstream)
+		elif action == "remove":
+			ok = remove_lineage(registry, args.product, args.upstream)
+		elif action == "impact":
+			ok = print_impact(registry, args.product)
+		else:
+			ok = print_lineage(registry, args.product, action, direct=args.direct)
+		exit_code = 0 if ok else 1
+	elif cmd == "compact":
+		if is_sqlite(registry):
+			registry.compact()
+			print(f"Checkpointed registry into {SQLITE_FILE}.")
+		elif is_sharded(registry):
+			namespaces = registry.compact_shards()
+			print(f"Compacted {len(namespaces)} shards under {registry.shards.root}.")
+		else:
+			open_store().compact(registry)
+			print(f"Compacted registry into {DATA_FILE}.")
+	elif cmd == "cache":
+		if not isinstance(registry, Registry):
+			parser.error("the query cache belongs to the json backend")
+		if args.clear:
+			registry.query_cache.clear()
+		print_query_cache(registry.query_cache)
+	elif cmd == "shard":
+		if not isinstance(registry, Registry):
+			parser.error("feam shard splits the json registry; run it with --backend json")
+		shards = open_shards()
+		if shards.namespaces():
+			parser.error(f"{shards.root} already holds shards")
+		counts = shards.split(registry, team_name_to_namespace)
+		print_header("Sharded registry")
+		for namespace, products in sorted(counts.items()):
+			print(f"{namespace:<40} {products:>8} products")
+		print(f"\nWrote {len(counts)} shards under {shards.root}; use them with --backend sharded.")
+	elif cmd == "daemon":
+		if not isinstance(registry, Registry):
+			parser.error("feam daemon only serves the json backend")
+		from registry.daemon import serve_forever
+
+		try:
+			serve_forever(registry, args.socket)
+		except (OSError, ValueError) as exc:
+			parser.error(str(exc))
 	else:
 		parser.error(f"Unknown feam subcommand: {cmd}")
 
-	save_registry(registry)
+	return exit_code
 
 
 
 def main() -> None:
 	"""Compatibility wrapper for `python cli.py` / `python main.py`.
 
-	This just forwards to `run()` which implements the Unix-style CLI.
+	Hands the command to a running `feam daemon` when there is one and
+	otherwise runs it here via `run()`, the Unix-style CLI.
 	"""
-	run()
+	client.main()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Thin front end for `feam`.
+#
+# When a `feam daemon` is listening on the registry socket, a command is sent
+# there as one JSON line and its captured output is printed here, so the
+# invocation costs one round trip instead of importing the registry and
+# loading the catalog. This module only uses the standard library and is
+# kept that way: everything it imports is paid on every `feam` call.
+#
+# Without a daemon (or when the daemon declines a request, e.g. an
+# interactive `feam serve`) the command runs in-process as before.
+
+SOCKET_ENV = "FEAM_SOCKET"
+DEFAULT_SOCKET = "feam.sock"
+# Set FEAM_DAEMON=0 to always run commands in-process.
+DAEMON_ENV = "FEAM_DAEMON"
+# Profiled commands always run in-process, where the phases happen.
+TRACE_ENV = "FEAM_TRACE"
+PROFILE_FLAG = "--profile"
+# Variables that only steer the client; everything else named FEAM_* must
+# match the daemon's environment for it to answer on our behalf.
+CLIENT_ENV = (SOCKET_ENV, DAEMON_ENV)
+CONNECT_TIMEOUT = 1.0
+
+
+def socket_path() -> str:
+	return os.getenv(SOCKET_ENV, DEFAULT_SOCKET)
+
+
+def feam_environment() -> Dict[str, str]:
+	"""The FEAM_* variables that change what a command does."""
+	return {
+		key: value
+		for key, value in os.environ.items()
+		if key.startswith("FEAM_") and key not in CLIENT_ENV
+	}
+
+
+def request(path: str, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+	"""Send one request to the daemon at `path`; None if nobody is listening."""
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.settimeout(CONNECT_TIMEOUT)
+		try:
+			sock.connect(path)
+		except OSError:
+			# No daemon, or a stale socket left by one that died.
+			return None
+		# Writes such as `feam scan` may legitimately take minutes.
+		sock.settimeout(None)
+		sock.sendall(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+		with sock.makefile("rb") as reader:
+			line = reader.readline()
+	finally:
+		sock.close()
+	if not line:
+		raise ConnectionError("feam daemon closed the connection without answering")
+	return json.loads(line)
+
+
+def forward(argv: List[str]) -> Optional[int]:
+	"""Run `argv` on the daemon and return its exit code.
+
+	Returns None when the command should run in-process instead.
+	"""
+	if os.getenv(DAEMON_ENV, "") == "0" or not hasattr(socket, "AF_UNIX"):
+		return None
+	if PROFILE_FLAG in argv or os.getenv(TRACE_ENV, "") not in ("", "0"):
+		return None
+	path = socket_path()
+	if not os.path.exists(path):
+		return None
+	message = {"argv": argv, "cwd": os.getcwd(), "env": feam_environment()}
+	try:
+		response = request(path, message)
+	except (OSError, ValueError) as exc:
+		# The request may already have been applied; running it again here
+		# could register things twice.
+		print(f"feam: lost connection to daemon at {path}: {exc}", file=sys.stderr)
+		return 1
+	if response is None or response.get("fallback"):
+		return None
+	sys.stdout.write(response.get("stdout", ""))
+	sys.stderr.write(response.get("stderr", ""))
+	sys.stdout.flush()
+	return int(response.get("exit_code", 0))
+
+
+def main() -> None:
+	"""`feam` entry point: forward to the daemon, else run the full CLI."""
+	exit_code = forward(sys.argv[1:])
+	if exit_code is None:
+		started = time.perf_counter()
+		from registry.cli import run
+
+		run(import_seconds=time.perf_counter() - started)
+	elif exit_code:
+		raise SystemExit(exit_code)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import operator
+from array import array
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Set, Tuple, Union
+
+from .filters import NOT_EQUAL, PRODUCT_FILTER_FIELDS, TIMESTAMP_FILTER_FIELDS, Filter
+from .typed_values import parse_range_literal
+
+# Columnar evaluation of `--filter` over large catalogs.
+#
+# Filters are answered from the per-value id sets of the filter indexes,
+# which is cheap for one value of one field but not for analytical
+# predicates across the whole catalog: `status=active,draft` unions sets,
+# `classification!=restricted` subtracts one from every id, and each
+# intersection hashes hundreds of thousands of ints. With NumPy installed,
+# `ProductColumns` keeps the product filter fields as integer codes in
+# arrays parallel to the sorted product ids, and `created_at` as int64
+# microseconds since the epoch, so each product field filter compiles to one
+# vectorized comparison (`created_at>=2025-01-01` included) and the filters
+# AND together as boolean masks. Metadata filters are still answered by
+# their indexes, and their ids scattered into a mask by binary search.
+#
+# Product fields never change once a product is added, so the columns are
+# built from the index postings and the sorted timestamps (no product is
+# decoded) and only rebuilt after products are added. Without NumPy, or for catalogs below
+# `COLUMNAR_MIN_PRODUCTS`, filters stay on the set indexes. NumPy is imported
+# by the first filter that could use it, so other commands start without it.
+
+# Smaller catalogs answer filters from the set indexes about as fast, without
+# building the columns.
+COLUMNAR_MIN_PRODUCTS = 50_000
+
+# An id list as the registry keeps it: a set in memory, or a slice of a
+# snapshot's id array.
+Ids = Union[Set[int], Sequence[int]]
+
+_COMPARISONS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+# NumPy once imported; False if it is not installed.
+np: Any = None
+_numpy: Optional[bool] = None
+
+
+def available() -> bool:
+	"""Whether NumPy is installed, so `ProductColumns` can be built; imports it on the first call."""
+	global np, _numpy
+	if _numpy is None:
+		try:
+			import numpy
+		except ImportError:  # optional: filters are then answered from the set indexes alone
+			_numpy = False
+		else:
+			np, _numpy = numpy, True
+	return _numpy
+
+
+def _id_array(ids: Ids) -> np.ndarray:
+	if isinstance(ids, (memoryview, array)):
+		# Snapshot id lists and range index ids are int64 already; read them
+		# without copying.
+		return np.asarray(ids, dtype=np.int64)
+	return np.fromiter(ids, dtype=np.int64, count=len(ids))
+
+
+def _microseconds(seconds: float) -> int:
+	return round(seconds * 1_000_000)
+
+
+class ProductColumns:
+	"""The product filter fields as integer codes, in arrays parallel to the sorted product ids."""
+
+	def __init__(
+		self,
+		ids: np.ndarray,
+		codes: Dict[str, np.ndarray],
+		vocabularies: Dict[str, Dict[str, int]],
+		timestamps: Dict[str, np.ndarray],
+	) -> None:
+		self.ids = ids
+		self._codes = codes
+		self._vocabularies = vocabularies
+		self._timestamps = timestamps
+
+	@classmethod
+	def build(
+		cls,
+		id_lists: Iterable[Ids],
+		postings: Callable[[str], Iterable[Tuple[str, Ids]]],
+		timestamps: Callable[[str], Iterable[Tuple[Sequence[float], Ids]]],
+	) -> ProductColumns:
+		"""Columns over the products in the disjoint `id_lists`.
+
+		`postings(field)` yields each value of a product field with its ids,
+		and `timestamps(field)` epoch seconds with their ids, in any chunks.
+		"""
+		if not available():
+			raise ValueError("Columnar filters need NumPy")
+		ids = np.concatenate([_id_array(ids) for ids in id_lists] or [np.empty(0, dtype=np.int64)])
+		ids.sort()
+		codes: Dict[str, np.ndarray] = {}
+		vocabularies: Dict[str, Dict[str, int]] = {}
+		for field in PRODUCT_FILTER_FIELDS:
+			column = np.full(len(ids), -1, dtype=np.int32)
+			vocabulary: Dict[str, int] = {}
+			for value, value_ids in postings(field):
+				code = vocabulary.setdefault(value, len(vocabulary))
+				column[np.searchsorted(ids, _id_array(value_ids))] = code
+			codes[field] = column
+			vocabularies[field] = vocabulary
+		times: Dict[str, np.ndarray] = {}
+		for field in TIMESTAMP_FILTER_FIELDS:
+			column = np.zeros(len(ids), dtype=np.int64)
+			for seconds, value_ids in timestamps(field):
+				if len(value_ids):
+					positions = np.searchsorted(ids, _id_array(value_ids))
+					column[positions] = np.rint(np.asarray(seconds, dtype=np.float64) * 1_000_000)
+			times[field] = column
+		return cls(ids, codes, vocabularies, times)
+
+	def __len__(self) -> int:
+		return len(self.ids)
+
+	def mask(self, f: Filter) -> np.ndarray:
+		"""Which products a product field filter matches, as a boolean array over `ids`."""
+		if f.is_range:
+			_, seconds = parse_range_literal(f.value)
+			return _COMPARISONS[f.op](self._timestamps[f.key], _microseconds(seconds))
+		vocabulary = self._vocabularies[f.key]
+		wanted = [vocabulary[value] for value in f.values if value in vocabulary]
+		column = self._codes[f.key]
+		matches = column == wanted[0] if len(wanted) == 1 else np.isin(column, wanted)
+		return ~matches if f.op == NOT_EQUAL else matches
+
+	def ids_mask(self, ids: Ids) -> np.ndarray:
+		"""`ids` as a boolean array over `ids`; ids of other products are ignored."""
+		mask = np.zeros(len(self.ids), dtype=bool)
+		if len(ids) and len(self.ids):
+			wanted = _id_array(ids)
+			positions = np.searchsorted(self.ids, wanted)
+			inside = positions < len(self.ids)
+			positions = positions[inside]
+			mask[positions[self.ids[positions] == wanted[inside]]] = True
+		return mask
+
+	def select(self, filters: Sequence[Filter], matches: Callable[[Filter], Ids]) -> Set[int]:
+		"""Ids of products matching every filter: product fields by column, the others by `matches`."""
+		mask = np.ones(len(self.ids), dtype=bool)
+		for f in filters:
+			mask &= self.mask(f) if f.is_product_field else self.ids_mask(matches(f))
+		return set(self.ids[mask].tolist())
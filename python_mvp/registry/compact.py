@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import bisect
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Union
+
+from .models import MetadataEntry
+from .typed_values import TypedValue, epoch_seconds
+
+# Compact metadata storage for large catalogs.
+#
+# In the default layout every metadata row is a `MetadataEntry` instance with
+# its own namespace/key/type strings and `datetime`, referenced from both
+# `Registry._metadata` and the product's `metadata` list. `MetadataStore`
+# keeps the same rows as parallel arrays instead: integer codes into an
+# interned vocabulary for namespace, key and type, epoch floats for
+# timestamps, and a per-product linked list of row numbers. `MetadataView`
+# and `ProductMetadata` expose rows through the familiar attribute names, and
+# are only created when a caller actually looks at a row.
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_ROW = -1
+
+
+class Vocabulary:
+	"""Bidirectional string <-> small integer mapping."""
+
+	__slots__ = ("_codes", "_strings")
+
+	def __init__(self) -> None:
+		self._codes: Dict[str, int] = {}
+		self._strings: List[str] = []
+
+	def __len__(self) -> int:
+		return len(self._strings)
+
+	def code(self, value: str) -> int:
+		code = self._codes.get(value)
+		if code is None:
+			code = self._codes[value] = len(self._strings)
+			self._strings.append(value)
+		return code
+
+	def string(self, code: int) -> str:
+		return self._strings[code]
+
+
+class MetadataStore:
+	"""Struct-of-arrays storage for metadata rows, usually appended in id order.
+
+	Ids are looked up by binary search over `ids`. Journals written by
+	concurrent processes can replay a few rows out of order; from the first
+	such row on, an id -> row dict is kept instead.
+	"""
+
+	__slots__ = (
+		"vocabulary",
+		"ids",
+		"product_ids",
+		"namespaces",
+		"keys",
+		"types",
+		"values",
+		"typed_values",
+		"created_at",
+		"next_row",
+		"_first_row",
+		"_last_row",
+		"_rows_by_id",
+	)
+
+	def __init__(self) -> None:
+		self.vocabulary = Vocabulary()
+		self.ids = array("q")
+		self.product_ids = array("q")
+		self.namespaces = array("I")
+		self.keys = array("I")
+		self.types = array("I")
+		self.values: List[str] = []
+		self.typed_values: List[Optional[TypedValue]] = []
+		self.created_at = array("d")
+		# Rows of one product form a linked list: next_row[row] is the
+		# product's following row, or -1.
+		self.next_row = array("q")
+		self._first_row: Dict[int, int] = {}
+		self._last_row: Dict[int, int] = {}
+		self._rows_by_id: Optional[Dict[int, int]] = None
+
+	def __len__(self) -> int:
+		return len(self.ids)
+
+	def append(
+		self,
+		metadata_id: int,
+		data_product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		value_type: str,
+		created_at: datetime,
+		typed_value: Optional[TypedValue],
+	) -> MetadataView:
+		if self.ids and metadata_id <= self.ids[-1]:
+			if self._rows_by_id is None:
+				self._rows_by_id = {metadata_id: row for row, metadata_id in enumerate(self.ids)}
+			if metadata_id in self._rows_by_id:
+				raise ValueError(f"Duplicate metadata_id {metadata_id}")
+
+		row = len(self.ids)
+		if self._rows_by_id is not None:
+			self._rows_by_id[metadata_id] = row
+		vocabulary = self.vocabulary
+		self.ids.append(metadata_id)
+		self.product_ids.append(data_product_id)
+		self.namespaces.append(vocabulary.code(namespace))
+		self.keys.append(vocabulary.code(meta_key))
+		self.types.append(vocabulary.code(value_type))
+		self.values.append(meta_value)
+		self.typed_values.append(typed_value)
+		self.created_at.append(epoch_seconds(created_at))
+		self.next_row.append(_NO_ROW)
+
+		last = self._last_row.get(data_product_id)
+		if last is None:
+			self._first_row[data_product_id] = row
+		else:
+			self.next_row[last] = row
+		self._last_row[data_product_id] = row
+		return MetadataView(self, row)
+
+	def update(
+		self,
+		metadata_id: int,
+		meta_value: str,
+		value_type: str,
+		typed_value: Optional[TypedValue],
+	) -> MetadataView:
+		view = self.get(metadata_id)
+		if view is None:
+			raise ValueError(f"Unknown metadata_id {metadata_id}")
+		row = view._row
+		self.values[row] = meta_value
+		self.types[row] = self.vocabulary.code(value_type)
+		self.typed_values[row] = typed_value
+		return view
+
+	def get(self, metadata_id: int) -> Optional[MetadataView]:
+		if self._rows_by_id is not None:
+			row = self._rows_by_id.get(metadata_id)
+			return MetadataView(self, row) if row is not None else None
+		row = bisect.bisect_left(self.ids, metadata_id)
+		if row < len(self.ids) and self.ids[row] == metadata_id:
+			return MetadataView(self, row)
+		return None
+
+	def rows_for(self, data_product_id: int) -> Iterator[int]:
+		row = self._first_row.get(data_product_id, _NO_ROW)
+		while row != _NO_ROW:
+			yield row
+			row = self.next_row[row]
+
+	def product_metadata(self, data_product_id: int) -> ProductMetadata:
+		return ProductMetadata(self, data_product_id)
+
+	def has_rows(self, data_product_id: int) -> bool:
+		return data_product_id in self._first_row
+
+
+class MetadataView:
+	"""Read-only `MetadataEntry` look-alike backed by one `MetadataStore` row."""
+
+	__slots__ = ("_store", "_row")
+
+	def __init__(self, store: MetadataStore, row: int) -> None:
+		self._store = store
+		self._row = row
+
+	@property
+	def metadata_id(self) -> int:
+		return self._store.ids[self._row]
+
+	@property
+	def data_product_id(self) -> int:
+		return self._store.product_ids[self._row]
+
+	@property
+	def namespace(self) -> str:
+		return self._store.vocabulary.string(self._store.namespaces[self._row])
+
+	@property
+	def meta_key(self) -> str:
+		return self._store.vocabulary.string(self._store.keys[self._row])
+
+	@property
+	def meta_value(self) -> str:
+		return self._store.values[self._row]
+
+	@property
+	def value_type(self) -> str:
+		return self._store.vocabulary.string(self._store.types[self._row])
+
+	@property
+	def created_at(self) -> datetime:
+		return _EPOCH + timedelta(seconds=self._store.created_at[self._row])
+
+	@property
+	def typed_value(self) -> Optional[TypedValue]:
+		return self._store.typed_values[self._row]
+
+	def to_entry(self) -> MetadataEntry:
+		return MetadataEntry(
+			metadata_id=self.metadata_id,
+			data_product_id=self.data_product_id,
+			namespace=self.namespace,
+			meta_key=self.meta_key,
+			meta_value=self.meta_value,
+			value_type=self.value_type,
+			created_at=self.created_at,
+			typed_value=self.typed_value,
+		)
+
+	def __repr__(self) -> str:
+		return f"MetadataView({self.to_entry()!r})"
+
+
+class ProductMetadata(Sequence):
+	"""A product's metadata rows, in insertion order, as `MetadataView`s."""
+
+	__slots__ = ("_store", "_product_id")
+
+	def __init__(self, store: MetadataStore, product_id: int) -> None:
+		self._store = store
+		self._product_id = product_id
+
+	def __iter__(self) -> Iterator[MetadataView]:
+		for row in self._store.rows_for(self._product_id):
+			yield MetadataView(self._store, row)
+
+	def __len__(self) -> int:
+		return sum(1 for _ in self._store.rows_for(self._product_id))
+
+	def __bool__(self) -> bool:
+		return self._store.has_rows(self._product_id)
+
+	def __getitem__(self, index):  # type: ignore[override]
+		rows = list(self._store.rows_for(self._product_id))
+		if isinstance(index, slice):
+			return [MetadataView(self._store, row) for row in rows[index]]
+		return MetadataView(self._store, rows[index])
+
+	def __repr__(self) -> str:
+		return f"ProductMetadata(product_id={self._product_id}, rows={len(self)})"
+
+
+MetadataRecord = Union[MetadataEntry, MetadataView]
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from registry import cli
+from registry.client import feam_environment
+from registry.services import Registry
+
+# `feam daemon`: the registry kept loaded behind a Unix domain socket.
+#
+# Each connection sends JSON lines of the form
+#
+#   {"argv": [...], "cwd": "...", "env": {"FEAM_...": "..."}}
+#
+# and gets back one line per request with the command's captured output:
+#
+#   {"stdout": "...", "stderr": "...", "exit_code": 0}
+#
+# or {"fallback": "<reason>"} when the client should run the command itself
+# (a different working directory or FEAM_* environment, the sqlite backend,
+# commands that read the terminal or stdin).
+#
+# Read-only commands run concurrently on a thread pool. Everything else is
+# queued to a single writer task, which waits for in-flight reads to finish,
+# runs the command, and appends its changes to the journal exactly as the
+# CLI would. Other processes may still write the files directly (e.g. an
+# interactive `feam serve`), so before every request the store is asked
+# whether the files still match what the daemon loaded, and the registry is
+# reloaded when they do not. The query cache survives reloads, minus the
+# entries that the records written meanwhile may have changed.
+
+READ_COMMANDS = frozenset(("teams", "products", "show", "search", "facets", "cache", "stale", "due"))
+READ_LINEAGE_COMMANDS = frozenset(("upstream", "downstream", "impact"))
+READ_THREADS = 4
+
+
+class _ThreadLocalStream(io.TextIOBase):
+	"""A stand-in for sys.stdout/sys.stderr that captures per thread."""
+
+	def __init__(self, stream: Any) -> None:
+		self._stream = stream
+		self._local = threading.local()
+
+	def capture(self) -> io.StringIO:
+		buffer = self._local.buffer = io.StringIO()
+		return buffer
+
+	def release(self) -> None:
+		self._local.buffer = None
+
+	def write(self, text: str) -> int:
+		buffer = getattr(self._local, "buffer", None)
+		return (buffer if buffer is not None else self._stream).write(text)
+
+	def flush(self) -> None:
+		if getattr(self._local, "buffer", None) is None:
+			self._stream.flush()
+
+
+class _ReadWriteLock:
+	"""Many readers or one writer; waiting writers hold off new readers."""
+
+	def __init__(self) -> None:
+		self._condition = asyncio.Condition()
+		self._readers = 0
+		self._writing = False
+		self._writers_waiting = 0
+
+	@asynccontextmanager
+	async def read(self) -> AsyncIterator[None]:
+		async with self._condition:
+			await self._condition.wait_for(lambda: not self._writing and not self._writers_waiting)
+			self._readers += 1
+		try:
+			yield
+		finally:
+			async with self._condition:
+				self._readers -= 1
+				self._condition.notify_all()
+
+	@asynccontextmanager
+	async def write(self) -> AsyncIterator[None]:
+		async with self._condition:
+			self._writers_waiting += 1
+			await self._condition.wait_for(lambda: not self._writing and not self._readers)
+			self._writers_waiting -= 1
+			self._writing = True
+		try:
+			yield
+		finally:
+			async with self._condition:
+				self._writing = False
+				self._condition.notify_all()
+
+
+class Daemon:
+	"""Serve feam commands against one in-memory `Registry`."""
+
+	def __init__(self, registry: Registry, socket_path: str) -> None:
+		self.registry = registry
+		self.socket_path = socket_path
+		self.store = cli.open_store()
+		self.cwd = os.path.realpath(os.getcwd())
+		self.env = feam_environment()
+		self.parser = cli.build_parser()
+		self._stdout = _ThreadLocalStream(sys.stdout)
+		self._stderr = _ThreadLocalStream(sys.stderr)
+		self._pool = ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix="feam-daemon")
+		self._lock: Optional[_ReadWriteLock] = None
+		self._writes: Optional[asyncio.Queue] = None
+
+	# -------------------- serving --------------------
+
+	async def serve(self) -> None:
+		self._lock = _ReadWriteLock()
+		self._writes = asyncio.Queue()
+		server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+		writer = asyncio.ensure_future(self._writer())
+		stop = asyncio.Event()
+		loop = asyncio.get_running_loop()
+		for signum in (signal.SIGINT, signal.SIGTERM):
+			loop.add_signal_handler(signum, stop.set)
+		print(f"feam daemon serving {self.socket_path} (pid {os.getpid()})", flush=True)
+		try:
+			await stop.wait()
+		finally:
+			server.close()
+			await server.wait_closed()
+			writer.cancel()
+			self._pool.shutdown(wait=True)
+
+	async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+				try:
+					response = await self._dispatch(json.loads(line))
+				except (ValueError, TypeError, KeyError) as exc:
+					response = {"stdout": "", "stderr": f"feam daemon: bad request: {exc}\n", "exit_code": 2}
+				writer.write(json.dumps(response, separators=(",", ":")).encode("utf-8") + b"\n")
+				await writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+
+	async def _dispatch(self, message: Dict[str, Any]) -> Dict[str, Any]:
+		if os.path.realpath(message["cwd"]) != self.cwd:
+			return {"fallback": "working directory differs from the daemon's"}
+		if message.get("env", {}) != self.env:
+			return {"fallback": "FEAM_* environment differs from the daemon's"}
+
+		argv = [str(arg) for arg in message["argv"]]
+		args, response = self._parse(argv)
+		if args is None:
+			return response
+		reason = self._fallback_reason(args)
+		if reason is not None:
+			return {"fallback": reason}
+
+		if _reads_only(args):
+			if not self.store.is_current():
+				await self._submit(None)
+			async with self._lock.read():
+				loop = asyncio.get_running_loop()
+				return await loop.run_in_executor(self._pool, self._run, args, False)
+		return await self._submit(args)
+
+	def _parse(self, argv: Any) -> Tuple[Optional[argparse.Namespace], Dict[str, Any]]:
+		"""Parse on the event loop; `--help` and usage errors are answered directly."""
+		stdout, stderr = self._stdout.capture(), self._stderr.capture()
+		try:
+			return self.parser.parse_args(argv), {}
+		except SystemExit as exc:
+			return None, {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit_code": _exit_code(exc)}
+		finally:
+			self._stdout.release()
+			self._stderr.release()
+
+	def _fallback_reason(self, args: argparse.Namespace) -> Optional[str]:
+		if args.backend != "json":
+			return "the daemon serves the json backend only"
+		if args.compact_metadata != self.registry.compact:
+			return "metadata layout differs from the daemon's"
+		if args.command == "daemon":
+			return "already running as a daemon"
+		if args.command == "serve" and not args.batch:
+			return "interactive serve reads the terminal"
+		if args.command == "serve" and args.batch == "-":
+			return "the manifest is read from stdin"
+		return None
+
+	async def _submit(self, args: Optional[argparse.Namespace]) -> Dict[str, Any]:
+		"""Queue a write (or, with None, a reload check) for the writer task."""
+		done = asyncio.get_running_loop().create_future()
+		await self._writes.put((args, done))
+		return await done
+
+	async def _writer(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			args, done = await self._writes.get()
+			try:
+				async with self._lock.write():
+					response = await loop.run_in_executor(self._pool, self._run, args, True)
+			except Exception as exc:
+				response = {"stdout": "", "stderr": f"feam daemon: {exc}\n", "exit_code": 1}
+			if not done.cancelled():
+				done.set_result(response)
+
+	# -------------------- commands --------------------
+
+	def _run(self, args: Optional[argparse.Namespace], write: bool) -> Dict[str, Any]:
+		if write and not self.store.is_current():
+			self._reload()
+		if args is None:
+			return {}
+		stdout, stderr = self._stdout.capture(), self._stderr.capture()
+		committed = False
+		try:
+			try:
+				exit_code = cli.run_command(self.parser, args, self.registry)
+				if write:
+					cli.commit_registry(self.registry)
+					committed = True
+			except SystemExit as exc:
+				exit_code = _exit_code(exc)
+			except Exception:
+				traceback.print_exc()
+				exit_code = 1
+			if write and not committed:
+				# The command stopped before committing; like an exiting CLI
+				# process, drop whatever it changed in memory.
+				self._reload(discard=True)
+		finally:
+			self._stdout.release()
+			self._stderr.release()
+		return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit_code": exit_code}
+
+	def _reload(self, discard: bool = False) -> None:
+		"""Load the registry again; with `discard`, its uncommitted changes are being dropped."""
+		cache = self.registry.query_cache
+		if discard:
+			# Results computed since those changes may reflect them.
+			cache.clear()
+		registry = Registry(compact=self.registry.compact)
+		self.store.load(registry, cache)
+		self.registry = registry
+
+
+def _reads_only(args: argparse.Namespace) -> bool:
+	if args.command == "lineage":
+		return args.lineage_command in READ_LINEAGE_COMMANDS
+	return args.command in READ_COMMANDS
+
+
+def _exit_code(exc: SystemExit) -> int:
+	if exc.code is None:
+		return 0
+	return exc.code if isinstance(exc.code, int) else 1
+
+
+def _claim_socket(path: str) -> None:
+	"""Remove a socket left behind by a daemon that died; refuse a live one."""
+	if not os.path.exists(path):
+		return
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		probe.connect(path)
+	except OSError:
+		os.unlink(path)
+		return
+	finally:
+		probe.close()
+	raise ValueError(f"A feam daemon is already listening on {path}")
+
+
+def serve_forever(registry: Registry, socket_path: str) -> None:
+	"""Run the daemon in the foreground until SIGINT or SIGTERM."""
+	if not hasattr(socket, "AF_UNIX"):
+		raise ValueError("feam daemon needs Unix domain sockets")
+	_claim_socket(socket_path)
+	daemon = Daemon(registry, socket_path)
+	saved = sys.stdout, sys.stderr
+	sys.stdout, sys.stderr = daemon._stdout, daemon._stderr
+	try:
+		asyncio.run(daemon.serve())
+	finally:
+		sys.stdout, sys.stderr = saved
+		try:
+			os.unlink(socket_path)
+		except FileNotFoundError:
+			pass
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .typed_values import TIME, parse_range_literal
+
+# Filter expressions accepted by `feam search --filter`.
+#
+#   business.domain=agriculture             metadata (namespace "business", key "domain")
+#   status=active                           product field (no namespace)
+#   status=active,draft                     any of several values of a product field
+#   classification!=restricted              none of them
+#   technical.row_count>1e9                 range over typed metadata values
+#   governance.published_after>=2025-01-01
+#   created_at>=2025-01-01                  range over when products were added;
+#                                           two of them make a window
+
+# Product fields that can be filtered on without a namespace.
+PRODUCT_FILTER_FIELDS = ("status", "data_format", "classification", "owner_team_id")
+# Product timestamps, filtered on with range operators only.
+TIMESTAMP_FILTER_FIELDS = ("created_at",)
+
+RANGE_OPERATORS = (">", ">=", "<", "<=")
+NOT_EQUAL = "!="
+# Separates the values of a product field filter; formats, statuses,
+# classifications and team ids never contain it.
+VALUE_SEPARATOR = ","
+
+# Facets counted by `feam facets`: these names, any product filter field, or
+# a metadata `namespace.key`.
+FACET_ALIASES = {
+	"format": "data_format",
+	"status": "status",
+	"classification": "classification",
+	"team": "owner_team_id",
+	"domain": "business.domain",
+}
+DEFAULT_FACETS = tuple(FACET_ALIASES)
+
+# The target is the shortest prefix before an operator, so `a=b!=c` filters
+# `a` on the value `b!=c`.
+_FILTER_RE = re.compile(r"^([^<>=]*?)(!=|>=|<=|>|<|=)(.*)$")
+
+
+@dataclass(frozen=True)
+class Filter:
+	namespace: Optional[str]
+	key: str
+	value: str
+	op: str = "="
+
+	@property
+	def is_product_field(self) -> bool:
+		return self.namespace is None
+
+	@property
+	def is_range(self) -> bool:
+		return self.op in RANGE_OPERATORS
+
+	@property
+	def values(self) -> Tuple[str, ...]:
+		"""The values a product field filter matches (or, with `!=`, excludes); just `value` for the others."""
+		if self.is_product_field and not self.is_range:
+			return tuple(self.value.split(VALUE_SEPARATOR))
+		return (self.value,)
+
+	def __str__(self) -> str:
+		target = self.key if self.is_product_field else f"{self.namespace}.{self.key}"
+		return f"{target}{self.op}{self.value}"
+
+
+def parse_filter(expr: str) -> Filter:
+	"""Parse `namespace.key<op>value` or `field=value[,value...]` (or `!=`) into a `Filter`."""
+	match = _FILTER_RE.match(expr)
+	target = match.group(1).strip() if match else ""
+	if not match or not target:
+		raise ValueError(f"Invalid filter {expr!r}; expected key=value")
+	op = match.group(2)
+	value = match.group(3).strip()
+
+	namespace, dot, key = target.partition(".")
+	if not dot and target in TIMESTAMP_FILTER_FIELDS:
+		if op not in RANGE_OPERATORS or parse_range_literal(value)[0] != TIME:
+			raise ValueError(f"Invalid filter {expr!r}; expected {target}>=DATE, {target}<DATE, ...")
+		return Filter(namespace=None, key=target, value=value, op=op)
+	if not dot:
+		if target not in PRODUCT_FILTER_FIELDS:
+			fields = ", ".join(PRODUCT_FILTER_FIELDS + TIMESTAMP_FILTER_FIELDS)
+			raise ValueError(
+				f"Unknown product field {target!r}; use namespace.key for metadata or one of: {fields}"
+			)
+		if op in RANGE_OPERATORS:
+			raise ValueError(f"Range filters only apply to metadata keys and timestamps, not {target!r}")
+		values = [item.strip() for item in value.split(VALUE_SEPARATOR)]
+		if len(values) > 1 and not all(values):
+			raise ValueError(f"Invalid filter {expr!r}; expected {target}=VALUE[,VALUE...]")
+		# Sorted, so the same set of values shares query cache entries.
+		value = VALUE_SEPARATOR.join(sorted(set(values)))
+		return Filter(namespace=None, key=target, value=value, op=op)
+	if not namespace or not key:
+		raise ValueError(f"Invalid filter {expr!r}; expected namespace.key=value")
+	if op == NOT_EQUAL:
+		raise ValueError(f"!= only applies to product fields, not {target!r}")
+	if op in RANGE_OPERATORS:
+		parse_range_literal(value)
+	return Filter(namespace=namespace, key=key, value=value, op=op)
+
+
+@dataclass(frozen=True)
+class Facet:
+	"""A product field (no namespace) or metadata key whose values products are counted by."""
+
+	name: str
+	namespace: Optional[str]
+	key: str
+
+	@property
+	def is_product_field(self) -> bool:
+		return self.namespace is None
+
+
+def parse_facet(name: str) -> Facet:
+	"""Parse a facet alias (`format`, `team`, ...), product field or `namespace.key`."""
+	name = name.strip()
+	target = FACET_ALIASES.get(name, name)
+	namespace, dot, key = target.partition(".")
+	if not dot:
+		if target not in PRODUCT_FILTER_FIELDS:
+			choices = ", ".join(sorted(set(FACET_ALIASES) | set(PRODUCT_FILTER_FIELDS)))
+			raise ValueError(f"Unknown facet {name!r}; use namespace.key for metadata or one of: {choices}")
+		return Facet(name=name, namespace=None, key=target)
+	if not namespace or not key:
+		raise ValueError(f"Invalid facet {name!r}; expected namespace.key")
+	return Facet(name=name, namespace=namespace, key=key)
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .storage import write_atomic
+
+# Content fingerprints for served and scanned assets.
+#
+# A product's fingerprint is a SHA-256 over the sorted list of its files'
+# relative paths, sizes and digests, so two copies of the same tree hash the
+# same wherever they live. Files up to `CHUNK_SIZE` digest to their plain
+# SHA-256 (what `sha256sum` prints); larger files to the SHA-256 of their
+# chunks' SHA-256 digests, so the chunks of one multi-terabyte file can be
+# hashed in parallel. Chunks are read through `mmap` on a process pool.
+#
+# `FingerprintCache` remembers every digest under the file's
+# `(device, inode, size, mtime_ns)` stat key, plus the per-file stat keys of
+# each fingerprinted tree. Re-fingerprinting an unchanged tree is then one
+# `stat` per file, and `verify` only re-hashes files whose stat key moved.
+
+FINGERPRINT_CACHE_VERSION = 1
+DIGEST_PREFIX = "sha256:"
+# A multiple of mmap.ALLOCATIONGRANULARITY on every platform we run on.
+CHUNK_SIZE = 64 * 2**20
+# Below this many bytes to hash, a process pool costs more than it saves.
+POOL_THRESHOLD_BYTES = 2 * CHUNK_SIZE
+# Ranges per pool task, so small files don't cost one round trip each.
+MAX_RANGES_PER_TASK = 256
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+StatKey = str
+FileRange = Tuple[str, int, int]
+
+
+def stat_key(st: os.stat_result) -> StatKey:
+	return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def hash_ranges(ranges: Sequence[FileRange]) -> List[Optional[str]]:
+	"""SHA-256 hex digests of `(path, offset, length)` ranges; None if unreadable.
+
+	Module-level so it can run in a worker process.
+	"""
+	digests: List[Optional[str]] = []
+	for path, offset, length in ranges:
+		try:
+			digests.append(_hash_range(path, offset, length))
+		except (OSError, ValueError):
+			digests.append(None)
+	return digests
+
+
+def _hash_range(path: str, offset: int, length: int) -> str:
+	if length == 0:
+		return hashlib.sha256().hexdigest()
+	with open(path, "rb") as f:
+		with mmap.mmap(f.fileno(), length, offset=offset, access=mmap.ACCESS_READ) as mm:
+			return hashlib.sha256(mm).hexdigest()
+
+
+def file_ranges(path: str, size: int, chunk_size: int = CHUNK_SIZE) -> List[FileRange]:
+	if size <= chunk_size:
+		return [(path, 0, size)]
+	return [(path, offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+
+
+def combine_chunks(chunk_digests: Sequence[str]) -> str:
+	if len(chunk_digests) == 1:
+		return chunk_digests[0]
+	return hashlib.sha256("".join(chunk_digests).encode("ascii")).hexdigest()
+
+
+# -------------------- cache --------------------
+
+
+class FingerprintCache:
+	"""Stat key -> digest, and tree root -> {relative path: stat key}."""
+
+	def __init__(self, path: Optional[Path] = None) -> None:
+		self.path = Path(path) if path is not None else None
+		self.digests: Dict[StatKey, str] = {}
+		self.trees: Dict[str, Dict[str, StatKey]] = {}
+		# Keys looked up or added by this process; kept even if no tree uses them.
+		self._used: Set[StatKey] = set()
+
+	@classmethod
+	def load(cls, path: Path) -> FingerprintCache:
+		cache = cls(path)
+		try:
+			with cache.path.open("r", encoding="utf-8") as f:
+				data = json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return cache
+		if data.get("version") == FINGERPRINT_CACHE_VERSION:
+			cache.digests = data.get("digests", {})
+			cache.trees = data.get("trees", {})
+		return cache
+
+	def get(self, key: StatKey) -> Optional[str]:
+		digest = self.digests.get(key)
+		if digest is not None:
+			self._used.add(key)
+		return digest
+
+	def put(self, key: StatKey, digest: str) -> None:
+		self.digests[key] = digest
+		self._used.add(key)
+
+	def save(self) -> None:
+		if self.path is None:
+			return
+		live = set(self._used)
+		for files in self.trees.values():
+			live.update(files.values())
+		payload = {
+			"version": FINGERPRINT_CACHE_VERSION,
+			"digests": {key: digest for key, digest in self.digests.items() if key in live},
+			"trees": self.trees,
+		}
+		write_atomic(self.path, json.dumps(payload, separators=(",", ":")))
+
+
+# -------------------- fingerprinting --------------------
+
+
+@dataclass
+class TreeFingerprint:
+	root: str
+	# "sha256:<hex>", or None if the tree is missing or a file was unreadable.
+	digest: Optional[str] = None
+	files: Dict[str, StatKey] = field(default_factory=dict)
+	file_digests: Dict[str, str] = field(default_factory=dict)
+	total_bytes: int = 0
+	hashed_files: int = 0
+	hashed_bytes: int = 0
+	errors: List[str] = field(default_factory=list)
+
+
+@dataclass
+class TreeDiff:
+	added: List[str] = field(default_factory=list)
+	removed: List[str] = field(default_factory=list)
+	modified: List[str] = field(default_factory=list)
+
+	def __bool__(self) -> bool:
+		return bool(self.added or self.removed or self.modified)
+
+
+def _walk_files(root: str) -> Iterator[Tuple[str, os.stat_result]]:
+	"""`(relative path, stat)` for every regular file below `root`."""
+	if not os.path.isdir(root):
+		yield "", os.stat(root)
+		return
+	stack = [""]
+	while stack:
+		relative = stack.pop()
+		with os.scandir(os.path.join(root, relative) if relative else root) as it:
+			for entry in it:
+				child = f"{relative}/{entry.name}" if relative else entry.name
+				if entry.is_dir(follow_symlinks=False):
+					stack.append(child)
+				elif entry.is_file(follow_symlinks=False):
+					yield child, entry.stat(follow_symlinks=False)
+
+
+class Fingerprinter:
+	"""Fingerprint trees, hashing only files the cache has not seen."""
+
+	def __init__(
+		self,
+		cache: Optional[FingerprintCache] = None,
+		workers: int = DEFAULT_WORKERS,
+		chunk_size: int = CHUNK_SIZE,
+		rehash: bool = False,
+	) -> None:
+		if chunk_size % mmap.ALLOCATIONGRANULARITY:
+			raise ValueError(f"chunk_size must be a multiple of {mmap.ALLOCATIONGRANULARITY}")
+		self.cache = cache if cache is not None else FingerprintCache()
+		self.workers = max(1, workers)
+		self.chunk_size = chunk_size
+		# Ignore cached digests and read every file again, e.g. to catch
+		# corruption that left size and mtime untouched.
+		self.rehash = rehash
+
+	def fingerprint(self, root: str, record: bool = True) -> TreeFingerprint:
+		return self.fingerprint_many([root], record=record)[os.path.abspath(root)]
+
+	def fingerprint_many(self, roots: Sequence[str], record: bool = True) -> Dict[str, TreeFingerprint]:
+		"""Fingerprint several trees, sharing one hashing pass across all of them.
+
+		With `record` each tree's per-file stat keys become its baseline (see
+		`baseline`).
+		"""
+		results: Dict[str, TreeFingerprint] = {}
+		# stat key -> (path, size, relative paths and trees waiting for it)
+		misses: Dict[StatKey, Tuple[str, int, List[Tuple[TreeFingerprint, str]]]] = {}
+		for root in roots:
+			root = os.path.abspath(root)
+			tree = results[root] = TreeFingerprint(root)
+			try:
+				for relative, st in _walk_files(root):
+					key = stat_key(st)
+					tree.files[relative] = key
+					tree.total_bytes += st.st_size
+					digest = None if self.rehash else self.cache.get(key)
+					if digest is not None:
+						tree.file_digests[relative] = digest
+						continue
+					path = os.path.join(root, relative) if relative else root
+					misses.setdefault(key, (path, st.st_size, []))[2].append((tree, relative))
+			except OSError as exc:
+				tree.errors.append(f"{exc.filename or root}: {exc.strerror or exc}")
+
+		self._hash_misses(misses)
+
+		for root, tree in results.items():
+			if tree.errors:
+				continue
+			tree.digest = DIGEST_PREFIX + hashlib.sha256(
+				"".join(
+					f"{relative}\0{key.split(':')[2]}\0{tree.file_digests[relative]}\n"
+					for relative, key in sorted(tree.files.items())
+				).encode("utf-8")
+			).hexdigest()
+			if record:
+				self.cache.trees[root] = dict(tree.files)
+		return results
+
+	def _hash_misses(self, misses: Dict[StatKey, Tuple[str, int, List[Tuple[TreeFingerprint, str]]]]) -> None:
+		ranges: List[FileRange] = []
+		owners: List[StatKey] = []
+		for key, (path, size, _) in misses.items():
+			for file_range in file_ranges(path, size, self.chunk_size):
+				ranges.append(file_range)
+				owners.append(key)
+		if not ranges:
+			return
+
+		chunk_digests: Dict[StatKey, List[Optional[str]]] = {key: [] for key in misses}
+		for key, digest in zip(owners, self._hash_ranges(ranges)):
+			chunk_digests[key].append(digest)
+
+		for key, (path, size, waiting) in misses.items():
+			chunks = chunk_digests[key]
+			if any(digest is None for digest in chunks):
+				for tree, _ in waiting:
+					tree.errors.append(f"{path}: unreadable")
+				continue
+			digest = combine_chunks(chunks)  # type: ignore[arg-type]
+			self.cache.put(key, digest)
+			for tree, relative in waiting:
+				tree.file_digests[relative] = digest
+				tree.hashed_files += 1
+				tree.hashed_bytes += size
+
+	def _hash_ranges(self, ranges: List[FileRange]) -> List[Optional[str]]:
+		total = sum(length for _, _, length in ranges)
+		if self.workers == 1 or total < POOL_THRESHOLD_BYTES:
+			return hash_ranges(ranges)
+
+		# Batch ranges into tasks of roughly one chunk each; results come back
+		# in submission order, matching `ranges`.
+		tasks: List[List[FileRange]] = [[]]
+		task_bytes = 0
+		for file_range in ranges:
+			full = task_bytes + file_range[2] > self.chunk_size or len(tasks[-1]) >= MAX_RANGES_PER_TASK
+			if tasks[-1] and full:
+				tasks.append([])
+				task_bytes = 0
+			tasks[-1].append(file_range)
+			task_bytes += file_range[2]
+
+		digests: List[Optional[str]] = []
+		with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+			for task_digests in pool.map(hash_ranges, tasks):
+				digests.extend(task_digests)
+		return digests
+
+	def baseline(self, root: str) -> Optional[Dict[str, Optional[str]]]:
+		"""Per-file digests recorded for `root` by the last fingerprint, if any."""
+		files = self.cache.trees.get(os.path.abspath(root))
+		if files is None:
+			return None
+		return {relative: self.cache.digests.get(key) for relative, key in files.items()}
+
+
+def diff_trees(baseline: Dict[str, Optional[str]], tree: TreeFingerprint) -> TreeDiff:
+	"""Files added, removed or modified in `tree` relative to `baseline` digests."""
+	result = TreeDiff()
+	for relative in sorted(tree.file_digests):
+		if relative not in baseline:
+			result.added.append(relative)
+		elif baseline[relative] != tree.file_digests[relative]:
+			result.modified.append(relative)
+	result.removed = sorted(relative for relative in baseline if relative not in tree.files)
+	return result
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Protocol, Sequence, Set, Tuple
+
+from .text_index import tokenize
+
+# Typo-tolerant search over product names and, optionally, descriptions.
+#
+# Every word is padded as "  word " and cut into character trigrams, the way
+# PostgreSQL's pg_trgm does, so `canda` still shares "  c", " ca", "can" and
+# "da " with `canada`. A trigram index maps each trigram to the sorted ids of
+# the products whose text contains it.
+#
+# A query with q distinct trigrams asks for products sharing at least
+# T = ceil(similarity * q) of them. Any such product appears in at least one
+# of the q - T + 1 shortest posting lists, so candidates come from those
+# alone and the longer lists are only probed for the candidates. Candidates
+# are then ranked by the edit distance between the query and the closest
+# substring of the text, so edit distance is never computed for products
+# that share too few trigrams with the query.
+#
+# Like full-text search, a query can span several segments holding disjoint
+# products: the in-memory `TrigramIndex` and the one stored in a binary
+# snapshot (see `binary_snapshot.py`).
+
+DEFAULT_SIMILARITY = 0.25
+
+# An edit changes at most three of the trigrams around it, so a candidate
+# missing m of the query's trigrams is at least about m / 3 edits away. Ranking
+# visits candidates by falling similarity and stops once that bound exceeds
+# the distances it already has.
+TRIGRAMS_PER_EDIT = 3
+
+# A long posting list is probed by binary search per candidate; one up to
+# this many times the number of candidates is cheaper to intersect whole.
+PROBE_SCAN_RATIO = 16
+
+NAME = "name"
+DESCRIPTION = "description"
+FIELDS = (NAME, DESCRIPTION)
+
+
+def normalize(text: str) -> str:
+	"""Lowercase words separated by single spaces, e.g. `satellite ndvi timeseries`."""
+	return " ".join(tokenize(text))
+
+
+def trigrams(text: str) -> Set[str]:
+	grams: Set[str] = set()
+	for token in tokenize(text):
+		padded = f"  {token} "
+		grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+	return grams
+
+
+def substring_distance(pattern: str, text: str) -> int:
+	"""Fewest edits turning `pattern` into some substring of `text`.
+
+	Levenshtein distance where the match may start and end anywhere in
+	`text`, so a correctly typed part of a long name costs nothing.
+	"""
+	return distance_from(pattern)(text)
+
+
+def distance_from(pattern: str) -> Callable[[str], int]:
+	"""`substring_distance` to `pattern`, preprocessed once for many texts.
+
+	Myers' bit-parallel algorithm: each column of the edit distance table is
+	held as bit vectors of +1/-1 steps, so a text character costs a handful
+	of integer operations instead of a pass over the pattern.
+	"""
+	m = len(pattern)
+	match: Dict[str, int] = {}
+	for i, char in enumerate(pattern):
+		match[char] = match.get(char, 0) | (1 << i)
+	mask = (1 << m) - 1
+	last = 1 << (m - 1) if m else 0
+
+	def distance(text: str) -> int:
+		plus, minus = mask, 0
+		score = best = m
+		for char in text:
+			eq = match.get(char, 0)
+			xv = eq | minus
+			xh = (((eq & plus) + plus) ^ plus) | eq
+			hplus = minus | (~(xh | plus) & mask)
+			hminus = plus & xh
+			if hplus & last:
+				score += 1
+			elif hminus & last:
+				score -= 1
+				if score < best:
+					best = score
+			# The match may start anywhere, so the top row stays 0 and
+			# nothing is shifted in.
+			hplus = (hplus << 1) & mask
+			hminus = (hminus << 1) & mask
+			plus = hminus | (~(xv | hplus) & mask)
+			minus = hplus & xv
+		return best
+
+	return distance
+
+
+class TrigramSegment(Protocol):
+	"""Read side of a trigram index over a disjoint set of products."""
+
+	def postings(self, field: str, trigram: str) -> Sequence[int]:
+		"""Ids of products whose `field` contains `trigram`, ascending."""
+		...
+
+
+class TrigramIndex:
+	"""Incrementally maintained trigram postings per field, keyed by product id."""
+
+	def __init__(self) -> None:
+		self._postings: Dict[Tuple[str, str], List[int]] = {}
+
+	def add(self, doc_id: int, field: str, text: str) -> None:
+		for trigram in trigrams(text):
+			ids = self._postings.setdefault((field, trigram), [])
+			# Products mostly arrive in id order; keep the lists sorted anyway.
+			if not ids or ids[-1] < doc_id:
+				ids.append(doc_id)
+			else:
+				position = bisect.bisect_left(ids, doc_id)
+				if position == len(ids) or ids[position] != doc_id:
+					ids.insert(position, doc_id)
+
+	def postings(self, field: str, trigram: str) -> Sequence[int]:
+		return self._postings.get((field, trigram), ())
+
+
+def _contains(ids: Sequence[int], doc_id: int) -> bool:
+	position = bisect.bisect_left(ids, doc_id)
+	return position < len(ids) and ids[position] == doc_id
+
+
+def candidates(
+	segments: Sequence[TrigramSegment],
+	field: str,
+	query: str,
+	similarity: float = DEFAULT_SIMILARITY,
+	restrict: Optional[Set[int]] = None,
+) -> Dict[int, float]:
+	"""Products sharing at least `similarity` of the query's trigrams in `field`.
+
+	Returns product id -> fraction of the query's trigrams found.
+	"""
+	grams = trigrams(query)
+	if not grams:
+		return {}
+	required = max(1, math.ceil(similarity * len(grams)))
+	# One list of per-segment postings for each trigram, shortest first.
+	lists = sorted(
+		([segment.postings(field, gram) for segment in segments] for gram in grams),
+		key=lambda parts: sum(len(ids) for ids in parts),
+	)
+	scan, probe = lists[:len(grams) - required + 1], lists[len(grams) - required + 1:]
+
+	counts: Counter = Counter()
+	for parts in scan:
+		for ids in parts:
+			counts.update(ids)
+	if restrict is not None:
+		counts = Counter({doc_id: count for doc_id, count in counts.items() if doc_id in restrict})
+
+	for parts in probe:
+		for ids in parts:
+			if len(ids) <= PROBE_SCAN_RATIO * len(counts):
+				hits: Iterable[int] = counts.keys() & set(ids)
+			else:
+				hits = [doc_id for doc_id in counts if _contains(ids, doc_id)]
+			for doc_id in hits:
+				counts[doc_id] += 1
+	return {doc_id: count / len(grams) for doc_id, count in counts.items() if count >= required}
+
+
+def search(
+	segments: Sequence[TrigramSegment],
+	query: str,
+	text_of: Callable[[int, str], str],
+	fields: Sequence[str] = (NAME,),
+	similarity: float = DEFAULT_SIMILARITY,
+	limit: Optional[int] = None,
+	restrict: Optional[Set[int]] = None,
+) -> List[Tuple[int, int]]:
+	"""Return `(doc_id, edit distance)` pairs, closest first.
+
+	Candidates come from the trigram postings of `fields`; `text_of(doc_id,
+	field)` supplies the text each one is ranked against. Ties go to the
+	higher trigram similarity, then the lower id.
+	"""
+	if limit is not None and limit <= 0:
+		return []
+	distance_to = distance_from(normalize(query))
+	gram_count = len(trigrams(query))
+	best: Dict[int, float] = {}
+	for field in fields:
+		for doc_id, score in candidates(segments, field, query, similarity, restrict).items():
+			if score > best.get(doc_id, 0.0):
+				best[doc_id] = score
+
+	ranked: List[Tuple[int, float, int]] = []
+	# Negated distances of the `limit` closest candidates so far.
+	closest: List[int] = []
+	for doc_id, score in sorted(best.items(), key=lambda item: (-item[1], item[0])):
+		cutoff = -closest[0] if limit is not None and len(closest) == limit else None
+		if cutoff is not None and (1 - score) * gram_count / TRIGRAMS_PER_EDIT > cutoff:
+			break
+		distance = min(distance_to(normalize(text_of(doc_id, field))) for field in fields)
+		ranked.append((distance, -score, doc_id))
+		if limit is not None:
+			if len(closest) < limit:
+				heapq.heappush(closest, -distance)
+			elif distance < cutoff:
+				heapq.heapreplace(closest, -distance)
+	chosen = heapq.nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+	return [(doc_id, distance) for distance, _, doc_id in chosen]
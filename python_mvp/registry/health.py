@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .shards import PUBLISH_PREFIX
+from .storage import write_atomic
+
+# Path health checks behind `feam verify` without a product id.
+#
+# Products point at shared storage twice: `access_uri` (where consumers read
+# them) and `feam.source_path` (what `serve` and `scan` registered), and
+# both go stale silently when a lab moves or purges a directory. A
+# `PathChecker` stats every distinct path with a bounded pool of worker
+# threads; a `RateLimiter` shared by the workers spaces their metadata calls
+# (`stat`, then `access` for readability) to at most so many per second, so
+# a sweep of the whole catalog does not swamp the filesystem's metadata
+# servers however many workers run.
+#
+# Results are kept in a `StatCache`, persisted as JSON between runs: a path
+# checked less than a TTL ago is not checked again, so re-running a sweep
+# (or verifying one namespace after another) only stats what has expired.
+
+DEFAULT_CHECK_WORKERS = 16
+DEFAULT_OPS_PER_SECOND = 1000.0
+DEFAULT_TTL_SECONDS = 3600.0
+STAT_CACHE_VERSION = 1
+
+# Outcomes of a check.
+OK = "ok"
+MISSING = "missing"
+DENIED = "denied"
+ERROR = "error"
+PROBLEMS = (MISSING, DENIED, ERROR)
+
+
+def uri_path(uri: str) -> Optional[str]:
+	"""The filesystem path an access URI names; None for other schemes (s3://, https://, ...).
+
+	`/publish/<namespace>/<name>` URIs name a published product rather than
+	a local path, so they have none either.
+	"""
+	if uri.startswith("file://"):
+		return uri[len("file://"):] or None
+	if "://" in uri or not uri or uri.startswith(PUBLISH_PREFIX):
+		return None
+	return uri
+
+
+@dataclass
+class PathStatus:
+	"""What a path looked like when it was checked (epoch seconds)."""
+
+	state: str
+	checked_at: float
+	is_dir: bool = False
+	size_bytes: Optional[int] = None
+	mtime: Optional[float] = None
+	error: Optional[str] = None
+
+	def to_list(self) -> list:
+		return [self.state, self.checked_at, self.is_dir, self.size_bytes, self.mtime, self.error]
+
+	@classmethod
+	def from_list(cls, item: list) -> PathStatus:
+		return cls(*item)
+
+
+class StatCache:
+	"""Path -> its last `PathStatus`, persisted as JSON between runs."""
+
+	def __init__(self, path: Optional[Path] = None) -> None:
+		self.path = Path(path) if path is not None else None
+		self.records: Dict[str, PathStatus] = {}
+
+	@classmethod
+	def load(cls, path: Path) -> StatCache:
+		cache = cls(path)
+		try:
+			with cache.path.open("r", encoding="utf-8") as f:
+				data = json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return cache
+		if data.get("version") == STAT_CACHE_VERSION:
+			cache.records = {path: PathStatus.from_list(item) for path, item in data.get("paths", {}).items()}
+		return cache
+
+	def save(self, ttl: float, now: Optional[float] = None) -> None:
+		"""Persist the entries checked less than `ttl` seconds ago; older ones would be checked again anyway."""
+		if self.path is None:
+			return
+		now = time.time() if now is None else now
+		payload = {
+			"version": STAT_CACHE_VERSION,
+			"paths": {
+				path: status.to_list()
+				for path, status in self.records.items()
+				if now - status.checked_at < ttl
+			},
+		}
+		write_atomic(self.path, json.dumps(payload, separators=(",", ":")))
+
+	def fresh(self, path: str, ttl: float, now: float) -> Optional[PathStatus]:
+		status = self.records.get(path)
+		if status is None or now - status.checked_at >= ttl:
+			return None
+		return status
+
+
+class RateLimiter:
+	"""Spaces calls to `acquire` at most `rate` per second across threads (no limit if `rate` is None)."""
+
+	def __init__(self, rate: Optional[float]) -> None:
+		if rate is not None and rate <= 0:
+			raise ValueError("ops per second must be positive")
+		self._interval = 1.0 / rate if rate else 0.0
+		self._next = 0.0
+		self._lock = threading.Lock()
+
+	def acquire(self) -> None:
+		if not self._interval:
+			return
+		with self._lock:
+			now = time.monotonic()
+			slot = max(self._next, now)
+			self._next = slot + self._interval
+		if slot > now:
+			time.sleep(slot - now)
+
+
+# -------------------- checking --------------------
+
+
+@dataclass
+class CheckReport:
+	statuses: Dict[str, PathStatus] = field(default_factory=dict)
+	checked: int = 0
+	cached: int = 0
+	metadata_ops: int = 0
+	seconds: float = 0.0
+
+
+class PathChecker:
+	"""Check many paths in parallel under a metadata ops-per-second cap."""
+
+	def __init__(
+		self,
+		cache: Optional[StatCache] = None,
+		workers: int = DEFAULT_CHECK_WORKERS,
+		ops_per_second: Optional[float] = DEFAULT_OPS_PER_SECOND,
+		ttl: float = DEFAULT_TTL_SECONDS,
+	) -> None:
+		if workers < 1:
+			raise ValueError("workers must be at least 1")
+		self.cache = cache if cache is not None else StatCache()
+		self.workers = workers
+		self.ttl = ttl
+		self._limiter = RateLimiter(ops_per_second)
+		self._ops = 0
+		self._ops_lock = threading.Lock()
+
+	def check(self, paths: Iterable[str]) -> CheckReport:
+		"""The status of each distinct path, from the cache when checked within the TTL."""
+		start = time.perf_counter()
+		now = time.time()
+		report = CheckReport()
+		pending: List[str] = []
+		for path in dict.fromkeys(paths):
+			status = self.cache.fresh(path, self.ttl, now)
+			if status is None:
+				pending.append(path)
+			else:
+				report.statuses[path] = status
+				report.cached += 1
+
+		self._ops = 0
+		if pending:
+			with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="feam-verify") as pool:
+				for path, status in zip(pending, pool.map(self._check, pending)):
+					self.cache.records[path] = status
+					report.statuses[path] = status
+		report.checked = len(pending)
+		report.metadata_ops = self._ops
+		report.seconds = time.perf_counter() - start
+		return report
+
+	# -------------------- workers --------------------
+
+	def _op(self) -> None:
+		self._limiter.acquire()
+		with self._ops_lock:
+			self._ops += 1
+
+	def _check(self, path: str) -> PathStatus:
+		self._op()
+		try:
+			st = os.stat(path)
+		except (FileNotFoundError, NotADirectoryError):
+			# NotADirectoryError: a parent of the path is now a file.
+			return PathStatus(MISSING, time.time())
+		except PermissionError:
+			return PathStatus(DENIED, time.time(), error="permission denied")
+		except OSError as exc:
+			return PathStatus(ERROR, time.time(), error=exc.strerror or str(exc))
+
+		is_dir = stat.S_ISDIR(st.st_mode)
+		self._op()
+		# Directories must also be searchable to be read.
+		readable = os.access(path, (os.R_OK | os.X_OK) if is_dir else os.R_OK)
+		return PathStatus(
+			OK if readable else DENIED,
+			time.time(),
+			is_dir=is_dir,
+			# A directory's st_size says nothing about its contents; scan measures those.
+			size_bytes=None if is_dir else st.st_size,
+			mtime=st.st_mtime,
+			error=None if readable else "permission denied",
+		)
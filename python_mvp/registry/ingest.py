@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Manifest parsing for `feam serve --batch`.
+#
+# A manifest lists one asset per row, either as JSON lines or as CSV with a
+# header row. Rows are streamed one at a time so memory does not grow with
+# the size of the manifest. Recognised fields:
+#
+#   path            (required) asset path on shared storage
+#   name            product name; defaults to the last component of `path`
+#   asset_type      defaults to "dataset"
+#   description     defaults to "Served from <path>"
+#   status          active | deprecated | draft (default draft)
+#   classification  internal | restricted | public (default internal)
+#   namespace       publishing namespace; defaults to the current namespace
+#   version         label for the published version; a row naming an already
+#                   published product adds a version if this label is new
+#                   (or, without a label, if its path changed)
+
+VALID_STATUSES = ("active", "deprecated", "draft")
+VALID_CLASSIFICATIONS = ("internal", "restricted", "public")
+MANIFEST_FIELDS = (
+	"path",
+	"name",
+	"asset_type",
+	"description",
+	"status",
+	"classification",
+	"namespace",
+	"version",
+)
+
+
+class ManifestError(ValueError):
+	"""A manifest row that cannot be registered."""
+
+	def __init__(self, line: int, message: str) -> None:
+		super().__init__(f"line {line}: {message}")
+		self.line = line
+
+
+@dataclass
+class ManifestRow:
+	line: int
+	path: str
+	name: str
+	asset_type: str
+	description: str
+	status: str
+	classification: str
+	namespace: Optional[str]
+	version: Optional[str] = None
+
+
+def iter_manifest_records(source: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+	"""Yield `(line number, raw record)` from a JSONL or CSV manifest.
+
+	`source` ending in `.csv` is read as CSV; anything else, including `-`
+	for stdin, as JSON lines.
+	"""
+	is_csv = source.lower().endswith(".csv")
+	if source == "-":
+		stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+	else:
+		stream = Path(source).open("r", encoding="utf-8", newline="")
+
+	with stream:
+		if is_csv:
+			reader = csv.DictReader(stream)
+			for record in reader:
+				yield reader.line_num, record
+			return
+
+		for line_no, line in enumerate(stream, start=1):
+			if not line.strip():
+				continue
+			try:
+				record = json.loads(line)
+			except json.JSONDecodeError as exc:
+				yield line_no, {"__error__": f"invalid JSON ({exc.msg})"}
+				continue
+			if not isinstance(record, dict):
+				record = {"__error__": "expected a JSON object"}
+			yield line_no, record
+
+
+def validate_record(line: int, record: Dict[str, Any]) -> ManifestRow:
+	"""Normalize one raw manifest record, raising `ManifestError` if invalid."""
+	if "__error__" in record:
+		raise ManifestError(line, record["__error__"])
+
+	unknown = sorted(k for k in record if k not in MANIFEST_FIELDS)
+	if unknown:
+		raise ManifestError(line, f"unknown field(s) {', '.join(unknown)}")
+
+	def text(field: str) -> str:
+		value = record.get(field)
+		return "" if value is None else str(value).strip()
+
+	path = text("path")
+	if not path:
+		raise ManifestError(line, "missing 'path'")
+
+	name = text("name") or os.path.basename(path.rstrip("/\\"))
+	if not name:
+		raise ManifestError(line, f"cannot derive a name from path {path!r}")
+
+	status = text("status") or "draft"
+	if status not in VALID_STATUSES:
+		raise ManifestError(line, f"status must be one of {', '.join(VALID_STATUSES)}")
+
+	classification = text("classification") or "internal"
+	if classification not in VALID_CLASSIFICATIONS:
+		raise ManifestError(
+			line, f"classification must be one of {', '.join(VALID_CLASSIFICATIONS)}"
+		)
+
+	return ManifestRow(
+		line=line,
+		path=path,
+		name=name,
+		asset_type=text("asset_type") or "dataset",
+		description=text("description") or f"Served from {path}",
+		status=status,
+		classification=classification,
+		namespace=text("namespace") or None,
+		version=text("version") or None,
+	)
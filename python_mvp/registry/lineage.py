@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Lineage: which data products each product was derived from.
+#
+# Edges point from a downstream product to an upstream one it reads, as in
+# mesh_core's `lineage_dependencies` (downstream version -> upstream URI).
+# Both directions are indexed as adjacency sets, so direct inputs and direct
+# consumers are dictionary lookups.
+#
+# Transitive closures are found by breadth-first search and memoized per
+# node. A search that reaches a node whose closure is already known takes
+# that closure whole instead of walking it again. When an edge
+# downstream -> upstream is added or removed, the only upstream closures
+# that can change are the downstream node's and those that contain it, and
+# likewise for downstream closures and the upstream node, so exactly those
+# memo entries are dropped.
+#
+# Edges that would close a cycle are rejected. Journal records from
+# concurrent writers are replayed unchecked, so a cycle can still appear;
+# closures tolerate it, and ordering reports it.
+
+# Memoized closures kept per direction; a long-running daemon would otherwise
+# keep one for every product ever queried.
+MAX_CACHED_CLOSURES = 4096
+
+
+class LineageCycleError(ValueError):
+	"""Raised when lineage edges form a cycle; `cycle` lists the product ids on it."""
+
+	def __init__(self, message: str, cycle: List[int]) -> None:
+		super().__init__(message)
+		self.cycle = cycle
+
+
+class LineageGraph:
+	"""Forward and reverse adjacency indexes over product ids, with memoized closures."""
+
+	def __init__(self) -> None:
+		# downstream id -> ids it reads, and upstream id -> ids reading it.
+		self._upstream: Dict[int, Set[int]] = {}
+		self._downstream: Dict[int, Set[int]] = {}
+		self._edge_count = 0
+		# node -> transitive closure, in each direction.
+		self._upstream_closures: Dict[int, FrozenSet[int]] = {}
+		self._downstream_closures: Dict[int, FrozenSet[int]] = {}
+
+	def __len__(self) -> int:
+		return self._edge_count
+
+	def edges(self) -> Iterator[Tuple[int, int]]:
+		"""Every `(downstream, upstream)` edge, sorted."""
+		for downstream in sorted(self._upstream):
+			for upstream in sorted(self._upstream[downstream]):
+				yield downstream, upstream
+
+	def has_edge(self, downstream: int, upstream: int) -> bool:
+		return upstream in self._upstream.get(downstream, ())
+
+	def add_edge(self, downstream: int, upstream: int, check: bool = True) -> bool:
+		"""Record that `downstream` reads `upstream`; False if it already did.
+
+		With `check`, an edge that would close a cycle raises
+		`LineageCycleError` and leaves the graph unchanged.
+		"""
+		if self.has_edge(downstream, upstream):
+			return False
+		if check and self._reaches(upstream, downstream):
+			cycle = [downstream] + self._path(upstream, downstream, self._upstream)
+			raise LineageCycleError("Lineage edge would create a cycle", cycle)
+		self._invalidate(downstream, upstream)
+		self._upstream.setdefault(downstream, set()).add(upstream)
+		self._downstream.setdefault(upstream, set()).add(downstream)
+		self._edge_count += 1
+		return True
+
+	def remove_edge(self, downstream: int, upstream: int) -> bool:
+		"""Forget that `downstream` reads `upstream`; False if it did not."""
+		if not self.has_edge(downstream, upstream):
+			return False
+		self._invalidate(downstream, upstream)
+		_discard(self._upstream, downstream, upstream)
+		_discard(self._downstream, upstream, downstream)
+		self._edge_count -= 1
+		return True
+
+	def _reaches(self, upstream: int, downstream: int) -> bool:
+		"""Whether `upstream` already reads `downstream`, directly or not.
+
+		Searches up from `upstream` and down from `downstream` in turns and
+		stops as soon as either side runs out, so a check costs at most twice
+		the smaller of the two closures. New products have no consumers yet,
+		which makes checking their edges immediate.
+		"""
+		if upstream == downstream:
+			return True
+		for closures, node, target in (
+			(self._upstream_closures, upstream, downstream),
+			(self._downstream_closures, downstream, upstream),
+		):
+			known = closures.get(node)
+			if known is not None:
+				return target in known
+		searches = (
+			(self._upstream, deque((upstream,)), {upstream}, downstream),
+			(self._downstream, deque((downstream,)), {downstream}, upstream),
+		)
+		while True:
+			for adjacency, queue, seen, target in searches:
+				if not queue:
+					return False
+				for neighbour in adjacency.get(queue.popleft(), ()):
+					if neighbour == target:
+						return True
+					if neighbour not in seen:
+						seen.add(neighbour)
+						queue.append(neighbour)
+
+	def _invalidate(self, downstream: int, upstream: int) -> None:
+		"""Drop the memoized closures an edge between these two nodes changes."""
+		for closures, node in ((self._upstream_closures, downstream), (self._downstream_closures, upstream)):
+			stale = [key for key, closure in closures.items() if key == node or node in closure]
+			for key in stale:
+				del closures[key]
+
+	# -------------------- queries --------------------
+
+	def direct_upstream(self, node: int) -> FrozenSet[int]:
+		return frozenset(self._upstream.get(node, ()))
+
+	def direct_downstream(self, node: int) -> FrozenSet[int]:
+		return frozenset(self._downstream.get(node, ()))
+
+	def upstream(self, node: int) -> FrozenSet[int]:
+		"""Every product `node` is derived from, directly or not."""
+		return self._closure(node, self._upstream, self._upstream_closures)
+
+	def downstream(self, node: int) -> FrozenSet[int]:
+		"""Every product derived from `node`, directly or not."""
+		return self._closure(node, self._downstream, self._downstream_closures)
+
+	@staticmethod
+	def _closure(node: int, adjacency: Dict[int, Set[int]], closures: Dict[int, FrozenSet[int]]) -> FrozenSet[int]:
+		closure = closures.get(node)
+		if closure is not None:
+			return closure
+		seen: Set[int] = set()
+		queue = deque((node,))
+		while queue:
+			for neighbour in adjacency.get(queue.popleft(), ()):
+				if neighbour in seen:
+					continue
+				seen.add(neighbour)
+				known = closures.get(neighbour)
+				if known is not None:
+					seen |= known
+				else:
+					queue.append(neighbour)
+		closure = frozenset(seen)
+		if len(closures) >= MAX_CACHED_CLOSURES:
+			# Evict the oldest entry; dicts keep insertion order. Another
+			# reader may have evicted it already.
+			closures.pop(next(iter(closures), None), None)
+		# Concurrent readers (the daemon's thread pool) only ever see a fully
+		# built graph that no writer changes while they run, so every closure
+		# they memoize is correct; at worst two compute the same one.
+		closures[node] = closure
+		return closure
+
+	def impact(self, node: int) -> List[int]:
+		"""What must be recomputed if `node` changes, each product after all of its inputs."""
+		affected = self.downstream(node)
+		if node in affected:
+			cycle = self._path(node, node, self._downstream)
+			raise LineageCycleError("Lineage contains a cycle", list(reversed(cycle)))
+		return self.topological_order(affected)
+
+	def topological_order(self, nodes: Iterable[int]) -> List[int]:
+		"""Order `nodes` so that every product comes after its upstreams among them.
+
+		Kahn's algorithm over the induced subgraph; ties go to the lower id.
+		Raises `LineageCycleError` if the nodes contain a cycle.
+		"""
+		members = set(nodes)
+		pending = {
+			node: sum(1 for upstream in self._upstream.get(node, ()) if upstream in members)
+			for node in members
+		}
+		ready = deque(sorted(node for node, count in pending.items() if count == 0))
+		order: List[int] = []
+		while ready:
+			node = ready.popleft()
+			order.append(node)
+			released = []
+			for downstream in self._downstream.get(node, ()):
+				if downstream in members:
+					pending[downstream] -= 1
+					if pending[downstream] == 0:
+						released.append(downstream)
+			ready.extend(sorted(released))
+		if len(order) < len(members):
+			left = {node for node, count in pending.items() if count > 0}
+			raise LineageCycleError("Lineage contains a cycle", self.find_cycle(left) or sorted(left))
+		return order
+
+	def find_cycle(self, nodes: Optional[Iterable[int]] = None) -> Optional[List[int]]:
+		"""A cycle among `nodes` (default: the whole graph) as `[a, b, ..., a]`, or None.
+
+		Iterative depth-first search following upstream edges.
+		"""
+		members = set(self._upstream) if nodes is None else set(nodes)
+		done: Set[int] = set()
+		for start in sorted(members):
+			if start in done:
+				continue
+			path = [start]
+			on_path = {start}
+			stack = [iter(sorted(self._upstream.get(start, ())))]
+			while stack:
+				upstream = next(stack[-1], None)
+				if upstream is None:
+					stack.pop()
+					done.add(path[-1])
+					on_path.discard(path.pop())
+					continue
+				if upstream not in members or upstream in done:
+					continue
+				if upstream in on_path:
+					return path[path.index(upstream):] + [upstream]
+				path.append(upstream)
+				on_path.add(upstream)
+				stack.append(iter(sorted(self._upstream.get(upstream, ()))))
+		return None
+
+	@staticmethod
+	def _path(source: int, target: int, adjacency: Dict[int, Set[int]]) -> List[int]:
+		"""Shortest path from `source` to `target` along `adjacency`, both ends included."""
+		parents: Dict[int, int] = {}
+		queue = deque((source,))
+		while queue:
+			node = queue.popleft()
+			for neighbour in adjacency.get(node, ()):
+				if neighbour in parents:
+					continue
+				parents[neighbour] = node
+				if neighbour == target:
+					path = [target, node]
+					while path[-1] != source:
+						path.append(parents[path[-1]])
+					return list(reversed(path))
+				queue.append(neighbour)
+		return [source] if source == target else [source, target]
+
+
+def _discard(adjacency: Dict[int, Set[int]], key: int, value: int) -> None:
+	values = adjacency[key]
+	values.discard(value)
+	if not values:
+		del adjacency[key]
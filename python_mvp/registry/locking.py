@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Dict, Optional, Type
+
+# Advisory, exclusive file locks shared by every process writing a registry.
+#
+# POSIX record locks (`fcntl.lockf`) are used rather than `flock` because
+# they are the ones NFS (via lockd/NLMv4 or NFSv4) and Lustre/GPFS propagate
+# between hosts; `flock` is node-local on several of those. Record locks
+# belong to the process, not the file descriptor, so threads of one process
+# additionally serialize on an in-process lock per path. On Windows the
+# first byte of the file is locked with `msvcrt.locking`.
+
+try:
+	import fcntl
+except ImportError:  # pragma: no cover - Windows
+	fcntl = None  # type: ignore[assignment]
+	import msvcrt
+
+# How long to sleep between attempts where locking cannot block (Windows).
+POLL_INTERVAL = 0.05
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: Path) -> threading.Lock:
+	key = os.path.abspath(path)
+	with _thread_locks_guard:
+		return _thread_locks.setdefault(key, threading.Lock())
+
+
+class FileLock:
+	"""Exclusive advisory lock on `path`, created if missing; not re-entrant."""
+
+	def __init__(self, path: Path) -> None:
+		self.path = Path(path)
+		self._fd: Optional[int] = None
+		self._thread_lock = _thread_lock(self.path)
+
+	def acquire(self) -> None:
+		self._thread_lock.acquire()
+		try:
+			fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+			try:
+				_lock(fd)
+			except BaseException:
+				os.close(fd)
+				raise
+		except BaseException:
+			self._thread_lock.release()
+			raise
+		self._fd = fd
+
+	def release(self) -> None:
+		fd, self._fd = self._fd, None
+		if fd is None:
+			return
+		try:
+			_unlock(fd)
+		finally:
+			os.close(fd)
+			self._thread_lock.release()
+
+	def __enter__(self) -> FileLock:
+		self.acquire()
+		return self
+
+	def __exit__(
+		self,
+		exc_type: Optional[Type[BaseException]],
+		exc: Optional[BaseException],
+		tb: Optional[TracebackType],
+	) -> None:
+		self.release()
+
+
+def _lock(fd: int) -> None:
+	if fcntl is not None:
+		fcntl.lockf(fd, fcntl.LOCK_EX)
+		return
+	while True:  # pragma: no cover - Windows
+		try:
+			msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+			return
+		except OSError:
+			# LK_LOCK gives up after ten seconds; keep waiting like lockf.
+			time.sleep(POLL_INTERVAL)
+
+
+def _unlock(fd: int) -> None:
+	if fcntl is not None:
+		fcntl.lockf(fd, fcntl.LOCK_UN)
+	else:  # pragma: no cover - Windows
+		os.lseek(fd, 0, os.SEEK_SET)
+		msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
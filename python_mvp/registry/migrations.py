@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import json
+import re
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+# Versioned layout of the JSON snapshot (`feam_registry.json`).
+#
+# Snapshots start with a header naming their format version:
+#
+#   {
+#     "format_version": 2,
+#     "teams": [...],
+#     ...
+#
+# Files written before the header existed are version 0, which covers every
+# older layout: records without ids, and files from before metadata was
+# persisted, whose metadata used to be backfilled from the mock catalog on
+# every load. Version 1 products have no `created_at`/`updated_at`, which
+# every load used to stamp with its own time. A store upgrades an older file
+# once, under its lock, by running it through the registered migrations (see
+# `migration`); after that, loads only check the header, and `seed.py` is
+# never imported just to load.
+#
+# Migrations work on a stream of top-level sections, `(key, value)` pairs
+# where a list value is an iterator over its records, so a file is upgraded
+# record by record without holding the catalog in memory. `iter_sections`
+# and `write_sections` read and write that stream; the output has the same
+# layout as `json.dumps(data, indent=2)`.
+
+FORMAT_KEY = "format_version"
+FORMAT_VERSION = 2
+
+# The header, if present, is the first key of the file.
+_HEADER_RE = re.compile(r'\A\s*\{\s*"format_version"\s*:\s*(\d+)')
+_HEADER_BYTES = 256
+_READ_CHUNK = 1 << 16
+# Characters that can continue a JSON number.
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+Section = Tuple[str, Any]
+Migration = Callable[[Iterator[Section]], Iterator[Section]]
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+class SnapshotFormatError(ValueError):
+	"""Raised for a snapshot that cannot be read or upgraded."""
+
+
+def migration(from_version: int) -> Callable[[Migration], Migration]:
+	"""Register a step that upgrades version `from_version` sections to the next version."""
+
+	def register(step: Migration) -> Migration:
+		MIGRATIONS[from_version] = step
+		return step
+
+	return register
+
+
+# -------------------- versions --------------------
+
+
+def format_version(data: Dict[str, Any]) -> int:
+	"""The format version of a parsed snapshot."""
+	return _checked(data.get(FORMAT_KEY, 0))
+
+
+def file_format_version(path: Path) -> int:
+	"""The format version of the snapshot at `path`, read from its header alone."""
+	with open(path, "r", encoding="utf-8", errors="replace") as f:
+		match = _HEADER_RE.match(f.read(_HEADER_BYTES))
+	return _checked(int(match.group(1)) if match else 0)
+
+
+def _checked(version: Any) -> int:
+	if not isinstance(version, int) or version < 0:
+		raise SnapshotFormatError(f"Invalid snapshot format version {version!r}")
+	if version > FORMAT_VERSION:
+		raise SnapshotFormatError(
+			f"Snapshot format version {version} is newer than this feam supports ({FORMAT_VERSION}); upgrade feam"
+		)
+	return version
+
+
+def upgrade(sections: Iterable[Section], version: int) -> Iterator[Section]:
+	"""Run version `version` sections through every migration to the current format."""
+	stream = (section for section in sections if section[0] != FORMAT_KEY)
+	for step in range(version, FORMAT_VERSION):
+		stream = MIGRATIONS[step](stream)
+	yield FORMAT_KEY, FORMAT_VERSION
+	yield from stream
+
+
+def upgrade_data(data: Dict[str, Any]) -> Dict[str, Any]:
+	"""`data` in the current format; returned as is if it already is."""
+	version = format_version(data)
+	if version == FORMAT_VERSION:
+		return data
+	sections = ((key, iter(value) if isinstance(value, list) else value) for key, value in data.items())
+	return {
+		key: list(value) if isinstance(value, Iterator) else value
+		for key, value in upgrade(sections, version)
+	}
+
+
+def upgrade_file(source: TextIO, target: TextIO) -> int:
+	"""Write the snapshot read from `source` to `target` in the current format; returns its old version."""
+	prefix = source.read(_HEADER_BYTES)
+	match = _HEADER_RE.match(prefix)
+	version = _checked(int(match.group(1)) if match else 0)
+	write_sections(target, upgrade(iter_sections(source, prefix), version))
+	return version
+
+
+# -------------------- migrations --------------------
+
+
+@migration(0)
+def _add_ids_and_sections(sections: Iterator[Section]) -> Iterator[Section]:
+	"""Give every record an id, backfill missing metadata, and add empty versions and lineage.
+
+	Missing ids are assigned the way loading always assigned them: one
+	above the highest id so far. Metadata is backfilled from the mock
+	catalog (`seed.py`) for products sharing a mock product's name, as
+	loading used to do every time.
+	"""
+	seen: Dict[str, bool] = {}
+	# Products named like a mock product, for the metadata backfill.
+	named: List[Tuple[int, str]] = []
+	seeded_names: Optional[Dict[str, List[Any]]] = None
+
+	for key, value in sections:
+		seen[key] = True
+		if key in ("teams", "products", "metadata") and isinstance(value, Iterator):
+			value = _with_ids(value)
+			if key == "products":
+				if seeded_names is None:
+					seeded_names = _seed_metadata()
+				value = _noting_names(value, seeded_names, named)
+		yield key, value
+
+	for key in ("teams", "products"):
+		if key not in seen:
+			yield key, iter(())
+	if "metadata" not in seen:
+		yield "metadata", _backfilled_metadata(named, seeded_names or {})
+	for key in ("versions", "lineage"):
+		if key not in seen:
+			yield key, iter(())
+
+
+def _with_ids(records: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+	next_id = 1
+	for record in records:
+		if not isinstance(record, dict):
+			raise SnapshotFormatError(f"Malformed snapshot record {record!r}")
+		record_id = record.get("id")
+		if record_id is None:
+			record = {"id": next_id, **record}
+			record_id = next_id
+		next_id = max(next_id, record_id + 1)
+		yield record
+
+
+def _noting_names(
+	products: Iterator[Dict[str, Any]], seeded: Dict[str, List[Any]], named: List[Tuple[int, str]]
+) -> Iterator[Dict[str, Any]]:
+	for product in products:
+		if product.get("name") in seeded:
+			named.append((product["id"], product["name"]))
+		yield product
+
+
+def _seed_metadata() -> Dict[str, List[Any]]:
+	"""Mock product name -> its metadata entries."""
+	from .seed import seed_mock_data
+	from .services import Registry
+
+	seeded = Registry()
+	with seeded.untracked():
+		seed_mock_data(seeded)
+	return {product.name: list(product.metadata) for product in seeded.list_products()}
+
+
+def _backfilled_metadata(named: List[Tuple[int, str]], seeded: Dict[str, List[Any]]) -> Iterator[Dict[str, Any]]:
+	next_id = 1
+	for product_id, name in sorted(named):
+		for entry in seeded[name]:
+			yield {
+				"id": next_id,
+				"data_product_id": product_id,
+				"namespace": entry.namespace,
+				"meta_key": entry.meta_key,
+				"meta_value": entry.meta_value,
+				"value_type": entry.value_type,
+			}
+			next_id += 1
+
+
+@migration(1)
+def _add_product_timestamps(sections: Iterator[Section]) -> Iterator[Section]:
+	"""Give every product a `created_at` and `updated_at`: the time of the upgrade.
+
+	When they were added is not known, so they are stamped once with the
+	time loads used to give them, and that time is kept from then on.
+	"""
+	now = datetime.utcnow().isoformat()
+	for key, value in sections:
+		if key == "products" and isinstance(value, Iterator):
+			value = _with_timestamps(value, now)
+		yield key, value
+
+
+def _with_timestamps(products: Iterator[Dict[str, Any]], now: str) -> Iterator[Dict[str, Any]]:
+	for product in products:
+		created_at = product.get("created_at", now)
+		yield {**product, "created_at": created_at, "updated_at": product.get("updated_at", created_at)}
+
+
+# -------------------- streaming --------------------
+
+
+class _Scanner:
+	"""Reads JSON values one at a time from a text stream."""
+
+	def __init__(self, f: TextIO, prefix: str = "") -> None:
+		self._file = f
+		self._buffer = prefix
+		self._pos = 0
+		self._eof = False
+		self._decoder = json.JSONDecoder()
+
+	def _fill(self) -> bool:
+		chunk = self._file.read(_READ_CHUNK)
+		if not chunk:
+			self._eof = True
+			return False
+		self._buffer = self._buffer[self._pos:] + chunk
+		self._pos = 0
+		return True
+
+	def peek(self) -> str:
+		"""The next character that is not whitespace, without consuming it."""
+		while True:
+			while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+				self._pos += 1
+			if self._pos < len(self._buffer):
+				return self._buffer[self._pos]
+			if not self._fill():
+				raise SnapshotFormatError("Snapshot ends unexpectedly")
+
+	def take(self, expected: str) -> str:
+		char = self.peek()
+		if char not in expected:
+			raise SnapshotFormatError(f"Expected one of {expected!r} in snapshot, found {char!r}")
+		self._pos += 1
+		return char
+
+	def value(self) -> Any:
+		self.peek()
+		while True:
+			try:
+				value, end = self._decoder.raw_decode(self._buffer, self._pos)
+			except json.JSONDecodeError as exc:
+				if self._fill():
+					continue
+				raise SnapshotFormatError(f"Malformed snapshot: {exc}") from exc
+			# A number running to the end of the buffer may continue in the
+			# next chunk, also when what was read so far ends in a "." or
+			# "e" that the decoder stopped before.
+			if isinstance(value, (int, float)) and not self._eof:
+				tail = end
+				while tail < len(self._buffer) and self._buffer[tail] in _NUMBER_CHARS:
+					tail += 1
+				if tail == len(self._buffer) and self._fill():
+					continue
+			self._pos = end
+			return value
+
+	def items(self) -> Iterator[Any]:
+		"""The values of the array whose `[` was just taken."""
+		if self.peek() == "]":
+			self._pos += 1
+			return
+		while True:
+			yield self.value()
+			if self.take(",]") == "]":
+				return
+
+
+def iter_sections(f: TextIO, prefix: str = "") -> Iterator[Section]:
+	"""The top-level keys of the JSON object in `f` (preceded by `prefix`), with list values streamed.
+
+	Each list iterator must be used before asking for the next section;
+	whatever is left of it is skipped.
+	"""
+	scanner = _Scanner(f, prefix)
+	scanner.take("{")
+	if scanner.peek() == "}":
+		return
+	while True:
+		key = scanner.value()
+		scanner.take(":")
+		if scanner.peek() == "[":
+			scanner.take("[")
+			records = scanner.items()
+			yield key, records
+			deque(records, maxlen=0)
+		else:
+			yield key, scanner.value()
+		if scanner.take(",}") == "}":
+			return
+
+
+def write_sections(f: TextIO, sections: Iterable[Section]) -> None:
+	"""Write `sections` to `f` as one JSON object, laid out like `json.dumps(data, indent=2)`."""
+	f.write("{")
+	first = True
+	for key, value in sections:
+		f.write("\n  " if first else ",\n  ")
+		first = False
+		f.write(json.dumps(key) + ": ")
+		if isinstance(value, (list, Iterator)):
+			_write_records(f, value)
+		else:
+			f.write(json.dumps(value, indent=2).replace("\n", "\n  "))
+	f.write("}" if first else "\n}")
+
+
+def _write_records(f: TextIO, records: Iterable[Any]) -> None:
+	empty = True
+	for record in records:
+		f.write("[\n    " if empty else ",\n    ")
+		empty = False
+		f.write(json.dumps(record, indent=2).replace("\n", "\n    "))
+	f.write("[]" if empty else "\n  ]")
@@ -1,19 +1,28 @@
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Union
+
+if TYPE_CHECKING:
+	from .versions import PersistentMap, VersionHistory
 
 # Main data models for the registry system (not including the registry itself).
 
-@dataclass
+# `__slots__` drop the per-instance `__dict__`, which dominates memory for
+# large catalogs. `dataclass(slots=True)` needs Python 3.10+.
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class Team:
 	teams_id: int
 	name: str
 	created_at: datetime
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class MetadataEntry:
 	metadata_id: int
 	data_product_id: int
@@ -22,9 +31,12 @@ class MetadataEntry:
 	meta_value: str
 	value_type: str
 	created_at: datetime
+	# Native value parsed from `meta_value` for numeric, temporal and size
+	# types (see `typed_values`); None for plain strings.
+	typed_value: Optional[Union[int, float, datetime]] = None
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class DataProduct:
 	product_id: int
 	name: str
@@ -36,4 +48,34 @@ class DataProduct:
 	classification: str
 	created_at: datetime
 	updated_at: datetime
+	# A plain list by default; a `compact.ProductMetadata` view when the
+	# registry uses compact metadata storage.
 	metadata: List[MetadataEntry] = field(default_factory=list)
+	# Published versions (see `versions`); None until the first publish.
+	versions: Optional[VersionHistory] = None
+
+
+@dataclass(frozen=True, **_SLOTS)
+class VersionedMetadata:
+	"""A metadata entry as it was when a version was published."""
+
+	metadata_id: int
+	namespace: str
+	meta_key: str
+	meta_value: str
+	value_type: str
+
+
+@dataclass(frozen=True, **_SLOTS)
+class DataProductVersion:
+	version_id: int
+	data_product_id: int
+	version_label: str
+	data_format: str
+	access_uri: str
+	status: str
+	classification: str
+	created_at: datetime
+	# metadata_id -> VersionedMetadata, sharing unchanged entries (and trie
+	# nodes) with the product's other versions.
+	metadata: PersistentMap[int, VersionedMetadata]
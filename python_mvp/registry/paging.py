@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any, Tuple
+
+from .filters import PRODUCT_FILTER_FIELDS
+from .models import DataProduct
+
+# Keyset pagination for listing and searching products.
+#
+# Every listing has a total order: the sort field, then the product id, so
+# products with equal values never swap places between pages. A page ends
+# with a cursor naming the last product's position in that order, and the
+# next page starts strictly after it by seeking in the sorted indexes rather
+# than counting past earlier pages, so page N costs the same as page 1 and
+# products added meanwhile never shift later pages.
+#
+# Cursors are opaque to users: URL-safe base64 of `[sort, *position]`.
+
+ID = "id"
+NAME = "name"
+# Ranked full-text search: best score first, then id.
+RANK = "rank"
+SORT_FIELDS = (ID, NAME) + PRODUCT_FILTER_FIELDS
+
+Position = Tuple[Any, ...]
+
+
+class CursorError(ValueError):
+	"""Raised for a malformed cursor or one taken from a differently sorted listing."""
+
+
+def position(product: DataProduct, sort: str) -> Position:
+	"""Where `product` falls in a listing sorted by `sort`."""
+	if sort == ID:
+		return (product.product_id,)
+	return (getattr(product, sort), product.product_id)
+
+
+def rank_position(score: float, product_id: int) -> Position:
+	return (-score, product_id)
+
+
+def encode_cursor(sort: str, after: Position) -> str:
+	payload = json.dumps([sort, *after], separators=(",", ":")).encode("utf-8")
+	return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Position:
+	"""The position encoded in `cursor`, which must come from a listing sorted by `sort`."""
+	try:
+		padded = cursor.strip() + "=" * (-len(cursor.strip()) % 4)
+		decoded = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+	except (binascii.Error, UnicodeError, ValueError) as exc:
+		raise CursorError(f"Invalid cursor {cursor!r}") from exc
+	if not isinstance(decoded, list) or not decoded or decoded[0] != sort:
+		raise CursorError(f"Cursor {cursor!r} does not belong to a listing sorted by {sort}")
+	after = tuple(decoded[1:])
+	expected = 1 if sort == ID else 2
+	if len(after) != expected or not isinstance(after[-1], int):
+		raise CursorError(f"Invalid cursor {cursor!r}")
+	return after
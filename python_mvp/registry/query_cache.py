@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Set, Sized, Tuple, TypeVar
+
+from . import trace
+from .filters import NOT_EQUAL, PRODUCT_FILTER_FIELDS, TIMESTAMP_FILTER_FIELDS, Filter
+from .fuzzy import trigrams
+from .models import DataProduct
+from .text_index import tokenize
+
+# Query result cache for `Registry`.
+#
+# Dashboards and workflow polling repeat the same searches and lookups. The
+# cache keeps their results (product ids and scores, never product objects)
+# in a bounded LRU keyed by the normalized query, so `Climate  DAILY` and
+# `climate daily` share an entry.
+#
+# Every entry lists what it depends on and every mutation names what it
+# touched, so a change drops only the entries it can affect:
+#
+#   ("term", t)             ranked searches for query term t; text containing
+#                           a word touches every prefix of it, as query terms
+#                           also match as prefixes
+#   ("trigram", g)          fuzzy searches whose query contains trigram g
+#   ("product", id)         ranked searches that returned the product
+#   ("name", name)          lookups by name
+#   ("field", field, value) filters on a product field
+#   ("field", field)        `!=` filters on a product field and range filters
+#                           on a timestamp, which any new product can match
+#   ("metadata", ns, key)   filters on a metadata key
+#
+# `generation` counts mutations. A result is stored only if no mutation
+# happened while it was being computed, so it can never outlive the change
+# that made it stale. Cached rankings keep the scores they were computed
+# with: products that do not contain a query's terms only nudge the BM25
+# corpus statistics, which is not worth dropping every ranking for.
+#
+# The storage engine sets `stamp` to the files the cached results reflect, so
+# a cache can be saved next to the registry and revalidated by the next
+# process against the journal records written since (see
+# `JournalStore.load`).
+
+T = TypeVar("T")
+Dependency = Tuple[Any, ...]
+
+QUERY_CACHE_VERSION = 1
+DEFAULT_CAPACITY = 512
+# Results with more items than this are recomputed rather than cached.
+MAX_CACHED_ITEMS = 10_000
+
+
+class QueryCache:
+	"""Bounded LRU of query results with dependency-based invalidation."""
+
+	def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+		self.capacity = capacity
+		# key -> (result, dependencies), least recently used first.
+		self._entries: OrderedDict[str, Tuple[Any, Tuple[Dependency, ...]]] = OrderedDict()
+		self._dependents: Dict[Dependency, Set[str]] = {}
+		# Read commands share the daemon's registry across threads.
+		self._lock = threading.Lock()
+		self.generation = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.invalidations = 0
+		# Set by the storage engine; see the module comment.
+		self.stamp: Optional[Any] = None
+		# Whether the storage engine saves the cache for the next process, and
+		# whether there is anything new to save.
+		self.persistent = False
+		self.dirty = False
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def cached(
+		self,
+		key: str,
+		compute: Callable[[], T],
+		dependencies: Callable[[T], Iterable[Dependency]],
+	) -> T:
+		"""The result stored under `key`, or `compute()`'s, stored with its `dependencies`.
+
+		Results are shared between callers and must not be modified.
+		"""
+		if self.capacity <= 0:
+			return compute()
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				self._entries.move_to_end(key)
+				self.hits += 1
+			else:
+				self.misses += 1
+			self.dirty = True
+			generation = self.generation
+		if entry is not None:
+			trace.count("query_cache_hits", 1)
+			return entry[0]
+		trace.count("query_cache_misses", 1)
+		value = compute()
+		if not isinstance(value, Sized) or len(value) <= MAX_CACHED_ITEMS:
+			self._store(key, value, tuple(dependencies(value)), generation)
+		return value
+
+	def _store(self, key: str, value: Any, dependencies: Tuple[Dependency, ...], generation: int) -> None:
+		with self._lock:
+			if generation != self.generation:
+				# The registry changed while `value` was computed.
+				return
+			if key in self._entries:
+				self._forget(key)
+			self._entries[key] = (value, dependencies)
+			for dependency in dependencies:
+				self._dependents.setdefault(dependency, set()).add(key)
+			while len(self._entries) > self.capacity:
+				self._forget(next(iter(self._entries)))
+				self.evictions += 1
+
+	def _forget(self, key: str) -> None:
+		_, dependencies = self._entries.pop(key)
+		for dependency in dependencies:
+			keys = self._dependents.get(dependency)
+			if keys is not None:
+				keys.discard(key)
+				if not keys:
+					del self._dependents[dependency]
+
+	def invalidate(self, dependencies: Iterable[Dependency]) -> int:
+		"""Record a mutation touching `dependencies`; returns how many entries it dropped.
+
+		`dependencies` is only iterated while there are entries, so it can be
+		a generator that does real work.
+		"""
+		with self._lock:
+			self.generation += 1
+			if not self._entries:
+				return 0
+			dropped = 0
+			for dependency in dependencies:
+				keys = self._dependents.get(dependency)
+				if keys:
+					for key in list(keys):
+						self._forget(key)
+						dropped += 1
+			if dropped:
+				self.invalidations += dropped
+				self.dirty = True
+			return dropped
+
+	def clear(self) -> None:
+		"""Drop every entry, e.g. when the files it was computed from are gone."""
+		with self._lock:
+			self.generation += 1
+			if self._entries:
+				self._entries.clear()
+				self._dependents.clear()
+				self.dirty = True
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			"entries": len(self._entries),
+			"capacity": self.capacity,
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"invalidations": self.invalidations,
+			"generation": self.generation,
+		}
+
+	# -------------------- persistence --------------------
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""A JSON-ready copy: entries least recently used first, and the counters."""
+		with self._lock:
+			return {
+				"version": QUERY_CACHE_VERSION,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"invalidations": self.invalidations,
+				"entries": [
+					[key, _jsonable(value), [list(dependency) for dependency in dependencies]]
+					for key, (value, dependencies) in self._entries.items()
+				],
+			}
+
+	@classmethod
+	def from_dict(cls, data: Dict[str, Any], capacity: int = DEFAULT_CAPACITY) -> QueryCache:
+		"""The cache saved by `to_dict`; raises ValueError if it is not one."""
+		if not isinstance(data, dict) or data.get("version") != QUERY_CACHE_VERSION:
+			raise ValueError("Unsupported query cache format")
+		cache = cls(capacity)
+		try:
+			cache.hits = int(data["hits"])
+			cache.misses = int(data["misses"])
+			cache.evictions = int(data["evictions"])
+			cache.invalidations = int(data["invalidations"])
+			entries = data["entries"][-capacity:] if capacity > 0 else []
+			for key, value, dependencies in entries:
+				cache._store(str(key), value, tuple(tuple(d) for d in dependencies), cache.generation)
+		except (KeyError, TypeError) as exc:
+			raise ValueError("Malformed query cache") from exc
+		return cache
+
+
+def _jsonable(value: Any) -> Any:
+	if isinstance(value, (set, frozenset)):
+		return sorted(value)
+	return value
+
+
+# -------------------- keys --------------------
+
+
+def query_key(kind: str, *parts: Any) -> str:
+	"""The cache key of a `kind` query with normalized `parts`."""
+	return json.dumps([kind, *parts], separators=(",", ":"), ensure_ascii=False)
+
+
+def filters_key(filters: Sequence[Filter]) -> Any:
+	"""`filters` in a canonical order; they are ANDed, so order does not matter."""
+	return sorted({(f.namespace or "", f.key, f.op, f.value) for f in filters})
+
+
+# -------------------- dependencies --------------------
+
+
+def text_dependencies(text: str) -> Iterator[Dependency]:
+	"""What adding `text` to (or removing it from) a product's searchable text touches."""
+	for token in set(tokenize(text)):
+		for end in range(1, len(token) + 1):
+			yield ("term", token[:end])
+
+
+def product_dependencies(product: DataProduct) -> Iterator[Dependency]:
+	"""What creating `product` touches."""
+	yield ("name", product.name)
+	for field in PRODUCT_FILTER_FIELDS:
+		yield ("field", field, str(getattr(product, field)))
+		yield ("field", field)
+	for field in TIMESTAMP_FILTER_FIELDS:
+		yield ("field", field)
+	yield from text_dependencies(product.name)
+	yield from text_dependencies(product.description)
+	for gram in trigrams(product.name) | trigrams(product.description):
+		yield ("trigram", gram)
+
+
+def metadata_dependencies(product_id: int, namespace: str, meta_key: str, meta_value: str) -> Iterator[Dependency]:
+	"""What adding a metadata entry, or setting it to `meta_value`, touches.
+
+	The value it replaces needs no terms of its own: losing words can only
+	push the product down or out of rankings, and the rankings it is in
+	depend on its id.
+	"""
+	yield ("product", product_id)
+	yield ("metadata", namespace, meta_key)
+	yield from text_dependencies(meta_value)
+
+
+def filter_dependencies(filters: Sequence[Filter]) -> Iterator[Dependency]:
+	for f in filters:
+		if f.op == NOT_EQUAL or (f.is_product_field and f.is_range):
+			yield ("field", f.key)
+		elif f.is_product_field:
+			for value in f.values:
+				yield ("field", f.key, value)
+		else:
+			yield ("metadata", f.namespace, f.key)
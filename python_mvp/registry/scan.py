@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .storage import write_atomic
+
+# Parallel filesystem crawler behind `feam scan`.
+#
+# Lab trees on shared HPC storage are walked by a bounded pool of worker
+# threads, each listing one directory with `os.scandir`. Matchers decide
+# whether a directory is a data product (a Zarr store, a Parquet dataset, a
+# folder of netCDF or HDF5 files, ...); product directories are measured
+# (total size, file count, newest mtime) and not descended into further.
+#
+# Every listed directory is remembered in a `ScanCache` keyed by path and
+# `st_mtime_ns`. A directory's mtime changes whenever an entry is added,
+# removed or renamed in it, so on a re-scan an unchanged directory is not
+# listed again: its cached subdirectories are reused, at the cost of one
+# `stat`. Product directories are the exception. Files rewritten in place
+# (or new chunks in a nested Zarr array) do not touch the product
+# directory's mtime, so known products are measured again on every scan and
+# compared with their cached measurements; only matching is skipped.
+#
+# Parallel filesystems serve metadata from a handful of servers, so every
+# `scandir` and `stat` goes through a shared semaphore that caps how many
+# are in flight at once, independently of the number of worker threads.
+
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_METADATA_OPS = 4
+SCAN_CACHE_VERSION = 1
+
+# A matcher looks at a directory and its entries and returns the product's
+# asset type (stored as `data_format`), or None if it is not a product.
+Matcher = Callable[[str, List[os.DirEntry]], Optional[str]]
+
+MATCHERS: List[Matcher] = []
+
+
+def register_matcher(matcher: Matcher) -> Matcher:
+	"""Add `matcher` to the default matchers; usable as a decorator.
+
+	Matchers run in registration order and the first match wins.
+	"""
+	MATCHERS.append(matcher)
+	return matcher
+
+
+def _has_file_suffix(entries: List[os.DirEntry], suffixes: Tuple[str, ...]) -> bool:
+	return any(
+		entry.name.lower().endswith(suffixes) and entry.is_file(follow_symlinks=False)
+		for entry in entries
+	)
+
+
+@register_matcher
+def match_zarr(path: str, entries: List[os.DirEntry]) -> Optional[str]:
+	if path.lower().endswith(".zarr"):
+		return "zarr"
+	names = {entry.name for entry in entries}
+	if names & {".zgroup", ".zarray", "zarr.json"}:
+		return "zarr"
+	return None
+
+
+@register_matcher
+def match_delta(path: str, entries: List[os.DirEntry]) -> Optional[str]:
+	if any(e.name == "_delta_log" and e.is_dir(follow_symlinks=False) for e in entries):
+		return "delta"
+	return None
+
+
+@register_matcher
+def match_parquet(path: str, entries: List[os.DirEntry]) -> Optional[str]:
+	if path.lower().endswith(".parquet") or _has_file_suffix(entries, (".parquet", ".pq")):
+		return "parquet"
+	return None
+
+
+@register_matcher
+def match_netcdf(path: str, entries: List[os.DirEntry]) -> Optional[str]:
+	if _has_file_suffix(entries, (".nc", ".nc4", ".netcdf")):
+		return "netcdf"
+	return None
+
+
+@register_matcher
+def match_hdf5(path: str, entries: List[os.DirEntry]) -> Optional[str]:
+	if _has_file_suffix(entries, (".h5", ".hdf5", ".he5")):
+		return "hdf5"
+	return None
+
+
+# -------------------- cache --------------------
+
+
+@dataclass
+class DirRecord:
+	"""What a directory looked like at `mtime_ns`."""
+
+	mtime_ns: int
+	subdirs: List[str] = field(default_factory=list)
+	asset_type: Optional[str] = None
+	size_bytes: int = 0
+	file_count: int = 0
+	latest_mtime: float = 0.0
+
+	def to_list(self) -> list:
+		if self.asset_type is None:
+			return [self.mtime_ns, self.subdirs]
+		return [self.mtime_ns, [], self.asset_type, self.size_bytes, self.file_count, self.latest_mtime]
+
+	@classmethod
+	def from_list(cls, item: list) -> DirRecord:
+		return cls(item[0], *item[1:])
+
+
+class ScanCache:
+	"""Directory path -> `DirRecord`, persisted as JSON between scans."""
+
+	def __init__(self, path: Optional[Path] = None) -> None:
+		self.path = Path(path) if path is not None else None
+		self.records: Dict[str, DirRecord] = {}
+
+	@classmethod
+	def load(cls, path: Path) -> ScanCache:
+		cache = cls(path)
+		try:
+			with cache.path.open("r", encoding="utf-8") as f:
+				data = json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			return cache
+		if data.get("version") == SCAN_CACHE_VERSION:
+			cache.records = {
+				path: DirRecord.from_list(item) for path, item in data.get("dirs", {}).items()
+			}
+		return cache
+
+	def save(self) -> None:
+		if self.path is None:
+			return
+		payload = {
+			"version": SCAN_CACHE_VERSION,
+			"dirs": {path: record.to_list() for path, record in self.records.items()},
+		}
+		write_atomic(self.path, json.dumps(payload, separators=(",", ":")))
+
+	def prune(self, root: str, visited: Set[str]) -> int:
+		"""Forget directories under `root` that the last scan did not reach."""
+		prefix = root.rstrip(os.sep) + os.sep
+		stale = [
+			path for path in self.records
+			if (path == root or path.startswith(prefix)) and path not in visited
+		]
+		for path in stale:
+			del self.records[path]
+		return len(stale)
+
+
+# -------------------- crawling --------------------
+
+
+@dataclass
+class FoundProduct:
+	path: str
+	asset_type: str
+	size_bytes: int
+	file_count: int
+	latest_mtime: float
+	# False when the measurements match the cached scan.
+	changed: bool = True
+
+
+@dataclass
+class ScanReport:
+	root: str
+	products: List[FoundProduct] = field(default_factory=list)
+	dirs_listed: int = 0
+	dirs_skipped: int = 0
+	metadata_ops: int = 0
+	errors: List[Tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass
+class _Visit:
+	path: str
+	children: List[str] = field(default_factory=list)
+	product: Optional[FoundProduct] = None
+	listed: bool = False
+	ops: int = 0
+	error: Optional[str] = None
+
+
+class Scanner:
+	"""Crawl a directory tree in parallel and report data product directories."""
+
+	def __init__(
+		self,
+		cache: Optional[ScanCache] = None,
+		matchers: Optional[List[Matcher]] = None,
+		workers: int = DEFAULT_WORKERS,
+		max_metadata_ops: int = DEFAULT_MAX_METADATA_OPS,
+		full: bool = False,
+	) -> None:
+		if workers < 1 or max_metadata_ops < 1:
+			raise ValueError("workers and max_metadata_ops must be at least 1")
+		self.cache = cache if cache is not None else ScanCache()
+		self.matchers = list(MATCHERS if matchers is None else matchers)
+		self.workers = workers
+		self.full = full
+		self._throttle = threading.BoundedSemaphore(max_metadata_ops)
+
+	def scan(self, root: str) -> ScanReport:
+		root = os.path.abspath(root)
+		report = ScanReport(root=root)
+		visited: Set[str] = set()
+		with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="feam-scan") as pool:
+			pending: Set[Future] = {pool.submit(self._visit, root)}
+			while pending:
+				done, pending = wait(pending, return_when=FIRST_COMPLETED)
+				for future in done:
+					visit: _Visit = future.result()
+					visited.add(visit.path)
+					report.metadata_ops += visit.ops
+					if visit.error is not None:
+						report.errors.append((visit.path, visit.error))
+						continue
+					if visit.listed:
+						report.dirs_listed += 1
+					else:
+						report.dirs_skipped += 1
+					if visit.product is not None:
+						report.products.append(visit.product)
+					for child in visit.children:
+						pending.add(pool.submit(self._visit, child))
+
+		report.products.sort(key=lambda product: product.path)
+		# Directories that vanished (or became unreadable) drop out of the cache.
+		self.cache.prune(root, visited - {path for path, _ in report.errors})
+		return report
+
+	# -------------------- workers --------------------
+
+	def _visit(self, path: str) -> _Visit:
+		visit = _Visit(path)
+		try:
+			self._visit_directory(visit)
+		except OSError as exc:
+			visit.error = exc.strerror or str(exc)
+		return visit
+
+	def _visit_directory(self, visit: _Visit) -> None:
+		path = visit.path
+		with self._throttle:
+			mtime_ns = os.stat(path).st_mtime_ns
+		visit.ops += 1
+
+		cached = self.cache.records.get(path)
+		if cached is not None and cached.mtime_ns == mtime_ns and not self.full:
+			if cached.asset_type is None:
+				visit.children = [os.path.join(path, name) for name in cached.subdirs]
+				return
+			# Files rewritten in place keep the product directory's mtime, so a
+			# known product is still measured; only the matchers are skipped.
+			entries = self._list(path, visit)
+			asset_type: Optional[str] = cached.asset_type
+		else:
+			entries = self._list(path, visit)
+			visit.listed = True
+			asset_type = self._match(path, entries)
+		if asset_type is not None:
+			size_bytes, file_count, latest_mtime = self._measure(entries, visit)
+			self.cache.records[path] = DirRecord(
+				mtime_ns, [], asset_type, size_bytes, file_count, latest_mtime
+			)
+			visit.product = FoundProduct(path, asset_type, size_bytes, file_count, latest_mtime)
+			if cached is not None and cached.asset_type is not None:
+				visit.product.changed = (
+					(cached.asset_type, cached.size_bytes, cached.file_count, cached.latest_mtime)
+					!= (asset_type, size_bytes, file_count, latest_mtime)
+				)
+			return
+
+		subdirs = sorted(e.name for e in entries if e.is_dir(follow_symlinks=False))
+		self.cache.records[path] = DirRecord(mtime_ns, subdirs)
+		visit.children = [os.path.join(path, name) for name in subdirs]
+
+	def _list(self, path: str, visit: _Visit) -> List[os.DirEntry]:
+		with self._throttle:
+			with os.scandir(path) as it:
+				entries = list(it)
+		visit.ops += 1
+		return entries
+
+	def _match(self, path: str, entries: List[os.DirEntry]) -> Optional[str]:
+		for matcher in self.matchers:
+			asset_type = matcher(path, entries)
+			if asset_type:
+				return asset_type
+		return None
+
+	def _measure(self, entries: List[os.DirEntry], visit: _Visit) -> Tuple[int, int, float]:
+		"""Total size, file count and newest mtime below a product directory."""
+		size_bytes = file_count = 0
+		latest_mtime = 0.0
+		stack = [entries]
+		while stack:
+			for entry in stack.pop():
+				if entry.is_dir(follow_symlinks=False):
+					try:
+						stack.append(self._list(entry.path, visit))
+					except OSError:
+						continue
+					continue
+				if not entry.is_file(follow_symlinks=False):
+					continue
+				try:
+					with self._throttle:
+						st = entry.stat(follow_symlinks=False)
+				except OSError:
+					continue
+				visit.ops += 1
+				size_bytes += st.st_size
+				file_count += 1
+				latest_mtime = max(latest_mtime, st.st_mtime)
+		return size_bytes, file_count, latest_mtime
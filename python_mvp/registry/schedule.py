@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import bisect
+import calendar
+import heapq
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .typed_values import TEMPORAL_TYPES, epoch_seconds, parse_datetime
+
+# Refresh schedules.
+#
+# Products declare when their data is refreshed as a cron expression in
+# `technical.refresh_schedule`; publishing and scanning record when it last
+# was in `feam.refreshed_at` (UTC, like every timestamp in the registry).
+# A product is expected to refresh at the first run of its schedule after
+# its last refresh, and is stale once that moment has passed (or if no
+# refresh was ever recorded).
+#
+# Cron expressions are compiled once per distinct string into sorted run
+# times and day sets (`CronSchedule`). `RefreshIndex` keeps each scheduled
+# product in a min-heap keyed by its expected refresh, which only changes
+# when the product's schedule or last refresh does, so listing the products
+# expected by some moment (`feam due`, and `feam stale` for "now") walks the
+# top of the heap and never evaluates a schedule of a product it skips.
+
+REFRESH_SCHEDULE = ("technical", "refresh_schedule")
+REFRESHED_AT = ("feam", "refreshed_at")
+
+_EPOCH = datetime(1970, 1, 1)
+_MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+_WEEKDAY_NAMES = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+_MACROS = {
+	"@yearly": "0 0 1 1 *",
+	"@annually": "0 0 1 1 *",
+	"@monthly": "0 0 1 * *",
+	"@weekly": "0 0 * * 0",
+	"@daily": "0 0 * * *",
+	"@midnight": "0 0 * * *",
+	"@hourly": "0 * * * *",
+}
+# A schedule that can run at all runs at least once in this many months (Feb
+# 29 can be eight years apart); searches give up after it.
+_MAX_GAP_MONTHS = 9 * 12 + 1
+# Matching days are memoized per month; the memo is dropped past this size.
+_MONTH_MEMO_SIZE = 512
+_DURATION_RE = re.compile(r"(\d+)\s*([smhdw])")
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class CronSchedule:
+	"""A compiled five-field cron expression (minute hour day-of-month month day-of-week).
+
+	Supports `*`, lists, ranges, steps, month and weekday names, `7` for
+	Sunday and the `@daily`-style macros. As in Vixie cron, a day matches
+	either of a restricted day of month and day of week.
+	"""
+
+	def __init__(self, expression: str) -> None:
+		self.expression = expression
+		text = _MACROS.get(expression.strip().lower(), expression)
+		fields = text.split()
+		if len(fields) != 5:
+			raise ValueError(f"Invalid cron expression {expression!r}: expected 5 fields")
+		minutes = _parse_field(fields[0], 0, 59, ())
+		hours = _parse_field(fields[1], 0, 23, ())
+		self._days = _parse_field(fields[2], 1, 31, ())
+		self._months = _parse_field(fields[3], 1, 12, _MONTH_NAMES, offset=1)
+		self._weekdays = frozenset(day % 7 for day in _parse_field(fields[4], 0, 7, _WEEKDAY_NAMES))
+		self._any_day = fields[2].startswith("*") or fields[4].startswith("*")
+		# Minutes past midnight at which the schedule runs on a matching day.
+		self._times = sorted(hour * 60 + minute for hour in hours for minute in minutes)
+		# (year, month) -> sorted days of that month the schedule runs on.
+		self._month_days: Dict[Tuple[int, int], List[int]] = {}
+		try:
+			self.next_after(datetime(2000, 1, 1))
+		except ValueError:
+			raise ValueError(f"Cron expression {expression!r} never runs") from None
+
+	def __repr__(self) -> str:
+		return f"CronSchedule({self.expression!r})"
+
+	def _days_in(self, year: int, month: int) -> List[int]:
+		"""The days of a month the schedule runs on."""
+		days = self._month_days.get((year, month))
+		if days is None:
+			days = []
+			if month in self._months:
+				# calendar counts weekdays from Monday = 0, cron from Sunday = 0.
+				first_weekday, length = calendar.monthrange(year, month)
+				for day in range(1, length + 1):
+					in_month = day in self._days
+					on_weekday = (first_weekday + day) % 7 in self._weekdays
+					if (in_month and on_weekday) if self._any_day else (in_month or on_weekday):
+						days.append(day)
+			if len(self._month_days) >= _MONTH_MEMO_SIZE:
+				self._month_days.clear()
+			self._month_days[(year, month)] = days
+		return days
+
+	def next_after(self, moment: datetime) -> datetime:
+		"""The first run strictly after `moment`."""
+		start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+		year, month, first, minute = start.year, start.month, start.day, start.hour * 60 + start.minute
+		times = self._times
+		for _ in range(_MAX_GAP_MONTHS):
+			days = self._days_in(year, month)
+			for day in days[bisect.bisect_left(days, first):]:
+				i = bisect.bisect_left(times, minute) if day == first else 0
+				if i < len(times):
+					return datetime(year, month, day, *divmod(times[i], 60))
+			year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+			first = minute = 0
+		raise ValueError(f"Cron expression {self.expression!r} does not run after {moment:%Y-%m-%d %H:%M}")
+
+	def last_until(self, moment: datetime) -> datetime:
+		"""The latest run at or before `moment`."""
+		year, month, last, minute = moment.year, moment.month, moment.day, moment.hour * 60 + moment.minute
+		times = self._times
+		for _ in range(_MAX_GAP_MONTHS):
+			days = self._days_in(year, month)
+			for day in reversed(days[: bisect.bisect_right(days, last)]):
+				i = bisect.bisect_right(times, minute) if day == last else len(times)
+				if i > 0:
+					return datetime(year, month, day, *divmod(times[i - 1], 60))
+			year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+			last, minute = 31, 24 * 60 - 1
+		raise ValueError(f"Cron expression {self.expression!r} does not run before {moment:%Y-%m-%d %H:%M}")
+
+
+def _parse_field(text: str, lo: int, hi: int, names: Tuple[str, ...], offset: int = 0) -> FrozenSet[int]:
+	def number(token: str) -> int:
+		lowered = token.lower()
+		if lowered in names:
+			return names.index(lowered) + offset
+		if not token.isdigit():
+			raise ValueError(f"Invalid cron field {text!r}")
+		return int(token)
+
+	values = set()
+	for part in text.split(","):
+		part, slash, step_text = part.partition("/")
+		step = int(step_text) if step_text.isdigit() else 0
+		if slash and step < 1:
+			raise ValueError(f"Invalid cron step in {text!r}")
+		if part in ("*", "?"):
+			start, end = lo, hi
+		elif "-" in part:
+			first, _, last = part.partition("-")
+			start, end = number(first), number(last)
+		else:
+			start = number(part)
+			end = hi if slash else start
+		if not lo <= start <= end <= hi:
+			raise ValueError(f"Cron field {text!r} is out of range {lo}-{hi}")
+		values.update(range(start, end + 1, step or 1))
+	return frozenset(values)
+
+
+@lru_cache(maxsize=1024)
+def compile_cron(expression: str) -> CronSchedule:
+	"""The compiled `expression`, shared by every product with the same schedule."""
+	return CronSchedule(expression)
+
+
+def parse_duration(text: str) -> timedelta:
+	"""Parse durations such as `6h`, `90m`, `1d12h` or `2w`; a bare `0` is no time at all."""
+	compact = text.strip().lower().replace(" ", "")
+	if compact == "0":
+		return timedelta(0)
+	if not compact or _DURATION_RE.sub("", compact):
+		raise ValueError(f"Invalid duration {text!r}; expected e.g. 30m, 6h, 2d or 1w")
+	return timedelta(seconds=sum(int(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_RE.findall(compact)))
+
+
+def from_epoch_seconds(seconds: float) -> datetime:
+	return _EPOCH + timedelta(seconds=seconds)
+
+
+# -------------------- index --------------------
+
+
+@dataclass(frozen=True)
+class RefreshDue:
+	"""A scheduled product and when its next refresh is expected."""
+
+	product_id: int
+	schedule: str
+	refreshed_at: Optional[datetime]
+	# The first run of the schedule after `refreshed_at`; None if no refresh
+	# was ever recorded.
+	expected_at: Optional[datetime]
+
+	def is_overdue(self, now: datetime) -> bool:
+		return self.expected_at is None or self.expected_at <= now
+
+
+def due_order(due: RefreshDue) -> Tuple[datetime, int]:
+	"""Sort key of `RefreshIndex.due` results: longest overdue first."""
+	return (due.expected_at or datetime.min, due.product_id)
+
+
+class RefreshIndex:
+	"""Scheduled products in a min-heap keyed by their expected refresh.
+
+	Changing a product's schedule or last refresh pushes a new entry and
+	marks the old one dead; dead entries are dropped when they outnumber
+	the live ones.
+	"""
+
+	def __init__(self) -> None:
+		# [expected refresh (epoch seconds; -inf if never refreshed), product id, live]
+		self._heap: List[List[Any]] = []
+		self._entries: Dict[int, List[Any]] = {}
+		self._schedules: Dict[int, CronSchedule] = {}
+		self._refreshed: Dict[int, float] = {}
+		self._dead = 0
+		# product id -> (expression, error) for schedules that do not parse.
+		self.invalid: Dict[int, Tuple[str, str]] = {}
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	@classmethod
+	def build(
+		cls, schedules: Iterable[Tuple[int, str]], refreshed: Iterable[Tuple[int, float]]
+	) -> RefreshIndex:
+		"""An index of product schedules and last refreshes (epoch seconds), heapified at once."""
+		index = cls()
+		index._refreshed.update(refreshed)
+		# The last schedule listed for a product wins.
+		for product_id, expression in dict(schedules).items():
+			index._set_schedule(product_id, expression)
+			entry = index._entry(product_id)
+			if entry is not None:
+				index._heap.append(entry)
+		heapq.heapify(index._heap)
+		return index
+
+	@classmethod
+	def from_metadata(cls, rows: Iterable[Tuple[int, str, str, str, str]]) -> RefreshIndex:
+		"""An index of `(product id, namespace, meta_key, meta_value, value_type)` metadata rows."""
+		schedules: List[Tuple[int, str]] = []
+		refreshed: List[Tuple[int, float]] = []
+		for product_id, namespace, meta_key, meta_value, value_type in rows:
+			if (namespace, meta_key) == REFRESH_SCHEDULE:
+				schedules.append((product_id, meta_value))
+			elif (namespace, meta_key) == REFRESHED_AT and value_type in TEMPORAL_TYPES:
+				try:
+					refreshed.append((product_id, epoch_seconds(parse_datetime(meta_value))))
+				except ValueError:
+					pass
+		return cls.build(schedules, refreshed)
+
+	# -------------------- updates --------------------
+
+	def index_metadata(self, product_id: int, namespace: str, meta_key: str, meta_value: str, typed_value: Any) -> None:
+		"""Track a metadata entry added to (or set on) a product."""
+		key = (namespace, meta_key)
+		if key == REFRESH_SCHEDULE:
+			self._set_schedule(product_id, meta_value)
+			self._reschedule(product_id)
+		elif key == REFRESHED_AT and isinstance(typed_value, datetime):
+			self._refreshed[product_id] = epoch_seconds(typed_value)
+			self._reschedule(product_id)
+
+	def unindex_metadata(self, product_id: int, namespace: str, meta_key: str) -> None:
+		"""Forget a metadata entry about to be replaced."""
+		key = (namespace, meta_key)
+		if key == REFRESH_SCHEDULE:
+			self._schedules.pop(product_id, None)
+			self.invalid.pop(product_id, None)
+			self._reschedule(product_id)
+		elif key == REFRESHED_AT and self._refreshed.pop(product_id, None) is not None:
+			self._reschedule(product_id)
+
+	def _set_schedule(self, product_id: int, expression: str) -> None:
+		self.invalid.pop(product_id, None)
+		try:
+			self._schedules[product_id] = compile_cron(expression)
+		except ValueError as exc:
+			self._schedules.pop(product_id, None)
+			self.invalid[product_id] = (expression, str(exc))
+
+	def _entry(self, product_id: int) -> Optional[List[Any]]:
+		schedule = self._schedules.get(product_id)
+		if schedule is None:
+			return None
+		refreshed = self._refreshed.get(product_id)
+		expected = float("-inf")
+		if refreshed is not None:
+			try:
+				expected = epoch_seconds(schedule.next_after(from_epoch_seconds(refreshed)))
+			except ValueError:
+				expected = float("inf")
+		entry = [expected, product_id, True]
+		self._entries[product_id] = entry
+		return entry
+
+	def _reschedule(self, product_id: int) -> None:
+		old = self._entries.pop(product_id, None)
+		if old is not None:
+			old[2] = False
+			self._dead += 1
+		entry = self._entry(product_id)
+		if entry is not None:
+			heapq.heappush(self._heap, entry)
+		if self._dead > max(len(self._entries), 64):
+			self._heap = [entry for entry in self._heap if entry[2]]
+			heapq.heapify(self._heap)
+			self._dead = 0
+
+	# -------------------- queries --------------------
+
+	def schedule_of(self, product_id: int) -> Optional[CronSchedule]:
+		return self._schedules.get(product_id)
+
+	def due(self, until: datetime) -> List[RefreshDue]:
+		"""Products expected to refresh by `until` (including overdue ones), longest overdue first.
+
+		Only entries at or above the bound are visited: a heap node that is
+		due later than `until` hides its whole subtree.
+		"""
+		bound = epoch_seconds(until)
+		heap = self._heap
+		found = []
+		pending = [0] if heap else []
+		while pending:
+			i = pending.pop()
+			entry = heap[i]
+			if entry[0] > bound:
+				continue
+			if entry[2]:
+				found.append(entry)
+			pending.extend(child for child in (2 * i + 1, 2 * i + 2) if child < len(heap))
+		found.sort()
+		return [self._due(entry) for entry in found]
+
+	def _due(self, entry: List[Any]) -> RefreshDue:
+		expected, product_id, _ = entry
+		refreshed = self._refreshed.get(product_id)
+		return RefreshDue(
+			product_id=product_id,
+			schedule=self._schedules[product_id].expression,
+			refreshed_at=None if refreshed is None else from_epoch_seconds(refreshed),
+			expected_at=None if expected == float("-inf") else from_epoch_seconds(expected),
+		)
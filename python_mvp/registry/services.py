@@ -1,31 +1,181 @@
 from __future__ import annotations
 
+import sys
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from heapq import merge
+from itertools import chain, islice
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
-from .models import DataProduct, MetadataEntry, Team
+from .columns import COLUMNAR_MIN_PRODUCTS, ProductColumns, available as columns_available
+from .compact import MetadataRecord, MetadataStore
+from .filters import NOT_EQUAL, PRODUCT_FILTER_FIELDS, TIMESTAMP_FILTER_FIELDS, Facet, Filter
+from .fuzzy import (
+	DEFAULT_SIMILARITY,
+	DESCRIPTION,
+	NAME,
+	TrigramIndex,
+	TrigramSegment,
+	normalize,
+	search as fuzzy_search,
+	trigrams,
+)
+from .lineage import LineageGraph
+from .models import DataProduct, DataProductVersion, MetadataEntry, Team
+from .paging import ID, NAME as NAME_SORT, SORT_FIELDS, Position, rank_position
+from .query_cache import (
+	QueryCache,
+	filter_dependencies,
+	filters_key,
+	metadata_dependencies,
+	product_dependencies,
+	query_key,
+)
+from .schedule import REFRESH_SCHEDULE, REFRESHED_AT, RefreshDue, RefreshIndex
+from .text_index import MaskedSegment, TextIndex, TextSegment, search_segments, tokenize
+from .typed_values import (
+	TIME,
+	RangeIndex,
+	TypedValue,
+	epoch_seconds,
+	parse_range_literal,
+	parse_typed_value,
+	sort_key,
+)
+from .versions import MetadataRow, VersionHistory
+
+if TYPE_CHECKING:
+	from .binary_snapshot import BinarySnapshot
+
+# (kind, lowest id not used by this registry) -> id for a new record.
+IdAllocator = Callable[[str, int], int]
+
+# Filtered facet counts probe a stored id list by binary search for each
+# filtered id while there are this many times fewer filtered ids than
+# ids in the list; otherwise they scan the list.
+_PROBE_RATIO = 32
 
 
 class Registry:
-	"""In-memory data registry for the CLI MVP."""
+	"""In-memory data registry for the CLI MVP.
+
+	With `compact=True` metadata rows live in a struct-of-arrays
+	`MetadataStore` and are handed out as lightweight views, which cuts memory
+	for catalogs with millions of metadata rows.
+
+	A registry can also be backed by a memory-mapped `BinarySnapshot` (see
+	`attach_snapshot`): snapshot products are decoded only when a command
+	touches them, and queries combine the snapshot's stored indexes with the
+	in-memory ones for products added since. Changing the metadata of a
+	snapshot product moves just that product's metadata into memory.
+
+	Publishing a product freezes its current state into an immutable
+	`DataProductVersion` (see `create_version`); versions share unchanged
+	metadata with each other.
 
-	def __init__(self) -> None:
+	Lineage edges (which products a product was derived from) are indexed
+	in both directions by a `LineageGraph`, built on first use.
+
+	Search, filter and name lookup results are kept in `query_cache` (see
+	`query_cache.py`) until a mutation touches what they depend on.
+	"""
+
+	def __init__(self, compact: bool = False) -> None:
 		# Internal storage keyed by primary ID
 		self._teams: Dict[int, Team] = {}
 		self._products: Dict[int, DataProduct] = {}
 		self._metadata: Dict[int, MetadataEntry] = {}
+		self._metadata_store: Optional[MetadataStore] = MetadataStore() if compact else None
+
+		# Unique lookups used when publishing: team name -> id, access_uri -> id
+		self._team_ids_by_name: Dict[str, int] = {}
+		self._product_ids_by_uri: Dict[str, int] = {}
 
 		# Simple auto-increment counters (simulate DB primary keys)
 		self._next_team_id = 1
 		self._next_product_id = 1
 		self._next_metadata_id = 1
+		self._next_version_id = 1
+		# Shared id source for registries that other processes write to as
+		# well; called with ("team" | "product" | "metadata" | "version",
+		# lowest free id).
+		self._id_allocator: Optional[IdAllocator] = None
+		# False once a product was inserted below an existing id (records
+		# replayed from concurrent writers), so listings must sort.
+		self._products_in_order = True
+
+		# Mutations made since the last drain, in the order they happened.
+		# Storage engines append these to their journal instead of rewriting
+		# the whole catalog.
+		self._changes: List[Dict[str, Any]] = []
+		self._track_changes = True
+
+		# Full-text index over names, descriptions and metadata values. Built on
+		# the first search and maintained incrementally afterwards, so commands
+		# that never search don't pay for it.
+		self._text_index: Optional[TextIndex] = None
+		# Character trigrams of names and descriptions for `--fuzzy`, built
+		# and maintained the same way.
+		self._trigram_index: Optional[TrigramIndex] = None
+
+		# Secondary indexes for `--filter`, maintained on every insert:
+		# (namespace, meta_key) -> meta_value -> product ids, and
+		# (product field, value) -> product ids. Most metadata values belong
+		# to a single product, so those are stored as a bare id and only
+		# promoted to a set when a second product shares the value.
+		self._metadata_index: Dict[Tuple[str, str], Dict[str, Union[int, Set[int]]]] = {}
+		self._field_index: Dict[Tuple[str, str], Set[int]] = {}
+		# (namespace, meta_key, kind) -> sorted typed values for range filters.
+		self._range_index: Dict[Tuple[str, str, str], RangeIndex] = {}
+		# Timestamp field -> sorted epoch seconds, for `created_at>=...`.
+		self._timestamp_index: Dict[str, RangeIndex] = {field: RangeIndex() for field in TIMESTAMP_FILTER_FIELDS}
+		# Product fields as integer-coded arrays for filters over large
+		# catalogs (see `columns.py`); built by the first filter on a product
+		# field once the catalog has `columnar_min_products` products, and
+		# dropped when a product is added.
+		self._columns: Optional[ProductColumns] = None
+		self.columnar_min_products = COLUMNAR_MIN_PRODUCTS
+		# Refresh schedules by expected refresh (see `schedule`); built by the
+		# first `feam stale`/`feam due` and maintained afterwards.
+		self._refresh_index: Optional[RefreshIndex] = None
+
+		# Read-only base layer of products that have not been decoded yet,
+		# and the ones that have. Everything above is the in-memory layer for
+		# products created since the snapshot was written.
+		self._snapshot: Optional[BinarySnapshot] = None
+		self._snapshot_products: Dict[int, DataProduct] = {}
+		# Snapshot products whose metadata has moved to the in-memory layer
+		# (see `_edit_snapshot_product`); the snapshot's stored metadata and
+		# text postings for them are stale and skipped by queries.
+		self._edited_ids: Set[int] = set()
+
+		# product id -> metadata ids added or updated since the product's
+		# latest version, so publishing the next one only looks at those.
+		# Only known for products last published by this registry; others
+		# are compared in full once.
+		self._unversioned: Dict[int, Set[int]] = {}
+
+		# Lineage edges; loaded from the snapshot by the first command that
+		# needs them.
+		self._lineage: Optional[LineageGraph] = None
+		# True for a shard of a sharded registry (see `shards.py`), whose
+		# edges may lead upstream to products held by other shards.
+		self.external_lineage = False
+
+		# Results of repeated queries; storage engines may replace it with one
+		# saved by an earlier process.
+		self.query_cache = QueryCache()
 
 	# -------------------- creation helpers --------------------
 
-	def create_team(self, name: str) -> Team:
-		team = Team(teams_id=self._next_team_id, name=name, created_at=datetime.utcnow())
+	def create_team(self, name: str, team_id: Optional[int] = None) -> Team:
+		team_id = self._take_id("team", team_id)
+		team = Team(teams_id=team_id, name=name, created_at=datetime.utcnow())
 		self._teams[team.teams_id] = team
-		self._next_team_id += 1
+		self._team_ids_by_name.setdefault(name, team.teams_id)
+		self._record("team", id=team.teams_id, name=name)
 		return team
 
 	def create_data_product(
@@ -37,10 +187,29 @@ class Registry:
 		access_uri: str,
 		status: str,
 		classification: str,
+		product_id: Optional[int] = None,
+		created_at: Optional[datetime] = None,
+		updated_at: Optional[datetime] = None,
 	) -> DataProduct:
-		now = datetime.utcnow()
+		"""Add a product; `created_at` and `updated_at` default to now."""
+		created_at = created_at or datetime.utcnow()
 		product = DataProduct(
-			product_id=self._next_product_id,
+			product_id=self._take_id("product", product_id),
+			name=name,
+			description=description,
+			owner_team_id=owner_team_id,
+			data_format=sys.intern(data_format),
+			access_uri=access_uri,
+			status=sys.intern(status),
+			classification=sys.intern(classification),
+			created_at=created_at,
+			updated_at=updated_at or created_at,
+		)
+		self._insert_product(product)
+		self.query_cache.invalidate(product_dependencies(product))
+		self._record(
+			"product",
+			id=product.product_id,
 			name=name,
 			description=description,
 			owner_team_id=owner_team_id,
@@ -48,11 +217,9 @@ class Registry:
 			access_uri=access_uri,
 			status=status,
 			classification=classification,
-			created_at=now,
-			updated_at=now,
+			created_at=product.created_at.isoformat(),
+			updated_at=product.updated_at.isoformat(),
 		)
-		self._products[product.product_id] = product
-		self._next_product_id += 1
 		return product
 
 	def add_metadata(
@@ -62,42 +229,936 @@ class Registry:
 		meta_key: str,
 		meta_value: str,
 		value_type: str,
-	) -> MetadataEntry:
-		if data_product_id not in self._products:
+		metadata_id: Optional[int] = None,
+	) -> MetadataRecord:
+		if self._in_snapshot(data_product_id):
+			self._edit_snapshot_product(data_product_id)
+		elif data_product_id not in self._products:
 			raise ValueError(f"Unknown data_product_id {data_product_id}")
 
-		entry = MetadataEntry(
-			metadata_id=self._next_metadata_id,
+		metadata_id = self._take_id("metadata", metadata_id)
+		entry = self._insert_metadata(
+			metadata_id, data_product_id, namespace, meta_key, meta_value, value_type
+		)
+		self._mark_unversioned(data_product_id, metadata_id)
+		self.query_cache.invalidate(metadata_dependencies(data_product_id, namespace, meta_key, meta_value))
+		self._record(
+			"metadata",
+			id=metadata_id,
 			data_product_id=data_product_id,
 			namespace=namespace,
 			meta_key=meta_key,
 			meta_value=meta_value,
 			value_type=value_type,
-			created_at=datetime.utcnow(),
 		)
-		self._metadata[entry.metadata_id] = entry
+		return entry
+
+	def update_metadata(self, metadata_id: int, meta_value: str, value_type: str) -> MetadataRecord:
+		"""Replace the value (and type) of an existing metadata entry."""
+		entry = self._memory_metadata(metadata_id)
+		if entry is None and self._snapshot is not None:
+			product_id = self._snapshot.metadata_product_id(metadata_id)
+			if product_id is not None:
+				self._edit_snapshot_product(product_id)
+				entry = self._memory_metadata(metadata_id)
+		if entry is None:
+			raise ValueError(f"Unknown metadata_id {metadata_id}")
 
-		# Maintain bidirectional relationship:
-		# - global metadata registry
-		# - product-local metadata list
-		self._products[data_product_id].metadata.append(entry)
-		self._next_metadata_id += 1
+		value_type = sys.intern(value_type)
+		typed_value = parse_typed_value(meta_value, value_type)
+		product_id = entry.data_product_id
+		self._unindex_metadata(
+			product_id, entry.namespace, entry.meta_key, entry.meta_value, entry.typed_value
+		)
+		if self._metadata_store is not None:
+			entry = self._metadata_store.update(metadata_id, meta_value, value_type, typed_value)
+		else:
+			entry.meta_value = meta_value
+			entry.value_type = value_type
+			entry.typed_value = typed_value
+		self._index_metadata(product_id, entry.namespace, entry.meta_key, meta_value, typed_value)
+		self._mark_unversioned(product_id, metadata_id)
+		self.query_cache.invalidate(metadata_dependencies(product_id, entry.namespace, entry.meta_key, meta_value))
+		self._record(
+			"metadata_update",
+			id=metadata_id,
+			meta_value=meta_value,
+			value_type=value_type,
+		)
 		return entry
 
+	def set_metadata(
+		self,
+		data_product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		value_type: str,
+	) -> MetadataRecord:
+		"""Update the product's `namespace.meta_key` entry, adding it if missing."""
+		if self._in_snapshot(data_product_id):
+			self._edit_snapshot_product(data_product_id)
+		product = self.get_product(data_product_id)
+		if product is None:
+			raise ValueError(f"Unknown data_product_id {data_product_id}")
+		for entry in product.metadata:
+			if entry.namespace == namespace and entry.meta_key == meta_key:
+				if entry.meta_value == meta_value and entry.value_type == value_type:
+					return entry
+				return self.update_metadata(entry.metadata_id, meta_value, value_type)
+		return self.add_metadata(data_product_id, namespace, meta_key, meta_value, value_type)
+
+	def create_version(self, data_product_id: int, version_label: Optional[str] = None) -> DataProductVersion:
+		"""Publish the product's current fields and metadata as a new immutable version.
+
+		Only metadata that changed since the previous version is stored anew;
+		the rest is shared with it. `version_label` defaults to the version's
+		number ("1", "2", ...).
+		"""
+		product = self.get_product(data_product_id)
+		if product is None:
+			raise ValueError(f"Unknown data_product_id {data_product_id}")
+		history = product.versions
+		latest = history.latest if history is not None else None
+
+		changed: List[MetadataRow] = []
+		removed: List[int] = []
+		pending = self._unversioned.get(data_product_id) if latest is not None else None
+		entries: Iterable[Optional[MetadataRecord]]
+		if pending is None:
+			entries = product.metadata
+			if latest is not None:
+				current = {m.metadata_id for m in product.metadata}
+				removed = sorted(metadata_id for metadata_id in latest.metadata if metadata_id not in current)
+		else:
+			ids = sorted(pending)
+			entries = [self.get_metadata(metadata_id) for metadata_id in ids]
+			removed = [metadata_id for metadata_id, m in zip(ids, entries) if m is None]
+		for m in entries:
+			if m is None:
+				continue
+			old = latest.metadata.get(m.metadata_id) if latest is not None else None
+			if old is not None and old.meta_value == m.meta_value and old.value_type == m.value_type:
+				continue
+			changed.append((m.metadata_id, m.namespace, m.meta_key, m.meta_value, m.value_type))
+
+		if version_label is None:
+			version_label = history.next_label() if history is not None else "1"
+		return self.add_version(
+			data_product_id,
+			version_label,
+			data_format=product.data_format,
+			access_uri=product.access_uri,
+			status=product.status,
+			classification=product.classification,
+			changed=changed,
+			removed=removed,
+		)
+
+	def add_version(
+		self,
+		data_product_id: int,
+		version_label: str,
+		data_format: str,
+		access_uri: str,
+		status: str,
+		classification: str,
+		changed: Sequence[MetadataRow],
+		removed: Sequence[int] = (),
+		created_at: Optional[datetime] = None,
+		version_id: Optional[int] = None,
+	) -> DataProductVersion:
+		"""Append a version given as a delta against the product's latest version."""
+		product = self.get_product(data_product_id)
+		if product is None:
+			raise ValueError(f"Unknown data_product_id {data_product_id}")
+		if product.versions is None:
+			product.versions = VersionHistory()
+		if product.versions.get(version_label) is not None:
+			raise ValueError(f"Data product {product.name!r} already has version {version_label!r}")
+
+		if self._track_changes:
+			self._unversioned[data_product_id] = set()
+		else:
+			# Replayed from disk: changes made after it may not have been seen.
+			self._unversioned.pop(data_product_id, None)
+		version = product.versions.append_delta(
+			version_id=self._take_id("version", version_id),
+			data_product_id=data_product_id,
+			version_label=version_label,
+			data_format=data_format,
+			access_uri=access_uri,
+			status=status,
+			classification=classification,
+			created_at=created_at or datetime.utcnow(),
+			changed=changed,
+			removed=removed,
+		)
+		self._record(
+			"version",
+			id=version.version_id,
+			data_product_id=data_product_id,
+			label=version_label,
+			data_format=data_format,
+			access_uri=access_uri,
+			status=status,
+			classification=classification,
+			created_at=version.created_at.isoformat(),
+			changed=[list(row) for row in changed],
+			removed=list(removed),
+		)
+		return version
+
+	def _mark_unversioned(self, product_id: int, metadata_id: int) -> None:
+		pending = self._unversioned.get(product_id)
+		if pending is not None:
+			pending.add(metadata_id)
+
+	# -------------------- lineage --------------------
+
+	def add_lineage(self, downstream_id: int, upstream_id: int) -> bool:
+		"""Record that `downstream_id` is derived from `upstream_id`; False if already known.
+
+		Raises `LineageCycleError` (a ValueError) if the edge would close a
+		cycle. Replayed records are not checked: concurrent writers may each
+		have added half of one.
+		"""
+		for product_id in (downstream_id,) if self.external_lineage else (downstream_id, upstream_id):
+			if not self._has_product(product_id):
+				raise ValueError(f"Unknown data_product_id {product_id}")
+		added = self._lineage_graph().add_edge(downstream_id, upstream_id, check=self._track_changes)
+		if added:
+			self._record("lineage", downstream=downstream_id, upstream=upstream_id)
+		return added
+
+	def remove_lineage(self, downstream_id: int, upstream_id: int) -> bool:
+		"""Forget that `downstream_id` is derived from `upstream_id`; False if it was not."""
+		removed = self._lineage_graph().remove_edge(downstream_id, upstream_id)
+		if removed:
+			self._record("lineage_remove", downstream=downstream_id, upstream=upstream_id)
+		return removed
+
+	def list_lineage(self) -> List[Tuple[int, int]]:
+		"""Every `(downstream id, upstream id)` edge, sorted."""
+		return list(self._lineage_graph().edges())
+
+	def upstream_ids(self, product_id: int, transitive: bool = True) -> Set[int]:
+		"""Ids of the products `product_id` is derived from (directly, without `transitive`)."""
+		graph = self._lineage_graph()
+		return set(graph.upstream(product_id) if transitive else graph.direct_upstream(product_id))
+
+	def downstream_ids(self, product_id: int, transitive: bool = True) -> Set[int]:
+		"""Ids of the products derived from `product_id` (directly, without `transitive`)."""
+		graph = self._lineage_graph()
+		return set(graph.downstream(product_id) if transitive else graph.direct_downstream(product_id))
+
+	def impact_order(self, product_id: int) -> List[int]:
+		"""Ids of everything to recompute if `product_id` changes, inputs first.
+
+		Raises `LineageCycleError` if the affected products form a cycle.
+		"""
+		return self._lineage_graph().impact(product_id)
+
+	def _lineage_graph(self) -> LineageGraph:
+		if self._lineage is None:
+			# Only publish the graph once every snapshot edge is in, or
+			# concurrent daemon readers memoize closures of a partial graph.
+			graph = LineageGraph()
+			if self._snapshot is not None:
+				for downstream_id, upstream_id in self._snapshot.lineage_edges():
+					graph.add_edge(downstream_id, upstream_id, check=False)
+			self._lineage = graph
+		return self._lineage
+
+	def _has_product(self, product_id: int) -> bool:
+		return product_id in self._products or self._in_snapshot(product_id)
+
+	def _take_id(self, kind: str, requested: Optional[int]) -> int:
+		"""The id for a new team, product or metadata entry.
+
+		Replayed records bring their own id. New ones come from the shared
+		allocator when there is one, so concurrent writers never collide.
+		"""
+		attribute = f"_next_{kind}_id"
+		next_id = getattr(self, attribute)
+		if requested is None:
+			if self._id_allocator is not None and self._track_changes:
+				requested = self._id_allocator(kind, next_id)
+			else:
+				requested = next_id
+		setattr(self, attribute, max(next_id, requested + 1))
+		return requested
+
+	def next_ids(self) -> Dict[str, int]:
+		"""The lowest id above every team, product and metadata entry."""
+		return {
+			"team": self._next_team_id,
+			"product": self._next_product_id,
+			"metadata": self._next_metadata_id,
+			"version": self._next_version_id,
+		}
+
+	def set_id_allocator(self, allocator: Optional[IdAllocator]) -> None:
+		"""Take ids for new records from `allocator` (see `storage.IdAllocator`)."""
+		self._id_allocator = allocator
+
+	def _insert_product(self, product: DataProduct) -> None:
+		"""Store `product` under its id and add it to the in-memory indexes."""
+		product_id = product.product_id
+		if self._products and product_id < next(reversed(self._products)):
+			self._products_in_order = False
+		product.metadata = (
+			self._metadata_store.product_metadata(product_id)
+			if self._metadata_store is not None
+			else []
+		)
+		self._products[product_id] = product
+		self._product_ids_by_uri.setdefault(product.access_uri, product_id)
+		for field in PRODUCT_FILTER_FIELDS:
+			key = (field, str(getattr(product, field)))
+			self._field_index.setdefault(key, set()).add(product_id)
+		for field, index in self._timestamp_index.items():
+			index.add(epoch_seconds(getattr(product, field)), product_id)
+		self._columns = None
+		if self._text_index is not None:
+			self._index_product_text(self._text_index, product)
+		if self._trigram_index is not None:
+			self._index_product_trigrams(self._trigram_index, product)
+
+	def _insert_metadata(
+		self,
+		metadata_id: int,
+		data_product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		value_type: str,
+	) -> MetadataRecord:
+		# Namespaces, keys and types come from a tiny vocabulary; share one
+		# string object per distinct value instead of one per row.
+		namespace = sys.intern(namespace)
+		meta_key = sys.intern(meta_key)
+		value_type = sys.intern(value_type)
+		typed_value = parse_typed_value(meta_value, value_type)
+
+		entry: MetadataRecord
+		if self._metadata_store is not None:
+			# The store links the row to its product's metadata view.
+			entry = self._metadata_store.append(
+				metadata_id,
+				data_product_id,
+				namespace,
+				meta_key,
+				meta_value,
+				value_type,
+				datetime.utcnow(),
+				typed_value,
+			)
+		else:
+			entry = MetadataEntry(
+				metadata_id=metadata_id,
+				data_product_id=data_product_id,
+				namespace=namespace,
+				meta_key=meta_key,
+				meta_value=meta_value,
+				value_type=value_type,
+				created_at=datetime.utcnow(),
+				typed_value=typed_value,
+			)
+			self._metadata[metadata_id] = entry
+
+			# Maintain bidirectional relationship:
+			# - global metadata registry
+			# - product-local metadata list
+			product = self._products.get(data_product_id) or self._snapshot_products[data_product_id]
+			product.metadata.append(entry)
+		self._index_metadata(data_product_id, namespace, meta_key, meta_value, typed_value)
+		return entry
+
+	# -------------------- binary snapshot --------------------
+
+	def attach_snapshot(self, snapshot: BinarySnapshot) -> None:
+		"""Serve the catalog in `snapshot` lazily from an empty registry."""
+		if self._teams or self._products or self._snapshot is not None:
+			raise ValueError("A snapshot can only be attached to an empty registry")
+		now = datetime.utcnow()
+		for team_id, name in snapshot.teams:
+			self._teams[team_id] = Team(teams_id=team_id, name=name, created_at=now)
+			self._team_ids_by_name.setdefault(name, team_id)
+		self._next_team_id = snapshot.next_team_id
+		self._next_product_id = snapshot.next_product_id
+		self._next_metadata_id = snapshot.next_metadata_id
+		self._next_version_id = snapshot.next_version_id
+		self._snapshot = snapshot
+
+	def _in_snapshot(self, product_id: int) -> bool:
+		return self._snapshot is not None and self._snapshot.has_product(product_id)
+
+	def _snapshot_product(self, product_id: int) -> Optional[DataProduct]:
+		if self._snapshot is None:
+			return None
+		product = self._snapshot_products.get(product_id)
+		if product is None:
+			product = self._snapshot.product(product_id)
+			if product is not None:
+				self._snapshot_products[product_id] = product
+		return product
+
+	def _edit_snapshot_product(self, product_id: int) -> None:
+		"""Move a snapshot product's metadata into the in-memory layer so it can change.
+
+		The snapshot's stored indexes cannot be edited, so the product's
+		metadata rows and text are indexed in memory instead, and queries
+		skip what the snapshot stored for it. Its fields stay in the
+		snapshot: metadata writes never change them. Everything is folded
+		back into a fresh snapshot on the next compaction.
+		"""
+		if product_id in self._edited_ids:
+			return
+		product = self._snapshot_product(product_id)
+		rows = [(m.metadata_id, m.namespace, m.meta_key, m.meta_value, m.value_type) for m in product.metadata]
+		self._edited_ids.add(product_id)
+		product.metadata = (
+			self._metadata_store.product_metadata(product_id)
+			if self._metadata_store is not None
+			else []
+		)
+		if self._text_index is not None:
+			self._index_product_text(self._text_index, product)
+		for metadata_id, namespace, meta_key, meta_value, value_type in rows:
+			self._insert_metadata(metadata_id, product_id, namespace, meta_key, meta_value, value_type)
+
+	@property
+	def compact(self) -> bool:
+		"""Whether metadata lives in a `MetadataStore`."""
+		return self._metadata_store is not None
+
+	# -------------------- change tracking --------------------
+
+	def _record(self, op: str, **fields: Any) -> None:
+		if self._track_changes:
+			self._changes.append({"op": op, **fields})
+
+	@contextmanager
+	def untracked(self) -> Iterator[None]:
+		"""Apply mutations without recording them, e.g. while loading from disk."""
+		previous, self._track_changes = self._track_changes, False
+		try:
+			yield
+		finally:
+			self._track_changes = previous
+
+	def drain_changes(self) -> List[Dict[str, Any]]:
+		"""Return the mutations recorded since the last call and forget them."""
+		changes, self._changes = self._changes, []
+		return changes
+
 	# -------------------- query helpers --------------------
 
 	def list_teams(self) -> List[Team]:
-		return list(self._teams.values())
+		return sorted(self._teams.values(), key=attrgetter("teams_id"))
 
 	def list_products(self) -> List[DataProduct]:
-		return list(self._products.values())
+		products: Sequence[DataProduct] = list(self._products.values())
+		if not self._products_in_order:
+			products = sorted(products, key=attrgetter("product_id"))
+		if self._snapshot is None:
+			return list(products)
+		snapshot_products = (self._snapshot_product(product_id) for product_id in self._snapshot.product_ids)
+		return list(merge(snapshot_products, products, key=attrgetter("product_id")))
+
+	def iter_products(
+		self,
+		filters: Sequence[Filter] = (),
+		sort: str = ID,
+		after: Optional[Position] = None,
+	) -> Iterator[DataProduct]:
+		"""Products matching `filters`, ordered by `sort` then id, from just after `after`.
+
+		A generator over the sorted indexes: it starts at `after` by binary
+		search and decodes snapshot products one at a time without caching
+		them, so the first product comes at once and memory stays flat
+		however many are listed.
+		"""
+		if sort not in SORT_FIELDS:
+			raise ValueError(f"Cannot sort products by {sort!r}")
+		allowed = self.filter_product_ids(filters) if filters else None
+		if sort == ID:
+			for product_id in self._ids_after(after[0] if after is not None else None, allowed):
+				yield self._peek_product(product_id)
+		elif sort == NAME_SORT:
+			for product in self._products_by_name(after):
+				if allowed is None or product.product_id in allowed:
+					yield product
+		else:
+			for product in self._products_by_field(sort, after):
+				if allowed is None or product.product_id in allowed:
+					yield product
+
+	def _ids_after(self, after: Optional[int], allowed: Optional[Set[int]]) -> Iterator[int]:
+		if allowed is not None:
+			ids = sorted(allowed)
+			return iter(ids[bisect_right(ids, after):] if after is not None else ids)
+		memory_ids: List[int] = list(self._products) if self._products_in_order else sorted(self._products)
+		start = bisect_right(memory_ids, after) if after is not None else 0
+		sources: List[Iterable[int]] = [islice(memory_ids, start, None)]
+		if self._snapshot is not None:
+			snapshot_ids = self._snapshot.product_ids
+			start = bisect_right(snapshot_ids, after) if after is not None else 0
+			sources.append(islice(snapshot_ids, start, None))
+		return merge(*sources)
+
+	def _products_by_name(self, after: Optional[Position]) -> Iterator[DataProduct]:
+		entries = sorted((p.name, p.product_id) for p in self._products.values())
+		start = bisect_right(entries, tuple(after)) if after is not None else 0
+		memory = (self._products[product_id] for _, product_id in islice(entries, start, None))
+		if self._snapshot is None:
+			return memory
+		stored = (self._peek_product(product_id) for product_id in self._snapshot.ids_by_name(after))
+		return merge(memory, stored, key=attrgetter("name", "product_id"))
+
+	def _products_by_field(self, field: str, after: Optional[Position]) -> Iterator[DataProduct]:
+		# Equality-filter indexes double as sort indexes: walk the field's
+		# values in order and each value's ids ascending.
+		convert: Callable[[str], Any] = int if field == "owner_team_id" else str
+		values = {value for key, value in self._field_index if key == field and self._field_index[(key, value)]}
+		if self._snapshot is not None:
+			values.update(self._snapshot.field_values(field))
+		for value in sorted(values, key=convert):
+			if after is not None and convert(value) < after[0]:
+				continue
+			ids: Iterable[int] = sorted(self._field_index.get((field, value), ()))
+			if self._snapshot is not None:
+				ids = merge(ids, self._snapshot.field_ids(field, value))
+			for product_id in ids:
+				if after is not None and (convert(value), product_id) <= tuple(after):
+					continue
+				product = self._peek_product(product_id)
+				if product is not None and str(getattr(product, field)) == value:
+					yield product
+
+	def _peek_product(self, product_id: int) -> Optional[DataProduct]:
+		"""`get_product` without caching decoded snapshot products, for streaming."""
+		product = self._products.get(product_id) or self._snapshot_products.get(product_id)
+		if product is None and self._snapshot is not None:
+			product = self._snapshot.product(product_id)
+		return product
 
 	def get_team(self, team_id: int) -> Optional[Team]:
 		return self._teams.get(team_id)
 
 	def get_product(self, product_id: int) -> Optional[DataProduct]:
-		return self._products.get(product_id)
+		product = self._products.get(product_id)
+		return product if product is not None else self._snapshot_product(product_id)
+
+	def get_product_by_name(self, name: str) -> Optional[DataProduct]:
+		"""The lowest-id product called `name`, if any."""
+		product_id = self.query_cache.cached(
+			query_key("name", name),
+			lambda: self._product_id_by_name(name),
+			lambda _: [("name", name)],
+		)
+		return self.get_product(product_id) if product_id is not None else None
+
+	def _product_id_by_name(self, name: str) -> Optional[int]:
+		if self._snapshot is not None:
+			product_id = self._snapshot.product_id_by_name(name)
+			if product_id is not None:
+				return product_id
+		return next((p.product_id for p in self._products.values() if p.name == name), None)
+
+	def list_versions(self, product_id: int) -> List[DataProductVersion]:
+		"""The product's versions, oldest first; their metadata is shared, not copied."""
+		product = self.get_product(product_id)
+		return list(product.versions) if product is not None and product.versions is not None else []
+
+	def get_version(self, product_id: int, version_label: Optional[str] = None) -> Optional[DataProductVersion]:
+		"""The version labelled `version_label`, or the latest one."""
+		product = self.get_product(product_id)
+		if product is None or product.versions is None:
+			return None
+		if version_label is None:
+			return product.versions.latest
+		return product.versions.get(version_label)
+
+	def get_team_by_name(self, name: str) -> Optional[Team]:
+		team_id = self._team_ids_by_name.get(name)
+		return self._teams[team_id] if team_id is not None else None
+
+	def get_product_by_uri(self, access_uri: str) -> Optional[DataProduct]:
+		if self._snapshot is not None:
+			product_id = self._snapshot.product_id_by_uri(access_uri)
+			if product_id is not None:
+				return self._snapshot_product(product_id)
+		product_id = self._product_ids_by_uri.get(access_uri)
+		return self._products[product_id] if product_id is not None else None
+
+	def get_metadata(self, metadata_id: int) -> Optional[MetadataRecord]:
+		entry = self._memory_metadata(metadata_id)
+		if entry is not None or self._snapshot is None:
+			return entry
+		product_id = self._snapshot.metadata_product_id(metadata_id)
+		if product_id is None:
+			return None
+		product = self._snapshot_product(product_id)
+		return next((m for m in product.metadata if m.metadata_id == metadata_id), None)
+
+	def _memory_metadata(self, metadata_id: int) -> Optional[MetadataRecord]:
+		if self._metadata_store is not None:
+			return self._metadata_store.get(metadata_id)
+		return self._metadata.get(metadata_id)
+
+	def _all_product_ids(self) -> Set[int]:
+		ids = set(self._products)
+		if self._snapshot is not None:
+			ids.update(self._snapshot.product_ids)
+		return ids
 
 	def search_products_by_name(self, term: str) -> List[DataProduct]:
 		term_lower = term.lower()
-		return [p for p in self._products.values() if term_lower in p.name.lower()]
+		return [p for p in self.iter_products() if term_lower in p.name.lower()]
+
+	def search_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		filters: Sequence[Filter] = (),
+	) -> List[DataProduct]:
+		"""Ranked full-text search over names, descriptions and metadata values.
+
+		`filters` restrict the results to products matching every filter. With
+		an empty query the filtered products are returned in id order.
+		"""
+		if not query.strip():
+			return list(islice(self.iter_products(filters), limit))
+		return [product for product, _ in self.rank_products(query, limit, match_all, filters)]
+
+	def rank_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		filters: Sequence[Filter] = (),
+		after: Optional[Position] = None,
+	) -> List[Tuple[DataProduct, Position]]:
+		"""`search_products` with each product's rank position, for paging with `after`."""
+		tokens = list(dict.fromkeys(tokenize(query)))
+
+		def rank() -> List[Tuple[int, float]]:
+			allowed = self.filter_product_ids(filters) if filters else None
+			return search_segments(
+				self.text_segments(), query, limit=limit, match_all=match_all, restrict=allowed, after=after
+			)
+
+		def dependencies(hits: List[Tuple[int, float]]) -> Iterator[Tuple[Any, ...]]:
+			yield from (("term", token) for token in tokens)
+			yield from filter_dependencies(filters)
+			yield from (("product", product_id) for product_id, _ in hits)
+
+		key = query_key("rank", tokens, limit, match_all, filters_key(filters), after)
+		hits = self.query_cache.cached(key, rank, dependencies)
+		return [(self.get_product(product_id), rank_position(score, product_id)) for product_id, score in hits]
+
+	def fuzzy_search_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		similarity: float = DEFAULT_SIMILARITY,
+		descriptions: bool = False,
+		filters: Sequence[Filter] = (),
+	) -> List[Tuple[DataProduct, int]]:
+		"""Typo-tolerant search over names (and `descriptions`), closest first.
+
+		Returns `(product, edit distance)` pairs for products sharing at
+		least `similarity` of the query's character trigrams.
+		"""
+		def text_of(product_id: int, field: str) -> str:
+			return getattr(self.get_product(product_id), field)
+
+		def search() -> List[Tuple[int, int]]:
+			allowed = self.filter_product_ids(filters) if filters else None
+			return fuzzy_search(
+				self.trigram_segments(),
+				query,
+				text_of,
+				fields=(NAME, DESCRIPTION) if descriptions else (NAME,),
+				similarity=similarity,
+				limit=limit,
+				restrict=allowed,
+			)
+
+		def dependencies(_: List[Tuple[int, int]]) -> Iterator[Tuple[Any, ...]]:
+			yield from (("trigram", gram) for gram in trigrams(query))
+			yield from filter_dependencies(filters)
+
+		key = query_key("fuzzy", normalize(query), limit, similarity, descriptions, filters_key(filters))
+		hits = self.query_cache.cached(key, search, dependencies)
+		return [(self.get_product(product_id), distance) for product_id, distance in hits]
+
+	def text_segments(self) -> List[TextSegment]:
+		"""The full-text index over this registry's products, one segment per layer."""
+		segments: List[TextSegment] = [self._ensure_text_index()]
+		if self._snapshot is not None:
+			stored: TextSegment = self._snapshot.text
+			segments.append(MaskedSegment(stored, self._edited_ids) if self._edited_ids else stored)
+		return segments
+
+	def trigram_segments(self) -> List[TrigramSegment]:
+		"""The trigram index over this registry's products, one segment per layer."""
+		segments: List[TrigramSegment] = [self._ensure_trigram_index()]
+		if self._snapshot is not None:
+			segments.append(self._snapshot.trigrams)
+		return segments
+
+	def filter_product_ids(self, filters: Sequence[Filter]) -> Set[int]:
+		"""Ids of products matching every filter, intersecting smallest sets first."""
+		if not filters:
+			return self._all_product_ids()
+		ids = self.query_cache.cached(
+			query_key("filter", filters_key(filters)),
+			lambda: self._filter_product_ids(filters),
+			lambda _: filter_dependencies(filters),
+		)
+		return set(ids)
+
+	def facet_counts(self, facet: Facet, filters: Sequence[Filter] = ()) -> Dict[str, int]:
+		"""Value -> number of products with it, among the products matching `filters`.
+
+		The counts are the sizes of the equality-filter indexes, which every
+		insert keeps current, and of the snapshot's stored id lists, so no
+		product is decoded. With filters, each value's ids are intersected
+		with the filtered id set.
+		"""
+		allowed = self.filter_product_ids(filters) if filters else None
+		counts: Dict[str, int] = {}
+		for value, ids in self._facet_postings(facet):
+			count = len(ids) if allowed is None else _count_allowed(ids, allowed)
+			if count:
+				counts[value] = counts.get(value, 0) + count
+		return counts
+
+	def _facet_postings(self, facet: Facet) -> Iterator[Tuple[str, Union[Set[int], Sequence[int]]]]:
+		if facet.is_product_field:
+			for (field, value), ids in self._field_index.items():
+				if field == facet.key:
+					yield value, ids
+			if self._snapshot is not None:
+				yield from self._snapshot.field_postings(facet.key)
+			return
+		for value, ids in self._metadata_index.get((facet.namespace, facet.key), {}).items():
+			yield value, ids if isinstance(ids, set) else (ids,)
+		if self._snapshot is not None:
+			yield from self._snapshot_metadata_values(facet.namespace, facet.key)
+
+	def _snapshot_metadata_values(self, namespace: str, meta_key: str) -> Iterator[Tuple[str, Sequence[int]]]:
+		"""`BinarySnapshot.metadata_values` without the edited products."""
+		for value, ids in self._snapshot.metadata_values(namespace, meta_key):
+			if self._edited_ids:
+				ids = [product_id for product_id in ids if product_id not in self._edited_ids]
+			if ids:
+				yield value, ids
+
+	def refresh_due(self, until: datetime) -> List[RefreshDue]:
+		"""Scheduled products expected to refresh by `until`, longest overdue first."""
+		return self._ensure_refresh_index().due(until)
+
+	def invalid_refresh_schedules(self) -> Dict[int, Tuple[str, str]]:
+		"""Product id -> (schedule, error) for schedules that do not parse."""
+		return dict(self._ensure_refresh_index().invalid)
+
+	def _filter_product_ids(self, filters: Sequence[Filter]) -> Set[int]:
+		# One value of a product field is already an index set; several, `!=`
+		# or a timestamp range are cheaper as column comparisons.
+		if any(f.op == NOT_EQUAL or f.is_range or len(f.values) > 1 for f in filters if f.is_product_field):
+			columns = self._ensure_columns()
+			if columns is not None:
+				return columns.select(filters, self._filter_matches)
+		candidates = sorted((self._filter_matches(f) for f in filters), key=len)
+		result = set(candidates[0])
+		for ids in candidates[1:]:
+			if not result:
+				break
+			result.intersection_update(ids)
+		return result
+
+	def _filter_matches(self, f: Filter) -> Set[int]:
+		if f.is_product_field and f.is_range:
+			return self._timestamp_matches(f)
+		if f.is_product_field:
+			matches = self._field_matches(f.key, f.values[0])
+			for value in f.values[1:]:
+				matches = matches.union(self._field_matches(f.key, value))
+			return self._all_product_ids() - matches if f.op == NOT_EQUAL else matches
+		matches = self._memory_filter_matches(f)
+		if self._snapshot is None:
+			return matches
+		if f.is_range:
+			kind, key = parse_range_literal(f.value)
+			stored = self._snapshot.range_select(f.namespace, f.key, kind, f.op, key)
+		else:
+			stored = self._snapshot.metadata_ids(f.namespace, f.key, f.value)
+		if stored and self._edited_ids:
+			stored = set(stored).difference(self._edited_ids)
+		return matches.union(stored) if stored else matches
+
+	def _field_matches(self, field: str, value: str) -> Set[int]:
+		matches = self._field_index.get((field, value), set())
+		stored = self._snapshot.field_ids(field, value) if self._snapshot is not None else ()
+		return matches.union(stored) if stored else matches
+
+	def _timestamp_matches(self, f: Filter) -> Set[int]:
+		_, key = parse_range_literal(f.value)
+		matches = self._timestamp_index[f.key].select(f.op, key)
+		stored = self._snapshot.timestamp_select(f.key, f.op, key) if self._snapshot is not None else ()
+		return matches.union(stored) if stored else matches
+
+	def _timestamp_arrays(self, field: str) -> List[Tuple[Sequence[float], Sequence[int]]]:
+		"""Epoch seconds of timestamp `field` and their product ids, one pair per layer."""
+		layers: List[Tuple[Sequence[float], Sequence[int]]] = [self._timestamp_index[field].arrays()]
+		if self._snapshot is not None:
+			layers.append(self._snapshot.timestamp_arrays(field))
+		return layers
+
+	def _memory_filter_matches(self, f: Filter) -> Set[int]:
+		if f.is_range:
+			kind, key = parse_range_literal(f.value)
+			index = self._range_index.get((f.namespace, f.key, kind))
+			return index.select(f.op, key) if index is not None else set()
+		ids = self._metadata_index.get((f.namespace, f.key), {}).get(f.value)
+		if ids is None:
+			return set()
+		return ids if isinstance(ids, set) else {ids}
+
+	# -------------------- indexes --------------------
+
+	def _ensure_columns(self) -> Optional[ProductColumns]:
+		"""The product field columns; None without NumPy or below `columnar_min_products` products."""
+		count = len(self._products) + (len(self._snapshot) if self._snapshot is not None else 0)
+		if count < self.columnar_min_products or not columns_available():
+			return None
+		if self._columns is None:
+			id_lists: List[Union[Set[int], Sequence[int]]] = [self._products.keys()]
+			if self._snapshot is not None:
+				id_lists.append(self._snapshot.product_ids)
+			self._columns = ProductColumns.build(
+				id_lists,
+				lambda field: self._facet_postings(Facet(name=field, namespace=None, key=field)),
+				self._timestamp_arrays,
+			)
+		return self._columns
+
+	def _ensure_text_index(self) -> TextIndex:
+		if self._text_index is None:
+			index = TextIndex()
+			edited = (self._snapshot_products[product_id] for product_id in self._edited_ids)
+			for product in chain(self._products.values(), edited):
+				self._index_product_text(index, product)
+				for entry in product.metadata:
+					index.add(product.product_id, entry.meta_value)
+			self._text_index = index
+		return self._text_index
+
+	def _index_metadata(
+		self,
+		product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		typed_value: Optional[TypedValue],
+	) -> None:
+		values = self._metadata_index.setdefault((namespace, meta_key), {})
+		ids = values.get(meta_value)
+		if ids is None:
+			values[meta_value] = product_id
+		elif isinstance(ids, set):
+			ids.add(product_id)
+		elif ids != product_id:
+			values[meta_value] = {ids, product_id}
+		if typed_value is not None:
+			kind, key = sort_key(typed_value)
+			self._range_index.setdefault((namespace, meta_key, kind), RangeIndex()).add(
+				key, product_id
+			)
+		if self._text_index is not None:
+			self._text_index.add(product_id, meta_value)
+		if self._refresh_index is not None:
+			self._refresh_index.index_metadata(product_id, namespace, meta_key, meta_value, typed_value)
+
+	def _unindex_metadata(
+		self,
+		product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		typed_value: Optional[TypedValue],
+	) -> None:
+		values = self._metadata_index.get((namespace, meta_key), {})
+		ids = values.get(meta_value)
+		if isinstance(ids, set):
+			ids.discard(product_id)
+			if len(ids) == 1:
+				values[meta_value] = next(iter(ids))
+		elif ids == product_id:
+			del values[meta_value]
+		if typed_value is not None:
+			kind, key = sort_key(typed_value)
+			index = self._range_index.get((namespace, meta_key, kind))
+			if index is not None:
+				index.remove(key, product_id)
+		if self._text_index is not None:
+			self._text_index.remove(product_id, meta_value)
+		if self._refresh_index is not None:
+			self._refresh_index.unindex_metadata(product_id, namespace, meta_key)
+
+	def _ensure_refresh_index(self) -> RefreshIndex:
+		if self._refresh_index is None:
+			# Read from the filter indexes, so snapshot products stay encoded.
+			schedules: List[Tuple[int, str]] = []
+			refreshed: List[Tuple[int, float]] = []
+			if self._snapshot is not None:
+				for meta_value, ids in self._snapshot_metadata_values(*REFRESH_SCHEDULE):
+					schedules.extend((product_id, meta_value) for product_id in ids)
+				refreshed.extend(
+					(product_id, key)
+					for key, product_id in self._snapshot.range_items(*REFRESHED_AT, TIME)
+					if product_id not in self._edited_ids
+				)
+			for meta_value, ids in self._metadata_index.get(REFRESH_SCHEDULE, {}).items():
+				schedules.extend((product_id, meta_value) for product_id in (ids if isinstance(ids, set) else (ids,)))
+			index = self._range_index.get((*REFRESHED_AT, TIME))
+			if index is not None:
+				refreshed.extend((product_id, key) for key, product_id in index.items())
+			self._refresh_index = RefreshIndex.build(schedules, refreshed)
+		return self._refresh_index
+
+	def _ensure_trigram_index(self) -> TrigramIndex:
+		if self._trigram_index is None:
+			index = TrigramIndex()
+			for product in self._products.values():
+				self._index_product_trigrams(index, product)
+			self._trigram_index = index
+		return self._trigram_index
+
+	@staticmethod
+	def _index_product_trigrams(index: TrigramIndex, product: DataProduct) -> None:
+		index.add(product.product_id, NAME, product.name)
+		index.add(product.product_id, DESCRIPTION, product.description)
+
+	@staticmethod
+	def _index_product_text(index: TextIndex, product: DataProduct) -> None:
+		index.add(product.product_id, product.name)
+		index.add(product.product_id, product.description)
+
+
+def _count_allowed(ids: Union[Set[int], Sequence[int]], allowed: Set[int]) -> int:
+	"""How many of `ids` (a set, or a sorted stored id list) are in `allowed`."""
+	if isinstance(ids, set):
+		return len(ids & allowed)
+	if len(allowed) * _PROBE_RATIO < len(ids):
+		count = 0
+		for product_id in allowed:
+			i = bisect_left(ids, product_id)
+			count += i < len(ids) and ids[i] == product_id
+		return count
+	return len(allowed.intersection(ids))
@@ -0,0 +1,521 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from heapq import merge
+from itertools import islice
+from operator import attrgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from . import trace
+from .compact import MetadataRecord
+from .filters import Facet, Filter
+from .fuzzy import DEFAULT_SIMILARITY, DESCRIPTION, NAME, search as fuzzy_search
+from .lineage import LineageGraph
+from .locking import FileLock
+from .migrations import FORMAT_KEY
+from .models import DataProduct, DataProductVersion, Team
+from .paging import ID, Position, position, rank_position
+from .query_cache import QueryCache
+from .schedule import RefreshDue, due_order
+from .services import Registry
+from .storage import IDS_SUFFIX, LOCK_SUFFIX, JournalStore, lease_counter, snapshot_to_dict
+from .text_index import search_segments
+
+T = TypeVar("T")
+
+# One registry shard per namespace.
+#
+# Every lab keeps its own journaled store (see `storage.py`) at
+# `<root>/<namespace>/feam_registry.json`, with its own journal, binary
+# snapshot and lock; pointing FEAM_SHARD_ROOT at the publish root puts each
+# lab's catalog next to its data. A command writes only the shards whose
+# products it changes, normally just the current namespace's, so labs never
+# contend for one lock or rewrite each other's catalogs on compaction.
+#
+# `ShardedRegistry` is the federated view and loads shards only when a query
+# needs them: lookups by publish URI go straight to that namespace's shard,
+# other point lookups try the current namespace first and load the rest one
+# at a time, and only listings and searches load every shard. Shards whose
+# binary snapshot is stale are rebuilt on a process pool first, so loading
+# many shards costs about as much as loading the largest.
+#
+# Ids stay unique across shards: all of them lease ids from one counter file
+# at the root, so shards can be searched together and a lineage edge (stored
+# with its downstream product) may point upstream into another shard.
+# Listings are k-way merges of the shards' sorted streams, and full-text and
+# fuzzy search run once over every shard's index segments, so results and
+# scores match those of a single registry holding every product.
+
+SHARD_FILE = "feam_registry.json"
+COUNTERS_FILE = "feam_shards"
+PUBLISH_PREFIX = "/publish/"
+
+
+def namespace_of_uri(access_uri: str) -> Optional[str]:
+	"""The namespace of a `/publish/<namespace>/<name>` URI (see `cli.publish_uri`)."""
+	if not access_uri.startswith(PUBLISH_PREFIX):
+		return None
+	namespace, separator, _ = access_uri[len(PUBLISH_PREFIX):].partition("/")
+	return namespace if separator and namespace else None
+
+
+class ShardStore(JournalStore):
+	"""The journaled store of one namespace; ids come from the shard set's counters."""
+
+	def __init__(self, shards: ShardSet, namespace: str) -> None:
+		super().__init__(shards.root / namespace / SHARD_FILE)
+		self.shards = shards
+		self.namespace = namespace
+
+	def load(self, registry: Registry, query_cache: Optional[QueryCache] = None) -> None:
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		super().load(registry, query_cache)
+
+	def _create(self, registry: Registry) -> None:
+		# A new shard starts empty, not with the mock catalog.
+		self._write_snapshot(snapshot_to_dict(registry))
+
+	def new_registry(self, compact: bool = False) -> Registry:
+		registry = Registry(compact=compact)
+		registry.external_lineage = True
+		return registry
+
+	def lease_ids(self, kind: str, floor: int, count: int) -> Tuple[int, int]:
+		return self.shards.lease_ids(kind, floor, count)
+
+	def _write_snapshot(self, data: Dict[str, Any]) -> None:
+		# Marks the file as a shard, whose lineage may leave it.
+		super()._write_snapshot({**data, "namespace": self.namespace})
+
+	def replace(self, data: Dict[str, Any]) -> None:
+		"""Make snapshot dict `data` the shard's whole contents."""
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		with self._lock():
+			self._write_snapshot(data)
+			try:
+				self.journal_path.unlink()
+			except FileNotFoundError:
+				pass
+			self._seen = None
+
+
+def load_shard(store: ShardStore, compact: bool = False) -> Registry:
+	registry = store.new_registry(compact)
+	with trace.span("shard"):
+		store.load(registry)
+	trace.count("shards_loaded")
+	return registry
+
+
+def _rebuild_binary(path: str) -> bool:
+	"""Process pool task: refresh one shard's binary snapshot."""
+	return JournalStore(Path(path)).rebuild_binary()
+
+
+class ShardSet:
+	"""The shards under one root directory, and the id counters they share."""
+
+	def __init__(self, root: Path) -> None:
+		self.root = Path(root)
+		self.ids_path = self.root / (COUNTERS_FILE + IDS_SUFFIX)
+		self.lock_path = self.root / (COUNTERS_FILE + LOCK_SUFFIX)
+		self._stores: Dict[str, ShardStore] = {}
+
+	def namespaces(self) -> List[str]:
+		"""Namespaces that have a shard, sorted."""
+		try:
+			entries = list(os.scandir(self.root))
+		except FileNotFoundError:
+			return []
+		return sorted(entry.name for entry in entries if entry.is_dir() and (Path(entry.path) / SHARD_FILE).exists())
+
+	def store(self, namespace: str) -> ShardStore:
+		store = self._stores.get(namespace)
+		if store is None:
+			if not namespace or namespace.startswith(".") or "/" in namespace or os.sep in namespace:
+				raise ValueError(f"Invalid namespace {namespace!r}")
+			store = self._stores[namespace] = ShardStore(self, namespace)
+		return store
+
+	def load(self, namespaces: Sequence[str], compact: bool = False) -> Dict[str, Registry]:
+		"""Load the shards of `namespaces`.
+
+		Binary snapshots that are missing or stale (e.g. after a shard was
+		written by an older version) are rebuilt first, in parallel on a
+		process pool when there are several and more than one CPU; the shards
+		are then memory-mapped and their journals replayed here.
+		"""
+		stores = [self.store(namespace) for namespace in namespaces]
+		stale = [str(store.path) for store in stores if store.path.exists() and not store.has_current_binary()]
+		workers = min(len(stale), os.cpu_count() or 1)
+		if workers > 1:
+			with trace.span("rebuild_binary"), ProcessPoolExecutor(max_workers=workers) as pool:
+				list(pool.map(_rebuild_binary, stale))
+		return {store.namespace: load_shard(store, compact) for store in stores}
+
+	def lease_ids(self, kind: str, floor: int, count: int) -> Tuple[int, int]:
+		"""Reserve `count` consecutive ids of `kind` for any shard."""
+		self.root.mkdir(parents=True, exist_ok=True)
+		return lease_counter(self.ids_path, FileLock(self.lock_path), kind, floor, count, self.next_ids_on_disk)
+
+	def next_ids_on_disk(self) -> Dict[str, int]:
+		counters: Dict[str, int] = {}
+		for namespace in self.namespaces():
+			for kind, next_id in self.store(namespace).next_ids_on_disk().items():
+				counters[kind] = max(counters.get(kind, 1), next_id)
+		return counters
+
+	def split(self, registry: Registry, team_namespace: Callable[[str], str]) -> Dict[str, int]:
+		"""Write `registry` out as one shard per namespace; returns products per namespace.
+
+		A product goes to the namespace of its publish URI, or else to its
+		owner team's, `team_namespace(team name)`. Ids are kept, so lineage
+		and references by id still hold.
+		"""
+		data = snapshot_to_dict(registry)
+		team_names = {team["id"]: team["name"] for team in data["teams"]}
+		parts: Dict[str, Dict[str, Any]] = {}
+
+		def part(namespace: str) -> Dict[str, Any]:
+			if namespace not in parts:
+				parts[namespace] = {FORMAT_KEY: data[FORMAT_KEY]}
+				parts[namespace].update((key, []) for key in ("teams", "products", "metadata", "versions", "lineage"))
+			return parts[namespace]
+
+		for team in data["teams"]:
+			part(team_namespace(team["name"]))["teams"].append(team)
+		homes: Dict[int, str] = {}
+		for product in data["products"]:
+			namespace = namespace_of_uri(product["access_uri"])
+			if namespace is None:
+				namespace = team_namespace(team_names.get(product["owner_team_id"], str(product["owner_team_id"])))
+			homes[product["id"]] = namespace
+			part(namespace)["products"].append(product)
+		for key, owner in (("metadata", "data_product_id"), ("versions", "data_product_id")):
+			for row in data[key]:
+				part(homes[row[owner]])[key].append(row)
+		for edge in data["lineage"]:
+			part(homes[edge[0]])["lineage"].append(edge)
+
+		for namespace, shard_data in parts.items():
+			self.store(namespace).replace(shard_data)
+		# Ids continue above every id the registry handed out.
+		for kind, next_id in registry.next_ids().items():
+			self.lease_ids(kind, next_id, 0)
+		return {namespace: len(shard_data["products"]) for namespace, shard_data in parts.items()}
+
+
+class ShardedRegistry:
+	"""A federated `Registry` over the shards of a `ShardSet`.
+
+	New teams and products go to the shard of their namespace: the one in
+	their publish URI, else `home` (the current namespace). Changes to an
+	existing product go to the shard holding it. With `namespaces`, queries
+	only read those namespaces' shards.
+	"""
+
+	def __init__(
+		self,
+		shards: ShardSet,
+		home: str,
+		compact: bool = False,
+		namespaces: Optional[Sequence[str]] = None,
+	) -> None:
+		self.shards = shards
+		self.home = home
+		self._compact = compact
+		self._scope = list(dict.fromkeys(namespaces)) if namespaces is not None else None
+		# Loaded shards by namespace.
+		self._registries: Dict[str, Registry] = {}
+		# Lineage across all shards; built on first use.
+		self._lineage: Optional[LineageGraph] = None
+
+	# -------------------- shards --------------------
+
+	def namespaces(self) -> List[str]:
+		"""Namespaces whose shards queries read."""
+		if self._scope is not None:
+			return self._scope
+		return sorted(set(self.shards.namespaces()).union(self._registries))
+
+	def shard(self, namespace: str) -> Registry:
+		"""The registry of `namespace`'s shard, loading it (or creating it) if needed."""
+		registry = self._registries.get(namespace)
+		if registry is None:
+			registry = self._registries[namespace] = load_shard(self.shards.store(namespace), self._compact)
+		return registry
+
+	def _all(self) -> List[Registry]:
+		"""Every shard queries read, loading the missing ones together."""
+		namespaces = self.namespaces()
+		missing = [namespace for namespace in namespaces if namespace not in self._registries]
+		if missing:
+			existing = set(self.shards.namespaces())
+			self._registries.update(self.shards.load([n for n in missing if n in existing], self._compact))
+		return [self._registries[namespace] for namespace in namespaces if namespace in self._registries]
+
+	def _candidates(self) -> Iterator[Registry]:
+		"""Shards in the order point lookups try them: home, loaded ones, then the rest."""
+		readable = set(self.namespaces())
+		existing: Optional[Set[str]] = None
+		for namespace in dict.fromkeys([self.home, *self._registries, *sorted(readable)]):
+			if namespace in self._registries:
+				yield self._registries[namespace]
+				continue
+			if namespace not in readable:
+				continue
+			if existing is None:
+				existing = set(self.shards.namespaces())
+			if namespace in existing:
+				yield self.shard(namespace)
+
+	def _find(self, lookup: Callable[[Registry], Optional[T]]) -> Optional[T]:
+		for registry in self._candidates():
+			found = lookup(registry)
+			if found is not None:
+				return found
+		return None
+
+	def _owner(self, product_id: int) -> Registry:
+		registry = self._find(lambda shard: shard if shard.get_product(product_id) is not None else None)
+		if registry is None:
+			raise ValueError(f"Unknown data_product_id {product_id}")
+		return registry
+
+	# -------------------- writes --------------------
+
+	def create_team(self, name: str, namespace: Optional[str] = None) -> Team:
+		"""Add team `name` to the shard of `namespace` (default: home)."""
+		namespace = namespace or self.home
+		return self.shards.store(namespace).create_team(self.shard(namespace), name)
+
+	def create_data_product(
+		self,
+		name: str,
+		description: str,
+		owner_team_id: int,
+		data_format: str,
+		access_uri: str,
+		status: str,
+		classification: str,
+	) -> DataProduct:
+		shard = self.shard(namespace_of_uri(access_uri) or self.home)
+		return shard.create_data_product(
+			name, description, owner_team_id, data_format, access_uri, status, classification
+		)
+
+	def add_metadata(
+		self, data_product_id: int, namespace: str, meta_key: str, meta_value: str, value_type: str
+	) -> MetadataRecord:
+		shard = self._owner(data_product_id)
+		return shard.add_metadata(data_product_id, namespace, meta_key, meta_value, value_type)
+
+	def set_metadata(
+		self, data_product_id: int, namespace: str, meta_key: str, meta_value: str, value_type: str
+	) -> MetadataRecord:
+		shard = self._owner(data_product_id)
+		return shard.set_metadata(data_product_id, namespace, meta_key, meta_value, value_type)
+
+	def update_metadata(self, metadata_id: int, meta_value: str, value_type: str) -> MetadataRecord:
+		shard = self._find(lambda registry: registry if registry.get_metadata(metadata_id) is not None else None)
+		if shard is None:
+			raise ValueError(f"Unknown metadata_id {metadata_id}")
+		return shard.update_metadata(metadata_id, meta_value, value_type)
+
+	def create_version(self, data_product_id: int, version_label: Optional[str] = None) -> DataProductVersion:
+		return self._owner(data_product_id).create_version(data_product_id, version_label)
+
+	def add_lineage(self, downstream_id: int, upstream_id: int) -> bool:
+		"""Record that `downstream_id` is derived from `upstream_id`, in the downstream's shard.
+
+		Cycles are checked across all shards (`LineageCycleError`).
+		"""
+		shard = self._owner(downstream_id)
+		self._owner(upstream_id)
+		graph = self._lineage_graph()
+		if graph.has_edge(downstream_id, upstream_id):
+			return False
+		graph.add_edge(downstream_id, upstream_id)
+		return shard.add_lineage(downstream_id, upstream_id)
+
+	def remove_lineage(self, downstream_id: int, upstream_id: int) -> bool:
+		shard = self._find(lambda registry: registry if registry.get_product(downstream_id) is not None else None)
+		if shard is None or not shard.remove_lineage(downstream_id, upstream_id):
+			return False
+		self._lineage_graph().remove_edge(downstream_id, upstream_id)
+		return True
+
+	# -------------------- queries --------------------
+
+	def list_teams(self) -> List[Team]:
+		return list(merge(*(shard.list_teams() for shard in self._all()), key=attrgetter("teams_id")))
+
+	def get_team(self, team_id: int) -> Optional[Team]:
+		return self._find(lambda shard: shard.get_team(team_id))
+
+	def get_team_by_name(self, name: str) -> Optional[Team]:
+		return self._find(lambda shard: shard.get_team_by_name(name))
+
+	def list_products(self) -> List[DataProduct]:
+		return list(merge(*(shard.list_products() for shard in self._all()), key=attrgetter("product_id")))
+
+	def iter_products(
+		self,
+		filters: Sequence[Filter] = (),
+		sort: str = ID,
+		after: Optional[Position] = None,
+	) -> Iterator[DataProduct]:
+		"""Products matching `filters` in `sort` order: a k-way merge of every shard's listing."""
+		streams = [shard.iter_products(filters, sort, after) for shard in self._all()]
+		return merge(*streams, key=lambda product: position(product, sort))
+
+	def get_product(self, product_id: int) -> Optional[DataProduct]:
+		return self._find(lambda shard: shard.get_product(product_id))
+
+	def get_product_by_name(self, name: str) -> Optional[DataProduct]:
+		"""The home namespace's product called `name`, else the lowest-id one anywhere."""
+		if self.home in self._registries or self.home in self.shards.namespaces():
+			product = self.shard(self.home).get_product_by_name(name)
+			if product is not None:
+				return product
+		found = (shard.get_product_by_name(name) for shard in self._all())
+		return min((product for product in found if product is not None), key=attrgetter("product_id"), default=None)
+
+	def get_product_by_uri(self, access_uri: str) -> Optional[DataProduct]:
+		namespace = namespace_of_uri(access_uri)
+		if namespace is None:
+			return self._find(lambda shard: shard.get_product_by_uri(access_uri))
+		if namespace not in self._registries and namespace not in self.shards.namespaces():
+			return None
+		return self.shard(namespace).get_product_by_uri(access_uri)
+
+	def list_versions(self, product_id: int) -> List[DataProductVersion]:
+		shard = self._find(lambda registry: registry if registry.get_product(product_id) is not None else None)
+		return shard.list_versions(product_id) if shard is not None else []
+
+	def get_version(self, product_id: int, version_label: Optional[str] = None) -> Optional[DataProductVersion]:
+		shard = self._find(lambda registry: registry if registry.get_product(product_id) is not None else None)
+		return shard.get_version(product_id, version_label) if shard is not None else None
+
+	def get_metadata(self, metadata_id: int) -> Optional[MetadataRecord]:
+		return self._find(lambda shard: shard.get_metadata(metadata_id))
+
+	def search_products_by_name(self, term: str) -> List[DataProduct]:
+		term_lower = term.lower()
+		return [p for p in self.iter_products() if term_lower in p.name.lower()]
+
+	def search_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		filters: Sequence[Filter] = (),
+	) -> List[DataProduct]:
+		"""`Registry.search_products` over every shard."""
+		if not query.strip():
+			return list(islice(self.iter_products(filters), limit))
+		return [product for product, _ in self.rank_products(query, limit, match_all, filters)]
+
+	def rank_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		filters: Sequence[Filter] = (),
+		after: Optional[Position] = None,
+	) -> List[Tuple[DataProduct, Position]]:
+		"""Ranked over the index segments of every shard at once, so scores are global."""
+		shards = self._all()
+		allowed = self.filter_product_ids(filters) if filters else None
+		segments = [segment for shard in shards for segment in shard.text_segments()]
+		hits = search_segments(segments, query, limit=limit, match_all=match_all, restrict=allowed, after=after)
+		return [(self.get_product(product_id), rank_position(score, product_id)) for product_id, score in hits]
+
+	def fuzzy_search_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		similarity: float = DEFAULT_SIMILARITY,
+		descriptions: bool = False,
+		filters: Sequence[Filter] = (),
+	) -> List[Tuple[DataProduct, int]]:
+		shards = self._all()
+		allowed = self.filter_product_ids(filters) if filters else None
+
+		def text_of(product_id: int, field: str) -> str:
+			return getattr(self.get_product(product_id), field)
+
+		hits = fuzzy_search(
+			[segment for shard in shards for segment in shard.trigram_segments()],
+			query,
+			text_of,
+			fields=(NAME, DESCRIPTION) if descriptions else (NAME,),
+			similarity=similarity,
+			limit=limit,
+			restrict=allowed,
+		)
+		return [(self.get_product(product_id), distance) for product_id, distance in hits]
+
+	def filter_product_ids(self, filters: Sequence[Filter]) -> Set[int]:
+		"""Ids of products matching every filter, in any shard."""
+		return set().union(*(shard.filter_product_ids(filters) for shard in self._all()))
+
+	def facet_counts(self, facet: Facet, filters: Sequence[Filter] = ()) -> Dict[str, int]:
+		"""Value -> number of products with it, among the products matching `filters`, in every shard."""
+		counts: Dict[str, int] = {}
+		for shard in self._all():
+			for value, count in shard.facet_counts(facet, filters).items():
+				counts[value] = counts.get(value, 0) + count
+		return counts
+
+	def refresh_due(self, until: datetime) -> List[RefreshDue]:
+		"""Scheduled products expected to refresh by `until`, longest overdue first, from every shard."""
+		return list(merge(*(shard.refresh_due(until) for shard in self._all()), key=due_order))
+
+	def invalid_refresh_schedules(self) -> Dict[int, Tuple[str, str]]:
+		invalid: Dict[int, Tuple[str, str]] = {}
+		for shard in self._all():
+			invalid.update(shard.invalid_refresh_schedules())
+		return invalid
+
+	# -------------------- lineage --------------------
+
+	def list_lineage(self) -> List[Tuple[int, int]]:
+		"""Every `(downstream id, upstream id)` edge, sorted."""
+		return list(merge(*(shard.list_lineage() for shard in self._all())))
+
+	def upstream_ids(self, product_id: int, transitive: bool = True) -> Set[int]:
+		graph = self._lineage_graph()
+		return set(graph.upstream(product_id) if transitive else graph.direct_upstream(product_id))
+
+	def downstream_ids(self, product_id: int, transitive: bool = True) -> Set[int]:
+		graph = self._lineage_graph()
+		return set(graph.downstream(product_id) if transitive else graph.direct_downstream(product_id))
+
+	def impact_order(self, product_id: int) -> List[int]:
+		return self._lineage_graph().impact(product_id)
+
+	def _lineage_graph(self) -> LineageGraph:
+		if self._lineage is None:
+			graph = LineageGraph()
+			for downstream_id, upstream_id in self.list_lineage():
+				graph.add_edge(downstream_id, upstream_id, check=False)
+			self._lineage = graph
+		return self._lineage
+
+	# -------------------- persistence --------------------
+
+	def commit(self) -> int:
+		"""Make pending changes durable, each in its own shard; returns how many were written."""
+		return sum(self.shards.store(namespace).commit(shard) for namespace, shard in self._registries.items())
+
+	def compact_shards(self) -> List[str]:
+		"""Fold every readable shard's journal into a fresh snapshot; returns their namespaces."""
+		self._all()
+		namespaces = [namespace for namespace in self.namespaces() if namespace in self._registries]
+		for namespace in namespaces:
+			self.shards.store(namespace).compact(self._registries[namespace])
+		return namespaces
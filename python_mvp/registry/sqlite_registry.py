@@ -0,0 +1,1048 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .filters import NOT_EQUAL, Facet, Filter
+from .fuzzy import DEFAULT_SIMILARITY, DESCRIPTION, FIELDS, NAME, TrigramIndex
+from .fuzzy import search as fuzzy_search
+from .lineage import LineageGraph
+from .models import DataProduct, DataProductVersion, MetadataEntry, Team, VersionedMetadata
+from .paging import ID, SORT_FIELDS, Position, rank_position
+from .schedule import REFRESH_SCHEDULE, REFRESHED_AT, RefreshDue, RefreshIndex
+from .text_index import tokenize
+from .typed_values import (
+	FLOAT_TYPES,
+	INTEGER_TYPES,
+	NUMBER,
+	SIZE_TYPES,
+	TEMPORAL_TYPES,
+	parse_range_literal,
+	parse_size,
+	parse_typed_value,
+)
+from .versions import PersistentMap
+
+# SQLite-backed registry sharing the `registry.db` schema created by
+# `mesh_core::db::init_schema`, so the Python and Rust CLIs can work against
+# one catalog.
+#
+# The Rust schema splits a product into a `data_products` row and one or more
+# `data_product_versions` rows. The flat Python `DataProduct` maps onto the
+# latest version of a product:
+#
+#   DataProduct.data_format    -> data_product_versions.asset_type
+#   DataProduct.access_uri     -> data_product_versions.access_uri
+#   DataProduct.status         -> data_product_versions.data_quality
+#   DataProduct.classification -> data_product_versions.classification
+#   DataProduct.updated_at     -> data_product_versions.created_at
+#
+# `source_path` keeps the meaning the Rust CLI gives it, the filesystem path
+# a version was served from: it mirrors the version's `feam.source_path`
+# metadata, and is empty until that is set. `access_uri` is a column the
+# Python CLI adds to the shared table (see `ACCESS_URI_COLUMN`); it is NULL
+# on versions written by the Rust CLI, which have no access URI.
+#
+# Metadata rows hang off a version; `add_metadata` attaches them to the
+# product's latest version. Versions are read back as `DataProductVersion`s;
+# the schema copies metadata rows per version, so unlike the JSON backend
+# they share nothing.
+#
+# `lineage_dependencies` rows link a downstream version to an upstream URI.
+# Lineage queries read them as product-level edges: every version of the
+# downstream product, and every product that has published under the
+# upstream access URI. Other URIs are external inputs and are skipped.
+#
+# The schema has no trigram table, and rows written by the Rust CLI would not
+# maintain one, so `--fuzzy` builds its trigram index from the product names
+# and descriptions once per process.
+
+DEFAULT_DB_FILENAME = "registry.db"
+DEFAULT_VERSION_LABEL = "1.0.0"
+
+# Kept verbatim in sync with feather-mesh/mesh_core/src/db.rs.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS teams (
+    team_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS data_products (
+    product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    owner_team_id INTEGER NOT NULL,
+    intended_use TEXT,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(owner_team_id) REFERENCES teams(team_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS data_product_versions (
+    version_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_product_id INTEGER NOT NULL,
+    version_label TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    data_quality TEXT NOT NULL,
+    classification TEXT,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(data_product_id) REFERENCES data_products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    metadata_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_product_version_id INTEGER NOT NULL,
+    namespace TEXT,
+    meta_key TEXT NOT NULL,
+    meta_value TEXT,
+    value_type TEXT,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    FOREIGN KEY(data_product_version_id) REFERENCES data_product_versions(version_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS lineage_dependencies (
+    dependency_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    downstream_version_id INTEGER NOT NULL,
+    upstream_product_uri TEXT NOT NULL,
+    upstream_version TEXT,
+    FOREIGN KEY(downstream_version_id) REFERENCES data_product_versions(version_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_data_products_owner_team_id ON data_products(owner_team_id);
+CREATE INDEX IF NOT EXISTS idx_data_product_versions_data_product_id ON data_product_versions(data_product_id);
+CREATE INDEX IF NOT EXISTS idx_metadata_data_product_version_id ON metadata(data_product_version_id);
+CREATE INDEX IF NOT EXISTS idx_lineage_dependencies_downstream_version_id ON lineage_dependencies(downstream_version_id);
+"""
+
+def _sql_list(values: Iterable[str]) -> str:
+	return ", ".join(f"'{value}'" for value in sorted(values))
+
+
+_NUMERIC_TYPES_SQL = _sql_list(INTEGER_TYPES | FLOAT_TYPES)
+_TEMPORAL_TYPES_SQL = _sql_list(TEMPORAL_TYPES)
+_SIZE_TYPES_SQL = _sql_list(SIZE_TYPES)
+
+# Added to `data_product_versions` on open. Databases written by releases
+# that kept access URIs in `source_path` are upgraded at the same time:
+# those rows are the ones holding a `/publish/` URI, and their source path is
+# restored from their `feam.source_path` metadata.
+ACCESS_URI_COLUMN = """
+ALTER TABLE data_product_versions ADD COLUMN access_uri TEXT;
+UPDATE data_product_versions SET
+    access_uri = source_path,
+    source_path = COALESCE((
+        SELECT m.meta_value FROM metadata m
+        WHERE m.data_product_version_id = data_product_versions.version_id
+          AND m.namespace = 'feam' AND m.meta_key = 'source_path'
+        ORDER BY m.metadata_id LIMIT 1
+    ), '')
+WHERE source_path LIKE '/publish/%';
+"""
+
+# Extra indexes for the Python query paths. They are additive and
+# `IF NOT EXISTS`, so a database created by either CLI stays valid for both.
+# The partial expression indexes keep numeric and temporal metadata sorted by
+# value, so range filters are index range scans instead of parsing every row;
+# they only use built-in SQL functions so the Rust CLI can still write rows.
+EXTRA_INDEXES = f"""
+CREATE INDEX IF NOT EXISTS idx_data_products_name ON data_products(name);
+CREATE INDEX IF NOT EXISTS idx_data_product_versions_access_uri ON data_product_versions(access_uri);
+CREATE INDEX IF NOT EXISTS idx_metadata_namespace_key_value ON metadata(namespace, meta_key, meta_value);
+CREATE INDEX IF NOT EXISTS idx_metadata_numeric_value
+    ON metadata(namespace, meta_key, CAST(meta_value AS REAL))
+    WHERE value_type IN ({_NUMERIC_TYPES_SQL});
+CREATE INDEX IF NOT EXISTS idx_metadata_temporal_value
+    ON metadata(namespace, meta_key, julianday(meta_value))
+    WHERE value_type IN ({_TEMPORAL_TYPES_SQL});
+"""
+
+# Unix epoch expressed as a Julian day number, for temporal range bounds.
+_JULIAN_EPOCH = 2440587.5
+
+# Full-text search over names, descriptions and metadata values: one FTS5
+# row per product (rowid = product_id), kept current by triggers so rows
+# written by the Rust CLI are indexed too.
+_SQL_PRODUCT_SEARCH_BODY = """
+p.name || ' ' || COALESCE(p.description, '') || COALESCE((
+    SELECT ' ' || group_concat(m.meta_value, ' ')
+    FROM metadata m
+    JOIN data_product_versions v ON v.version_id = m.data_product_version_id
+    WHERE v.data_product_id = p.product_id
+), '')
+"""
+
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE product_search USING fts5(body);
+
+INSERT INTO product_search(rowid, body)
+SELECT p.product_id, {_SQL_PRODUCT_SEARCH_BODY}
+FROM data_products p;
+"""
+
+# Created on every open so databases indexed by an older release pick up
+# triggers added since.
+FTS_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS trg_product_search_insert AFTER INSERT ON data_products BEGIN
+    INSERT INTO product_search(rowid, body)
+    VALUES (NEW.product_id, NEW.name || ' ' || COALESCE(NEW.description, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_product_search_delete AFTER DELETE ON data_products BEGIN
+    DELETE FROM product_search WHERE rowid = OLD.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_product_search_metadata AFTER INSERT ON metadata BEGIN
+    UPDATE product_search SET body = body || ' ' || COALESCE(NEW.meta_value, '')
+    WHERE rowid = (
+        SELECT data_product_id FROM data_product_versions WHERE version_id = NEW.data_product_version_id
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_product_search_metadata_update
+AFTER UPDATE OF meta_value ON metadata BEGIN
+    UPDATE product_search SET body = (
+        SELECT {_SQL_PRODUCT_SEARCH_BODY} FROM data_products p WHERE p.product_id = product_search.rowid
+    )
+    WHERE rowid = (
+        SELECT data_product_id FROM data_product_versions WHERE version_id = NEW.data_product_version_id
+    );
+END;
+"""
+
+# Latest version per product: the highest version_id for that product.
+_PRODUCT_SELECT = """
+SELECT p.product_id, p.name, p.description, p.owner_team_id, p.created_at,
+       v.version_id, v.asset_type, v.access_uri, v.data_quality, v.classification,
+       v.created_at AS updated_at
+FROM data_products p
+LEFT JOIN data_product_versions v
+    ON v.version_id = (
+        SELECT MAX(version_id) FROM data_product_versions WHERE data_product_id = p.product_id
+    )
+"""
+_SQL_GET_PRODUCT = _PRODUCT_SELECT + " WHERE p.product_id = ?"
+_SQL_LIST_PRODUCTS = _PRODUCT_SELECT + " ORDER BY p.product_id"
+_SQL_SEARCH_PRODUCTS = _PRODUCT_SELECT + " WHERE p.name LIKE ? ESCAPE '\\' ORDER BY p.product_id"
+_SQL_PRODUCT_BY_URI = (
+	"SELECT data_product_id FROM data_product_versions WHERE access_uri = ? "
+	"ORDER BY version_id DESC LIMIT 1"
+)
+_SQL_PRODUCT_BY_NAME = "SELECT product_id FROM data_products WHERE name = ? ORDER BY product_id LIMIT 1"
+_SQL_PRODUCTS_BY_IDS = _PRODUCT_SELECT + " WHERE p.product_id IN ({placeholders})"
+_SQL_FULL_TEXT = """
+SELECT rowid FROM product_search WHERE product_search MATCH ?{conditions}
+ORDER BY bm25(product_search), rowid LIMIT ?
+"""
+_SQL_PAGE_PRODUCTS = _PRODUCT_SELECT + " WHERE 1 = 1{conditions} ORDER BY {order}"
+_SQL_RANKED = """
+SELECT rowid, bm25(product_search) AS score FROM product_search WHERE product_search MATCH ?{conditions}
+ORDER BY score, rowid
+"""
+_SQL_PRODUCT_TEXTS = "SELECT product_id, name, COALESCE(description, '') AS description FROM data_products"
+_SQL_FILTERED_IDS = "SELECT product_id FROM data_products WHERE 1 = 1{conditions} ORDER BY product_id LIMIT ?"
+
+# Filter subqueries yielding matching product ids. Metadata and version
+# fields are matched on each product's latest version only.
+_LATEST_VERSION_CONDITION = (
+	"v.version_id = (SELECT MAX(version_id) FROM data_product_versions WHERE data_product_id = v.data_product_id)"
+)
+_SQL_FILTER_METADATA = (
+	"SELECT v.data_product_id FROM metadata m"
+	" JOIN data_product_versions v ON v.version_id = m.data_product_version_id"
+	" WHERE m.namespace = ? AND m.meta_key = ? AND m.meta_value = ? AND " + _LATEST_VERSION_CONDITION
+)
+_SQL_FILTER_VERSION_FIELD = (
+	"SELECT v.data_product_id FROM data_product_versions v WHERE v.{column} IN ({values}) AND "
+	+ _LATEST_VERSION_CONDITION
+)
+_SQL_FILTER_RANGE_JOIN = (
+	"SELECT v.data_product_id FROM metadata m"
+	" JOIN data_product_versions v ON v.version_id = m.data_product_version_id"
+	" WHERE m.namespace = ? AND m.meta_key = ? AND "
+)
+_SQL_FILTER_NUMBER_RANGE = (
+	_SQL_FILTER_RANGE_JOIN
+	+ f"m.value_type IN ({_NUMERIC_TYPES_SQL}) AND CAST(m.meta_value AS REAL) {{op}} ? AND "
+	+ _LATEST_VERSION_CONDITION
+	+ " UNION "
+	+ _SQL_FILTER_RANGE_JOIN
+	+ f"m.value_type IN ({_SIZE_TYPES_SQL}) AND feam_size_bytes(m.meta_value) {{op}} ? AND "
+	+ _LATEST_VERSION_CONDITION
+)
+_SQL_FILTER_TIME_RANGE = (
+	_SQL_FILTER_RANGE_JOIN
+	+ f"m.value_type IN ({_TEMPORAL_TYPES_SQL}) AND julianday(m.meta_value) {{op}} ? AND "
+	+ _LATEST_VERSION_CONDITION
+)
+_SQL_FILTER_OWNER = "SELECT product_id FROM data_products WHERE owner_team_id IN ({values})"
+_SQL_FILTER_CREATED = "SELECT product_id FROM data_products WHERE julianday(created_at) {op} ?"
+# Refresh schedules and last refreshes (see `schedule`) on latest versions.
+_SQL_REFRESH_METADATA = (
+	"SELECT v.data_product_id, m.namespace, m.meta_key, m.meta_value, m.value_type FROM metadata m"
+	" JOIN data_product_versions v ON v.version_id = m.data_product_version_id"
+	" WHERE ((m.namespace = ? AND m.meta_key = ?) OR (m.namespace = ? AND m.meta_key = ?)) AND "
+	+ _LATEST_VERSION_CONDITION
+	+ " ORDER BY m.metadata_id"
+)
+# Facet counts (see `facet_counts`); metadata is counted on latest versions.
+_SQL_FACET_OWNER = (
+	"SELECT CAST(p.owner_team_id AS TEXT) AS value, COUNT(*) AS count FROM data_products p"
+	" WHERE 1 = 1{conditions} GROUP BY p.owner_team_id"
+)
+_SQL_FACET_VERSION_FIELD = (
+	"SELECT COALESCE(v.{column}, '') AS value, COUNT(*) AS count FROM data_products p"
+	" LEFT JOIN data_product_versions v"
+	" ON v.version_id = (SELECT MAX(version_id) FROM data_product_versions WHERE data_product_id = p.product_id)"
+	" WHERE 1 = 1{conditions} GROUP BY value"
+)
+_SQL_FACET_METADATA = (
+	"SELECT m.meta_value AS value, COUNT(DISTINCT v.data_product_id) AS count FROM metadata m"
+	" JOIN data_product_versions v ON v.version_id = m.data_product_version_id"
+	" WHERE m.namespace = ? AND m.meta_key = ? AND " + _LATEST_VERSION_CONDITION + "{conditions}"
+	" GROUP BY m.meta_value"
+)
+_VERSION_FILTER_COLUMNS = {
+	"status": "data_quality",
+	"data_format": "asset_type",
+	"classification": "classification",
+}
+# Sort expressions for `iter_products`, matching how rows map onto `DataProduct`.
+_SORT_COLUMNS = {
+	"name": "p.name",
+	"owner_team_id": "p.owner_team_id",
+	**{field: f"COALESCE(v.{column}, '')" for field, column in _VERSION_FILTER_COLUMNS.items()},
+}
+
+_SQL_INSERT_TEAM = "INSERT INTO teams (name, created_at) VALUES (?, ?)"
+_SQL_GET_TEAM = "SELECT team_id, name, created_at FROM teams WHERE team_id = ?"
+_SQL_GET_TEAM_BY_NAME = "SELECT team_id, name, created_at FROM teams WHERE name = ?"
+_SQL_LIST_TEAMS = "SELECT team_id, name, created_at FROM teams ORDER BY team_id"
+
+_SQL_INSERT_PRODUCT = (
+	"INSERT INTO data_products (name, description, owner_team_id, created_at) VALUES (?, ?, ?, ?)"
+)
+_SQL_INSERT_VERSION = """
+INSERT INTO data_product_versions
+    (data_product_id, version_label, asset_type, source_path, access_uri, data_quality, classification, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_LATEST_VERSION = "SELECT MAX(version_id) FROM data_product_versions WHERE data_product_id = ?"
+_SQL_COUNT_VERSIONS = "SELECT COUNT(*) FROM data_product_versions WHERE data_product_id = ?"
+_SQL_COPY_METADATA = """
+INSERT INTO metadata (data_product_version_id, namespace, meta_key, meta_value, value_type, created_at)
+SELECT ?, namespace, meta_key, meta_value, value_type, ?
+FROM metadata WHERE data_product_version_id = ? ORDER BY metadata_id
+"""
+
+_SQL_INSERT_METADATA = """
+INSERT INTO metadata (data_product_version_id, namespace, meta_key, meta_value, value_type, created_at)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+_SQL_UPDATE_METADATA = "UPDATE metadata SET meta_value = ?, value_type = ? WHERE metadata_id = ?"
+# Keeps `source_path` equal to the version's `feam.source_path` (see above).
+_SQL_SYNC_SOURCE_PATH = """
+UPDATE data_product_versions SET source_path = ?
+WHERE version_id = (
+    SELECT data_product_version_id FROM metadata
+    WHERE metadata_id = ? AND namespace = 'feam' AND meta_key = 'source_path'
+)
+"""
+_SQL_FIND_METADATA = """
+SELECT metadata_id, namespace, meta_key, meta_value, value_type, created_at
+FROM metadata
+WHERE data_product_version_id = (SELECT MAX(version_id) FROM data_product_versions WHERE data_product_id = ?)
+  AND namespace = ? AND meta_key = ?
+ORDER BY metadata_id LIMIT 1
+"""
+_SQL_VERSION_METADATA = """
+SELECT metadata_id, namespace, meta_key, meta_value, value_type, created_at
+FROM metadata WHERE data_product_version_id = ? ORDER BY metadata_id
+"""
+_SQL_GET_METADATA_WITH_PRODUCT = """
+SELECT m.metadata_id, m.namespace, m.meta_key, m.meta_value, m.value_type, m.created_at,
+       v.data_product_id
+FROM metadata m JOIN data_product_versions v ON v.version_id = m.data_product_version_id
+WHERE m.metadata_id = ?
+"""
+_SQL_VERSIONS_METADATA = """
+SELECT metadata_id, namespace, meta_key, meta_value, value_type, created_at,
+       data_product_version_id
+FROM metadata WHERE data_product_version_id IN ({placeholders}) ORDER BY metadata_id
+"""
+
+_SQL_VERSION_COLUMNS = """
+SELECT version_id, data_product_id, version_label, asset_type, source_path, access_uri,
+       data_quality, classification, created_at
+FROM data_product_versions
+"""
+_SQL_PRODUCT_VERSIONS = _SQL_VERSION_COLUMNS + "WHERE data_product_id = ? ORDER BY version_id"
+_SQL_VERSION_BY_LABEL = (
+	_SQL_VERSION_COLUMNS + "WHERE data_product_id = ? AND version_label = ? ORDER BY version_id DESC LIMIT 1"
+)
+_SQL_LATEST_VERSION_ROW = _SQL_VERSION_COLUMNS + "WHERE data_product_id = ? ORDER BY version_id DESC LIMIT 1"
+
+_SQL_LINEAGE_EDGES = """
+SELECT DISTINCT v.data_product_id AS downstream_id, u.data_product_id AS upstream_id
+FROM lineage_dependencies l
+JOIN data_product_versions v ON v.version_id = l.downstream_version_id
+JOIN data_product_versions u ON u.access_uri = l.upstream_product_uri
+"""
+_SQL_INSERT_LINEAGE = """
+INSERT INTO lineage_dependencies (downstream_version_id, upstream_product_uri, upstream_version)
+VALUES (?, ?, ?)
+"""
+_SQL_DELETE_LINEAGE = """
+DELETE FROM lineage_dependencies
+WHERE downstream_version_id IN (SELECT version_id FROM data_product_versions WHERE data_product_id = ?)
+  AND upstream_product_uri IN (SELECT access_uri FROM data_product_versions WHERE data_product_id = ?)
+"""
+
+# Keeps `IN (...)` lists below SQLite's host parameter limit.
+_IN_CHUNK = 500
+
+
+def parse_timestamp(value: Optional[str]) -> datetime:
+	if not value:
+		return datetime.utcnow()
+	# `datetime('now')` text; fromisoformat is much cheaper than strptime.
+	return datetime.fromisoformat(value)
+
+
+def utc_now() -> datetime:
+	"""Current time at the one-second precision SQLite timestamps carry."""
+	return datetime.utcnow().replace(microsecond=0)
+
+
+def size_bytes_or_null(value: Optional[str]) -> Optional[int]:
+	try:
+		return parse_size(value) if value is not None else None
+	except ValueError:
+		return None
+
+
+def escape_like(term: str) -> str:
+	return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SqliteRegistry:
+	"""Drop-in `Registry` replacement backed by the mesh_core SQLite schema.
+
+	Mutations run inside one transaction that is made durable by `commit()`,
+	so a CLI command that creates a product and its metadata costs a single
+	fsync. Queries go through the connection's statement cache and only touch
+	the rows they return.
+	"""
+
+	def __init__(self, path: Path = Path(DEFAULT_DB_FILENAME)) -> None:
+		self.path = Path(path)
+		self._conn = sqlite3.connect(str(self.path), cached_statements=256)
+		self._conn.row_factory = sqlite3.Row
+		# Only used in queries, never in indexes or triggers, so databases stay
+		# writable from the Rust CLI.
+		self._conn.create_function("feam_size_bytes", 1, size_bytes_or_null, deterministic=True)
+		self._conn.execute("PRAGMA journal_mode = WAL")
+		self._conn.execute("PRAGMA foreign_keys = ON")
+		with self._conn:
+			self._conn.executescript(SCHEMA)
+		self._add_access_uri_column()
+		with self._conn:
+			self._conn.executescript(EXTRA_INDEXES)
+		self._has_fts = self._init_full_text()
+		# Built from `lineage_dependencies` by the first lineage command.
+		self._lineage: Optional[LineageGraph] = None
+		# (trigram index, product id -> (name, description)) for `--fuzzy`.
+		self._fuzzy: Optional[Tuple[TrigramIndex, Dict[int, Tuple[str, str]]]] = None
+
+	def _add_access_uri_column(self) -> None:
+		"""Add `data_product_versions.access_uri` once; another process may be doing the same."""
+		if self._has_access_uri_column():
+			return
+		self._conn.execute("BEGIN IMMEDIATE")
+		try:
+			if not self._has_access_uri_column():
+				for statement in ACCESS_URI_COLUMN.split(";"):
+					if statement.strip():
+						self._conn.execute(statement)
+		except BaseException:
+			self._conn.rollback()
+			raise
+		self._conn.commit()
+
+	def _has_access_uri_column(self) -> bool:
+		rows = self._conn.execute("PRAGMA table_info(data_product_versions)")
+		return any(row["name"] == "access_uri" for row in rows)
+
+	def _init_full_text(self) -> bool:
+		"""Create and backfill the FTS5 table once; False if FTS5 is unavailable."""
+		exists = self._conn.execute(
+			"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+		).fetchone()
+		try:
+			self._conn.executescript("BEGIN;" + ("" if exists else FTS_SCHEMA) + FTS_TRIGGERS + "COMMIT;")
+		except sqlite3.OperationalError:
+			self._conn.rollback()
+			return False
+		return True
+
+	# -------------------- lifecycle --------------------
+
+	def commit(self) -> None:
+		self._conn.commit()
+
+	def close(self) -> None:
+		self._conn.close()
+
+	def compact(self) -> None:
+		"""Fold the WAL back into the main database file."""
+		self._conn.commit()
+		self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+	# -------------------- creation helpers --------------------
+
+	# Inserts write `created_at` explicitly in the same format as the schema's
+	# `datetime('now')` default, so the returned objects can be built without
+	# reading the rows back.
+
+	def create_team(self, name: str) -> Team:
+		now = utc_now()
+		try:
+			cursor = self._conn.execute(_SQL_INSERT_TEAM, (name, now.isoformat(" ")))
+		except sqlite3.IntegrityError as exc:
+			raise ValueError(f"Team {name!r} already exists") from exc
+		return Team(teams_id=cursor.lastrowid, name=name, created_at=now)
+
+	def create_data_product(
+		self,
+		name: str,
+		description: str,
+		owner_team_id: int,
+		data_format: str,
+		access_uri: str,
+		status: str,
+		classification: str,
+	) -> DataProduct:
+		now = utc_now()
+		created_at = now.isoformat(" ")
+		try:
+			cursor = self._conn.execute(
+				_SQL_INSERT_PRODUCT, (name, description, owner_team_id, created_at)
+			)
+		except sqlite3.IntegrityError as exc:
+			raise ValueError(f"Unknown owner_team_id {owner_team_id}") from exc
+		product_id = cursor.lastrowid
+		self._conn.execute(
+			_SQL_INSERT_VERSION,
+			(
+				product_id,
+				DEFAULT_VERSION_LABEL,
+				data_format,
+				"",
+				access_uri,
+				status,
+				classification,
+				created_at,
+			),
+		)
+		if self._fuzzy is not None:
+			index, texts = self._fuzzy
+			texts[product_id] = (name, description)
+			index.add(product_id, NAME, name)
+			index.add(product_id, DESCRIPTION, description)
+		return DataProduct(
+			product_id=product_id,
+			name=name,
+			description=description,
+			owner_team_id=owner_team_id,
+			data_format=data_format,
+			access_uri=access_uri,
+			status=status,
+			classification=classification,
+			created_at=now,
+			updated_at=now,
+		)
+
+	def add_metadata(
+		self,
+		data_product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		value_type: str,
+	) -> MetadataEntry:
+		version_id = self._conn.execute(_SQL_LATEST_VERSION, (data_product_id,)).fetchone()[0]
+		if version_id is None:
+			raise ValueError(f"Unknown data_product_id {data_product_id}")
+
+		now = utc_now()
+		cursor = self._conn.execute(
+			_SQL_INSERT_METADATA,
+			(version_id, namespace, meta_key, meta_value, value_type, now.isoformat(" ")),
+		)
+		if (namespace, meta_key) == ("feam", "source_path"):
+			self._conn.execute(_SQL_SYNC_SOURCE_PATH, (meta_value, cursor.lastrowid))
+		return MetadataEntry(
+			metadata_id=cursor.lastrowid,
+			data_product_id=data_product_id,
+			namespace=namespace,
+			meta_key=meta_key,
+			meta_value=meta_value,
+			value_type=value_type,
+			created_at=now,
+			typed_value=parse_typed_value(meta_value, value_type),
+		)
+
+	def create_version(self, data_product_id: int, version_label: Optional[str] = None) -> DataProductVersion:
+		"""Open a new latest version, copying the current one and its metadata rows.
+
+		Unlike the JSON backend, the current state is the latest version row,
+		so a version is opened before the changes it publishes: they land on
+		it and leave the previous one as it was. `version_label` defaults to
+		the version's number.
+		"""
+		latest = self._conn.execute(_SQL_LATEST_VERSION_ROW, (data_product_id,)).fetchone()
+		if latest is None:
+			raise ValueError(f"Unknown data_product_id {data_product_id}")
+		if version_label is None:
+			version_label = str(self._conn.execute(_SQL_COUNT_VERSIONS, (data_product_id,)).fetchone()[0] + 1)
+		created_at = utc_now().isoformat(" ")
+		cursor = self._conn.execute(
+			_SQL_INSERT_VERSION,
+			(
+				data_product_id,
+				version_label,
+				latest["asset_type"],
+				latest["source_path"],
+				latest["access_uri"],
+				latest["data_quality"],
+				latest["classification"],
+				created_at,
+			),
+		)
+		self._conn.execute(_SQL_COPY_METADATA, (cursor.lastrowid, created_at, latest["version_id"]))
+		return self.get_version(data_product_id, version_label)
+
+	def update_metadata(self, metadata_id: int, meta_value: str, value_type: str) -> MetadataEntry:
+		"""Replace the value (and type) of an existing metadata entry."""
+		cursor = self._conn.execute(_SQL_UPDATE_METADATA, (meta_value, value_type, metadata_id))
+		if cursor.rowcount == 0:
+			raise ValueError(f"Unknown metadata_id {metadata_id}")
+		self._conn.execute(_SQL_SYNC_SOURCE_PATH, (meta_value, metadata_id))
+		return self.get_metadata(metadata_id)
+
+	def set_metadata(
+		self,
+		data_product_id: int,
+		namespace: str,
+		meta_key: str,
+		meta_value: str,
+		value_type: str,
+	) -> MetadataEntry:
+		"""Update the product's `namespace.meta_key` entry, adding it if missing."""
+		row = self._conn.execute(
+			_SQL_FIND_METADATA, (data_product_id, namespace, meta_key)
+		).fetchone()
+		if row is None:
+			return self.add_metadata(data_product_id, namespace, meta_key, meta_value, value_type)
+		if row["meta_value"] == meta_value and row["value_type"] == value_type:
+			return self._metadata_from_row(row, data_product_id)
+		return self.update_metadata(row["metadata_id"], meta_value, value_type)
+
+	# -------------------- lineage --------------------
+
+	def add_lineage(self, downstream_id: int, upstream_id: int) -> bool:
+		"""Link the downstream product's latest version to the upstream's access URI."""
+		version_id = self._conn.execute(_SQL_LATEST_VERSION, (downstream_id,)).fetchone()[0]
+		upstream = self.get_version(upstream_id)
+		for product_id, found in ((downstream_id, version_id), (upstream_id, upstream)):
+			if found is None:
+				raise ValueError(f"Unknown data_product_id {product_id}")
+		if not self._lineage_graph().add_edge(downstream_id, upstream_id):
+			return False
+		self._conn.execute(_SQL_INSERT_LINEAGE, (version_id, upstream.access_uri, upstream.version_label))
+		return True
+
+	def remove_lineage(self, downstream_id: int, upstream_id: int) -> bool:
+		if not self._lineage_graph().remove_edge(downstream_id, upstream_id):
+			return False
+		self._conn.execute(_SQL_DELETE_LINEAGE, (downstream_id, upstream_id))
+		return True
+
+	def list_lineage(self) -> List[Tuple[int, int]]:
+		return list(self._lineage_graph().edges())
+
+	def upstream_ids(self, product_id: int, transitive: bool = True) -> Set[int]:
+		graph = self._lineage_graph()
+		return set(graph.upstream(product_id) if transitive else graph.direct_upstream(product_id))
+
+	def downstream_ids(self, product_id: int, transitive: bool = True) -> Set[int]:
+		graph = self._lineage_graph()
+		return set(graph.downstream(product_id) if transitive else graph.direct_downstream(product_id))
+
+	def impact_order(self, product_id: int) -> List[int]:
+		return self._lineage_graph().impact(product_id)
+
+	def _lineage_graph(self) -> LineageGraph:
+		if self._lineage is None:
+			graph = LineageGraph()
+			for row in self._conn.execute(_SQL_LINEAGE_EDGES):
+				# Rows written by other tools are taken as they are.
+				graph.add_edge(row["downstream_id"], row["upstream_id"], check=False)
+			self._lineage = graph
+		return self._lineage
+
+	# -------------------- query helpers --------------------
+
+	def list_teams(self) -> List[Team]:
+		return [self._team_from_row(row) for row in self._conn.execute(_SQL_LIST_TEAMS)]
+
+	def list_products(self) -> List[DataProduct]:
+		return self._products_with_metadata(self._conn.execute(_SQL_LIST_PRODUCTS))
+
+	def iter_products(
+		self,
+		filters: Sequence[Filter] = (),
+		sort: str = ID,
+		after: Optional[Position] = None,
+	) -> Iterator[DataProduct]:
+		"""Products matching `filters`, ordered by `sort` then id, from just after `after`.
+
+		One keyset query, fetched and decoded in chunks.
+		"""
+		if sort not in SORT_FIELDS:
+			raise ValueError(f"Cannot sort products by {sort!r}")
+		conditions, params = self._filter_conditions(filters, "p.product_id")
+		column = _SORT_COLUMNS.get(sort)
+		order = f"{column}, p.product_id" if column is not None else "p.product_id"
+		if after is not None:
+			conditions += f" AND ({order}) > ({', '.join('?' * len(after))})"
+			params.extend(after)
+		cursor = self._conn.execute(_SQL_PAGE_PRODUCTS.format(conditions=conditions, order=order), params)
+		while True:
+			rows = cursor.fetchmany(_IN_CHUNK)
+			if not rows:
+				return
+			yield from self._products_with_metadata(rows)
+
+	def rank_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		filters: Sequence[Filter] = (),
+		after: Optional[Position] = None,
+	) -> List[Tuple[DataProduct, Position]]:
+		"""Full-text matches with their rank positions, for paging with `after`."""
+		if not self._has_fts:
+			products = self.search_products(query, match_all=match_all, filters=filters)
+			hits = [(p.product_id, rank_position(0.0, p.product_id)) for p in products]
+		else:
+			tokens = list(dict.fromkeys(tokenize(query)))
+			if not tokens:
+				return []
+			operator = " AND " if match_all else " OR "
+			expression = operator.join(f'"{token}"*' for token in tokens)
+			conditions, params = self._filter_conditions(filters, "rowid")
+			rows = self._conn.execute(_SQL_RANKED.format(conditions=conditions), (expression, *params))
+			# bm25() is lower for better matches; positions negate higher-is-better scores.
+			hits = [(row["rowid"], rank_position(-row["score"], row["rowid"])) for row in rows]
+		if after is not None:
+			hits = [hit for hit in hits if hit[1] > tuple(after)]
+		hits = hits[:limit] if limit is not None else hits
+		products = self._products_by_ids([product_id for product_id, _ in hits])
+		return list(zip(products, (position for _, position in hits)))
+
+	def get_team(self, team_id: int) -> Optional[Team]:
+		row = self._conn.execute(_SQL_GET_TEAM, (team_id,)).fetchone()
+		return self._team_from_row(row) if row else None
+
+	def get_product(self, product_id: int) -> Optional[DataProduct]:
+		row = self._conn.execute(_SQL_GET_PRODUCT, (product_id,)).fetchone()
+		if row is None:
+			return None
+		product = self._product_from_row(row)
+		if row["version_id"] is not None:
+			product.metadata = [
+				self._metadata_from_row(m, product_id)
+				for m in self._conn.execute(_SQL_VERSION_METADATA, (row["version_id"],))
+			]
+		return product
+
+	def list_versions(self, product_id: int) -> List[DataProductVersion]:
+		"""The product's versions, oldest first."""
+		return self._versions_with_metadata(list(self._conn.execute(_SQL_PRODUCT_VERSIONS, (product_id,))))
+
+	def get_version(self, product_id: int, version_label: Optional[str] = None) -> Optional[DataProductVersion]:
+		"""The version labelled `version_label`, or the latest one."""
+		if version_label is None:
+			row = self._conn.execute(_SQL_LATEST_VERSION_ROW, (product_id,)).fetchone()
+		else:
+			row = self._conn.execute(_SQL_VERSION_BY_LABEL, (product_id, version_label)).fetchone()
+		return self._versions_with_metadata([row])[0] if row else None
+
+	def get_team_by_name(self, name: str) -> Optional[Team]:
+		row = self._conn.execute(_SQL_GET_TEAM_BY_NAME, (name,)).fetchone()
+		return self._team_from_row(row) if row else None
+
+	def get_product_by_uri(self, access_uri: str) -> Optional[DataProduct]:
+		row = self._conn.execute(_SQL_PRODUCT_BY_URI, (access_uri,)).fetchone()
+		return self.get_product(row[0]) if row else None
+
+	def get_product_by_name(self, name: str) -> Optional[DataProduct]:
+		row = self._conn.execute(_SQL_PRODUCT_BY_NAME, (name,)).fetchone()
+		return self.get_product(row[0]) if row else None
+
+	def get_metadata(self, metadata_id: int) -> Optional[MetadataEntry]:
+		row = self._conn.execute(_SQL_GET_METADATA_WITH_PRODUCT, (metadata_id,)).fetchone()
+		return self._metadata_from_row(row, row["data_product_id"]) if row else None
+
+	def search_products_by_name(self, term: str) -> List[DataProduct]:
+		pattern = f"%{escape_like(term)}%"
+		return self._products_with_metadata(self._conn.execute(_SQL_SEARCH_PRODUCTS, (pattern,)))
+
+	def search_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		filters: Sequence[Filter] = (),
+	) -> List[DataProduct]:
+		"""Ranked full-text search over names, descriptions and metadata values.
+
+		`filters` restrict the results to products matching every filter. With
+		an empty query the filtered products are returned in id order.
+		"""
+		sql_limit = -1 if limit is None else limit
+		tokens = list(dict.fromkeys(tokenize(query)))
+		if not tokens:
+			if query.strip():
+				return []
+			conditions, params = self._filter_conditions(filters, "product_id")
+			rows = self._conn.execute(
+				_SQL_FILTERED_IDS.format(conditions=conditions), (*params, sql_limit)
+			)
+			return self._products_by_ids([row[0] for row in rows])
+
+		if not self._has_fts:
+			matches = self.search_products_by_name(query)
+			if filters:
+				conditions, params = self._filter_conditions(filters, "product_id")
+				allowed = {
+					row[0]
+					for row in self._conn.execute(
+						_SQL_FILTERED_IDS.format(conditions=conditions), (*params, -1)
+					)
+				}
+				matches = [p for p in matches if p.product_id in allowed]
+			return matches[:limit]
+
+		operator = " AND " if match_all else " OR "
+		expression = operator.join(f'"{token}"*' for token in tokens)
+		conditions, params = self._filter_conditions(filters, "rowid")
+		rows = self._conn.execute(
+			_SQL_FULL_TEXT.format(conditions=conditions), (expression, *params, sql_limit)
+		)
+		return self._products_by_ids([row[0] for row in rows])
+
+	def fuzzy_search_products(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		similarity: float = DEFAULT_SIMILARITY,
+		descriptions: bool = False,
+		filters: Sequence[Filter] = (),
+	) -> List[Tuple[DataProduct, int]]:
+		"""Typo-tolerant search over names (and `descriptions`), closest first."""
+		allowed = None
+		if filters:
+			conditions, params = self._filter_conditions(filters, "product_id")
+			allowed = {
+				row[0]
+				for row in self._conn.execute(_SQL_FILTERED_IDS.format(conditions=conditions), (*params, -1))
+			}
+		index, texts = self._fuzzy_index()
+		fields = (NAME, DESCRIPTION) if descriptions else (NAME,)
+		hits = fuzzy_search(
+			[index],
+			query,
+			lambda product_id, field: texts[product_id][FIELDS.index(field)],
+			fields=fields,
+			similarity=similarity,
+			limit=limit,
+			restrict=allowed,
+		)
+		products = self._products_by_ids([product_id for product_id, _ in hits])
+		return [(product, distance) for product, (_, distance) in zip(products, hits)]
+
+	def _fuzzy_index(self) -> Tuple[TrigramIndex, Dict[int, Tuple[str, str]]]:
+		if self._fuzzy is None:
+			index = TrigramIndex()
+			texts: Dict[int, Tuple[str, str]] = {}
+			for row in self._conn.execute(_SQL_PRODUCT_TEXTS):
+				texts[row["product_id"]] = (row["name"], row["description"])
+				index.add(row["product_id"], NAME, row["name"])
+				index.add(row["product_id"], DESCRIPTION, row["description"])
+			self._fuzzy = (index, texts)
+		return self._fuzzy
+
+	@staticmethod
+	def _filter_conditions(filters: Sequence[Filter], id_column: str) -> Tuple[str, List[object]]:
+		"""SQL `AND ... IN (subquery)` clauses for `filters` over `id_column`."""
+		clauses: List[str] = []
+		params: List[object] = []
+		for f in filters:
+			if f.is_product_field and f.is_range:
+				# `created_at`, the only timestamp field.
+				_, key = parse_range_literal(f.value)
+				subquery = _SQL_FILTER_CREATED.format(op=f.op)
+				params.append(key / 86400.0 + _JULIAN_EPOCH)
+			elif f.is_range:
+				kind, key = parse_range_literal(f.value)
+				if kind == NUMBER:
+					subquery = _SQL_FILTER_NUMBER_RANGE.format(op=f.op)
+					params.extend((f.namespace, f.key, key, f.namespace, f.key, key))
+				else:
+					subquery = _SQL_FILTER_TIME_RANGE.format(op=f.op)
+					params.extend((f.namespace, f.key, key / 86400.0 + _JULIAN_EPOCH))
+			elif not f.is_product_field:
+				subquery = _SQL_FILTER_METADATA
+				params.extend((f.namespace, f.key, f.value))
+			else:
+				values = ", ".join("?" * len(f.values))
+				if f.key == "owner_team_id":
+					subquery = _SQL_FILTER_OWNER.format(values=values)
+				else:
+					subquery = _SQL_FILTER_VERSION_FIELD.format(column=_VERSION_FILTER_COLUMNS[f.key], values=values)
+				params.extend(f.values)
+			membership = "NOT IN" if f.op == NOT_EQUAL else "IN"
+			clauses.append(f" AND {id_column} {membership} ({subquery})")
+		return "".join(clauses), params
+
+	def refresh_due(self, until: datetime) -> List[RefreshDue]:
+		"""Scheduled products expected to refresh by `until`, longest overdue first.
+
+		The index is built from the two metadata keys on every call, as
+		commands do not share a connection.
+		"""
+		return self._refresh_index().due(until)
+
+	def invalid_refresh_schedules(self) -> Dict[int, Tuple[str, str]]:
+		return dict(self._refresh_index().invalid)
+
+	def facet_counts(self, facet: Facet, filters: Sequence[Filter] = ()) -> Dict[str, int]:
+		"""Value -> number of products with it, among the products matching `filters`, by `GROUP BY`."""
+		if not facet.is_product_field:
+			conditions, params = self._filter_conditions(filters, "v.data_product_id")
+			sql = _SQL_FACET_METADATA.format(conditions=conditions)
+			params = [facet.namespace, facet.key, *params]
+		else:
+			conditions, params = self._filter_conditions(filters, "p.product_id")
+			if facet.key == "owner_team_id":
+				sql = _SQL_FACET_OWNER.format(conditions=conditions)
+			else:
+				sql = _SQL_FACET_VERSION_FIELD.format(column=_VERSION_FILTER_COLUMNS[facet.key], conditions=conditions)
+		return {row["value"]: row["count"] for row in self._conn.execute(sql, params)}
+
+	def _refresh_index(self) -> RefreshIndex:
+		rows = self._conn.execute(_SQL_REFRESH_METADATA, (*REFRESH_SCHEDULE, *REFRESHED_AT))
+		return RefreshIndex.from_metadata(tuple(row) for row in rows)
+
+	def _products_by_ids(self, product_ids: List[int]) -> List[DataProduct]:
+		"""Load products for `product_ids`, preserving their order."""
+		rows: List[sqlite3.Row] = []
+		for start in range(0, len(product_ids), _IN_CHUNK):
+			chunk = product_ids[start:start + _IN_CHUNK]
+			sql = _SQL_PRODUCTS_BY_IDS.format(placeholders=",".join("?" * len(chunk)))
+			rows.extend(self._conn.execute(sql, chunk))
+		position = {product_id: i for i, product_id in enumerate(product_ids)}
+		rows.sort(key=lambda row: position[row["product_id"]])
+		return self._products_with_metadata(rows)
+
+	# -------------------- row mapping --------------------
+
+	def _products_with_metadata(self, rows: Iterable[sqlite3.Row]) -> List[DataProduct]:
+		"""Materialize product rows and attach their metadata in one extra query."""
+		products: List[DataProduct] = []
+		by_version: Dict[int, DataProduct] = {}
+		for row in rows:
+			product = self._product_from_row(row)
+			products.append(product)
+			if row["version_id"] is not None:
+				by_version[row["version_id"]] = product
+		version_ids = list(by_version)
+		for start in range(0, len(version_ids), _IN_CHUNK):
+			chunk = version_ids[start:start + _IN_CHUNK]
+			sql = _SQL_VERSIONS_METADATA.format(placeholders=",".join("?" * len(chunk)))
+			for m in self._conn.execute(sql, chunk):
+				product = by_version[m["data_product_version_id"]]
+				product.metadata.append(self._metadata_from_row(m, product.product_id))
+		return products
+
+	def _versions_with_metadata(self, rows: List[sqlite3.Row]) -> List[DataProductVersion]:
+		metadata: Dict[int, List[Tuple[int, VersionedMetadata]]] = {row["version_id"]: [] for row in rows}
+		version_ids = list(metadata)
+		for start in range(0, len(version_ids), _IN_CHUNK):
+			chunk = version_ids[start:start + _IN_CHUNK]
+			sql = _SQL_VERSIONS_METADATA.format(placeholders=",".join("?" * len(chunk)))
+			for m in self._conn.execute(sql, chunk):
+				entry = VersionedMetadata(
+					metadata_id=m["metadata_id"],
+					namespace=m["namespace"] or "",
+					meta_key=m["meta_key"],
+					meta_value=m["meta_value"] or "",
+					value_type=m["value_type"] or "",
+				)
+				metadata[m["data_product_version_id"]].append((entry.metadata_id, entry))
+		return [
+			DataProductVersion(
+				version_id=row["version_id"],
+				data_product_id=row["data_product_id"],
+				version_label=row["version_label"],
+				data_format=row["asset_type"] or "",
+				access_uri=row["access_uri"] or "",
+				status=row["data_quality"] or "",
+				classification=row["classification"] or "",
+				created_at=parse_timestamp(row["created_at"]),
+				metadata=PersistentMap.from_items(metadata[row["version_id"]]),
+			)
+			for row in rows
+		]
+
+	@staticmethod
+	def _team_from_row(row: sqlite3.Row) -> Team:
+		return Team(
+			teams_id=row["team_id"],
+			name=row["name"],
+			created_at=parse_timestamp(row["created_at"]),
+		)
+
+	@staticmethod
+	def _product_from_row(row: sqlite3.Row) -> DataProduct:
+		created_at = parse_timestamp(row["created_at"])
+		return DataProduct(
+			product_id=row["product_id"],
+			name=row["name"],
+			description=row["description"] or "",
+			owner_team_id=row["owner_team_id"],
+			data_format=row["asset_type"] or "",
+			access_uri=row["access_uri"] or "",
+			status=row["data_quality"] or "",
+			classification=row["classification"] or "",
+			created_at=created_at,
+			updated_at=parse_timestamp(row["updated_at"]) if row["updated_at"] else created_at,
+		)
+
+	@staticmethod
+	def _metadata_from_row(row: sqlite3.Row, data_product_id: int) -> MetadataEntry:
+		return MetadataEntry(
+			metadata_id=row["metadata_id"],
+			data_product_id=data_product_id,
+			namespace=row["namespace"] or "",
+			meta_key=row["meta_key"],
+			meta_value=row["meta_value"] or "",
+			value_type=row["value_type"] or "",
+			created_at=parse_timestamp(row["created_at"]),
+			typed_value=parse_typed_value(row["meta_value"] or "", row["value_type"] or ""),
+		)
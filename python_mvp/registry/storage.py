@@ -0,0 +1,758 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from . import trace
+from .binary_snapshot import BinarySnapshot, source_stamp, write_binary_snapshot
+from .locking import FileLock
+from .migrations import FORMAT_KEY, FORMAT_VERSION, file_format_version, upgrade_data, upgrade_file
+from .models import Team
+from .query_cache import Dependency, QueryCache, metadata_dependencies, product_dependencies
+from .services import Registry
+
+# Journaled persistence for the registry.
+#
+# The catalog lives in two files: a JSON snapshot (the historical
+# `feam_registry.json` format, versioned since; see `migrations`) and an
+# append-only journal of compact records
+# for every mutation made since that snapshot was written. Read-only commands
+# write nothing, mutating commands append a few lines, and once the journal
+# grows past a threshold it is folded back into a fresh snapshot.
+#
+# Next to the JSON snapshot sits a binary copy (see `binary_snapshot`) that
+# is memory-mapped on load, so a command only decodes the products it
+# touches. It is derived data: it records the size and mtime of the JSON it
+# was built from, and is rebuilt whenever the two disagree (e.g. after the
+# JSON was edited by hand or written by an older version).
+#
+# The registry's query cache can be saved next to them as well
+# (`feam_registry.json.cache`), stamped with the files its results reflect;
+# the next process keeps it, minus the entries the journal records written
+# since may have changed.
+
+JOURNAL_SUFFIX = ".journal"
+BINARY_SUFFIX = ".snapshot"
+LOCK_SUFFIX = ".lock"
+IDS_SUFFIX = ".ids"
+SPOOL_SUFFIX = ".pending"
+SPOOL_RECORDS_SUFFIX = ".jsonl"
+QUERY_CACHE_SUFFIX = ".cache"
+COMPACT_THRESHOLD_BYTES = 1024 * 1024
+MAX_ID_LEASE = 1024
+
+FileStamps = Tuple[Optional[Tuple[int, int, int]], ...]
+
+PRODUCT_FIELDS = (
+	"name",
+	"description",
+	"owner_team_id",
+	"data_format",
+	"access_uri",
+	"status",
+	"classification",
+)
+# ISO-8601 in snapshots and journal records; journal records written before
+# they were stored have none.
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+METADATA_FIELDS = ("data_product_id", "namespace", "meta_key", "meta_value", "value_type")
+VERSION_FIELDS = ("data_format", "access_uri", "status", "classification", "changed", "removed")
+
+
+def snapshot_to_dict(registry: Registry) -> Dict[str, Any]:
+	"""Serialize the registry into the snapshot layout."""
+	products = registry.list_products()
+	return {
+		FORMAT_KEY: FORMAT_VERSION,
+		"teams": [{"id": t.teams_id, "name": t.name} for t in registry.list_teams()],
+		"products": [
+			{
+				"id": p.product_id,
+				**{field: getattr(p, field) for field in PRODUCT_FIELDS},
+				**{field: getattr(p, field).isoformat() for field in TIMESTAMP_FIELDS},
+			}
+			for p in products
+		],
+		"metadata": [
+			{
+				"id": m.metadata_id,
+				"data_product_id": p.product_id,
+				"namespace": m.namespace,
+				"meta_key": m.meta_key,
+				"meta_value": m.meta_value,
+				"value_type": m.value_type,
+			}
+			for p in products
+			for m in p.metadata
+		],
+		# Listed by product, oldest first; each version only lists the
+		# metadata changed or removed since the product's previous one.
+		"versions": [
+			{
+				"id": v.version_id,
+				"data_product_id": p.product_id,
+				"label": v.version_label,
+				"created_at": v.created_at.isoformat(),
+				"data_format": v.data_format,
+				"access_uri": v.access_uri,
+				"status": v.status,
+				"classification": v.classification,
+				"changed": [list(row) for row in changed],
+				"removed": removed,
+			}
+			for p in products
+			if p.versions is not None
+			for v, changed, removed in p.versions.deltas()
+		],
+		# [downstream product id, upstream product id] pairs.
+		"lineage": [list(edge) for edge in registry.list_lineage()],
+	}
+
+
+def apply_snapshot(registry: Registry, data: Dict[str, Any]) -> None:
+	"""Rebuild registry state from a snapshot dict.
+
+	Snapshots in an older format are upgraded first (see `migrations`).
+	"""
+	data = upgrade_data(data)
+	for team in data["teams"]:
+		registry.create_team(team["name"], team_id=team["id"])
+
+	for product in data["products"]:
+		registry.create_data_product(
+			**{field: product[field] for field in PRODUCT_FIELDS},
+			**product_timestamps(product),
+			product_id=product["id"],
+		)
+
+	# Listed by product; adding them in id order keeps each product's
+	# entries in creation order.
+	for entry in sorted(data["metadata"], key=lambda entry: entry["id"]):
+		if registry.get_product(entry["data_product_id"]) is None:
+			continue
+		registry.add_metadata(
+			**{field: entry[field] for field in METADATA_FIELDS}, metadata_id=entry["id"]
+		)
+
+	for version in data["versions"]:
+		if registry.get_product(version["data_product_id"]) is not None:
+			add_version(registry, version)
+
+	for downstream_id, upstream_id in data["lineage"]:
+		if lineage_applies(registry, downstream_id, upstream_id):
+			registry.add_lineage(downstream_id, upstream_id)
+
+
+def product_timestamps(record: Dict[str, Any]) -> Dict[str, datetime]:
+	"""The timestamps stored in a product's snapshot or journal record."""
+	return {field: datetime.fromisoformat(record[field]) for field in TIMESTAMP_FIELDS if field in record}
+
+
+def lineage_applies(registry: Registry, downstream_id: int, upstream_id: int) -> bool:
+	"""Whether a stored edge still connects products of `registry`.
+
+	A shard's edges may lead upstream into other shards (see `shards.py`).
+	"""
+	if registry.get_product(downstream_id) is None:
+		return False
+	return registry.external_lineage or registry.get_product(upstream_id) is not None
+
+
+def add_version(registry: Registry, version: Dict[str, Any]) -> None:
+	"""Add a version from its snapshot or journal record."""
+	label = version["label"]
+	if registry.get_version(version["data_product_id"], label) is not None:
+		# Two writers published the same product concurrently and picked the
+		# same label; keep both versions.
+		label = f"{label}-{version['id']}"
+	registry.add_version(
+		version["data_product_id"],
+		label,
+		**{field: version[field] for field in VERSION_FIELDS},
+		created_at=datetime.fromisoformat(version["created_at"]),
+		version_id=version["id"],
+	)
+
+
+def apply_change(registry: Registry, change: Dict[str, Any]) -> None:
+	"""Replay one journal record.
+
+	Records carry the id they were assigned when first written, so a record
+	that is already part of the snapshot (e.g. after a crash between writing a
+	snapshot and truncating the journal) is skipped instead of duplicated.
+	"""
+	op = change["op"]
+	if op == "team":
+		if registry.get_team(change["id"]) is None:
+			registry.create_team(change["name"], team_id=change["id"])
+	elif op == "product":
+		if registry.get_product(change["id"]) is None:
+			registry.create_data_product(
+				**{field: change[field] for field in PRODUCT_FIELDS},
+				**product_timestamps(change),
+				product_id=change["id"],
+			)
+	elif op == "metadata":
+		if registry.get_metadata(change["id"]) is None:
+			registry.add_metadata(
+				**{field: change[field] for field in METADATA_FIELDS}, metadata_id=change["id"]
+			)
+	elif op == "metadata_update":
+		# Updates carry the full new value, so replaying one twice is harmless.
+		if registry.get_metadata(change["id"]) is not None:
+			registry.update_metadata(change["id"], change["meta_value"], change["value_type"])
+	elif op == "version":
+		product = registry.get_product(change["data_product_id"])
+		if product is not None and not (product.versions and product.versions.has_version_id(change["id"])):
+			add_version(registry, change)
+	elif op == "lineage":
+		# Edges are a set, so replaying either lineage record twice is harmless.
+		if lineage_applies(registry, change["downstream"], change["upstream"]):
+			registry.add_lineage(change["downstream"], change["upstream"])
+	elif op == "lineage_remove":
+		registry.remove_lineage(change["downstream"], change["upstream"])
+	else:
+		raise ValueError(f"Unknown journal op {op!r}")
+
+
+def change_dependencies(registry: Registry, change: Dict[str, Any]) -> Iterator[Dependency]:
+	"""What journal record `change`, already applied to `registry`, touches (see `query_cache`)."""
+	op = change.get("op")
+	if op == "product":
+		product = registry.get_product(change["id"])
+		if product is not None:
+			yield from product_dependencies(product)
+	elif op == "metadata":
+		yield from metadata_dependencies(
+			change["data_product_id"], change["namespace"], change["meta_key"], change["meta_value"]
+		)
+	elif op == "metadata_update":
+		entry = registry.get_metadata(change["id"])
+		if entry is not None:
+			yield from metadata_dependencies(
+				entry.data_product_id, entry.namespace, entry.meta_key, change["meta_value"]
+			)
+
+
+def write_atomic(path: Path, payload: str, sync: bool = True) -> None:
+	"""Write `payload` to `path` via a temporary file and an atomic rename.
+
+	Without `sync` the data is not flushed to disk first, for files that can
+	be rebuilt.
+	"""
+	with atomic_file(path, sync) as f:
+		f.write(payload)
+
+
+@contextmanager
+def atomic_file(path: Path, sync: bool = True) -> Iterator[TextIO]:
+	"""A new text file that replaces `path` if the block completes; see `write_atomic`."""
+	# Unique per writer, so processes writing the same file never share one.
+	tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:12]}.tmp")
+	try:
+		with tmp_path.open("x", encoding="utf-8") as f:
+			yield f
+			if sync:
+				f.flush()
+				os.fsync(f.fileno())
+	except BaseException:
+		tmp_path.unlink(missing_ok=True)
+		raise
+	os.replace(tmp_path, path)
+
+
+def lease_counter(
+	ids_path: Path,
+	lock: FileLock,
+	kind: str,
+	floor: int,
+	count: int,
+	initial: Callable[[], Dict[str, int]],
+) -> Tuple[int, int]:
+	"""Reserve `count` consecutive ids of `kind` from the counter file at `ids_path`.
+
+	`initial()` supplies the counters when the file is missing or unreadable.
+	"""
+	with lock:
+		try:
+			with ids_path.open("r", encoding="utf-8") as f:
+				counters = json.load(f)
+		except (FileNotFoundError, json.JSONDecodeError):
+			counters = initial()
+		start = max(counters.get(kind, 1), floor)
+		counters[kind] = start + count
+		write_atomic(ids_path, json.dumps(counters))
+	return start, start + count
+
+
+class IdAllocator:
+	"""Hands a `Registry` ids that no other process writing the store will use.
+
+	Ids are leased from the store's counter file in blocks that double in
+	size (up to `MAX_ID_LEASE`), so a one-product `feam serve` takes the lock
+	once per kind and a large batch only rarely. Ids leased but not used
+	leave gaps.
+	"""
+
+	def __init__(self, store: JournalStore) -> None:
+		self.store = store
+		self._leases: Dict[str, Tuple[int, int]] = {}
+		self._lease_sizes: Dict[str, int] = {}
+
+	def __call__(self, kind: str, floor: int) -> int:
+		start, end = self._leases.get(kind, (0, 0))
+		if start >= end:
+			size = self._lease_sizes.get(kind, 1)
+			self._lease_sizes[kind] = min(size * 2, MAX_ID_LEASE)
+			start, end = self.store.lease_ids(kind, floor, size)
+		self._leases[kind] = (start + 1, end)
+		return start
+
+
+class JournalStore:
+	"""Snapshot + append-only journal storage for a `Registry`.
+
+	Safe for many writing processes, also on shared filesystems:
+
+	- every write to the snapshot, journal or id counters happens under an
+	  advisory lock (`feam_registry.json.lock`);
+	- new ids are leased from a counter file (`feam_registry.json.ids`), so
+	  concurrent writers never hand out the same id;
+	- commits are grouped: a writer spools its records to
+	  `feam_registry.json.pending/` and then takes the lock; whoever holds it
+	  appends every spooled batch with a single fsync, and the writers queued
+	  behind it find their records already durable.
+	"""
+
+	def __init__(self, path: Path, compact_threshold: int = COMPACT_THRESHOLD_BYTES) -> None:
+		self.path = Path(path)
+		self.journal_path = self.path.with_name(self.path.name + JOURNAL_SUFFIX)
+		self.binary_path = self.path.with_name(self.path.name + BINARY_SUFFIX)
+		self.lock_path = self.path.with_name(self.path.name + LOCK_SUFFIX)
+		self.ids_path = self.path.with_name(self.path.name + IDS_SUFFIX)
+		self.spool_dir = self.path.with_name(self.path.name + SPOOL_SUFFIX)
+		self.query_cache_path = self.path.with_name(self.path.name + QUERY_CACHE_SUFFIX)
+		self.compact_threshold = compact_threshold
+		# File stamps as of the last load or commit, while the registry this
+		# store loaded still matches the files; None once it may not.
+		self._seen: Optional[FileStamps] = None
+		# Spooled batches whose records came from the registry being committed.
+		self._own_spools: Set[str] = set()
+
+	def _lock(self) -> FileLock:
+		return FileLock(self.lock_path)
+
+	def _stamps(self) -> FileStamps:
+		return (_stat(self.path), _stat(self.journal_path))
+
+	def is_current(self) -> bool:
+		"""True while nobody else has written since this store's last load or commit."""
+		return self._seen is not None and self._seen == self._stamps()
+
+	def _saw(self, registry: Registry, stamps: Optional[FileStamps]) -> None:
+		"""Note that `registry` matches the files at `stamps` (None: it may not)."""
+		self._seen = stamps
+		cache = registry.query_cache
+		if cache.stamp != stamps:
+			cache.stamp = stamps
+			cache.dirty = True
+
+	# -------------------- reading --------------------
+
+	def load(self, registry: Registry, query_cache: Optional[QueryCache] = None) -> None:
+		"""Load the snapshot, replay the journal, and leave no pending changes.
+
+		`query_cache`, saved by an earlier process or taken from a registry
+		this store loaded before, becomes `registry`'s, without the entries
+		that records written since may have changed.
+		"""
+		if not self.path.exists():
+			with self._lock():
+				if not self.path.exists():
+					self._create(registry)
+					self._keep_query_cache(registry, query_cache, None)
+					self._saw(registry, self._stamps())
+					registry.set_id_allocator(IdAllocator(self))
+					return
+
+		self.upgrade()
+		stamps = self._read_files(registry)
+		self._keep_query_cache(registry, query_cache, stamps)
+		self._saw(registry, stamps)
+		registry.set_id_allocator(IdAllocator(self))
+
+	def _create(self, registry: Registry) -> None:
+		"""Write the first snapshot: a new registry starts with the mock catalog."""
+		from .seed import seed_mock_data
+
+		with registry.untracked():
+			seed_mock_data(registry)
+		self._write_snapshot(snapshot_to_dict(registry))
+		write_atomic(self.ids_path, json.dumps(registry.next_ids()))
+
+	def _read_files(self, registry: Registry) -> FileStamps:
+		"""Apply the snapshot and journal to `registry`; returns the stamps read."""
+		# Stamped before reading: a write that races with us makes the
+		# registry look stale, never current.
+		stamps = self._stamps()
+		with registry.untracked():
+			with trace.span("snapshot"):
+				snapshot = self._open_binary()
+				if snapshot is not None:
+					registry.attach_snapshot(snapshot)
+					if trace.enabled():
+						trace.count("products_loaded", len(snapshot))
+						trace.count("bytes_mapped", _size(self.binary_path))
+				else:
+					with trace.span("parse_json"), self.path.open("r", encoding="utf-8") as f:
+						# Upgraded by `load`, unless an older feam rewrote it since.
+						data = upgrade_data(json.load(f))
+					if trace.enabled():
+						trace.count("bytes_read", _size(self.path))
+					with trace.span("apply"):
+						apply_snapshot(registry, data)
+					trace.count("products_loaded", len(data["products"]))
+					self._write_binary(data)
+
+			with trace.span("journal"):
+				replayed = 0
+				for change in self._read_journal():
+					apply_change(registry, change)
+					replayed += 1
+				if trace.enabled():
+					trace.count("bytes_read", _size(self.journal_path))
+					trace.count("journal_records_replayed", replayed)
+		return stamps
+
+	def _keep_query_cache(
+		self, registry: Registry, cache: Optional[QueryCache], stamps: Optional[FileStamps]
+	) -> None:
+		"""Give `registry`, just loaded from the files at `stamps`, the results in `cache` still valid."""
+		if cache is None:
+			return
+		with trace.span("query_cache"):
+			offset = self._journal_offset(cache.stamp, stamps)
+			if offset is None:
+				cache.clear()
+			else:
+				for change in self._read_journal_from(offset):
+					cache.invalidate(change_dependencies(registry, change))
+		registry.query_cache = cache
+
+	def _journal_offset(self, seen: Optional[FileStamps], loaded: Optional[FileStamps]) -> Optional[int]:
+		"""Where the journal records written after `seen` start, if `loaded` only adds records to it."""
+		if seen is None or loaded is None:
+			return None
+		seen_snapshot, seen_journal = seen
+		loaded_snapshot, loaded_journal = loaded
+		if seen_snapshot != loaded_snapshot:
+			return None
+		if seen_journal is None:
+			return 0
+		if loaded_journal is None or loaded_journal[0] != seen_journal[0] or loaded_journal[1] < seen_journal[1]:
+			return None
+		return seen_journal[1]
+
+	def _read_journal_from(self, offset: int) -> Iterator[Dict[str, Any]]:
+		try:
+			with self.journal_path.open("rb") as f:
+				f.seek(offset)
+				tail = f.read()
+		except FileNotFoundError:
+			return
+		yield from _parse_records(tail.decode("utf-8", errors="replace").splitlines())
+
+	def read_query_cache(self, capacity: int) -> QueryCache:
+		"""The query cache saved by `save_query_cache`, or a new one that will be saved."""
+		cache: Optional[QueryCache] = None
+		try:
+			with self.query_cache_path.open("r", encoding="utf-8") as f:
+				data = json.load(f)
+			cache = QueryCache.from_dict(data["cache"], capacity)
+			cache.stamp = _stamps_from_json(data["stamp"])
+		except (OSError, ValueError, KeyError, TypeError):
+			cache = QueryCache(capacity)
+		cache.persistent = True
+		return cache
+
+	def save_query_cache(self, cache: QueryCache) -> None:
+		"""Save a cache from `read_query_cache` if it changed, for the next process."""
+		if not cache.persistent or not cache.dirty:
+			return
+		payload = {"stamp": cache.stamp, "cache": cache.to_dict()}
+		with trace.span("save_query_cache"):
+			write_atomic(self.query_cache_path, json.dumps(payload, separators=(",", ":")), sync=False)
+		cache.dirty = False
+
+	def _fresh_registry(self) -> Registry:
+		registry = self.new_registry()
+		self._read_files(registry)
+		return registry
+
+	def new_registry(self, compact: bool = False) -> Registry:
+		"""An empty registry of the kind this store holds."""
+		return Registry(compact=compact)
+
+	def _open_binary(self) -> Optional[BinarySnapshot]:
+		"""The binary snapshot, if it exists and matches the JSON snapshot."""
+		try:
+			snapshot = BinarySnapshot(self.binary_path)
+		except (OSError, ValueError):
+			return None
+		if snapshot.source_stamp != source_stamp(self.path):
+			return None
+		return snapshot
+
+	def has_current_binary(self) -> bool:
+		return self._open_binary() is not None
+
+	def rebuild_binary(self) -> bool:
+		"""Rebuild the binary snapshot if it is missing or stale; False if it was current.
+
+		The expensive part of loading a stale store, so it can run on a worker
+		process while the caller loads other stores.
+		"""
+		self.upgrade()
+		if self.has_current_binary():
+			return False
+		with self.path.open("r", encoding="utf-8") as f:
+			data = upgrade_data(json.load(f))
+		self._write_binary(data)
+		return True
+
+	def upgrade(self) -> bool:
+		"""Rewrite the snapshot in the current format if it is older; False if it was current.
+
+		Loading only reads the snapshot's header; the migrations (see
+		`migrations`) run once per file, streaming it record by record.
+		"""
+		if file_format_version(self.path) == FORMAT_VERSION:
+			return False
+		with self._lock():
+			if file_format_version(self.path) == FORMAT_VERSION:
+				return False
+			with trace.span("migrate"):
+				with self.path.open("r", encoding="utf-8") as source, atomic_file(self.path) as target:
+					upgrade_file(source, target)
+		return True
+
+	def _read_journal(self) -> Iterator[Dict[str, Any]]:
+		if not self.journal_path.exists():
+			return
+		with self.journal_path.open("r", encoding="utf-8") as f:
+			yield from _parse_records(f)
+
+	# -------------------- ids --------------------
+
+	def lease_ids(self, kind: str, floor: int, count: int) -> Tuple[int, int]:
+		"""Reserve `count` consecutive ids of `kind`, none below `floor`."""
+		# Registries from before shared counters start above everything
+		# written so far.
+		return lease_counter(self.ids_path, self._lock(), kind, floor, count, self.next_ids_on_disk)
+
+	def next_ids_on_disk(self) -> Dict[str, int]:
+		"""The lowest unused ids according to the files."""
+		return self._fresh_registry().next_ids() if self.path.exists() else {}
+
+	# -------------------- writing --------------------
+
+	def commit(self, registry: Registry) -> int:
+		"""Make pending changes durable and return how many were written."""
+		changes = registry.drain_changes()
+		if not changes:
+			return 0
+
+		trace.count("changes_committed", len(changes))
+		spool = self._spool(changes)
+		with self._lock():
+			current = self.is_current()
+			if spool.exists():
+				# Nobody has committed our batch yet: commit it, and every
+				# other batch waiting behind the lock with it.
+				self._append_spooled(registry)
+			self._own_spools.discard(spool.name)
+			if _size(self.journal_path) >= self.compact_threshold:
+				with trace.span("compact"):
+					self._compact_locked(registry if current else self._fresh_registry())
+			self._saw(registry, self._stamps() if current else None)
+		return len(changes)
+
+	def _spool(self, changes: List[Dict[str, Any]]) -> Path:
+		"""Write `changes` where the next lock holder will pick them up."""
+		self.spool_dir.mkdir(exist_ok=True)
+		name = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex}"
+		tmp_path = self.spool_dir / (name + ".tmp")
+		with tmp_path.open("w", encoding="utf-8") as f:
+			f.writelines(json.dumps(c, separators=(",", ":")) + "\n" for c in changes)
+		# Renamed only once complete, so a lock holder never sees half a batch.
+		path = self.spool_dir / (name + SPOOL_RECORDS_SUFFIX)
+		os.replace(tmp_path, path)
+		self._own_spools.add(path.name)
+		return path
+
+	def _append_spooled(self, registry: Registry) -> None:
+		"""Append all spooled batches to the journal with one fsync."""
+		batches: List[Tuple[Path, bytes]] = []
+		for path in sorted(self.spool_dir.glob("*" + SPOOL_RECORDS_SUFFIX)):
+			try:
+				batches.append((path, path.read_bytes()))
+			except FileNotFoundError:
+				continue
+		if not batches:
+			return
+
+		self._append_journal(b"".join(payload for _, payload in batches))
+
+		# Other processes' records are now part of the journal; keep this
+		# registry in step with it.
+		with registry.untracked():
+			for path, payload in batches:
+				if path.name in self._own_spools:
+					continue
+				for change in _parse_records(payload.decode("utf-8").splitlines()):
+					apply_change(registry, change)
+		for path, _ in batches:
+			self._own_spools.discard(path.name)
+			try:
+				path.unlink()
+			except FileNotFoundError:
+				pass
+
+	def _append_journal(self, data: bytes) -> None:
+		with self.journal_path.open("a+b") as f:
+			end = f.seek(0, os.SEEK_END)
+			if end:
+				f.seek(end - 1)
+				if f.read(1) != b"\n":
+					# Keep our records on their own lines after a torn append.
+					data = b"\n" + data
+			f.write(data)
+			f.flush()
+			os.fsync(f.fileno())
+		trace.count("bytes_written", len(data))
+
+	def create_team(self, registry: Registry, name: str) -> Team:
+		"""Add team `name` to `registry`, agreeing with other writers on its id.
+
+		Unlike other records a team is written to the journal at once, under
+		the lock, after checking that no other process created it meanwhile;
+		otherwise concurrent first publishers to a namespace would each add
+		the team.
+		"""
+		team_id, _ = self.lease_ids("team", registry.next_ids()["team"], 1)
+		with self._lock():
+			current = self.is_current()
+			existing = self._team_ids_on_disk().get(name)
+			if existing is None:
+				record = {"op": "team", "id": team_id, "name": name}
+				self._append_journal(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+			else:
+				team_id = existing
+			if current:
+				self._saw(registry, self._stamps())
+		with registry.untracked():
+			team = registry.get_team(team_id) or registry.create_team(name, team_id=team_id)
+		return team
+
+	def _team_ids_on_disk(self) -> Dict[str, int]:
+		teams: Dict[str, int] = {}
+		if self.path.exists():
+			snapshot = self._open_binary()
+			if snapshot is not None:
+				stored = snapshot.teams
+			else:
+				with self.path.open("r", encoding="utf-8") as f:
+					data = json.load(f)
+				stored = [
+					(team.get("id", team_id), team["name"])
+					for team_id, team in enumerate(data.get("teams", []), start=1)
+				]
+			for team_id, team_name in stored:
+				teams.setdefault(team_name, team_id)
+		if self.journal_path.exists():
+			with self.journal_path.open("r", encoding="utf-8") as f:
+				team_lines = (line for line in f if line.startswith('{"op":"team"'))
+				for change in _parse_records(team_lines):
+					teams.setdefault(change["name"], change["id"])
+		return teams
+
+	def compact(self, registry: Registry) -> None:
+		"""Fold the registry into a fresh snapshot and truncate the journal.
+
+		If other processes have written since `registry` was loaded, the
+		snapshot is built from the files instead, so none of their records
+		are dropped.
+		"""
+		self.commit(registry)
+		with self._lock():
+			if not self.path.exists() or self.is_current():
+				self._compact_locked(registry)
+				self._saw(registry, self._stamps())
+			else:
+				self._compact_locked(self._fresh_registry())
+				self._saw(registry, None)
+
+	def _compact_locked(self, registry: Registry) -> None:
+		self._write_snapshot(snapshot_to_dict(registry))
+		try:
+			self.journal_path.unlink()
+		except FileNotFoundError:
+			pass
+
+	def _write_snapshot(self, data: Dict[str, Any]) -> None:
+		with trace.span("write_json"):
+			payload = json.dumps(data, indent=2)
+			write_atomic(self.path, payload)
+		trace.count("bytes_written", len(payload))
+		self._write_binary(data)
+
+	def _write_binary(self, data: Dict[str, Any]) -> None:
+		try:
+			with trace.span("write_binary"):
+				write_binary_snapshot(self.binary_path, data, source_stamp(self.path))
+			if trace.enabled():
+				trace.count("bytes_written", _size(self.binary_path))
+		except OSError:
+			# E.g. the old file is still mapped on Windows. The JSON snapshot is
+			# authoritative; the next load rebuilds the binary copy.
+			pass
+
+
+def _parse_records(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+	for line in lines:
+		if not line.strip():
+			continue
+		try:
+			yield json.loads(line)
+		except json.JSONDecodeError:
+			# Torn append from an interrupted writer; the command that
+			# produced it never reported success, so drop it.
+			continue
+
+
+def _stat(path: Path) -> Optional[Tuple[int, int, int]]:
+	try:
+		st = os.stat(path)
+	except FileNotFoundError:
+		return None
+	return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _stamps_from_json(data: Any) -> Optional[FileStamps]:
+	"""File stamps as saved in JSON, where tuples become lists."""
+	if data is None:
+		return None
+	return tuple(tuple(stat) if stat is not None else None for stat in data)
+
+
+def _size(path: Path) -> int:
+	try:
+		return path.stat().st_size
+	except FileNotFoundError:
+		return 0
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Protocol, Sequence, Set, Tuple
+
+# Tokenized inverted index with BM25 ranking for product search.
+#
+# Each product is one document made of its name, description and metadata
+# values. Names like `satellite_ndvi_timeseries` and values like
+# `Sentinel-2 Satellite Imagery` are split on anything that is not a letter or
+# digit, so "ndvi" and "sentinel-2" both find them. Query terms also match as
+# prefixes ("clim" finds "climate"), which keeps the old substring search
+# behaviour for partially typed names.
+#
+# Searches can span several segments holding disjoint documents, e.g. the
+# in-memory `TextIndex` for recent products plus the postings stored in a
+# binary snapshot (see `binary_snapshot.py`). A `MaskedSegment` hides the
+# stored documents of products whose text has since changed.
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Score multiplier for terms reached through prefix expansion, so an exact
+# token match ranks above a longer word that merely starts with the query.
+PREFIX_WEIGHT = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+	return _TOKEN_RE.findall(text.lower())
+
+
+class TextIndex:
+	"""Incrementally maintained inverted index keyed by product id."""
+
+	def __init__(self) -> None:
+		# term -> {doc_id: term frequency}
+		self._postings: Dict[str, Dict[int, int]] = {}
+		self._doc_lengths: Dict[int, int] = {}
+		self._total_length = 0
+		# Sorted vocabulary for prefix lookups; new terms are merged lazily.
+		self._terms: List[str] = []
+		self._new_terms: List[str] = []
+
+	def __len__(self) -> int:
+		return len(self._doc_lengths)
+
+	# -------------------- maintenance --------------------
+
+	def add(self, doc_id: int, text: str) -> None:
+		"""Append `text` to document `doc_id`, creating it if needed."""
+		tokens = tokenize(text)
+		if not tokens:
+			return
+		for token in tokens:
+			postings = self._postings.get(token)
+			if postings is None:
+				postings = self._postings[token] = {}
+				self._new_terms.append(token)
+			postings[doc_id] = postings.get(doc_id, 0) + 1
+		self._doc_lengths[doc_id] = self._doc_lengths.get(doc_id, 0) + len(tokens)
+		self._total_length += len(tokens)
+
+	def remove(self, doc_id: int, text: str) -> None:
+		"""Take `text`, previously passed to `add`, back out of document `doc_id`."""
+		tokens = tokenize(text)
+		removed = 0
+		for token in tokens:
+			postings = self._postings.get(token)
+			tf = postings.get(doc_id) if postings is not None else None
+			if tf is None:
+				continue
+			# Emptied postings stay in place so the sorted vocabulary never
+			# points at a missing term.
+			if tf > 1:
+				postings[doc_id] = tf - 1
+			else:
+				del postings[doc_id]
+			removed += 1
+		if removed:
+			length = self._doc_lengths[doc_id] - removed
+			if length > 0:
+				self._doc_lengths[doc_id] = length
+			else:
+				del self._doc_lengths[doc_id]
+			self._total_length -= removed
+
+	def _vocabulary(self) -> List[str]:
+		if self._new_terms:
+			if len(self._new_terms) < 64:
+				for term in self._new_terms:
+					bisect.insort(self._terms, term)
+			else:
+				self._terms.extend(self._new_terms)
+				self._terms.sort()
+			self._new_terms = []
+		return self._terms
+
+	# -------------------- segment interface --------------------
+
+	@property
+	def doc_count(self) -> int:
+		return len(self._doc_lengths)
+
+	@property
+	def total_length(self) -> int:
+		return self._total_length
+
+	def expand(self, token: str) -> List[str]:
+		"""Vocabulary terms that start with `token`, exact match first."""
+		terms = self._vocabulary()
+		start = bisect.bisect_left(terms, token)
+		end = bisect.bisect_left(terms, token + "\uffff", start)
+		return terms[start:end]
+
+	def postings(self, term: str) -> Dict[int, int]:
+		return self._postings.get(term, {})
+
+	def doc_length(self, doc_id: int) -> int:
+		return self._doc_lengths.get(doc_id, 0)
+
+	# -------------------- queries --------------------
+
+	def search(
+		self,
+		query: str,
+		limit: Optional[int] = None,
+		match_all: bool = True,
+		restrict: Optional[Set[int]] = None,
+	) -> List[Tuple[int, float]]:
+		"""Return `(doc_id, score)` pairs, best first; see `search_segments`."""
+		return search_segments([self], query, limit=limit, match_all=match_all, restrict=restrict)
+
+
+class TextSegment(Protocol):
+	"""Read side of an index over a disjoint set of documents."""
+
+	@property
+	def doc_count(self) -> int: ...
+
+	@property
+	def total_length(self) -> int: ...
+
+	def expand(self, token: str) -> List[str]: ...
+
+	def postings(self, term: str) -> Dict[int, int]: ...
+
+	def doc_length(self, doc_id: int) -> int: ...
+
+
+class MaskedSegment:
+	"""A segment with some of its documents hidden, e.g. ones re-indexed in another segment."""
+
+	def __init__(self, segment: TextSegment, hidden: Set[int]) -> None:
+		self._segment = segment
+		self._hidden = hidden
+		lengths = [segment.doc_length(doc_id) for doc_id in hidden]
+		self.doc_count = segment.doc_count - sum(1 for length in lengths if length)
+		self.total_length = segment.total_length - sum(lengths)
+
+	def expand(self, token: str) -> List[str]:
+		return self._segment.expand(token)
+
+	def postings(self, term: str) -> Dict[int, int]:
+		postings = self._segment.postings(term)
+		if not any(doc_id in postings for doc_id in self._hidden):
+			return postings
+		return {doc_id: tf for doc_id, tf in postings.items() if doc_id not in self._hidden}
+
+	def doc_length(self, doc_id: int) -> int:
+		return 0 if doc_id in self._hidden else self._segment.doc_length(doc_id)
+
+
+def search_segments(
+	segments: Sequence[TextSegment],
+	query: str,
+	limit: Optional[int] = None,
+	match_all: bool = True,
+	restrict: Optional[Set[int]] = None,
+	after: Optional[Tuple[float, int]] = None,
+) -> List[Tuple[int, float]]:
+	"""Return `(doc_id, score)` pairs over all segments, best first.
+
+	With `match_all` every query term must match (AND); otherwise any term
+	may match (OR). `restrict` limits results to the given doc ids, and
+	`after` to those ranked after `(-score, doc_id)`, for paging. Segments
+	hold disjoint documents, so BM25 statistics are simply summed across
+	them. Work is proportional to the postings of the query terms, not to
+	the number of indexed documents.
+	"""
+	tokens = list(dict.fromkeys(tokenize(query)))
+	n_docs = sum(segment.doc_count for segment in segments)
+	if not tokens or not n_docs or restrict is not None and not restrict:
+		return []
+
+	expanded: List[List[str]] = []
+	for token in tokens:
+		terms = {term for segment in segments for term in segment.expand(token)}
+		# Exact match first, as `TextIndex.expand` orders them.
+		expanded.append(sorted(terms, key=lambda term: (term != token, term)))
+	if match_all and any(not terms for terms in expanded):
+		return []
+
+	postings: Dict[str, Dict[int, int]] = {}
+	for terms in expanded:
+		for term in terms:
+			if term not in postings:
+				if len(segments) == 1:
+					postings[term] = segments[0].postings(term)
+				else:
+					merged: Dict[int, int] = {}
+					for segment in segments:
+						merged.update(segment.postings(term))
+					postings[term] = merged
+
+	matches = [_matching_docs(postings, terms) for terms in expanded if terms]
+	if match_all:
+		if restrict is not None:
+			matches.append(restrict)
+		matches.sort(key=len)
+		candidates = set(matches[0])
+		for docs in matches[1:]:
+			candidates.intersection_update(docs)
+			if not candidates:
+				return []
+	else:
+		candidates = set().union(*matches)
+		if restrict is not None:
+			candidates.intersection_update(restrict)
+
+	avg_length = sum(segment.total_length for segment in segments) / n_docs
+	scores = _score(segments, postings, tokens, expanded, candidates, n_docs, avg_length)
+	ranked: Iterable[Tuple[int, float]]
+	key = lambda item: (-item[1], item[0])
+	items: Iterable[Tuple[int, float]] = scores.items()
+	if after is not None:
+		items = [item for item in items if key(item) > tuple(after)]
+	if limit is not None:
+		ranked = heapq.nsmallest(limit, items, key=key)
+	else:
+		ranked = sorted(items, key=key)
+	return list(ranked)
+
+
+def _matching_docs(postings: Dict[str, Dict[int, int]], terms: List[str]) -> Set[int]:
+	if len(terms) == 1:
+		return set(postings[terms[0]])
+	docs: Set[int] = set()
+	for term in terms:
+		docs.update(postings[term])
+	return docs
+
+
+def _score(
+	segments: Sequence[TextSegment],
+	postings_by_term: Dict[str, Dict[int, int]],
+	tokens: List[str],
+	expanded: List[List[str]],
+	candidates: Set[int],
+	n_docs: int,
+	avg_length: float,
+) -> Dict[int, float]:
+	lengths: Dict[int, int] = {}
+	for doc_id in candidates:
+		for segment in segments:
+			length = segment.doc_length(doc_id)
+			if length:
+				lengths[doc_id] = length
+				break
+
+	scores: Dict[int, float] = dict.fromkeys(candidates, 0.0)
+	for token, terms in zip(tokens, expanded):
+		for term in terms:
+			postings = postings_by_term[term]
+			df = len(postings)
+			if not df:
+				continue
+			idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+			weight = idf if term == token else idf * PREFIX_WEIGHT
+			# Walk whichever side is smaller: the postings or the candidates.
+			if len(postings) <= len(candidates):
+				pairs = ((d, tf) for d, tf in postings.items() if d in scores)
+			else:
+				pairs = ((d, postings[d]) for d in candidates if d in postings)
+			for doc_id, tf in pairs:
+				norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avg_length)
+				scores[doc_id] += weight * tf * (BM25_K1 + 1) / (tf + norm)
+	return scores
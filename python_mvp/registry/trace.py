@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from .client import TRACE_ENV
+
+# Timing spans and counters for `feam --profile` / FEAM_TRACE.
+#
+# Code marks phases with `with trace.span("load"):` and counts work with
+# `trace.count("bytes_read", n)`. Spans nest: a span opened inside "load" is
+# recorded as "load/journal". Each span name aggregates its calls, total and
+# longest duration, so tracing a million `add_metadata` calls costs memory
+# for one entry, not a million.
+#
+# While tracing is off, `span` hands out one shared no-op context manager and
+# `count` returns at once, and classes are only instrumented (their public
+# methods wrapped in spans) when tracing is turned on, so the hooks cost next
+# to nothing in normal runs.
+#
+# Like `client.py`, this module only uses the standard library; FEAM_TRACE
+# is read there too, to keep profiled commands off the daemon.
+
+FORMATS = ("table", "prometheus", "jsonl")
+METRIC_PREFIX = "feam"
+
+_NO_SPAN: ContextManager[None] = contextlib.nullcontext()
+
+
+@dataclass
+class SpanStats:
+	calls: int = 0
+	total: float = 0.0
+	longest: float = 0.0
+
+
+class Tracer:
+	"""Aggregated spans and counters for one process."""
+
+	def __init__(self) -> None:
+		self.spans: Dict[str, SpanStats] = {}
+		self.counters: Dict[str, float] = {}
+		self._lock = threading.Lock()
+		self._local = threading.local()
+
+	@contextlib.contextmanager
+	def span(self, name: str) -> Iterator[None]:
+		stack: List[str] = self._local.__dict__.setdefault("stack", [])
+		path = f"{stack[-1]}/{name}" if stack else name
+		stack.append(path)
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			stack.pop()
+			self.record(path, time.perf_counter() - start)
+
+	def record(self, path: str, seconds: float) -> None:
+		with self._lock:
+			stats = self.spans.get(path)
+			if stats is None:
+				stats = self.spans[path] = SpanStats()
+			stats.calls += 1
+			stats.total += seconds
+			if seconds > stats.longest:
+				stats.longest = seconds
+
+	def count(self, name: str, amount: float) -> None:
+		with self._lock:
+			self.counters[name] = self.counters.get(name, 0) + amount
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enabled() -> bool:
+	return _tracer is not None
+
+
+def enable() -> Tracer:
+	"""Start tracing this process (idempotent) and return the tracer."""
+	global _tracer
+	if _tracer is None:
+		_tracer = Tracer()
+	return _tracer
+
+
+def disable() -> Optional[Tracer]:
+	"""Stop tracing and return what was recorded."""
+	global _tracer
+	tracer, _tracer = _tracer, None
+	return tracer
+
+
+def span(name: str) -> ContextManager[None]:
+	"""Time the enclosed block as `name`, nested under the enclosing span."""
+	if _tracer is None:
+		return _NO_SPAN
+	return _tracer.span(name)
+
+
+def record(name: str, seconds: float) -> None:
+	"""Add a span measured elsewhere, e.g. before tracing could be enabled."""
+	if _tracer is not None:
+		_tracer.record(name, seconds)
+
+
+def count(name: str, amount: float = 1) -> None:
+	if _tracer is not None:
+		_tracer.count(name, amount)
+
+
+def instrument(cls: type, prefix: Optional[str] = None) -> None:
+	"""Wrap every public method of `cls` in a span named `Class.method`.
+
+	Does nothing while tracing is off, so call it after `enable()`.
+	"""
+	if _tracer is None or getattr(cls, "_feam_traced", False):
+		return
+	prefix = prefix or cls.__name__
+	for name, attribute in list(vars(cls).items()):
+		if name.startswith("_") or not callable(attribute) or isinstance(attribute, (type, staticmethod, classmethod)):
+			continue
+		setattr(cls, name, _traced(f"{prefix}.{name}", attribute))
+	cls._feam_traced = True
+
+
+def _traced(name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+	@functools.wraps(method)
+	def wrapper(*args: Any, **kwargs: Any) -> Any:
+		if _tracer is None:
+			return method(*args, **kwargs)
+		with _tracer.span(name):
+			return method(*args, **kwargs)
+
+	return wrapper
+
+
+# -------------------- output --------------------
+
+
+def parse_target(value: str) -> Tuple[str, Optional[str]]:
+	"""Parse a FEAM_TRACE value: `1`, `table`, `prometheus:/path` or `jsonl:/path`.
+
+	Returns `(format, path)`; a None path means stderr.
+	"""
+	text = value.strip()
+	if text.lower() in ("1", "true", "yes", "on"):
+		return "table", None
+	fmt, _, path = text.partition(":")
+	fmt = fmt.lower()
+	if fmt not in FORMATS:
+		raise ValueError(f"{TRACE_ENV} format must be one of {', '.join(FORMATS)}, not {fmt!r}")
+	return fmt, path or None
+
+
+def format_table(tracer: Tracer, title: str) -> str:
+	lines = [f"Profile of {title}", ""]
+	lines.append(f"{'span':<44} {'calls':>8} {'total ms':>11} {'mean ms':>10} {'max ms':>10}")
+	# Children right after their parent, in the order they first finished.
+	for path in sorted(tracer.spans, key=_tree_key(tracer)):
+		stats = tracer.spans[path]
+		depth = path.count("/")
+		label = "  " * depth + path.rsplit("/", 1)[-1]
+		lines.append(
+			f"{label:<44} {stats.calls:>8} {stats.total * 1e3:>11.3f} "
+			f"{stats.total / stats.calls * 1e3:>10.3f} {stats.longest * 1e3:>10.3f}"
+		)
+	if tracer.counters:
+		lines.append("")
+		lines.append(f"{'counter':<44} {'value':>8}")
+		for name in sorted(tracer.counters):
+			lines.append(f"{name:<44} {_number(tracer.counters[name]):>8}")
+	return "\n".join(lines) + "\n"
+
+
+def _tree_key(tracer: Tracer) -> Callable[[str], Tuple[int, ...]]:
+	order = {path: position for position, path in enumerate(tracer.spans)}
+
+	def key(path: str) -> Tuple[int, ...]:
+		parts = path.split("/")
+		return tuple(order.get("/".join(parts[:i + 1]), len(order)) for i in range(len(parts)))
+
+	return key
+
+
+def format_prometheus(tracer: Tracer, labels: Dict[str, str]) -> str:
+	"""The Prometheus text exposition format, e.g. for node_exporter's textfile collector."""
+	common = ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+
+	def series(metric: str, extra: Dict[str, str], value: float) -> str:
+		pairs = [common] if common else []
+		pairs += [f'{key}="{_escape(text)}"' for key, text in extra.items()]
+		return f"{METRIC_PREFIX}_{metric}{{{','.join(pairs)}}} {_number(value)}"
+
+	lines = [
+		f"# HELP {METRIC_PREFIX}_span_seconds_total Time spent in each traced span.",
+		f"# TYPE {METRIC_PREFIX}_span_seconds_total counter",
+	]
+	lines += [series("span_seconds_total", {"span": path}, stats.total) for path, stats in tracer.spans.items()]
+	lines += [
+		f"# HELP {METRIC_PREFIX}_span_calls_total Times each traced span was entered.",
+		f"# TYPE {METRIC_PREFIX}_span_calls_total counter",
+	]
+	lines += [series("span_calls_total", {"span": path}, stats.calls) for path, stats in tracer.spans.items()]
+	for name in sorted(tracer.counters):
+		metric = f"{name}_total"
+		lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+		lines.append(series(metric, {}, tracer.counters[name]))
+	return "\n".join(lines) + "\n"
+
+
+def format_jsonl(tracer: Tracer, labels: Dict[str, str]) -> str:
+	"""One JSON object per span and counter, tagged with a run id so appended runs stay apart."""
+	run = {"run": uuid.uuid4().hex[:12], "time": time.time(), **labels}
+	records: List[Dict[str, Any]] = [
+		{**run, "span": path, "calls": stats.calls, "total_s": stats.total, "max_s": stats.longest}
+		for path, stats in tracer.spans.items()
+	]
+	records += [{**run, "counter": name, "value": value} for name, value in sorted(tracer.counters.items())]
+	return "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+
+def write_report(tracer: Tracer, fmt: str, path: Optional[str], labels: Dict[str, str]) -> None:
+	"""Write the report to `path` (stderr if None).
+
+	Prometheus files are replaced atomically, as textfile collectors expect;
+	JSON lines are appended so repeated runs accumulate.
+	"""
+	if fmt == "table":
+		title = " ".join(f"{key}={value}" for key, value in labels.items()) or "feam"
+		text = format_table(tracer, title)
+	elif fmt == "prometheus":
+		text = format_prometheus(tracer, labels)
+	else:
+		text = format_jsonl(tracer, labels)
+
+	if path is None:
+		sys.stderr.write(text)
+		sys.stderr.flush()
+	elif fmt == "jsonl":
+		with open(path, "a", encoding="utf-8") as f:
+			f.write(text)
+	else:
+		tmp_path = f"{path}.{uuid.uuid4().hex[:12]}.tmp"
+		with open(tmp_path, "w", encoding="utf-8") as f:
+			f.write(text)
+		os.replace(tmp_path, path)
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+	return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
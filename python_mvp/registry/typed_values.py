@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import bisect
+import re
+from array import array
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Set, Tuple, Union
+
+# Typed metadata values.
+#
+# `MetadataEntry.meta_value` is always a string, but `value_type` says how to
+# read it. Numeric, temporal and size values are parsed once when the entry
+# is added, and their sort keys go into a `RangeIndex` so range filters such
+# as `technical.row_count>1e9` or `governance.published_after>=2025-01-01`
+# are answered with a bisect.
+
+TypedValue = Union[int, float, datetime]
+
+INTEGER_TYPES = frozenset({"int", "integer"})
+FLOAT_TYPES = frozenset({"float", "double", "number"})
+TEMPORAL_TYPES = frozenset({"date", "datetime", "timestamp"})
+SIZE_TYPES = frozenset({"bytes", "size"})
+
+# Range index kinds: every typed value sorts as a float within its kind.
+NUMBER = "number"
+TIME = "time"
+
+_SIZE_RE = re.compile(r"^\s*([0-9]*\.?[0-9]+(?:[eE][+-]?[0-9]+)?)\s*([A-Za-z]*)\s*$")
+_SIZE_UNITS = {
+	"": 1,
+	"b": 1,
+	"kb": 10**3,
+	"mb": 10**6,
+	"gb": 10**9,
+	"tb": 10**12,
+	"pb": 10**15,
+	"kib": 2**10,
+	"mib": 2**20,
+	"gib": 2**30,
+	"tib": 2**40,
+	"pib": 2**50,
+	# `du -h` / `ls -h` style single letters are binary.
+	"k": 2**10,
+	"m": 2**20,
+	"g": 2**30,
+	"t": 2**40,
+	"p": 2**50,
+}
+
+
+def parse_number(value: str) -> Union[int, float]:
+	text = value.strip().replace("_", "")
+	try:
+		return int(text)
+	except ValueError:
+		return float(text)
+
+
+def parse_datetime(value: str) -> datetime:
+	"""Parse an ISO-8601 date or datetime into a naive UTC datetime."""
+	text = value.strip()
+	if text.endswith(("Z", "z")):
+		text = text[:-1] + "+00:00"
+	parsed = datetime.fromisoformat(text)
+	if parsed.tzinfo is not None:
+		parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+	return parsed
+
+
+def parse_size(value: str) -> int:
+	"""Parse sizes such as `512`, `10GB`, `1.5 TiB` or `3T` into bytes."""
+	match = _SIZE_RE.match(value)
+	if not match:
+		raise ValueError(f"Invalid size {value!r}")
+	number, unit = match.groups()
+	multiplier = _SIZE_UNITS.get(unit.lower())
+	if multiplier is None:
+		raise ValueError(f"Unknown size unit {unit!r}")
+	return int(float(number) * multiplier)
+
+
+def parse_typed_value(meta_value: str, value_type: str) -> Optional[TypedValue]:
+	"""Native value for typed metadata, or None for untyped or unparsable values."""
+	try:
+		if value_type in INTEGER_TYPES or value_type in FLOAT_TYPES:
+			return parse_number(meta_value)
+		if value_type in TEMPORAL_TYPES:
+			return parse_datetime(meta_value)
+		if value_type in SIZE_TYPES:
+			return parse_size(meta_value)
+	except ValueError:
+		return None
+	return None
+
+
+def epoch_seconds(value: datetime) -> float:
+	return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def sort_key(value: TypedValue) -> Tuple[str, float]:
+	"""Range index kind and float sort key for a typed value."""
+	if isinstance(value, datetime):
+		return TIME, epoch_seconds(value)
+	return NUMBER, float(value)
+
+
+def parse_range_literal(literal: str) -> Tuple[str, float]:
+	"""Kind and sort key for the right-hand side of a range filter.
+
+	Numbers (`1e9`), sizes (`10GB`) and ISO dates (`2025-01-01`) are accepted,
+	tried in that order.
+	"""
+	for parse in (parse_number, parse_size, parse_datetime):
+		try:
+			return sort_key(parse(literal))
+		except ValueError:
+			continue
+	raise ValueError(f"Cannot compare against {literal!r}; expected a number, size or ISO date")
+
+
+class RangeIndex:
+	"""Sorted `(key, product_id)` pairs answering range predicates by bisect.
+
+	Inserts are buffered and merged on the next query, so loading a catalog
+	costs one sort instead of a sorted insert per row. Keys and ids are kept
+	in typed arrays (16 bytes per entry) rather than lists of Python objects.
+	"""
+
+	def __init__(self) -> None:
+		self._keys = array("d")
+		self._ids = array("q")
+		self._pending_keys = array("d")
+		self._pending_ids = array("q")
+
+	def __len__(self) -> int:
+		return len(self._keys) + len(self._pending_keys)
+
+	def add(self, key: float, product_id: int) -> None:
+		self._pending_keys.append(key)
+		self._pending_ids.append(product_id)
+
+	def remove(self, key: float, product_id: int) -> None:
+		"""Drop one `(key, product_id)` pair, if present."""
+		if self._pending_keys:
+			self._merge()
+		lo = bisect.bisect_left(self._keys, key)
+		hi = bisect.bisect_right(self._keys, key, lo)
+		for pos in range(lo, hi):
+			if self._ids[pos] == product_id:
+				del self._keys[pos]
+				del self._ids[pos]
+				return
+
+	def _merge(self) -> None:
+		if len(self._pending_keys) < 64:
+			for key, product_id in zip(self._pending_keys, self._pending_ids):
+				pos = bisect.bisect_right(self._keys, key)
+				self._keys.insert(pos, key)
+				self._ids.insert(pos, product_id)
+		else:
+			keys = self._keys + self._pending_keys
+			ids = self._ids + self._pending_ids
+			order = sorted(range(len(keys)), key=keys.__getitem__)
+			self._keys = array("d", (keys[i] for i in order))
+			self._ids = array("q", (ids[i] for i in order))
+		self._pending_keys = array("d")
+		self._pending_ids = array("q")
+
+	def arrays(self) -> Tuple[array, array]:
+		"""The keys and their product ids as parallel typed arrays, in key order."""
+		if self._pending_keys:
+			self._merge()
+		return self._keys, self._ids
+
+	def items(self) -> Iterator[Tuple[float, int]]:
+		"""Every `(key, product_id)` pair, in key order."""
+		if self._pending_keys:
+			self._merge()
+		return zip(self._keys, self._ids)
+
+	def select(self, op: str, key: float) -> Set[int]:
+		"""Product ids whose value satisfies `value <op> key`."""
+		if self._pending_keys:
+			self._merge()
+		if op == ">":
+			lo, hi = bisect.bisect_right(self._keys, key), len(self._keys)
+		elif op == ">=":
+			lo, hi = bisect.bisect_left(self._keys, key), len(self._keys)
+		elif op == "<":
+			lo, hi = 0, bisect.bisect_left(self._keys, key)
+		elif op == "<=":
+			lo, hi = 0, bisect.bisect_right(self._keys, key)
+		elif op == "=":
+			lo, hi = bisect.bisect_left(self._keys, key), bisect.bisect_right(self._keys, key)
+		else:
+			raise ValueError(f"Unknown range operator {op!r}")
+		return set(self._ids[lo:hi])
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import sys
+from datetime import datetime
+from typing import Any, Dict, Generic, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from .models import DataProductVersion, VersionedMetadata
+
+# Immutable product versions.
+#
+# Every publish freezes a product's fields and metadata into a
+# `DataProductVersion`. Consecutive versions usually differ in a handful of
+# metadata entries (a new source path, a new fingerprint), so a version's
+# metadata is a `PersistentMap`: a hash array mapped trie whose updates copy
+# only the path from the root to the changed entry and share every other
+# node with the previous version. Storing a version costs
+# O(changed entries * log32 n) instead of O(n).
+
+# (metadata_id, namespace, meta_key, meta_value, value_type), as stored in
+# snapshots and journal records.
+MetadataRow = Sequence[Any]
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_BITS = 5
+_MISSING = object()
+_MASK = (1 << _BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+
+
+def _hash(key: Hashable) -> int:
+	return hash(key) & _HASH_MASK
+
+
+def _bit_count(value: int) -> int:
+	return bin(value).count("1")
+
+
+class _Node:
+	"""Trie node: `bitmap` marks which of 32 slots are present, densely packed in `children`."""
+
+	__slots__ = ("bitmap", "children")
+
+	def __init__(self, bitmap: int, children: Tuple[Any, ...]) -> None:
+		self.bitmap = bitmap
+		self.children = children
+
+
+class _Collision:
+	"""Entries whose 64-bit hashes are equal."""
+
+	__slots__ = ("key_hash", "entries")
+
+	def __init__(self, key_hash: int, entries: Tuple[Tuple[Any, Any], ...]) -> None:
+		self.key_hash = key_hash
+		self.entries = entries
+
+
+# Leaves are plain `(hash, key, value)` tuples.
+_Child = Union[_Node, _Collision, Tuple[int, Any, Any]]
+
+
+def _pair(shift: int, first: _Child, first_hash: int, second: _Child, second_hash: int) -> _Node:
+	"""Smallest subtree holding two children whose hashes differ."""
+	first_slot = (first_hash >> shift) & _MASK
+	second_slot = (second_hash >> shift) & _MASK
+	if first_slot == second_slot:
+		child = _pair(shift + _BITS, first, first_hash, second, second_hash)
+		return _Node(1 << first_slot, (child,))
+	children = (first, second) if first_slot < second_slot else (second, first)
+	return _Node((1 << first_slot) | (1 << second_slot), children)
+
+
+def _assoc(node: _Node, shift: int, key_hash: int, key: Any, value: Any) -> Tuple[_Node, bool]:
+	"""`node` with `key` set to `value`, and whether the key is new."""
+	bit = 1 << ((key_hash >> shift) & _MASK)
+	index = _bit_count(node.bitmap & (bit - 1))
+	children = node.children
+	if not node.bitmap & bit:
+		leaf = (key_hash, key, value)
+		return _Node(node.bitmap | bit, children[:index] + (leaf,) + children[index:]), True
+
+	child = children[index]
+	added = False
+	if isinstance(child, _Node):
+		new_child, added = _assoc(child, shift + _BITS, key_hash, key, value)
+	elif isinstance(child, _Collision):
+		if child.key_hash == key_hash:
+			entries = tuple(entry for entry in child.entries if entry[0] != key)
+			added = len(entries) == len(child.entries)
+			new_child = _Collision(key_hash, entries + ((key, value),))
+		else:
+			new_child = _pair(shift + _BITS, child, child.key_hash, (key_hash, key, value), key_hash)
+			added = True
+	elif child[1] == key:
+		if child[2] is value:
+			return node, False
+		new_child = (key_hash, key, value)
+	elif child[0] == key_hash:
+		new_child = _Collision(key_hash, ((child[1], child[2]), (key, value)))
+		added = True
+	else:
+		new_child = _pair(shift + _BITS, child, child[0], (key_hash, key, value), key_hash)
+		added = True
+	return _Node(node.bitmap, children[:index] + (new_child,) + children[index + 1:]), added
+
+
+def _dissoc(node: _Node, shift: int, key_hash: int, key: Any) -> Optional[_Node]:
+	"""`node` without `key` (the same object if absent); None once empty."""
+	bit = 1 << ((key_hash >> shift) & _MASK)
+	if not node.bitmap & bit:
+		return node
+	index = _bit_count(node.bitmap & (bit - 1))
+	child = node.children[index]
+	new_child: Optional[_Child]
+	if isinstance(child, _Node):
+		new_child = _dissoc(child, shift + _BITS, key_hash, key)
+		if new_child is child:
+			return node
+	elif isinstance(child, _Collision):
+		entries = tuple(entry for entry in child.entries if entry[0] != key)
+		if len(entries) == len(child.entries):
+			return node
+		new_child = (
+			(key_hash, entries[0][0], entries[0][1]) if len(entries) == 1 else _Collision(key_hash, entries)
+		)
+	elif child[1] == key:
+		new_child = None
+	else:
+		return node
+
+	if new_child is not None:
+		return _Node(node.bitmap, node.children[:index] + (new_child,) + node.children[index + 1:])
+	if node.bitmap == bit:
+		return None
+	return _Node(node.bitmap & ~bit, node.children[:index] + node.children[index + 1:])
+
+
+def _items(child: Optional[_Child]) -> Iterator[Tuple[Any, Any]]:
+	if child is None:
+		return
+	if isinstance(child, _Node):
+		for grandchild in child.children:
+			yield from _items(grandchild)
+	elif isinstance(child, _Collision):
+		yield from child.entries
+	else:
+		yield child[1], child[2]
+
+
+def _diff(old: Optional[_Child], new: Optional[_Child], changed: List[Tuple[Any, Any]], removed: List[Any]) -> None:
+	"""Collect what turns `old` into `new`, skipping subtrees the two share."""
+	if old is new:
+		return
+	if isinstance(old, _Node) and isinstance(new, _Node):
+		for slot in range(1 << _BITS):
+			bit = 1 << slot
+			old_child = old.children[_bit_count(old.bitmap & (bit - 1))] if old.bitmap & bit else None
+			new_child = new.children[_bit_count(new.bitmap & (bit - 1))] if new.bitmap & bit else None
+			_diff(old_child, new_child, changed, removed)
+		return
+	old_items = dict(_items(old))
+	for key, value in _items(new):
+		if key not in old_items or old_items.pop(key) is not value:
+			changed.append((key, value))
+	removed.extend(old_items)
+
+
+class PersistentMap(Generic[K, V]):
+	"""Immutable mapping; `set` and `delete` return a new map sharing structure."""
+
+	__slots__ = ("_root", "_size")
+
+	def __init__(self, root: Optional[_Node] = None, size: int = 0) -> None:
+		self._root = root
+		self._size = size
+
+	@classmethod
+	def from_items(cls, items: Iterable[Tuple[K, V]]) -> PersistentMap[K, V]:
+		return cls().update(items)
+
+	def __len__(self) -> int:
+		return self._size
+
+	def __iter__(self) -> Iterator[K]:
+		return (key for key, _ in _items(self._root))
+
+	def __contains__(self, key: object) -> bool:
+		return self.get(key, _MISSING) is not _MISSING  # type: ignore[arg-type]
+
+	def items(self) -> Iterator[Tuple[K, V]]:
+		return _items(self._root)
+
+	def values(self) -> Iterator[V]:
+		return (value for _, value in _items(self._root))
+
+	def get(self, key: K, default: Any = None) -> Any:
+		node: Optional[_Child] = self._root
+		key_hash = _hash(key)
+		shift = 0
+		while isinstance(node, _Node):
+			bit = 1 << ((key_hash >> shift) & _MASK)
+			if not node.bitmap & bit:
+				return default
+			node = node.children[_bit_count(node.bitmap & (bit - 1))]
+			shift += _BITS
+		if node is None:
+			return default
+		if isinstance(node, _Collision):
+			return next((value for k, value in node.entries if k == key), default)
+		return node[2] if node[1] == key else default
+
+	def set(self, key: K, value: V) -> PersistentMap[K, V]:
+		root = self._root if self._root is not None else _Node(0, ())
+		new_root, added = _assoc(root, 0, _hash(key), key, value)
+		if new_root is root:
+			return self
+		return PersistentMap(new_root, self._size + added)
+
+	def delete(self, key: K) -> PersistentMap[K, V]:
+		if self._root is None:
+			return self
+		new_root = _dissoc(self._root, 0, _hash(key), key)
+		if new_root is self._root:
+			return self
+		return PersistentMap(new_root, self._size - 1)
+
+	def update(self, items: Iterable[Tuple[K, V]] = (), removed: Iterable[K] = ()) -> PersistentMap[K, V]:
+		"""A map with `items` set and `removed` deleted."""
+		result = self
+		for key, value in items:
+			result = result.set(key, value)
+		for key in removed:
+			result = result.delete(key)
+		return result
+
+	def diff(self, older: PersistentMap[K, V]) -> Tuple[List[Tuple[K, V]], List[K]]:
+		"""`(changed items, removed keys)` since `older`, in time proportional to the change."""
+		changed: List[Tuple[K, V]] = []
+		removed: List[K] = []
+		_diff(older._root, self._root, changed, removed)
+		return changed, removed
+
+
+class VersionHistory:
+	"""A product's versions, oldest first, with O(1) lookup of the latest one and by label."""
+
+	__slots__ = ("_versions", "_by_label")
+
+	def __init__(self) -> None:
+		self._versions: List[DataProductVersion] = []
+		self._by_label: Dict[str, DataProductVersion] = {}
+
+	def __len__(self) -> int:
+		return len(self._versions)
+
+	def __iter__(self) -> Iterator[DataProductVersion]:
+		return iter(self._versions)
+
+	@property
+	def latest(self) -> Optional[DataProductVersion]:
+		return self._versions[-1] if self._versions else None
+
+	def get(self, label: str) -> Optional[DataProductVersion]:
+		return self._by_label.get(label)
+
+	def has_version_id(self, version_id: int) -> bool:
+		return any(version.version_id == version_id for version in reversed(self._versions))
+
+	def next_label(self) -> str:
+		"""Default label for the next version: its position, counting from 1."""
+		number = len(self._versions) + 1
+		while str(number) in self._by_label:
+			number += 1
+		return str(number)
+
+	def append_delta(
+		self,
+		version_id: int,
+		data_product_id: int,
+		version_label: str,
+		data_format: str,
+		access_uri: str,
+		status: str,
+		classification: str,
+		created_at: datetime,
+		changed: Iterable[MetadataRow],
+		removed: Iterable[int] = (),
+	) -> DataProductVersion:
+		"""Append a version whose metadata is the latest one's with `changed` set and `removed` dropped."""
+		if version_label in self._by_label:
+			raise ValueError(f"Data product {data_product_id} already has version {version_label!r}")
+		latest = self.latest
+		previous: PersistentMap[int, VersionedMetadata] = latest.metadata if latest is not None else PersistentMap()
+		entries = (
+			(
+				row[0],
+				VersionedMetadata(
+					metadata_id=row[0],
+					namespace=sys.intern(row[1]),
+					meta_key=sys.intern(row[2]),
+					meta_value=row[3],
+					value_type=sys.intern(row[4]),
+				),
+			)
+			for row in changed
+		)
+		version = DataProductVersion(
+			version_id=version_id,
+			data_product_id=data_product_id,
+			version_label=version_label,
+			data_format=sys.intern(data_format),
+			access_uri=access_uri,
+			status=sys.intern(status),
+			classification=sys.intern(classification),
+			created_at=created_at,
+			metadata=previous.update(entries, removed),
+		)
+		self._versions.append(version)
+		self._by_label[version_label] = version
+		return version
+
+	def deltas(self) -> Iterator[Tuple[DataProductVersion, List[MetadataRow], List[int]]]:
+		"""Each version with the metadata rows changed and ids removed since the one before."""
+		previous: PersistentMap[int, VersionedMetadata] = PersistentMap()
+		for version in self._versions:
+			changed, removed = version.metadata.diff(previous)
+			rows = sorted(
+				(m.metadata_id, m.namespace, m.meta_key, m.meta_value, m.value_type) for _, m in changed
+			)
+			yield version, rows, sorted(removed)
+			previous = version.metadata
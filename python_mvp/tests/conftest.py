@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Iterable
+
+import pytest
+
+from registry import cli
+
+
+@pytest.fixture
+def feam(tmp_path, monkeypatch, capsys) -> Callable[..., str]:
+	"""Run `feam` commands in a fresh working directory and return their output.
+
+	`answers` are fed to the interactive prompts in order; prompts beyond
+	them get an empty answer, i.e. their default.
+	"""
+	for name in list(os.environ):
+		if name.startswith("FEAM_"):
+			monkeypatch.delenv(name)
+	monkeypatch.chdir(tmp_path)
+	# The store is opened once per process; each test has its own directory.
+	cli.open_store.cache_clear()
+
+	def run(*argv: str, answers: Iterable[str] = ()) -> str:
+		replies = iter(answers)
+		monkeypatch.setattr("builtins.input", lambda prompt="": next(replies, ""))
+		capsys.readouterr()
+		cli.run(list(argv))
+		return capsys.readouterr().out
+
+	return run
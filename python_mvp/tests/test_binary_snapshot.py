@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+
+import pytest
+
+from registry import binary_snapshot
+from registry.binary_snapshot import BinarySnapshot
+from registry.filters import parse_facet, parse_filter
+from registry.services import Registry
+from registry.storage import JournalStore, apply_snapshot, snapshot_to_dict
+
+QUERIES = ("climate", "clim", "ocean salinity", "desert", "nothing")
+FILTERS = (
+	(),
+	("status=active",),
+	("business.domain=ocean",),
+	("business.domain=desert",),
+	("business.domain=climate",),
+	("business.domain=agriculture",),
+	("technical.row_count>150",),
+	("technical.row_count<=500", "status=draft"),
+)
+FACETS = ("business.domain", "technical.row_count", "status")
+
+
+@pytest.fixture
+def store(tmp_path) -> JournalStore:
+	"""A compacted store of 30 products with metadata, versions and lineage."""
+	store = JournalStore(tmp_path / "feam_registry.json")
+	registry = Registry()
+	store.load(registry)
+	team = registry.create_team("lab")
+	for i in range(30):
+		product = registry.create_data_product(
+			name=f"prod_{i}",
+			description="ocean salinity" if i % 3 == 0 else f"climate sentinel run {i}",
+			owner_team_id=team.teams_id,
+			data_format="zarr" if i % 2 else "parquet",
+			access_uri=f"/publish/lab/prod_{i}",
+			status="active" if i % 4 else "draft",
+			classification="internal",
+		)
+		registry.add_metadata(product.product_id, "business", "domain", "ocean" if i % 3 == 0 else "climate", "string")
+		registry.add_metadata(product.product_id, "technical", "row_count", str(i * 37), "integer")
+		if i % 5 == 0:
+			registry.add_metadata(product.product_id, "technical", "refresh_schedule", "@daily", "string")
+			registry.add_metadata(product.product_id, "feam", "refreshed_at", f"2024-01-{i + 1:02d}T00:00:00", "datetime")
+		if i % 7 == 0:
+			registry.create_version(product.product_id)
+		if i:
+			registry.add_lineage(product.product_id, product.product_id - 1)
+	store.compact(registry)
+	return store
+
+
+def load(store: JournalStore, compact: bool = False) -> Registry:
+	registry = Registry(compact=compact)
+	store.load(registry)
+	return registry
+
+
+def from_json(store: JournalStore) -> Registry:
+	"""The registry as the JSON snapshot alone describes it."""
+	registry = Registry()
+	with store.path.open("r", encoding="utf-8") as f, registry.untracked():
+		apply_snapshot(registry, json.load(f))
+	return registry
+
+
+def answers(registry: Registry) -> list:
+	"""What queries over every index return, to compare registries by."""
+	out: list = [snapshot_to_dict(registry)]
+	for query in QUERIES:
+		for exprs in FILTERS:
+			filters = [parse_filter(expr) for expr in exprs]
+			for match_all in (True, False):
+				hits = registry.rank_products(query, limit=10, match_all=match_all, filters=filters)
+				out.append([(product.product_id, round(position[0], 9)) for product, position in hits])
+	for exprs in FILTERS:
+		out.append(sorted(registry.filter_product_ids([parse_filter(expr) for expr in exprs])))
+	for name in FACETS:
+		out.append(registry.facet_counts(parse_facet(name)))
+		out.append(registry.facet_counts(parse_facet(name), [parse_filter("status=active")]))
+	out.append([(due.product_id, due.expected_at) for due in registry.refresh_due(datetime(2024, 2, 1))])
+	out.append([[(m.metadata_id, m.meta_value) for m in p.metadata] for p in registry.list_products()])
+	return out
+
+
+def test_binary_snapshot_round_trips_the_json(store):
+	assert store.has_current_binary()
+	snapshot = BinarySnapshot(store.binary_path)
+	with store.path.open("r", encoding="utf-8") as f:
+		data = json.load(f)
+	assert list(snapshot.product_ids) == [p["id"] for p in data["products"]]
+	assert sorted(snapshot.lineage_edges()) == sorted(map(tuple, data["lineage"]))
+
+	registry = load(store)
+	assert registry._snapshot is not None
+	assert answers(registry) == answers(from_json(store))
+
+
+@pytest.mark.parametrize(
+	"damage",
+	(
+		lambda data: data[:len(data) // 2],
+		lambda data: b"NOTASNAP" + data[8:],
+		lambda data: b"",
+	),
+	ids=("truncated", "bad-magic", "empty"),
+)
+def test_damaged_snapshot_is_rebuilt(store, damage):
+	expected = answers(from_json(store))
+	store.binary_path.write_bytes(damage(store.binary_path.read_bytes()))
+	assert not store.has_current_binary()
+
+	# The JSON snapshot is read instead and the binary copy written again.
+	registry = load(store)
+	assert registry._snapshot is None
+	assert answers(registry) == expected
+	assert store.has_current_binary()
+	assert answers(load(store)) == expected
+
+
+def test_stale_snapshot_is_rebuilt(store):
+	# Something other than feam edited the JSON snapshot.
+	with store.path.open("r", encoding="utf-8") as f:
+		data = json.load(f)
+	data["products"][0]["description"] = "desert survey"
+	store.path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+	assert not store.has_current_binary()
+
+	registry = load(store)
+	assert [p.product_id for p in registry.search_products("desert")] == [data["products"][0]["id"]]
+	assert store.has_current_binary()
+	assert answers(load(store)) == answers(from_json(store))
+
+
+def test_snapshot_of_another_version_is_rebuilt(store, monkeypatch):
+	with store.path.open("r", encoding="utf-8") as f:
+		data = json.load(f)
+	monkeypatch.setattr(binary_snapshot, "FORMAT_VERSION", binary_snapshot.FORMAT_VERSION + 1)
+	store.rebuild_binary()
+	assert not store.rebuild_binary()
+	monkeypatch.undo()
+
+	with pytest.raises(ValueError, match="version"):
+		BinarySnapshot(store.binary_path)
+	assert store.rebuild_binary()
+	assert answers(load(store)) == answers(from_json(store))
+	assert len(load(store).list_products()) == len(data["products"])
+
+
+@pytest.mark.parametrize("compact", (False, True))
+@pytest.mark.parametrize("searched_first", (False, True))
+def test_metadata_writes_only_move_the_edited_products(store, compact, searched_first):
+	registry, expected = load(store, compact), from_json(store)
+	# Number new rows like the JSON-only registry does.
+	registry.set_id_allocator(None)
+	if searched_first:
+		# Build the in-memory indexes before the edits, so they are updated in place.
+		answers(registry)
+	held = registry.get_product(4)
+	for r in (registry, expected):
+		r.set_metadata(4, "business", "domain", "desert", "string")
+		r.set_metadata(5, "technical", "row_count", "9999", "integer")
+		r.add_metadata(10, "business", "note", "desert climate", "string")
+		r.set_metadata(12, "technical", "row_count", "1", "integer")
+		r.set_metadata(17, "feam", "refreshed_at", "2024-01-31T00:00:00", "datetime")
+		r.update_metadata(r.get_product(20).metadata[0].metadata_id, "ocean", "string")
+
+	# The rest of the catalog is still served from the snapshot.
+	assert registry._snapshot is not None
+	assert registry._edited_ids == {4, 5, 10, 12, 17, 20}
+	assert registry.get_product(4) is held
+	assert answers(registry) == answers(expected)
+
+	store.commit(registry)
+	assert answers(load(store)) == answers(expected)
+	store.compact(registry)
+	assert answers(load(store)) == answers(expected)
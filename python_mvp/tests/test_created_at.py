@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+
+import pytest
+
+from registry import columns
+from registry.filters import parse_filter
+from registry.migrations import FORMAT_VERSION, file_format_version
+from registry.query_cache import QueryCache
+from registry.services import Registry
+from registry.sqlite_registry import SqliteRegistry
+from registry.storage import JournalStore
+
+WINDOWS = (
+	("created_at>=2024-01-01", "created_at<2025-01-01"),
+	("created_at>2024-03-01T06:00:00",),
+	("created_at<=2023-12-31", "status=active,draft"),
+	("created_at>=2024-01-01", "classification!=restricted"),
+)
+
+
+def add_product(registry: Registry, team_id: int, name: str, created_at: datetime, status: str = "active"):
+	return registry.create_data_product(
+		name=name,
+		description=f"{name} test product",
+		owner_team_id=team_id,
+		data_format="parquet",
+		access_uri=f"/publish/lab/{name}",
+		status=status,
+		classification="restricted" if name.endswith("3") else "internal",
+		created_at=created_at,
+	)
+
+
+def load(path) -> Registry:
+	registry = Registry()
+	JournalStore(path).load(registry)
+	return registry
+
+
+def expected_ids(registry: Registry, exprs) -> set:
+	filters = [parse_filter(expr) for expr in exprs]
+	ids = set()
+	for product in registry.list_products():
+		if all(matches(product, f) for f in filters):
+			ids.add(product.product_id)
+	return ids
+
+
+def matches(product, f) -> bool:
+	if f.key == "created_at":
+		value, bound = product.created_at, datetime.fromisoformat(f.value)
+		return {">": value > bound, ">=": value >= bound, "<": value < bound, "<=": value <= bound}[f.op]
+	found = str(getattr(product, f.key)) in f.values
+	return not found if f.op == "!=" else found
+
+
+@pytest.fixture
+def catalog(tmp_path) -> Registry:
+	"""Products from 2023 to 2025, half in the binary snapshot and half added since."""
+	path = tmp_path / "feam_registry.json"
+	store = JournalStore(path)
+	registry = Registry()
+	store.load(registry)
+	team = registry.create_team("lab")
+	for i, month in enumerate((1, 5, 9)):
+		add_product(registry, team.teams_id, f"stored_{i}", datetime(2023 + i, month, 1, 6, 0), "draft")
+	store.compact(registry)
+
+	registry = load(path)
+	for i, month in enumerate((2, 3, 12)):
+		add_product(registry, team.teams_id, f"recent_{i}", datetime(2023 + i, month, 1, 12, 0))
+	registry.query_cache = QueryCache(capacity=0)
+	return registry
+
+
+def test_timestamps_survive_the_journal_and_both_snapshots(tmp_path):
+	path = tmp_path / "feam_registry.json"
+	store = JournalStore(path)
+	registry = Registry()
+	store.load(registry)
+	team = registry.create_team("lab")
+	created_at = datetime(2024, 5, 1, 12, 30, 0, 250000)
+	product_id = add_product(registry, team.teams_id, "foo", created_at).product_id
+	store.commit(registry)
+
+	# Replayed from the journal, then read from the binary and the JSON snapshot.
+	assert load(path).get_product(product_id).created_at == created_at
+	store.compact(registry)
+	assert load(path).get_product(product_id).updated_at == created_at
+	store.binary_path.unlink()
+	assert load(path).get_product(product_id).created_at == created_at
+
+
+def test_format_1_snapshot_is_stamped_once(tmp_path):
+	path = tmp_path / "feam_registry.json"
+	product = {
+		"id": 1,
+		"name": "foo",
+		"description": "",
+		"owner_team_id": 1,
+		"data_format": "csv",
+		"access_uri": "/publish/lab/foo",
+		"status": "active",
+		"classification": "internal",
+	}
+	data = {
+		"format_version": 1,
+		"teams": [{"id": 1, "name": "lab"}],
+		"products": [product],
+		"metadata": [],
+		"versions": [],
+		"lineage": [],
+	}
+	path.write_text(json.dumps(data))
+
+	before = datetime.utcnow()
+	first = load(path).get_product(1)
+	assert file_format_version(path) == FORMAT_VERSION
+	assert before <= first.created_at == first.updated_at <= datetime.utcnow()
+	assert load(path).get_product(1).created_at == first.created_at
+
+
+@pytest.mark.parametrize("exprs", WINDOWS)
+def test_created_at_filters_without_numpy(catalog, monkeypatch, exprs):
+	monkeypatch.setattr(columns, "_numpy", False)
+	catalog.columnar_min_products = 0
+	assert catalog.filter_product_ids([parse_filter(expr) for expr in exprs]) == expected_ids(catalog, exprs)
+
+
+@pytest.mark.parametrize("exprs", WINDOWS)
+def test_created_at_columns_match_the_set_indexes(catalog, exprs):
+	if not columns.available():
+		pytest.skip("NumPy is not installed")
+	filters = [parse_filter(expr) for expr in exprs]
+	catalog.columnar_min_products = len(catalog.list_products()) + 1
+	by_sets = catalog.filter_product_ids(filters)
+	catalog.columnar_min_products = 0
+	assert catalog.filter_product_ids(filters) == by_sets == expected_ids(catalog, exprs)
+
+
+def test_cached_created_at_filter_sees_new_products(tmp_path):
+	registry = Registry()
+	team = registry.create_team("lab")
+	add_product(registry, team.teams_id, "old", datetime(2023, 1, 1))
+	window = [parse_filter("created_at>=2024-01-01")]
+	assert registry.filter_product_ids(window) == set()
+	new = add_product(registry, team.teams_id, "new", datetime(2024, 6, 1))
+	assert registry.filter_product_ids(window) == {new.product_id}
+
+
+@pytest.mark.parametrize("expr", ("created_at=2024-01-01", "created_at>1e9", "created_at!=2024-01-01"))
+def test_created_at_needs_a_range_over_dates(expr):
+	with pytest.raises(ValueError):
+		parse_filter(expr)
+
+
+def test_created_at_filter_on_sqlite(tmp_path):
+	registry = SqliteRegistry(tmp_path / "registry.db")
+	try:
+		team = registry.create_team("lab")
+		product = registry.create_data_product("foo", "", team.teams_id, "csv", "/publish/lab/foo", "active", "internal")
+		registry.commit()
+		ids = lambda expr: {p.product_id for p in registry.iter_products([parse_filter(expr)])}
+		assert ids("created_at>=2000-01-01") == {product.product_id}
+		assert ids("created_at<2000-01-01") == set()
+	finally:
+		registry.close()
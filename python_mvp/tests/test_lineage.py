@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import random
+from typing import Dict, Set
+
+import pytest
+
+from registry.lineage import LineageCycleError, LineageGraph
+
+
+def chain(*nodes: int) -> LineageGraph:
+	"""A graph where each node reads the next one."""
+	graph = LineageGraph()
+	for downstream, upstream in zip(nodes, nodes[1:]):
+		graph.add_edge(downstream, upstream)
+	return graph
+
+
+def reachable(adjacency: Dict[int, Set[int]], node: int) -> Set[int]:
+	seen: Set[int] = set()
+	stack = [node]
+	while stack:
+		for neighbour in adjacency.get(stack.pop(), ()):
+			if neighbour not in seen:
+				seen.add(neighbour)
+				stack.append(neighbour)
+	return seen
+
+
+def test_self_edge_is_rejected():
+	graph = LineageGraph()
+	with pytest.raises(LineageCycleError) as error:
+		graph.add_edge(1, 1)
+	assert error.value.cycle == [1, 1]
+	assert len(graph) == 0 and not graph.has_edge(1, 1)
+
+
+@pytest.mark.parametrize("memoized", (False, True))
+def test_edge_closing_a_longer_cycle_is_rejected(memoized):
+	graph = chain(1, 2, 3)
+	if memoized:
+		# The check answers from a memoized closure instead of searching.
+		assert graph.upstream(1) == {2, 3}
+	with pytest.raises(LineageCycleError) as error:
+		graph.add_edge(3, 1)
+	assert error.value.cycle == [3, 1, 2, 3]
+	assert list(graph.edges()) == [(1, 2), (2, 3)]
+	assert graph.upstream(3) == frozenset()
+
+
+def test_cycles_replayed_unchecked_are_reported():
+	graph = chain(1, 2, 3)
+	graph.add_edge(3, 1, check=False)
+	assert graph.upstream(1) == {1, 2, 3}
+	assert graph.find_cycle() == [1, 2, 3, 1]
+	with pytest.raises(LineageCycleError):
+		graph.impact(2)
+	with pytest.raises(LineageCycleError):
+		graph.topological_order([1, 2, 3])
+
+
+def test_new_edges_invalidate_only_the_closures_they_change():
+	graph = chain(1, 2, 3)
+	graph.add_edge(10, 11)
+	assert graph.upstream(1) == {2, 3}
+	assert graph.downstream(3) == {1, 2}
+	assert graph.upstream(10) == {11}
+
+	graph.add_edge(3, 4)
+	assert graph.upstream(1) == {2, 3, 4}
+	assert graph.upstream(2) == {3, 4}
+	assert graph.downstream(4) == {1, 2, 3}
+	# The other component's memo entry survived the edit.
+	assert 10 in graph._upstream_closures
+
+	graph.remove_edge(2, 3)
+	assert graph.upstream(1) == {2}
+	assert graph.downstream(4) == {3}
+	assert graph.upstream(10) == {11}
+
+
+def test_memoized_closures_match_a_fresh_search():
+	rng = random.Random(7)
+	graph = LineageGraph()
+	upstream: Dict[int, Set[int]] = {}
+	downstream: Dict[int, Set[int]] = {}
+	for _ in range(400):
+		a, b = rng.sample(range(40), 2)
+		# Edges always point to a lower id, so there are no cycles.
+		a, b = max(a, b), min(a, b)
+		if graph.has_edge(a, b) and rng.random() < 0.5:
+			graph.remove_edge(a, b)
+			upstream[a].discard(b)
+			downstream[b].discard(a)
+		else:
+			graph.add_edge(a, b)
+			upstream.setdefault(a, set()).add(b)
+			downstream.setdefault(b, set()).add(a)
+		node = rng.randrange(40)
+		assert graph.upstream(node) == reachable(upstream, node)
+		assert graph.downstream(node) == reachable(downstream, node)
+
+
+def test_impact_order_puts_inputs_first():
+	graph = LineageGraph()
+	# 2, 3 and 7 read 1; 4 reads 2 and 3; 5 reads 4; 6 reads 3.
+	for downstream, upstream in ((4, 2), (4, 3), (2, 1), (3, 1), (7, 1), (5, 4), (6, 3)):
+		graph.add_edge(downstream, upstream)
+
+	# Kahn's algorithm, lower ids first among the ready products.
+	assert graph.impact(1) == [2, 3, 7, 4, 6, 5]
+	assert graph.impact(2) == [4, 5]
+	assert graph.impact(5) == []
+	order = graph.impact(1)
+	for downstream, upstream in graph.edges():
+		if upstream in order:
+			assert order.index(upstream) < order.index(downstream)
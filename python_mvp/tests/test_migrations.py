@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from registry import migrations
+from registry.migrations import (
+	FORMAT_VERSION,
+	SnapshotFormatError,
+	file_format_version,
+	iter_sections,
+	upgrade_data,
+	upgrade_file,
+	write_sections,
+)
+from registry.seed import seed_mock_data
+from registry.services import Registry
+from registry.storage import JournalStore
+
+MOCK_PRODUCT = "canada_climate_observations_daily"
+
+
+def product(name: str, **fields) -> dict:
+	record = {
+		"name": name,
+		"description": "",
+		"owner_team_id": 1,
+		"data_format": "csv",
+		"access_uri": f"/publish/lab/{name}",
+		"status": "active",
+		"classification": "internal",
+	}
+	return {**record, **fields}
+
+
+def upgraded(data: dict) -> str:
+	target = io.StringIO()
+	upgrade_file(io.StringIO(json.dumps(data, indent=2)), target)
+	return target.getvalue()
+
+
+@pytest.mark.parametrize(
+	"data",
+	(
+		{},
+		{"format_version": 2, "teams": [], "products": []},
+		{"teams": [{"id": 1, "name": "Lab é"}], "lineage": [[2, 1], [3, 1]]},
+		{"info": {"nested": [1, {"a": None}], "empty": {}}, "records": [[], {}, "x", 1.5, True]},
+	),
+)
+def test_write_sections_is_laid_out_like_json_dumps(data):
+	for lists in (list, iter):
+		out = io.StringIO()
+		write_sections(out, ((key, lists(value) if isinstance(value, list) else value) for key, value in data.items()))
+		assert out.getvalue() == json.dumps(data, indent=2)
+
+
+@pytest.mark.parametrize("chunk", range(1, 12))
+def test_numbers_split_across_chunks_are_read_whole(monkeypatch, chunk):
+	monkeypatch.setattr(migrations, "_READ_CHUNK", chunk)
+	data = {"ids": [123456789, -42, 3.25e10, 7], "name": "x", "next_id": 9876543210}
+	for text in (json.dumps(data), json.dumps(data, indent=2)):
+		sections = []
+		for key, value in iter_sections(io.StringIO(text)):
+			sections.append((key, list(value) if key == "ids" else value))
+		assert dict(sections) == data
+
+
+def test_headerless_v0_file_is_upgraded():
+	data = {
+		"teams": [{"name": "Climate & Environment"}, {"name": "Lab"}],
+		"products": [product("local_product"), product(MOCK_PRODUCT), product("pinned", id=7)],
+	}
+	before = datetime.utcnow()
+	text = upgraded(data)
+	result = json.loads(text)
+
+	assert list(result) == ["format_version", "teams", "products", "metadata", "versions", "lineage"]
+	assert result["format_version"] == FORMAT_VERSION
+	assert [team["id"] for team in result["teams"]] == [1, 2]
+	assert [p["id"] for p in result["products"]] == [1, 2, 7]
+	# Metadata is backfilled from the mock catalog for the product named like a mock product.
+	seeded = Registry()
+	with seeded.untracked():
+		seed_mock_data(seeded)
+	expected = [
+		(m.namespace, m.meta_key, m.meta_value, m.value_type)
+		for m in seeded.get_product_by_name(MOCK_PRODUCT).metadata
+	]
+	assert expected
+	assert [(m["namespace"], m["meta_key"], m["meta_value"], m["value_type"]) for m in result["metadata"]] == expected
+	assert {m["data_product_id"] for m in result["metadata"]} == {2}
+	assert [m["id"] for m in result["metadata"]] == list(range(1, len(expected) + 1))
+	assert result["versions"] == [] and result["lineage"] == []
+	for p in result["products"]:
+		assert before <= datetime.fromisoformat(p["created_at"]) <= datetime.utcnow()
+		assert p["updated_at"] == p["created_at"]
+	# The streamed upgrade writes what upgrading the parsed file gives.
+	assert text == json.dumps(result, indent=2)
+
+
+def test_v1_file_gets_timestamps():
+	stamped = "2024-05-01T12:00:00"
+	data = {
+		"format_version": 1,
+		"teams": [{"id": 1, "name": "Lab"}],
+		"products": [product("old", id=1), product("kept", id=2, created_at=stamped)],
+		"metadata": [],
+		"versions": [],
+		"lineage": [],
+	}
+	result = json.loads(upgraded(data))
+	assert result["format_version"] == FORMAT_VERSION
+	old, kept = result["products"]
+	assert old["created_at"] == old["updated_at"]
+	assert kept["created_at"] == kept["updated_at"] == stamped
+	assert {key: value for key, value in kept.items() if not key.endswith("_at")} == product("kept", id=2)
+	assert upgrade_data(data)["products"][1] == kept
+
+
+def test_current_file_is_rewritten_byte_for_byte():
+	data = {
+		"format_version": FORMAT_VERSION,
+		"teams": [{"id": 1, "name": "Lab"}],
+		"products": [product("p", id=1, created_at="2024-01-01T00:00:00", updated_at="2024-01-02T00:00:00")],
+		"metadata": [
+			{"id": 1, "data_product_id": 1, "namespace": "business", "meta_key": "domain", "meta_value": "x", "value_type": "string"}
+		],
+		"versions": [],
+		"lineage": [[2, 1]],
+	}
+	assert upgraded(data) == json.dumps(data, indent=2)
+	assert upgrade_data(data) is data
+
+
+def test_newer_format_is_refused(tmp_path):
+	data = {"format_version": FORMAT_VERSION + 1, "teams": [], "products": []}
+	path = tmp_path / "feam_registry.json"
+	path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+	with pytest.raises(SnapshotFormatError, match="newer"):
+		file_format_version(path)
+	with pytest.raises(SnapshotFormatError):
+		upgraded(data)
+	with pytest.raises(SnapshotFormatError):
+		upgrade_data(data)
+	with pytest.raises(SnapshotFormatError):
+		JournalStore(path).load(Registry())
+	# The file is left for the newer feam that wrote it.
+	assert json.loads(path.read_text(encoding="utf-8")) == data
+
+
+def test_store_upgrades_a_v0_file_once(tmp_path):
+	path = tmp_path / "feam_registry.json"
+	path.write_text(json.dumps({"teams": [{"name": "Lab"}], "products": [product("p")]}), encoding="utf-8")
+	store = JournalStore(path)
+	assert store.upgrade()
+	assert file_format_version(path) == FORMAT_VERSION
+	assert not store.upgrade()
+	registry = Registry()
+	store.load(registry)
+	assert [(p.product_id, p.name) for p in registry.list_products()] == [(1, "p")]
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import os
+
+from registry.cli import publish_uri
+from registry.scan import ScanCache, Scanner
+from registry.services import Registry
+from registry.storage import JournalStore
+
+
+def rewrite_in_place(path, data: bytes) -> None:
+	"""Overwrite `path` without touching its directory's mtime."""
+	parent = os.stat(path.parent)
+	with open(path, "r+b") as f:
+		f.write(data)
+	os.utime(path.parent, ns=(parent.st_atime_ns, parent.st_mtime_ns))
+
+
+def test_rescan_measures_known_products_again(tmp_path):
+	product = tmp_path / "lab" / "run1"
+	product.mkdir(parents=True)
+	(product / "t.nc").write_bytes(b"x" * 10)
+	cache = ScanCache()
+
+	[found] = Scanner(cache).scan(str(tmp_path)).products
+	assert (found.size_bytes, found.changed) == (10, True)
+
+	[found] = Scanner(cache).scan(str(tmp_path)).products
+	assert found.changed is False
+
+	rewrite_in_place(product / "t.nc", b"y" * 25)
+	report = Scanner(cache).scan(str(tmp_path))
+	[found] = report.products
+	assert (found.size_bytes, found.changed) == (25, True)
+	# The other directories are still answered from the cache.
+	assert report.dirs_listed == 0
+
+
+def test_scan_updates_metadata_of_files_rewritten_in_place(feam, tmp_path):
+	product = tmp_path / "lab" / "run1"
+	product.mkdir(parents=True)
+	(product / "t.nc").write_bytes(b"x" * 10)
+
+	feam("scan", "lab")
+	rewrite_in_place(product / "t.nc", b"y" * 25)
+	out = feam("scan", "lab")
+	assert "Updated     : 1" in out
+
+	registry = Registry()
+	JournalStore(tmp_path / "feam_registry.json").load(registry)
+	product = registry.get_product_by_uri(publish_uri("demo_team", "run1"))
+	sizes = [m.meta_value for m in product.metadata if (m.namespace, m.meta_key) == ("feam", "size_bytes")]
+	assert sizes == ["25"]
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime
+
+import pytest
+
+from registry.schedule import CronSchedule, RefreshIndex, compile_cron
+from registry.typed_values import epoch_seconds
+
+
+def runs(expression: str, moment: datetime, count: int) -> list:
+	"""The next `count` runs of `expression` after `moment`."""
+	schedule, found = CronSchedule(expression), []
+	for _ in range(count):
+		moment = schedule.next_after(moment)
+		found.append(moment)
+	return found
+
+
+def test_restricted_day_of_month_or_day_of_week():
+	# The 13th or any Friday; 2026-10-01 is a Thursday.
+	schedule = CronSchedule("0 0 13 * 5")
+	assert runs("0 0 13 * 5", datetime(2026, 10, 1), 4) == [
+		datetime(2026, 10, 2),
+		datetime(2026, 10, 9),
+		datetime(2026, 10, 13),
+		datetime(2026, 10, 16),
+	]
+	assert schedule.last_until(datetime(2026, 10, 15)) == datetime(2026, 10, 13)
+	assert schedule.last_until(datetime(2026, 10, 12, 23, 59)) == datetime(2026, 10, 9)
+
+
+def test_day_field_starting_with_a_star_needs_both():
+	# Days 1, 11, 21 and 31 that are also Mondays: 2026-06-01 and 2026-08-31.
+	schedule = CronSchedule("0 0 */10 * mon")
+	assert schedule.next_after(datetime(2026, 6, 1)) == datetime(2026, 8, 31)
+	assert schedule.last_until(datetime(2026, 8, 30)) == datetime(2026, 6, 1)
+	# With only one field restricted, that one decides.
+	assert runs("0 0 * * 5", datetime(2026, 10, 1), 2) == [datetime(2026, 10, 2), datetime(2026, 10, 9)]
+	assert runs("0 0 13 * *", datetime(2026, 10, 1), 2) == [datetime(2026, 10, 13), datetime(2026, 11, 13)]
+
+
+def test_steps_ranges_lists_and_names():
+	# 2026-10-02 is a Friday.
+	assert runs("*/15 9-17/4 * * mon-fri", datetime(2026, 10, 2, 13, 10), 4) == [
+		datetime(2026, 10, 2, 13, 15),
+		datetime(2026, 10, 2, 13, 30),
+		datetime(2026, 10, 2, 13, 45),
+		datetime(2026, 10, 2, 17, 0),
+	]
+	assert CronSchedule("*/15 9-17/4 * * mon-fri").next_after(datetime(2026, 10, 2, 17, 45)) == datetime(
+		2026, 10, 5, 9, 0
+	)
+	# A step from a single value runs to the end of the field.
+	assert runs("5/20 0 * * *", datetime(2026, 10, 1), 4) == [
+		datetime(2026, 10, 1, 0, 5),
+		datetime(2026, 10, 1, 0, 25),
+		datetime(2026, 10, 1, 0, 45),
+		datetime(2026, 10, 2, 0, 5),
+	]
+	assert runs("30 6 1 JAN,jul *", datetime(2026, 2, 1), 2) == [
+		datetime(2026, 7, 1, 6, 30),
+		datetime(2027, 1, 1, 6, 30),
+	]
+	# 7 is Sunday too.
+	assert runs("0 0 * * 7", datetime(2026, 10, 1), 3) == runs("0 0 * * sun", datetime(2026, 10, 1), 3)
+
+
+@pytest.mark.parametrize(
+	"macro, expression",
+	(
+		("@yearly", "0 0 1 1 *"),
+		("@annually", "0 0 1 1 *"),
+		("@monthly", "0 0 1 * *"),
+		("@weekly", "0 0 * * 0"),
+		("@daily", "0 0 * * *"),
+		("@Midnight", "0 0 * * *"),
+		("@hourly", "0 * * * *"),
+	),
+)
+def test_macros_expand_to_their_expressions(macro, expression):
+	start = datetime(2026, 12, 30, 22, 30)
+	assert runs(macro, start, 5) == runs(expression, start, 5)
+	assert CronSchedule(macro).expression == macro
+
+
+@pytest.mark.parametrize(
+	"expression, moment, following, previous",
+	(
+		("@monthly", datetime(2026, 12, 15), datetime(2027, 1, 1), datetime(2026, 12, 1)),
+		("@yearly", datetime(2027, 1, 1), datetime(2028, 1, 1), datetime(2027, 1, 1)),
+		("@daily", datetime(2026, 12, 31, 23, 59, 30), datetime(2027, 1, 1), datetime(2026, 12, 31)),
+		("59 23 31 * *", datetime(2026, 4, 1), datetime(2026, 5, 31, 23, 59), datetime(2026, 3, 31, 23, 59)),
+		("0 0 29 2 *", datetime(2025, 3, 1), datetime(2028, 2, 29), datetime(2024, 2, 29)),
+		("0 12 * * *", datetime(2026, 10, 1, 12, 0, 30), datetime(2026, 10, 2, 12), datetime(2026, 10, 1, 12)),
+	),
+)
+def test_runs_across_month_and_year_boundaries(expression, moment, following, previous):
+	schedule = CronSchedule(expression)
+	assert schedule.next_after(moment) == following
+	assert schedule.last_until(moment) == previous
+	# Strictly after, and at or before.
+	assert schedule.next_after(previous) > previous
+	assert schedule.last_until(following) == following
+
+
+@pytest.mark.parametrize(
+	"expression",
+	("0 0 * *", "61 * * * *", "*/0 * * * *", "5-1 * * * *", "0 0 1 foo *", "0 0 30 2 *", "@often"),
+)
+def test_invalid_expressions_are_rejected(expression):
+	with pytest.raises(ValueError):
+		CronSchedule(expression)
+
+
+def test_due_lists_the_heap_in_expected_order():
+	refreshed = datetime(2026, 10, 1, 8, 30)
+	index = RefreshIndex.build(
+		[(1, "@hourly"), (2, "@daily"), (3, "@weekly"), (4, "0 9 * * *"), (5, "@monthly"), (6, "not cron")],
+		[(product_id, epoch_seconds(refreshed)) for product_id in (1, 2, 3, 4)],
+	)
+	# Product 5 was never refreshed, so it is overdue first; 6 does not parse.
+	assert [d.product_id for d in index.due(datetime(2026, 10, 2))] == [5, 1, 4, 2]
+	assert [d.expected_at for d in index.due(datetime(2026, 10, 2))] == [
+		None,
+		datetime(2026, 10, 1, 9),
+		datetime(2026, 10, 1, 9),
+		datetime(2026, 10, 2),
+	]
+	assert [d.product_id for d in index.due(datetime(2026, 10, 1, 8, 59))] == [5]
+	assert set(index.invalid) == {6}
+
+	# A new refresh moves the product to its next run.
+	index.index_metadata(1, "feam", "refreshed_at", "", datetime(2026, 10, 1, 23, 10))
+	index.index_metadata(5, "technical", "refresh_schedule", "@yearly", None)
+	# 1 and 2 are now both due at midnight; ties go to the lower id.
+	assert [d.product_id for d in index.due(datetime(2026, 10, 2))] == [5, 4, 1, 2]
+	index.unindex_metadata(4, "technical", "refresh_schedule")
+	assert [d.product_id for d in index.due(datetime(2026, 10, 2))] == [5, 1, 2]
+
+
+def test_due_matches_a_full_scan_after_many_updates():
+	rng = random.Random(7)
+	expressions = ("@hourly", "@daily", "*/20 * * * *", "0 6 * * mon-fri", "0 0 1 * *", "0 0 13 * 5")
+	start = datetime(2026, 1, 1)
+	schedules = {product_id: rng.choice(expressions) for product_id in range(200)}
+	refreshed = {product_id: epoch_seconds(start) + rng.randrange(86400 * 60) for product_id in range(0, 200, 2)}
+	index = RefreshIndex.build(schedules.items(), refreshed.items())
+	for _ in range(1000):
+		product_id = rng.randrange(200)
+		if rng.random() < 0.5:
+			schedules[product_id] = rng.choice(expressions)
+			index.index_metadata(product_id, "technical", "refresh_schedule", schedules[product_id], None)
+		else:
+			at = datetime.utcfromtimestamp(epoch_seconds(start) + rng.randrange(86400 * 60)).replace(microsecond=0)
+			refreshed[product_id] = epoch_seconds(at)
+			index.index_metadata(product_id, "feam", "refreshed_at", at.isoformat(), at)
+
+	until = datetime(2026, 2, 15)
+	expected = []
+	for product_id, expression in schedules.items():
+		if product_id not in refreshed:
+			expected.append((datetime.min, product_id))
+			continue
+		at = compile_cron(expression).next_after(datetime.utcfromtimestamp(refreshed[product_id]))
+		if at <= until:
+			expected.append((at, product_id))
+	assert [d.product_id for d in index.due(until)] == [product_id for _, product_id in sorted(expected)]
+	assert len(index) == len(schedules)
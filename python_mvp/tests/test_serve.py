@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import pytest
+
+from registry.cli import SQLITE_FILE
+from registry.services import Registry
+from registry.sqlite_registry import SqliteRegistry
+from registry.storage import JournalStore
+
+
+def fingerprint_of(entries) -> Optional[str]:
+	return next((m.meta_value for m in entries if m.namespace == "feam" and m.meta_key == "fingerprint"), None)
+
+
+def test_serving_a_name_again_on_sqlite_adds_a_version(feam, tmp_path):
+	(tmp_path / "a.csv").write_text("x\n1\n")
+	(tmp_path / "b.csv").write_text("x\n2\n")
+
+	feam("--backend", "sqlite", "serve", "a.csv", "--name", "foo", "--no-fingerprint")
+	out = feam("--backend", "sqlite", "serve", "b.csv", "--name", "foo", "--version", "2", "--no-fingerprint")
+	assert "Version     : 2" in out
+	out = feam("--backend", "sqlite", "serve", "b.csv", "--name", "foo", "--version", "2", "--no-fingerprint")
+	assert "already has a version 2" in out
+
+	registry = SqliteRegistry(tmp_path / SQLITE_FILE)
+	try:
+		[product] = registry.list_products()
+		labels = [version.version_label for version in registry.list_versions(product.product_id)]
+		assert labels == ["1.0.0", "2"]
+		paths = [m.meta_value for m in product.metadata if m.meta_key == "source_path"]
+		assert paths == ["b.csv"]
+	finally:
+		registry.close()
+
+
+def test_freshly_served_product_verifies_clean(feam, tmp_path):
+	(tmp_path / "a.csv").write_text("x\n1\n")
+	feam("serve", "a.csv", "--name", "foo", "--no-fingerprint")
+
+	out = feam("verify", "--namespace", "demo_team")
+	assert "OK          : 1" in out
+	assert "Missing     : 0" in out
+
+
+@pytest.mark.parametrize("backend", ("json", "sqlite"))
+def test_fingerprint_is_cleared_when_the_source_cannot_be_hashed(feam, tmp_path, capsys, backend):
+	(tmp_path / "a.csv").write_text("x\n1\n")
+	out = feam("--backend", backend, "serve", "a.csv", "--name", "foo")
+	assert "Fingerprint : sha256:" in out
+	# Served again from a path that is not available on this machine.
+	feam("--backend", backend, "serve", "/gone/b.csv", "--name", "foo", "--version", "2")
+
+	if backend == "sqlite":
+		registry = SqliteRegistry(tmp_path / SQLITE_FILE)
+	else:
+		registry = Registry()
+		JournalStore(tmp_path / "feam_registry.json").load(registry)
+	try:
+		product = registry.get_product_by_name("foo")
+		first, second = registry.list_versions(product.product_id)
+		assert fingerprint_of(first.metadata.values()).startswith("sha256:")
+		assert not fingerprint_of(second.metadata.values())
+		assert not fingerprint_of(product.metadata)
+	finally:
+		if backend == "sqlite":
+			registry.close()
+	with pytest.raises(SystemExit):
+		feam("--backend", backend, "verify", str(product.product_id))
+	assert "NOT FINGERPRINTED" in capsys.readouterr().out
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import sqlite3
+
+from registry.sqlite_registry import SCHEMA, SqliteRegistry
+
+VERSION_ROWS = "SELECT version_label, source_path, access_uri FROM data_product_versions ORDER BY version_id"
+
+
+def version_rows(path) -> list:
+	conn = sqlite3.connect(str(path))
+	try:
+		return conn.execute(VERSION_ROWS).fetchall()
+	finally:
+		conn.close()
+
+
+def test_source_path_keeps_the_rust_meaning(feam, tmp_path):
+	(tmp_path / "a.csv").write_text("x\n")
+	(tmp_path / "b.csv").write_text("y\n")
+	feam("--backend", "sqlite", "serve", "a.csv", "--name", "foo", "--no-fingerprint")
+	feam("--backend", "sqlite", "serve", "b.csv", "--name", "foo", "--version", "2", "--no-fingerprint")
+
+	# The access URI has its own column; source_path holds the served file.
+	assert version_rows(tmp_path / "registry.db") == [
+		("1.0.0", "a.csv", "/publish/demo_team/foo"),
+		("2", "b.csv", "/publish/demo_team/foo"),
+	]
+	registry = SqliteRegistry(tmp_path / "registry.db")
+	try:
+		product = registry.get_product_by_uri("/publish/demo_team/foo")
+		assert product.access_uri == "/publish/demo_team/foo"
+		assert registry.get_version(product.product_id, "1.0.0").access_uri == product.access_uri
+	finally:
+		registry.close()
+
+
+def test_older_databases_are_upgraded_once(tmp_path):
+	path = tmp_path / "registry.db"
+	conn = sqlite3.connect(str(path))
+	conn.executescript(SCHEMA)
+	conn.executescript(
+		"""
+		INSERT INTO teams (name) VALUES ('Lab');
+		INSERT INTO data_products (name, owner_team_id) VALUES ('python', 1), ('rust', 1);
+		-- Written by an older Python release: the access URI in source_path.
+		INSERT INTO data_product_versions (data_product_id, version_label, asset_type, source_path, data_quality)
+		VALUES (1, '1.0.0', 'csv', '/publish/lab/python', 'active');
+		INSERT INTO metadata (data_product_version_id, namespace, meta_key, meta_value, value_type)
+		VALUES (1, 'feam', 'source_path', '/data/python.csv', 'path');
+		-- Written by the Rust CLI.
+		INSERT INTO data_product_versions (data_product_id, version_label, asset_type, source_path, data_quality)
+		VALUES (2, '1.0.0', 'csv', 'test/data', 'active');
+		"""
+	)
+	conn.commit()
+	conn.close()
+
+	for _ in range(2):
+		SqliteRegistry(path).close()
+	assert version_rows(path) == [
+		("1.0.0", "/data/python.csv", "/publish/lab/python"),
+		("1.0.0", "test/data", None),
+	]
+	registry = SqliteRegistry(path)
+	try:
+		assert registry.get_product_by_uri("/publish/lab/python").name == "python"
+		assert registry.get_product_by_name("rust").access_uri == ""
+	finally:
+		registry.close()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from registry.services import Registry
+from registry.storage import COMPACT_THRESHOLD_BYTES, JournalStore, snapshot_to_dict
+
+
+def load(path) -> Registry:
+	registry = Registry()
+	JournalStore(path).load(registry)
+	return registry
+
+
+def add_product(registry: Registry, name: str, description: str = "") -> int:
+	team = registry.get_team_by_name("Lab") or registry.create_team("Lab")
+	product = registry.create_data_product(
+		name=name,
+		description=description or f"{name} test product",
+		owner_team_id=team.teams_id,
+		data_format="parquet",
+		access_uri=f"/publish/lab/{name}",
+		status="active",
+		classification="internal",
+	)
+	registry.add_metadata(product.product_id, "business", "domain", "climate", "string")
+	return product.product_id
+
+
+@pytest.fixture
+def store(tmp_path) -> JournalStore:
+	return JournalStore(tmp_path / "feam_registry.json")
+
+
+def test_journal_replays_over_the_snapshot(store):
+	registry = Registry()
+	store.load(registry)
+	snapshot = store.path.read_bytes()
+	product_id = add_product(registry, "foo")
+	registry.set_metadata(product_id, "business", "domain", "ocean", "string")
+	registry.create_version(product_id, "v1")
+	store.commit(registry)
+
+	# Only the journal was written; replaying it gives the same registry.
+	assert store.path.read_bytes() == snapshot
+	assert store.journal_path.stat().st_size > 0
+	replayed = load(store.path)
+	assert snapshot_to_dict(replayed) == snapshot_to_dict(registry)
+	assert replayed.get_version(product_id, "v1") is not None
+
+
+def test_torn_last_record_is_dropped(store):
+	registry = Registry()
+	store.load(registry)
+	add_product(registry, "kept")
+	store.commit(registry)
+	committed = snapshot_to_dict(registry)
+	size = store.journal_path.stat().st_size
+	add_product(registry, "torn")
+	store.commit(registry)
+
+	# A writer died halfway through appending its last record.
+	with store.journal_path.open("r+b") as f:
+		f.truncate(size + 20)
+	assert snapshot_to_dict(load(store.path)) == committed
+
+	# The next writer starts on a new line, so its records survive.
+	store = JournalStore(store.path)
+	registry = Registry()
+	store.load(registry)
+	add_product(registry, "after")
+	store.commit(registry)
+	names = {p.name for p in load(store.path).list_products()}
+	assert {"kept", "after"} <= names and "torn" not in names
+
+
+def test_compaction_at_the_threshold_keeps_the_state(store):
+	registry = Registry()
+	store.load(registry)
+	description = "x" * 4096
+	journal_size = 0
+	while True:
+		add_product(registry, f"p{journal_size}", description)
+		expected = snapshot_to_dict(registry)
+		store.commit(registry)
+		if not store.journal_path.exists():
+			break
+		journal_size = store.journal_path.stat().st_size
+		assert journal_size < COMPACT_THRESHOLD_BYTES
+
+	# The commit that took the journal past 1 MiB folded it into the snapshot.
+	assert journal_size > COMPACT_THRESHOLD_BYTES - 2 * len(description)
+	with store.path.open("r", encoding="utf-8") as f:
+		assert json.load(f) == expected
+	assert snapshot_to_dict(load(store.path)) == expected
+
+	# Reloading without the binary snapshot reads the same state from JSON.
+	store.binary_path.unlink()
+	assert snapshot_to_dict(load(store.path)) == expected
+
+
+def test_explicit_compaction_keeps_the_state(store):
+	registry = Registry()
+	store.load(registry)
+	product_id = add_product(registry, "foo")
+	registry.create_version(product_id)
+	registry.add_lineage(product_id, add_product(registry, "bar"))
+	store.commit(registry)
+	expected = snapshot_to_dict(load(store.path))
+
+	store.compact(registry)
+	assert not store.journal_path.exists()
+	assert snapshot_to_dict(load(store.path)) == expected
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import multiprocessing
+import os
+from collections import Counter
+from typing import List
+
+import pytest
+
+from registry import cli
+from registry.services import Registry
+from registry.storage import JournalStore
+
+PROCESSES = 8
+ROWS = 3
+
+
+def serve_batch(argv: List[str]) -> None:
+	"""One writer: a `feam serve --batch` in its own process."""
+	cli.open_store.cache_clear()
+	with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+		cli.run(argv)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_concurrent_writers_lose_nothing(feam, tmp_path):
+	feam("teams")
+	expected = set()
+	writers = []
+	context = multiprocessing.get_context("fork")
+	for task in range(PROCESSES):
+		manifest = tmp_path / f"task_{task}.jsonl"
+		with manifest.open("w", encoding="utf-8") as f:
+			for row in range(ROWS):
+				# Writers share new teams, so they also race to create them.
+				name, namespace = f"task_{task}_{row}", f"lab_{task % 2}"
+				expected.add(f"/publish/{namespace}/{name}")
+				f.write(json.dumps({"path": f"/scratch/{name}", "name": name, "namespace": namespace}) + "\n")
+		argv = ["serve", "--batch", str(manifest), "--no-fingerprint"]
+		writers.append(context.Process(target=serve_batch, args=(argv,)))
+	for process in writers:
+		process.start()
+	for process in writers:
+		process.join()
+	assert [process.exitcode for process in writers] == [0] * PROCESSES
+
+	store = JournalStore(tmp_path / "feam_registry.json")
+	assert not list(store.spool_dir.glob("*"))
+	registry = Registry()
+	store.load(registry)
+	products = registry.list_products()
+	uris = Counter(p.access_uri for p in products)
+	assert all(uris[uri] == 1 for uri in expected)
+	assert len({p.product_id for p in products}) == len(products)
+	metadata_ids = [m.metadata_id for p in products for m in p.metadata]
+	assert len(set(metadata_ids)) == len(metadata_ids)
+	teams = Counter(team.name for team in registry.list_teams())
+	assert teams["lab_0"] == teams["lab_1"] == 1